@@ -0,0 +1,74 @@
+"""
+Configuration gunicorn du service d'embedding (src/services/embeddingService.py).
+
+    gunicorn -c server/gunicorn.embedding.conf.py embeddingService:app
+
+EMBEDDING_PRELOAD=1 (défaut) : le master importe l'app, charge et préchauffe
+le modèle une seule fois, puis forke les workers, qui partagent les poids en
+copie sur écriture et sont prêts dès leur démarrage.
+EMBEDDING_PRELOAD=0 : chaque worker charge sa propre copie en tâche de fond ;
+/live répond tout de suite, /ready passe à 200 une fois le modèle préchauffé.
+
+EMBEDDING_WORKERS, EMBEDDING_THREADS (threads de calcul par worker, par défaut
+les cœurs répartis entre workers), EMBEDDING_BIND, EMBEDDING_MODEL,
+EMBEDDING_BACKEND (torch, onnx, onnx-int8).
+
+METRICS_MULTIPROC_DIR : répertoire où les workers déposent leurs histogrammes
+pour que /metrics agrège tous les workers (requestMetricsService.py) ; vidé au
+démarrage du master.
+"""
+
+import glob
+import os
+import sys
+import tempfile
+
+chdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'services')
+sys.path.insert(0, chdir)
+
+from embeddingModelService import configure_threads, freeze_for_fork  # noqa: E402
+
+bind = os.getenv('EMBEDDING_BIND', '127.0.0.1:5000')
+workers = int(os.getenv('EMBEDDING_WORKERS', '2'))
+preload_app = os.getenv('EMBEDDING_PRELOAD', '1') == '1'
+timeout = 120
+
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'embedding-metrics'))
+
+
+def _model(app):
+    return app.extensions['embedding_model']
+
+
+def on_starting(server):
+    # Instantanés d'une exécution précédente : /metrics repart de zéro
+    metrics_dir = os.environ['METRICS_MULTIPROC_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.json')):
+        os.remove(path)
+
+
+def when_ready(server):
+    # Appelé dans le master après l'import de l'app et avant le fork des workers
+    if not server.cfg.preload_app:
+        return
+    # Un seul thread dans le master : pas de pool OpenMP actif au moment du fork
+    configure_threads(1, threads=1)
+    model = _model(server.app.wsgi())
+    model.warmup()
+    freeze_for_fork()
+    server.log.info("Modèle %s préchargé (chargement %ss, préchauffage %ss)",
+                    model.model_name, model.stats['load_seconds'], model.stats['warmup_seconds'])
+
+
+def post_fork(server, worker):
+    configure_threads(server.cfg.workers)
+
+
+def post_worker_init(worker):
+    model = _model(worker.wsgi)
+    if model.ready:
+        # Préchargé : court préchauffage des threads du worker (et de sa session ONNX Runtime)
+        model.warmup()
+    else:
+        model.warmup_in_background()
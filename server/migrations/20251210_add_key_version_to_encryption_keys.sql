@@ -0,0 +1,19 @@
+-- ============================================================================
+-- Migration : Version de clé maître pour les clés de chiffrement
+-- Date: 2025-12-10
+-- Description: Permet la rotation des clés maîtres (ré-enveloppement des clés
+--              de données sans rechiffrer les documents)
+-- ============================================================================
+
+BEGIN;
+
+ALTER TABLE "EncryptionKeys"
+ADD COLUMN IF NOT EXISTS "key_version" VARCHAR(16) NOT NULL DEFAULT 'v1';
+
+COMMENT ON COLUMN "EncryptionKeys"."key_version" IS 'Version de la clé maître ayant enveloppé encrypted_key';
+
+-- Parcours des clés à ré-envelopper lors d'une rotation
+CREATE INDEX IF NOT EXISTS idx_encryptionkeys_key_version_id
+ON "EncryptionKeys" ("key_version", "id");
+
+COMMIT;
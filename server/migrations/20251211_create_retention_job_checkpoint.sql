@@ -0,0 +1,32 @@
+-- ============================================================================
+-- Migration : Point de reprise du job de rétention
+-- Date: 2025-12-11
+-- Description: Permet au job de rétention nocturne de reprendre après le
+--              dernier lot validé en cas d'interruption
+-- ============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS "RetentionJobCheckpoint" (
+  "job_name" TEXT NOT NULL,
+  "phase" TEXT NOT NULL CHECK ("phase" IN ('archive', 'delete')),
+  "last_document_id" UUID,
+  "updated_at" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY ("job_name", "phase")
+);
+
+COMMENT ON TABLE "RetentionJobCheckpoint" IS 'Dernier document traité par phase du job de rétention';
+
+-- Parcours ordonné des documents éligibles
+CREATE INDEX IF NOT EXISTS idx_documentfile_retention_archive
+ON "DocumentFile" ("id")
+WHERE archived = false AND retention_rule_id IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_documentfile_retention_delete
+ON "DocumentFile" ("id")
+WHERE archived = true AND retention_rule_id IS NOT NULL;
+
+ALTER TABLE "RetentionAudit"
+ALTER COLUMN "performed_at" SET DEFAULT NOW();
+
+COMMIT;
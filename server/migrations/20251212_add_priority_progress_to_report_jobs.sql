@@ -0,0 +1,31 @@
+-- ============================================================================
+-- Migration : Priorités, progression et annulation des jobs de rapports
+-- Date: 2025-12-12
+-- Description: Colonnes utilisées par le worker de rapports multi-processus
+--              (reportWorkerService.py)
+-- ============================================================================
+
+BEGIN;
+
+ALTER TABLE "report_jobs"
+ADD COLUMN IF NOT EXISTS "priority" INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS "timeout_seconds" INTEGER NOT NULL DEFAULT 600,
+ADD COLUMN IF NOT EXISTS "progress" NUMERIC(5, 2) NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS "progress_message" TEXT,
+ADD COLUMN IF NOT EXISTS "partial_result" JSONB,
+ADD COLUMN IF NOT EXISTS "cancel_requested" BOOLEAN NOT NULL DEFAULT false;
+
+COMMENT ON COLUMN "report_jobs"."priority" IS '10 = demande interactive admin, 0 = traitement nocturne';
+COMMENT ON COLUMN "report_jobs"."partial_result" IS 'Sections du rapport déjà calculées, publiées pendant la génération';
+
+-- Statut 'cancelled' (annulation depuis l'interface)
+ALTER TABLE "report_jobs" DROP CONSTRAINT IF EXISTS "report_jobs_status_check";
+ALTER TABLE "report_jobs" ADD CONSTRAINT "report_jobs_status_check"
+CHECK ("status" IN ('pending', 'processing', 'completed', 'failed', 'cancelled'));
+
+-- Prise des jobs en attente par priorité puis ancienneté
+CREATE INDEX IF NOT EXISTS idx_report_jobs_pending_priority
+ON "report_jobs" ("priority" DESC, "created_at" ASC)
+WHERE "status" = 'pending';
+
+COMMIT;
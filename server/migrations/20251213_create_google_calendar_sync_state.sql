@@ -0,0 +1,33 @@
+-- ============================================================================
+-- Migration : État de synchronisation incrémentale Google Calendar
+-- Date: 2025-12-13
+-- Description: Jeton nextSyncToken par intégration et empreintes (etag Google,
+--              empreinte locale du RDV) utilisés par calendarSyncService.py
+-- ============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS "GoogleCalendarSyncState" (
+  "integration_id" UUID PRIMARY KEY REFERENCES "GoogleCalendarIntegration"("id") ON DELETE CASCADE,
+  "sync_token" TEXT,
+  "updated_at" TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS "GoogleCalendarEventFingerprint" (
+  "integration_id" UUID NOT NULL REFERENCES "GoogleCalendarIntegration"("id") ON DELETE CASCADE,
+  "google_event_id" TEXT NOT NULL,
+  "rdv_id" UUID REFERENCES "RDV"("id") ON DELETE SET NULL,
+  "etag" TEXT,
+  "local_fingerprint" VARCHAR(40),
+  "updated_at" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY ("integration_id", "google_event_id")
+);
+
+COMMENT ON TABLE "GoogleCalendarEventFingerprint" IS 'Dernier etag Google et empreinte locale connus par événement synchronisé';
+
+-- Export des RDV modifiés depuis la dernière synchronisation
+CREATE INDEX IF NOT EXISTS idx_rdv_expert_updated_at ON "RDV" ("expert_id", "updated_at");
+CREATE INDEX IF NOT EXISTS idx_rdv_client_updated_at ON "RDV" ("client_id", "updated_at");
+CREATE INDEX IF NOT EXISTS idx_rdv_apporteur_updated_at ON "RDV" ("apporteur_id", "updated_at");
+
+COMMIT;
@@ -0,0 +1,27 @@
+-- ============================================================================
+-- Migration : Journal d'ajouts des réponses du simulateur
+-- Date: 2025-12-14
+-- Description: Deltas de réponses ajoutés par answerLogService.py puis compactés
+--              dans simulations.answers par une fusion atomique answers || delta
+-- ============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS simulation_answer_log (
+  id BIGSERIAL PRIMARY KEY,
+  session_token TEXT NOT NULL,
+  delta JSONB NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Lecture fusionnée et compaction par session, dans l'ordre d'insertion
+CREATE INDEX IF NOT EXISTS idx_simulation_answer_log_session
+  ON simulation_answer_log (session_token, id);
+
+CREATE INDEX IF NOT EXISTS idx_simulations_session_token
+  ON simulations (session_token);
+
+COMMENT ON TABLE simulation_answer_log IS
+  'Deltas de réponses du simulateur en attente de compaction dans simulations.answers';
+
+COMMIT;
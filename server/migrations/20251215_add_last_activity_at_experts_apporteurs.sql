@@ -0,0 +1,19 @@
+-- ============================================================================
+-- Migration : last_activity_at pour les experts et les apporteurs
+-- Date: 2025-12-15
+-- Description: Colonne écrite par activityTrackerService.py (UPDATE groupé),
+--              comme "Client".last_activity_at
+-- ============================================================================
+
+BEGIN;
+
+ALTER TABLE "Client" ADD COLUMN IF NOT EXISTS last_activity_at TIMESTAMPTZ;
+ALTER TABLE "Expert" ADD COLUMN IF NOT EXISTS last_activity_at TIMESTAMPTZ;
+ALTER TABLE "ApporteurAffaires" ADD COLUMN IF NOT EXISTS last_activity_at TIMESTAMPTZ;
+
+COMMENT ON COLUMN "Expert".last_activity_at IS
+  'Dernière activité authentifiée (résolution de activityTrackerService.py)';
+COMMENT ON COLUMN "ApporteurAffaires".last_activity_at IS
+  'Dernière activité authentifiée (résolution de activityTrackerService.py)';
+
+COMMIT;
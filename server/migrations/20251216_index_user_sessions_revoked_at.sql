@@ -0,0 +1,14 @@
+-- ============================================================================
+-- Migration : Index de lecture incrémentale des sessions révoquées
+-- Date: 2025-12-16
+-- Description: RevocationFilter (authCacheService.py) relit user_sessions
+--              par revoked_at croissant depuis son dernier filigrane
+-- ============================================================================
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_user_sessions_revoked_at
+  ON user_sessions (revoked_at)
+  WHERE revoked_at IS NOT NULL;
+
+COMMIT;
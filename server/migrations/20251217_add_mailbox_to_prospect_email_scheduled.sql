@@ -0,0 +1,21 @@
+-- ============================================================================
+-- Migration : Boîte d'envoi des emails programmés
+-- Date: 2025-12-17
+-- Description: Plafonds horaire / journalier par boîte d'envoi appliqués par
+--              bulkSequenceSchedulerService.py (NULL = boîte par défaut)
+-- ============================================================================
+
+BEGIN;
+
+ALTER TABLE "prospect_email_scheduled"
+ADD COLUMN IF NOT EXISTS mailbox TEXT;
+
+-- Chargement des créneaux déjà réservés avant chaque planification
+CREATE INDEX IF NOT EXISTS idx_prospect_email_scheduled_mailbox_slot
+  ON "prospect_email_scheduled" (scheduled_for, mailbox)
+  WHERE status = 'scheduled';
+
+COMMENT ON COLUMN "prospect_email_scheduled".mailbox IS
+  'Boîte d''envoi attribuée par le planificateur (plafonds horaire et journalier)';
+
+COMMIT;
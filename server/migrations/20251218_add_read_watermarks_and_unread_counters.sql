@@ -0,0 +1,55 @@
+-- ============================================================================
+-- Migration : Filigranes de lecture et compteurs non lus de la messagerie
+-- Date: 2025-12-18
+-- Description: Filigrane (last_read_at, last_read_message_id) et compteur par
+--              participant, total par utilisateur, index de pagination par
+--              curseur (messagingReadModelService.py)
+-- ============================================================================
+
+BEGIN;
+
+ALTER TABLE "ConversationParticipant"
+ADD COLUMN IF NOT EXISTS last_read_message_id UUID,
+ADD COLUMN IF NOT EXISTS unread_count INTEGER NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS user_unread_counters (
+  user_id UUID NOT NULL,
+  user_type TEXT NOT NULL,
+  unread_total INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (user_id, user_type)
+);
+
+-- Historique par curseur (created_at, id) et recherche du dernier message
+CREATE INDEX IF NOT EXISTS idx_message_conversation_cursor
+  ON "Message" (conversation_id, created_at DESC, id DESC);
+
+-- Reprise : compteurs initiaux depuis l'état is_read actuel
+UPDATE "ConversationParticipant" AS p
+SET unread_count = c.unread
+FROM (
+  SELECT p2.id, count(m.id)::int AS unread
+  FROM "ConversationParticipant" p2
+  JOIN "Message" m
+    ON m.conversation_id = p2.conversation_id
+   AND m.sender_id <> p2.user_id
+   AND m.is_read = false
+  GROUP BY p2.id
+) AS c
+WHERE p.id = c.id;
+
+INSERT INTO user_unread_counters (user_id, user_type, unread_total)
+SELECT user_id, user_type, sum(unread_count)
+FROM "ConversationParticipant"
+WHERE is_active = true
+GROUP BY user_id, user_type
+ON CONFLICT (user_id, user_type) DO UPDATE SET unread_total = EXCLUDED.unread_total;
+
+COMMENT ON COLUMN "ConversationParticipant".last_read_message_id IS
+  'Filigrane de lecture avec last_read_at : messages (created_at, id) à ou avant le filigrane lus';
+COMMENT ON COLUMN "ConversationParticipant".unread_count IS
+  'Messages non lus dans la conversation, maintenu à l''envoi et à la lecture';
+COMMENT ON TABLE user_unread_counters IS
+  'Badge non lus par utilisateur, somme des unread_count des participations actives';
+
+COMMIT;
@@ -0,0 +1,41 @@
+-- ============================================================================
+-- Migration : Notifications de messages glissantes
+-- Date: 2025-12-19
+-- Description: Une notification non lue par (destinataire, conversation),
+--              mise à jour avec un compteur de messages
+--              (messageNotificationFanoutService.py)
+-- ============================================================================
+
+BEGIN;
+
+ALTER TABLE "MessageNotification"
+ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 1,
+ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ;
+
+-- Regroupement des doublons non lus existants sur la plus récente
+WITH ranked AS (
+  SELECT id,
+         row_number() OVER w AS rank,
+         count(*) OVER (PARTITION BY user_id, user_type, conversation_id) AS total
+  FROM "MessageNotification"
+  WHERE is_read = false
+  WINDOW w AS (PARTITION BY user_id, user_type, conversation_id ORDER BY created_at DESC, id DESC)
+),
+kept AS (
+  UPDATE "MessageNotification" AS n
+  SET message_count = ranked.total
+  FROM ranked
+  WHERE n.id = ranked.id AND ranked.rank = 1 AND ranked.total > 1
+)
+DELETE FROM "MessageNotification" AS n
+USING ranked
+WHERE n.id = ranked.id AND ranked.rank > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_message_notification_unread_rolling
+  ON "MessageNotification" (user_id, user_type, conversation_id)
+  WHERE is_read = false;
+
+COMMENT ON COLUMN "MessageNotification".message_count IS
+  'Messages regroupés dans cette notification tant qu''elle n''est pas lue';
+
+COMMIT;
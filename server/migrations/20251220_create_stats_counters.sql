@@ -0,0 +1,25 @@
+-- ============================================================================
+-- Migration : Compteurs de statistiques admin
+-- Date: 2025-12-20
+-- Description: Compteurs notifications admin et RDV maintenus par deltas et
+--              recomptés périodiquement (adminStatsCounterService.py)
+-- ============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS stats_counters (
+  scope TEXT NOT NULL,
+  key TEXT NOT NULL,
+  value BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (scope, key)
+);
+
+-- RDV en attente du jour déjà passés (seul comptage fait à la lecture)
+CREATE INDEX IF NOT EXISTS idx_rdv_scheduled_date_status
+  ON "RDV" (scheduled_date, status);
+
+COMMENT ON TABLE stats_counters IS
+  'Compteurs par portée (admin_notification, rdv) : total, unread, type:<type>, status:<statut>, date:<jour>, pending_date:<jour>';
+
+COMMIT;
@@ -0,0 +1,25 @@
+-- ============================================================================
+-- Migration : Dernier état documentaire évalué par dossier
+-- Date: 2025-12-21
+-- Description: État documentaire mémorisé par dossier pour ne traiter que les
+--              changements lors des balayages (documentStatusBatchService.py)
+-- ============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS dossier_document_status (
+  client_produit_id UUID PRIMARY KEY REFERENCES "ClientProduitEligible"(id) ON DELETE CASCADE,
+  status_key TEXT NOT NULL,
+  notification_type TEXT,
+  priority TEXT,
+  evaluated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Agrégats de documents par lot de dossiers
+CREATE INDEX IF NOT EXISTS idx_client_process_document_client_produit_id
+  ON "ClientProcessDocument" (client_produit_id);
+
+COMMENT ON TABLE dossier_document_status IS
+  'Dernier état documentaire évalué : type de notification|priorité|en attente|validés|documents présents';
+
+COMMIT;
@@ -0,0 +1,36 @@
+-- ============================================================================
+-- Migration : File d'actions des workflows documentaires
+-- Date: 2025-12-22
+-- Description: Actions d'étapes (notification, tâche, facture, signature)
+--              déposées avec la transition et exécutées par un pool de workers
+--              (workflowEngineService.py)
+-- ============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS workflow_outbox (
+  id BIGSERIAL PRIMARY KEY,
+  instance_id UUID NOT NULL,
+  step_id TEXT NOT NULL,
+  action TEXT NOT NULL,
+  payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+  status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'processing', 'done', 'failed')),
+  attempts INTEGER NOT NULL DEFAULT 0,
+  available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  last_error TEXT,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  processed_at TIMESTAMPTZ
+);
+
+-- Réservation des actions disponibles (les terminées sortent de l'index)
+CREATE INDEX IF NOT EXISTS idx_workflow_outbox_available
+  ON workflow_outbox (available_at, id)
+  WHERE status IN ('pending', 'processing');
+
+CREATE INDEX IF NOT EXISTS idx_workflow_outbox_instance
+  ON workflow_outbox (instance_id);
+
+COMMENT ON TABLE workflow_outbox IS
+  'Actions des étapes de workflow à exécuter ; processing = réservée jusqu''à available_at (bail)';
+
+COMMIT;
@@ -0,0 +1,21 @@
+-- ============================================================================
+-- Migration : Coordonnées géographiques des experts
+-- Date: 2025-12-23
+-- Description: Latitude / longitude des experts pour le filtre de distance
+--              de l'index de recherche (expertSearchIndexService.py)
+-- ============================================================================
+
+BEGIN;
+
+ALTER TABLE "Expert"
+  ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION,
+  ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+
+-- Statistiques de missions par expert (chargement de l'index)
+CREATE INDEX IF NOT EXISTS idx_expert_assignment_expert_id
+  ON "ExpertAssignment" (expert_id);
+
+COMMENT ON COLUMN "Expert".latitude IS 'Latitude (WGS84) du lieu d''exercice, géocodée depuis location';
+COMMENT ON COLUMN "Expert".longitude IS 'Longitude (WGS84) du lieu d''exercice, géocodée depuis location';
+
+COMMIT;
@@ -0,0 +1,28 @@
+-- ============================================================================
+-- Migration : Schéma d'enveloppement des clés de chiffrement
+-- Date: 2025-12-24
+-- Description: Distingue les clés enveloppées par encryption-service.ts
+--              (crypto.createCipher : clé et IV dérivés de la clé maître par
+--              EVP_BytesToKey, colonne iv utilisée comme AAD) de celles
+--              enveloppées par streamingEncryptionService.py (AES-256-GCM,
+--              nonce de 12 octets, AAD "<id>:<key_version>"). Sans cette
+--              colonne, la rotation échouait sur la première clé historique.
+-- ============================================================================
+
+BEGIN;
+
+-- Valeur par défaut = schéma historique : couvre les lignes existantes et les
+-- insertions de storeKey qui ne renseignent pas la colonne
+ALTER TABLE "EncryptionKeys"
+ADD COLUMN IF NOT EXISTS "key_wrapping" VARCHAR(16) NOT NULL DEFAULT 'node-legacy';
+
+-- Clés déjà écrites par le service Python : seul ce schéma stocke un nonce de 12 octets
+-- (storeKey stocke un IV de 16 octets)
+UPDATE "EncryptionKeys"
+SET "key_wrapping" = 'aes-gcm-aad'
+WHERE "key_wrapping" = 'node-legacy'
+  AND length(decode("iv", 'base64')) = 12;
+
+COMMENT ON COLUMN "EncryptionKeys"."key_wrapping" IS 'Schéma d''enveloppement de encrypted_key : node-legacy (createCipher) ou aes-gcm-aad';
+
+COMMIT;
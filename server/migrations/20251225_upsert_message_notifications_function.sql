@@ -0,0 +1,55 @@
+-- ============================================================================
+-- Migration : Notifications glissantes depuis MessagingService (Node)
+-- Date: 2025-12-25
+-- Description: Depuis l'index unique partiel idx_message_notification_unread_rolling
+--              (20251219), l'insert ligne à ligne de createMessageNotifications
+--              échoue dès qu'une notification non lue existe pour la
+--              conversation, et toutes les notifications du lot sont perdues.
+--              Cette fonction applique le même upsert que
+--              messageNotificationFanoutService.py (message_count incrémenté),
+--              appelée via supabase.rpc.
+-- ============================================================================
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION public.upsert_message_notifications(
+  p_conversation_id UUID,
+  p_message_id UUID,
+  p_sender_id UUID,
+  p_title TEXT,
+  p_body TEXT
+)
+RETURNS INTEGER
+SET search_path = ''
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  written INTEGER;
+BEGIN
+  -- Destinataires triés : ordre de verrouillage stable entre envois concurrents
+  INSERT INTO public."MessageNotification" AS n
+    (user_id, user_type, conversation_id, message_id, title, body,
+     message_count, is_read, created_at, updated_at)
+  SELECT DISTINCT p.user_id, p.user_type, p_conversation_id, p_message_id, p_title, p_body,
+         1, false, NOW(), NOW()
+  FROM public."ConversationParticipant" p
+  WHERE p.conversation_id = p_conversation_id
+    AND p.user_id <> p_sender_id
+    AND p.is_active = true
+  ORDER BY p.user_id, p.user_type
+  ON CONFLICT (user_id, user_type, conversation_id) WHERE is_read = false
+  DO UPDATE SET message_id = EXCLUDED.message_id,
+                title = EXCLUDED.title,
+                body = EXCLUDED.body,
+                message_count = n.message_count + 1,
+                updated_at = EXCLUDED.updated_at;
+
+  GET DIAGNOSTICS written = ROW_COUNT;
+  RETURN written;
+END;
+$$;
+
+COMMENT ON FUNCTION public.upsert_message_notifications(UUID, UUID, UUID, TEXT, TEXT) IS
+  'Crée ou met à jour la notification non lue de chaque participant (hors expéditeur) pour un message';
+
+COMMIT;
@@ -0,0 +1,41 @@
+-- ============================================================================
+-- Migration : Prise atomique des jobs de rapports
+-- Date: 2025-12-26
+-- Description: AsyncReportService.processQueue (Node) lisait le job en attente
+--              le plus ancien puis le passait en 'processing' en deux requêtes,
+--              sans tenir compte de la priorité ni de cancel_requested : deux
+--              consommateurs pouvaient générer le même rapport. Cette fonction
+--              applique la même prise que reportWorkerService.py (priorité puis
+--              ancienneté, FOR UPDATE SKIP LOCKED), pour Node via supabase.rpc
+--              comme pour le worker Python.
+-- ============================================================================
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION public.claim_report_jobs(
+  p_types TEXT[],
+  p_limit INTEGER
+)
+RETURNS SETOF public."report_jobs"
+SET search_path = ''
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  RETURN QUERY
+  UPDATE public."report_jobs" j
+  SET status = 'processing', started_at = NOW(), progress = 0
+  WHERE j.id IN (
+    SELECT p.id FROM public."report_jobs" p
+    WHERE p.status = 'pending' AND p.cancel_requested = false AND p.type = ANY(p_types)
+    ORDER BY p.priority DESC, p.created_at ASC
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING j.*;
+END;
+$$;
+
+COMMENT ON FUNCTION public.claim_report_jobs(TEXT[], INTEGER) IS
+  'Passe en processing jusqu''à p_limit jobs en attente des types donnés, par priorité puis ancienneté';
+
+COMMIT;
@@ -0,0 +1,113 @@
+"""
+Statistiques admin : recomptage des tables "notification" et "RDV" à chaque
+appel (get_notification_stats / get_rdv_stats), contre lecture des compteurs
+maintenus (StatsCounterMaintainer).
+
+Usage : BENCH_DATABASE_URL=postgresql://... python server/scripts/bench_admin_stats_counters.py
+Les tables sont créées dans un schéma jetable `admin_stats_bench`.
+"""
+
+import os
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from adminStatsCounterService import StatsCounterMaintainer, StatsCounterStore  # noqa: E402
+
+DSN = os.getenv('BENCH_DATABASE_URL')
+SCHEMA = 'admin_stats_bench'
+NOTIFICATIONS = int(os.getenv('BENCH_NOTIFICATIONS', '200000'))
+RDVS = int(os.getenv('BENCH_RDVS', '50000'))
+CALLS = 200
+
+
+def setup():
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}.notification (
+                id SERIAL PRIMARY KEY, user_type TEXT, notification_type TEXT, is_read BOOLEAN,
+                priority TEXT, status TEXT, hidden_in_list BOOLEAN DEFAULT false
+            );
+            CREATE TABLE {SCHEMA}."RDV" (
+                id SERIAL PRIMARY KEY, status TEXT, scheduled_date DATE, scheduled_time TIME
+            );
+            CREATE INDEX ON {SCHEMA}."RDV" (scheduled_date, status);
+            CREATE TABLE {SCHEMA}.stats_counters (
+                scope TEXT NOT NULL, key TEXT NOT NULL, value BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(), PRIMARY KEY (scope, key)
+            );
+        """)
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}.notification (user_type, notification_type, is_read, priority, status)
+            SELECT (ARRAY['admin', 'client', 'expert'])[1 + g %% 3], 'type_' || (g %% 25), g %% 4 = 0,
+                   (ARRAY['normal', 'high', 'urgent'])[1 + g %% 3], (ARRAY['unread', 'late', 'replaced'])[1 + g %% 7 %% 3]
+            FROM generate_series(1, %s) g
+        """, (NOTIFICATIONS,))
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}."RDV" (status, scheduled_date, scheduled_time)
+            SELECT (ARRAY['proposed', 'scheduled', 'completed', 'cancelled'])[1 + g %% 4],
+                   CURRENT_DATE + (g %% 120 - 60), make_time(8 + g %% 10, 0, 0)
+            FROM generate_series(1, %s) g
+        """, (RDVS,))
+        cur.execute(f'ANALYZE {SCHEMA}.notification')
+        cur.execute(f'ANALYZE {SCHEMA}."RDV"')
+    conn.close()
+
+
+def main():
+    if not DSN:
+        print('BENCH_DATABASE_URL requis')
+        return
+    setup()
+    conn = psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT count(*) FILTER (WHERE is_read = false), count(*) FILTER (WHERE priority = 'high'),
+                       count(*) FILTER (WHERE priority = 'urgent'), count(*) FILTER (WHERE status = 'late')
+                FROM notification
+                WHERE user_type = 'admin' AND hidden_in_list = false AND status != 'replaced'
+                  AND notification_type NOT IN ('rdv_reminder', 'rdv_confirmed', 'rdv_cancelled')
+            """)
+            cur.fetchone()
+            cur.execute("""SELECT notification_type, count(*) FROM notification
+                           WHERE user_type = 'admin' AND hidden_in_list = false GROUP BY 1""")
+            cur.fetchall()
+            cur.execute("""
+                SELECT count(*) FILTER (WHERE scheduled_date = CURRENT_DATE),
+                       count(*) FILTER (WHERE status IN ('proposed', 'scheduled')
+                                        AND scheduled_date + scheduled_time < NOW())
+                FROM "RDV"
+            """)
+            cur.fetchone()
+            cur.execute('SELECT status, count(*) FROM "RDV" GROUP BY 1')
+            cur.fetchall()
+    recount = (time.perf_counter() - started) / CALLS
+    conn.close()
+
+    connect = lambda: psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')  # noqa: E731
+    maintainer = StatsCounterMaintainer(StatsCounterStore(connect), cache_seconds=0, autostart=False)
+    started = time.perf_counter()
+    maintainer.reconcile()
+    reconcile = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        maintainer.notification_stats()
+        maintainer.rdv_stats()
+    counters = (time.perf_counter() - started) / (CALLS * 2)
+
+    print(f'{NOTIFICATIONS} notifications, {RDVS} RDV')
+    print(f'Recomptage par appel : {recount * 1000:.1f} ms')
+    print(f'Compteurs : {counters * 1000:.2f} ms par appel (connexion comprise), '
+          f'recomptage de réconciliation {reconcile * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Débit de sauvegarde des réponses du simulateur : lecture-fusion-écriture
+(comportement de POST /api/simulator/response) contre journal d'ajouts + compaction.
+
+Usage : BENCH_DATABASE_URL=postgresql://... python server/scripts/bench_answer_log.py
+Les tables sont créées dans un schéma jetable `answer_log_bench`.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from answerLogService import AnswerLogStore, AnswerPersistenceService  # noqa: E402
+
+DSN = os.environ['BENCH_DATABASE_URL']
+SCHEMA = 'answer_log_bench'
+SESSIONS = int(os.getenv('BENCH_SESSIONS', '50'))
+ANSWERS_PER_SESSION = int(os.getenv('BENCH_ANSWERS', '60'))
+THREADS = int(os.getenv('BENCH_THREADS', '8'))
+
+
+def connect():
+    return psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+
+
+def setup():
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f'SET search_path = {SCHEMA}')
+        cur.execute("""
+            CREATE TABLE simulations (
+                id UUID PRIMARY KEY, session_token TEXT UNIQUE, answers JSONB NOT NULL DEFAULT '{}',
+                updated_at TIMESTAMPTZ
+            )
+        """)
+        migration = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'migrations',
+                                 '20251214_create_simulation_answer_log.sql')
+        cur.execute(open(migration, encoding='utf-8').read().replace('BEGIN;', '').replace('COMMIT;', ''))
+        tokens = [str(uuid.uuid4()) for _ in range(SESSIONS)]
+        for token in tokens:
+            cur.execute('INSERT INTO simulations (id, session_token) VALUES (%s, %s)', (token, token))
+    conn.close()
+    return tokens
+
+
+def legacy_save(token, responses):
+    """Lecture de la ligne, fusion côté application, réécriture complète."""
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT answers FROM simulations WHERE session_token = %s', (token,))
+            answers = {**cur.fetchone()[0], **responses}
+            cur.execute('UPDATE simulations SET answers = %s, updated_at = NOW() WHERE session_token = %s',
+                        (json.dumps(answers), token))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run(label, save):
+    tokens = setup()
+    work = [(t, {f'q{i}': i}) for i in range(ANSWERS_PER_SESSION) for t in tokens]
+    chunks = [work[i::THREADS] for i in range(THREADS)]
+    start = time.perf_counter()
+    threads = [threading.Thread(target=lambda c=c: [save(t, r) for t, r in c]) for c in chunks]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return label, tokens, len(work), start
+
+
+def lost_answers(tokens):
+    conn = connect()
+    with conn.cursor() as cur:
+        cur.execute('SELECT answers FROM simulations WHERE session_token = ANY(%s)', (tokens,))
+        lost = sum(ANSWERS_PER_SESSION - len(row[0]) for row in cur.fetchall())
+    conn.close()
+    return lost
+
+
+def report(label, count, elapsed, lost):
+    print(f'{label:<28} {count:>6} réponses  {elapsed:7.2f}s  {count / elapsed:9.0f} réponses/s  perdues : {lost}')
+
+
+if __name__ == '__main__':
+    label, tokens, count, start = run('lecture-fusion-écriture', legacy_save)
+    report(label, count, time.perf_counter() - start, lost_answers(tokens))
+
+    store = AnswerLogStore(connection_factory=connect)
+    service = AnswerPersistenceService(store, debounce_ms=50, max_delay_ms=500, compact_interval_s=1)
+    label, tokens, count, start = run('journal + compaction', service.save_answers)
+    service.close()
+    store.compact()
+    # Le temps inclut l'écriture effective en base et la compaction finale
+    report(label, count, time.perf_counter() - start, lost_answers(tokens))
+    print(f"deltas écrits : {service.stats['deltas_written']}  flushs : {service.stats['flushes']}")
+
+    store_only = AnswerLogStore(connection_factory=connect)
+    label, tokens, count, start = run('journal sans debounce', lambda t, r: store_only.append([(t, r)]))
+    store_only.compact()
+    report(label, count, time.perf_counter() - start, lost_answers(tokens))
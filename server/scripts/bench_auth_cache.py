@@ -0,0 +1,107 @@
+"""
+Coût d'authentification par requête : vérification JWT complète et lecture
+de "user_sessions" à chaque appel, contre TokenVerifier (cache des claims)
+et RevocationFilter (révocations en mémoire).
+
+Usage : BENCH_DATABASE_URL=postgresql://... python server/scripts/bench_auth_cache.py
+Sans BENCH_DATABASE_URL, seule la vérification JWT est mesurée.
+La table est créée dans un schéma jetable `auth_cache_bench`.
+"""
+
+import os
+import random
+import sys
+import time
+import uuid
+
+import jwt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from authCacheService import RevocationFilter, RevocationStore, TokenVerifier  # noqa: E402
+
+DSN = os.getenv('BENCH_DATABASE_URL')
+SCHEMA = 'auth_cache_bench'
+SECRET = 'bench-secret-' + 'x' * 32
+USERS = int(os.getenv('BENCH_USERS', '2000'))
+REQUESTS = int(os.getenv('BENCH_REQUESTS', '20000'))
+
+
+def make_tokens():
+    exp = int(time.time()) + 3600
+    return [(jwt.encode({'id': str(uuid.uuid4()), 'type': 'client', 'jti': str(uuid.uuid4()), 'exp': exp},
+                        SECRET, algorithm='HS256')) for _ in range(USERS)]
+
+
+def setup(tokens):
+    import psycopg2
+
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}.user_sessions (
+                id UUID PRIMARY KEY, user_id UUID, is_active BOOLEAN NOT NULL DEFAULT true,
+                expires_at TIMESTAMPTZ NOT NULL, revoked_at TIMESTAMPTZ
+            );
+            CREATE INDEX ON {SCHEMA}.user_sessions (revoked_at) WHERE revoked_at IS NOT NULL;
+        """)
+        ids = [jwt.decode(t, options={'verify_signature': False})['jti'] for t in tokens]
+        cur.execute(f"""INSERT INTO {SCHEMA}.user_sessions (id, expires_at)
+                        SELECT unnest(%s::uuid[]), NOW() + interval '1 hour'""", (ids,))
+        # 5 % de sessions révoquées
+        cur.execute(f"""UPDATE {SCHEMA}.user_sessions SET is_active = false, revoked_at = NOW()
+                        WHERE id = ANY(%s::uuid[])""", (ids[:USERS // 20],))
+    conn.close()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run(label, check, tokens):
+    rng = random.Random(7)
+    latencies = []
+    for _ in range(REQUESTS):
+        token = rng.choice(tokens)
+        started = time.perf_counter()
+        try:
+            check(token)
+        except Exception:
+            pass
+        latencies.append(time.perf_counter() - started)
+    print(f'{label:<34} moyenne {sum(latencies) / len(latencies) * 1e6:8.1f} µs  '
+          f'p50 {percentile(latencies, 0.5) * 1e6:8.1f} µs  p99 {percentile(latencies, 0.99) * 1e6:8.1f} µs')
+
+
+if __name__ == '__main__':
+    tokens = make_tokens()
+    print(f'{REQUESTS} requêtes sur {USERS} tokens')
+    run('jwt.decode', lambda t: jwt.decode(t, SECRET, algorithms=['HS256']), tokens)
+    run('TokenVerifier (cache)', TokenVerifier(SECRET).verify, tokens)
+
+    if DSN:
+        import psycopg2
+
+        setup(tokens)
+        conn = psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+        conn.autocommit = True
+
+        def legacy(token):
+            claims = jwt.decode(token, SECRET, algorithms=['HS256'])
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1 FROM user_sessions WHERE id = %s AND is_active', (claims['jti'],))
+                if cur.fetchone() is None:
+                    raise PermissionError('Token révoqué')
+            return claims
+
+        run('jwt.decode + user_sessions', legacy, tokens)
+        store = RevocationStore(lambda: psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}'))
+        revocation = RevocationFilter(store, refresh_seconds=1)
+        verifier = TokenVerifier(SECRET, revocation=revocation)
+        run('TokenVerifier + RevocationFilter', verifier.verify, tokens)
+        print(f'révocations en mémoire : {len(revocation)}  rafraîchissements : {revocation.stats["refreshes"]}  '
+              f'hits : {verifier.stats["hits"]}  refusés : {verifier.stats["revoked"]}')
+        conn.close()
@@ -0,0 +1,155 @@
+"""
+Proposition de 3 créneaux communs expert / client / apporteur : relecture des
+RDV de chaque participant et comparaison des horaires (schéma actuel) contre
+AvailabilityIndex (ET de bitmaps), plus le coût d'une réservation / annulation.
+
+Usage : BENCH_DATABASE_URL=postgresql://... python server/scripts/bench_availability_index.py
+Les tables sont créées dans un schéma jetable `availability_bench`.
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from availabilityIndexService import load_index  # noqa: E402
+
+DSN = os.getenv('BENCH_DATABASE_URL')
+SCHEMA = 'availability_bench'
+EXPERTS = 200
+CLIENTS = 5000
+RDV_PER_EXPERT = int(os.getenv('BENCH_RDV_PER_EXPERT', '400'))
+WINDOW_DAYS = 30
+PROPOSALS = 200
+
+
+def setup():
+    rng = random.Random(2)
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f'SET search_path = {SCHEMA}')
+        cur.execute("""
+            CREATE TABLE "Expert" (id UUID PRIMARY KEY, disponibilites JSONB);
+            CREATE TABLE "RDV" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(), client_id UUID, expert_id UUID, apporteur_id UUID,
+                scheduled_date DATE, scheduled_time TIME, duration_minutes INT, status TEXT
+            );
+            CREATE INDEX ON "RDV" (expert_id, scheduled_date);
+            CREATE INDEX ON "RDV" (client_id, scheduled_date);
+            CREATE INDEX ON "RDV" (apporteur_id, scheduled_date);
+        """)
+        experts = [(str(i).zfill(12), ) for i in range(EXPERTS)]
+        execute_values(cur, 'INSERT INTO "Expert" VALUES %s', [
+            (f'00000000-0000-0000-0000-{e[0]}', '{"lundi": ["09:00-12:00", "14:00-18:00"], '
+             '"mardi": ["09:00-18:00"], "mercredi": ["09:00-12:00"], "jeudi": ["09:00-18:00"], '
+             '"vendredi": ["09:00-17:00"]}') for e in experts])
+        rows = []
+        for e in experts:
+            for _ in range(RDV_PER_EXPERT):
+                day = date.today() + timedelta(days=rng.randrange(-5, WINDOW_DAYS + 30))
+                rows.append((f'00000000-0000-0000-0001-{rng.randrange(CLIENTS):012d}',
+                             f'00000000-0000-0000-0000-{e[0]}',
+                             f'00000000-0000-0000-0002-{rng.randrange(50):012d}' if rng.random() < 0.3 else None,
+                             day, f'{rng.randrange(8, 18):02d}:{rng.choice([0, 15, 30, 45]):02d}',
+                             rng.choice([30, 45, 60, 90]), rng.choice(['scheduled', 'confirmed', 'cancelled'])))
+        execute_values(cur, """INSERT INTO "RDV" (client_id, expert_id, apporteur_id, scheduled_date,
+                                                  scheduled_time, duration_minutes, status) VALUES %s""",
+                       rows, page_size=10000)
+        cur.execute('ANALYZE "RDV"')
+    conn.close()
+
+
+def connect():
+    return psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+
+
+WORKING = {0: [(540, 720), (840, 1080)], 1: [(540, 1080)], 2: [(540, 720)], 3: [(540, 1080)], 4: [(540, 1020)]}
+
+
+def per_participant(conn, participants, start, end, duration, limit=3):
+    """Relecture des RDV de chacun puis test de chaque créneau de 15 min contre chaque RDV."""
+    busy = []
+    with conn.cursor() as cur:
+        for column, user_id in participants:
+            cur.execute(f"""SELECT scheduled_date, scheduled_time, duration_minutes FROM "RDV"
+                            WHERE {column} = %s AND scheduled_date BETWEEN %s AND %s
+                              AND status NOT IN ('cancelled', 'refused', 'declined', 'rejected')""",
+                        (user_id, start, end))
+            for day, at, minutes in cur.fetchall():
+                begin = datetime.combine(day, at)
+                busy.append((begin, begin + timedelta(minutes=minutes or 60)))
+        cur.execute('SELECT disponibilites FROM "Expert" WHERE id = %s', (participants[0][1],))
+        cur.fetchone()
+    conn.commit()
+    slots = []
+    day = start
+    while day <= end and len(slots) < limit:
+        for open_minute, close_minute in WORKING.get(day.weekday(), []):
+            minute = open_minute
+            while minute + duration <= close_minute and len(slots) < limit:
+                begin = datetime.combine(day, datetime.min.time()) + timedelta(minutes=minute)
+                finish = begin + timedelta(minutes=duration)
+                if all(finish <= b or begin >= e for b, e in busy):
+                    slots.append(begin)
+                    minute += duration
+                else:
+                    minute += 15
+        day += timedelta(days=1)
+    return slots
+
+
+def main():
+    if not DSN:
+        print('BENCH_DATABASE_URL requis')
+        return
+    setup()
+    rng = random.Random(3)
+    start, end = date.today(), date.today() + timedelta(days=WINDOW_DAYS)
+    requests = [(rng.randrange(EXPERTS), rng.randrange(CLIENTS), rng.randrange(50)) for _ in range(PROPOSALS)]
+    print(f'{EXPERTS} experts, {EXPERTS * RDV_PER_EXPERT} RDV, fenêtre {WINDOW_DAYS} jours')
+
+    conn = connect()
+    naive = []
+    for e, c, a in requests:
+        t = time.perf_counter()
+        per_participant(conn, [('expert_id', f'00000000-0000-0000-0000-{e:012d}'),
+                               ('client_id', f'00000000-0000-0000-0001-{c:012d}'),
+                               ('apporteur_id', f'00000000-0000-0000-0002-{a:012d}')], start, end, 60)
+        naive.append(time.perf_counter() - t)
+    conn.close()
+
+    t = time.perf_counter()
+    index = load_index(connect, days_back=5, days_ahead=WINDOW_DAYS + 30)
+    load = time.perf_counter() - t
+    bitmap = []
+    for e, c, a in requests:
+        t = time.perf_counter()
+        index.common_slots([('expert', f'00000000-0000-0000-0000-{e:012d}'),
+                            ('client', f'00000000-0000-0000-0001-{c:012d}'),
+                            ('apporteur', f'00000000-0000-0000-0002-{a:012d}')], start, end, 60, limit=3)
+        bitmap.append(time.perf_counter() - t)
+
+    t = time.perf_counter()
+    for n in range(1000):
+        index.book(f'bench-{n}', [('expert', f'00000000-0000-0000-0000-{n % EXPERTS:012d}')],
+                   start + timedelta(days=n % WINDOW_DAYS), '10:00', 60)
+        index.cancel(f'bench-{n}')
+    updates = (time.perf_counter() - t) / 2000
+
+    print(f'Relecture + comparaison : médiane {statistics.median(naive) * 1000:.2f} ms '
+          f'(max {max(naive) * 1000:.2f})')
+    print(f'Bitmaps : médiane {statistics.median(bitmap) * 1000:.3f} ms (max {max(bitmap) * 1000:.3f}) ; '
+          f'chargement {load:.2f} s ; réservation / annulation {updates * 1e6:.0f} µs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Lancement d'une séquence pour un grand nombre de prospects : planification
+en mémoire (grille de créneaux par boîte d'envoi) et écriture groupée.
+
+Usage : BENCH_DATABASE_URL=postgresql://... python server/scripts/bench_bulk_sequence_scheduler.py
+Sans BENCH_DATABASE_URL, seule la planification est mesurée.
+Les tables sont créées dans un schéma jetable `bulk_sequence_bench`.
+"""
+
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from bulkSequenceSchedulerService import (  # noqa: E402
+    BulkSequenceScheduler,
+    ScheduledEmailStore,
+    SequencePlanner,
+)
+
+DSN = os.getenv('BENCH_DATABASE_URL')
+SCHEMA = 'bulk_sequence_bench'
+PROSPECTS = int(os.getenv('BENCH_PROSPECTS', '20000'))
+MAILBOXES = {f'boite{i}@profitum.fr': (12, 100) for i in range(int(os.getenv('BENCH_MAILBOXES', '10')))}
+STEPS = [
+    {'step_number': 1, 'delay_days': 0, 'subject': 'Bonjour', 'body': 'Premier contact'},
+    {'step_number': 2, 'delay_days': 3, 'subject': 'Relance', 'body': 'Deuxième contact'},
+    {'step_number': 3, 'delay_days': 7, 'subject': 'Dernière relance', 'body': 'Troisième contact'}
+]
+START = datetime(2025, 12, 15, 8, 0, tzinfo=ZoneInfo('Europe/Paris'))
+
+
+def setup(ids):
+    import psycopg2
+
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}.prospects (
+                id UUID PRIMARY KEY, emailing_status TEXT, updated_at TIMESTAMPTZ
+            );
+            CREATE TABLE {SCHEMA}.prospect_email_scheduled (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                prospect_id UUID NOT NULL, sequence_id UUID, step_number INTEGER NOT NULL,
+                subject TEXT NOT NULL, body TEXT NOT NULL, content_hash VARCHAR(64),
+                scheduled_for TIMESTAMPTZ NOT NULL, status TEXT NOT NULL DEFAULT 'scheduled',
+                mailbox TEXT, updated_at TIMESTAMPTZ DEFAULT NOW()
+            );
+            CREATE INDEX ON {SCHEMA}.prospect_email_scheduled (scheduled_for, mailbox)
+                WHERE status = 'scheduled';
+            CREATE INDEX ON {SCHEMA}.prospect_email_scheduled (prospect_id);
+        """)
+        cur.execute(f'INSERT INTO {SCHEMA}.prospects (id) SELECT unnest(%s::uuid[])', (ids,))
+    conn.close()
+
+
+def main():
+    ids = [str(uuid.uuid4()) for _ in range(PROSPECTS)]
+    prospects = [{'id': i} for i in ids]
+
+    started = time.perf_counter()
+    emails = SequencePlanner(MAILBOXES, seed=0).plan(prospects, STEPS, START)
+    elapsed = time.perf_counter() - started
+    print(f'Planification : {len(emails)} emails pour {PROSPECTS} prospects en {elapsed:.2f} s')
+
+    per_hour = Counter((e['mailbox'], e['scheduled_for'].strftime('%Y-%m-%d %H')) for e in emails)
+    per_day = Counter((e['mailbox'], e['scheduled_for'].date()) for e in emails)
+    print(f'Par boîte et par heure : max {max(per_hour.values())}, '
+          f'moyenne {sum(per_hour.values()) / len(per_hour):.1f}')
+    print(f'Par boîte et par jour : max {max(per_day.values())}')
+    print(f'Dernier envoi : {max(e["scheduled_for"] for e in emails):%Y-%m-%d %H:%M}')
+
+    if not DSN:
+        return
+    import psycopg2
+
+    setup(ids)
+    store = ScheduledEmailStore(lambda: psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}'))
+    scheduler = BulkSequenceScheduler(store, MAILBOXES, clock=lambda: START)
+    started = time.perf_counter()
+    result = scheduler.launch(str(uuid.uuid4()), prospects, STEPS)
+    print(f'Lancement complet (base) : {result["scheduled"]} emails en {time.perf_counter() - started:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+État documentaire des dossiers : requêtes unitaires par dossier (schéma de
+DocumentStatusChecker.checkDocumentStatus) contre balayage par lots
+(DocumentStatusEvaluator), premier passage puis passage sans changement.
+
+Usage : BENCH_DATABASE_URL=postgresql://... python server/scripts/bench_document_status_batch.py
+Les tables sont créées dans un schéma jetable `document_status_bench`.
+"""
+
+import os
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from documentStatusBatchService import (  # noqa: E402
+    DocumentStatusEvaluator,
+    DocumentStatusStore,
+    document_status,
+    notification_for,
+)
+
+DSN = os.getenv('BENCH_DATABASE_URL')
+SCHEMA = 'document_status_bench'
+DOSSIERS = int(os.getenv('BENCH_DOSSIERS', '5000'))
+
+
+def setup():
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}."Client" (id UUID PRIMARY KEY, company_name TEXT, name TEXT);
+            CREATE TABLE {SCHEMA}."ProduitEligible" (id UUID PRIMARY KEY, nom TEXT);
+            CREATE TABLE {SCHEMA}."ClientProduitEligible" (
+                id UUID PRIMARY KEY, "clientId" UUID, "produitId" UUID, statut TEXT,
+                admin_eligibility_status TEXT, expert_validation_status TEXT, created_at TIMESTAMPTZ
+            );
+            CREATE TABLE {SCHEMA}."ClientProcessDocument" (
+                id SERIAL PRIMARY KEY, client_produit_id UUID, validation_status TEXT, created_at TIMESTAMPTZ
+            );
+            CREATE INDEX ON {SCHEMA}."ClientProcessDocument" (client_produit_id);
+            CREATE TABLE {SCHEMA}.dossier_document_status (
+                client_produit_id UUID PRIMARY KEY, status_key TEXT NOT NULL, notification_type TEXT,
+                priority TEXT, evaluated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+        """)
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}."Client"
+            SELECT gen_random_uuid(), CASE WHEN g %% 2 = 0 THEN 'Société ' || g END, 'Client ' || g
+            FROM generate_series(1, %s) g
+        """, (DOSSIERS // 4,))
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}."ProduitEligible"
+            SELECT gen_random_uuid(), 'Produit ' || g FROM generate_series(1, 10) g
+        """)
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}."ClientProduitEligible"
+            SELECT gen_random_uuid(),
+                   (SELECT id FROM {SCHEMA}."Client" OFFSET g %% %s LIMIT 1),
+                   (SELECT id FROM {SCHEMA}."ProduitEligible" OFFSET g %% 10 LIMIT 1),
+                   'en_cours', CASE WHEN g %% 5 = 0 THEN 'validated' END, NULL,
+                   NOW() - make_interval(days => g %% 10)
+            FROM generate_series(1, %s) g
+        """, (DOSSIERS // 4, DOSSIERS))
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}."ClientProcessDocument" (client_produit_id, validation_status, created_at)
+            SELECT d.id, (ARRAY['validated', 'pending', 'rejected', NULL])[1 + n % 4],
+                   d.created_at + interval '1 day'
+            FROM {SCHEMA}."ClientProduitEligible" d, generate_series(1, 4) n
+            WHERE ('x' || substr(d.id::text, 1, 2))::bit(8)::int % 3 <> 0
+        """)
+        cur.execute(f'ANALYZE {SCHEMA}."ClientProduitEligible"')
+        cur.execute(f'ANALYZE {SCHEMA}."ClientProcessDocument"')
+    conn.close()
+
+
+def connect():
+    return psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+
+
+def per_dossier():
+    """Une lecture par table et par dossier, comme le service Node."""
+    conn = connect()
+    notifications = 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT NOW()')
+            now = cur.fetchone()[0]
+            cur.execute("""SELECT id::text FROM "ClientProduitEligible"
+                           WHERE admin_eligibility_status = 'pending' OR admin_eligibility_status IS NULL""")
+            ids = [r[0] for r in cur.fetchall()]
+            for dossier_id in ids:
+                cur.execute("""SELECT "clientId", "produitId", admin_eligibility_status,
+                                      expert_validation_status, created_at
+                               FROM "ClientProduitEligible" WHERE id = %s""", (dossier_id,))
+                client_id, product_id, admin_status, expert_status, created_at = cur.fetchone()
+                cur.execute('SELECT company_name, name FROM "Client" WHERE id = %s', (client_id,))
+                company_name, client_name = cur.fetchone()
+                cur.execute('SELECT nom FROM "ProduitEligible" WHERE id = %s', (product_id,))
+                product_name = cur.fetchone()[0]
+                cur.execute("""SELECT validation_status, created_at FROM "ClientProcessDocument"
+                               WHERE client_produit_id = %s ORDER BY created_at""", (dossier_id,))
+                documents = cur.fetchall()
+                row = {
+                    'id': dossier_id, 'admin_eligibility_status': admin_status,
+                    'expert_validation_status': expert_status, 'created_at': created_at,
+                    'company_name': company_name, 'client_name': client_name, 'product_name': product_name,
+                    'documents_total': len(documents),
+                    'documents_validated': sum(1 for s, _ in documents if s == 'validated'),
+                    'documents_pending': sum(1 for s, _ in documents if s not in ('validated', 'rejected')),
+                    'first_document_at': documents[0][1] if documents else None
+                }
+                if notification_for(dossier_id, row, document_status(row, now)):
+                    notifications += 1
+        conn.commit()
+    finally:
+        conn.close()
+    return len(ids), notifications
+
+
+def main():
+    if not DSN:
+        print('BENCH_DATABASE_URL requis')
+        return
+    setup()
+    print(f'{DOSSIERS} dossiers')
+
+    start = time.perf_counter()
+    evaluated, notifications = per_dossier()
+    unit = time.perf_counter() - start
+    print(f'Requêtes par dossier : {unit * 1000:.0f} ms ({evaluated} dossiers, {notifications} notifications)')
+
+    evaluator = DocumentStatusEvaluator(DocumentStatusStore(connect))
+    start = time.perf_counter()
+    changed = evaluator.evaluate(pending_only=True)
+    first = time.perf_counter() - start
+    notified = sum(1 for c in changed if c['notification'])
+    print(f'Balayage par lots (1er passage) : {first * 1000:.0f} ms '
+          f'({len(changed)} changements, {notified} notifications) — x{unit / first:.1f}')
+
+    start = time.perf_counter()
+    changed = evaluator.evaluate(pending_only=True)
+    second = time.perf_counter() - start
+    print(f'Balayage par lots (sans changement) : {second * 1000:.0f} ms ({len(changed)} changements)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Anti-doublon à la programmation : deux requêtes par prospect
+(areEmailsAlreadyScheduledOrSent), contre EmailDedupIndex en mémoire.
+
+Usage : BENCH_DATABASE_URL=postgresql://... python server/scripts/bench_email_dedup_index.py
+Sans BENCH_DATABASE_URL, seuls le chargement, la sauvegarde et les recherches en mémoire sont mesurés.
+Les tables sont créées dans un schéma jetable `email_dedup_bench`.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from bulkSequenceSchedulerService import content_hash  # noqa: E402
+from emailDedupIndexService import DedupStore, EmailDedupIndex  # noqa: E402
+
+DSN = os.getenv('BENCH_DATABASE_URL')
+SCHEMA = 'email_dedup_bench'
+HISTORY = int(os.getenv('BENCH_HISTORY', '1000000'))
+PROSPECTS = int(os.getenv('BENCH_PROSPECTS', '20000'))
+STEPS = 5
+
+
+class GeneratedStore:
+    """Historique synthétique : HISTORY couples déjà envoyés ou programmés (générés hors mesure)."""
+
+    def __init__(self):
+        self.rows = [('sent' if i % 3 else 'scheduled', str(uuid.UUID(int=i)), f'{i % 97:064x}')
+                     for i in range(HISTORY)]
+
+    def load(self, consume, since=None):
+        for i in range(0, len(self.rows), 50_000):
+            consume(self.rows[i:i + 50_000])
+        return datetime.now(timezone.utc)
+
+
+def setup(prospects, hashes):
+    import psycopg2
+    from psycopg2.extras import execute_values
+
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}.prospects_emails (
+                id SERIAL PRIMARY KEY, prospect_id UUID, content_hash VARCHAR(64),
+                is_duplicate_archived BOOLEAN, created_at TIMESTAMPTZ DEFAULT NOW()
+            );
+            CREATE INDEX ON {SCHEMA}.prospects_emails (prospect_id, content_hash);
+            CREATE TABLE {SCHEMA}.prospect_email_scheduled (
+                id SERIAL PRIMARY KEY, prospect_id UUID, content_hash VARCHAR(64), status TEXT,
+                scheduled_for TIMESTAMPTZ, subject TEXT, body TEXT, updated_at TIMESTAMPTZ DEFAULT NOW()
+            );
+            CREATE INDEX ON {SCHEMA}.prospect_email_scheduled (prospect_id, content_hash);
+        """)
+        # Une partie des prospects a déjà reçu la première étape
+        execute_values(cur, f'INSERT INTO {SCHEMA}.prospects_emails (prospect_id, content_hash) VALUES %s',
+                       [(p, hashes[0]) for p in prospects[::50]])
+        cur.execute(f'ANALYZE {SCHEMA}.prospects_emails')
+    conn.close()
+
+
+def main():
+    generated = GeneratedStore()
+    started = time.perf_counter()
+    index = EmailDedupIndex(generated, capacity=HISTORY)
+    index.load()
+    load = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'dedup.bin')
+        started = time.perf_counter()
+        index.save(path)
+        save = time.perf_counter() - started
+        size = os.path.getsize(path)
+        started = time.perf_counter()
+        EmailDedupIndex(generated, snapshot_path=path)._read_snapshot(path)
+        restore = time.perf_counter() - started
+        # Empreinte mémoire mesurée sur une seconde restauration (tracemalloc ralentit la mesure de temps)
+        tracemalloc.start()
+        restored = EmailDedupIndex(generated, snapshot_path=path)
+        restored._read_snapshot(path)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+    prospects = [str(uuid.uuid4()) for _ in range(PROSPECTS)]
+    hashes = [content_hash(f'Étape {s}', f'Corps {s}') for s in range(STEPS)]
+    started = time.perf_counter()
+    duplicates = sum(1 for p in prospects if any(index.contains(p, h) for h in hashes))
+    lookups = time.perf_counter() - started
+
+    print(f'Historique : {len(index)} couples, chargement {load:.1f} s, index {memory / 1e6:.0f} Mo')
+    print(f'Sauvegarde : {size / 1e6:.1f} Mo en {save * 1000:.0f} ms, restauration {restore * 1000:.0f} ms')
+    print(f'{PROSPECTS} prospects x {STEPS} étapes : {lookups * 1000:.0f} ms en mémoire, '
+          f'{duplicates} doublons, {index.stats["bloom_negatives"]} réponses du filtre de Bloom')
+
+    if not DSN:
+        return
+    import psycopg2
+
+    setup(prospects, hashes)
+    conn = psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+    started = time.perf_counter()
+    legacy_duplicates = 0
+    for prospect in prospects:
+        with conn.cursor() as cur:
+            cur.execute("""SELECT subject FROM prospect_email_scheduled
+                           WHERE prospect_id = %s AND content_hash = ANY(%s) AND status IN ('scheduled', 'sent')""",
+                        (prospect, hashes))
+            found = cur.fetchall()
+            cur.execute("""SELECT content_hash FROM prospects_emails
+                           WHERE prospect_id = %s AND content_hash = ANY(%s) AND is_duplicate_archived IS NOT TRUE""",
+                        (prospect, hashes))
+            found += cur.fetchall()
+            legacy_duplicates += bool(found)
+    legacy = time.perf_counter() - started
+    conn.close()
+
+    index = EmailDedupIndex(DedupStore(lambda: psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')))
+    index.load()
+    started = time.perf_counter()
+    indexed_duplicates = sum(1 for p in prospects if any(index.contains(p, h) for h in hashes))
+    indexed = time.perf_counter() - started
+    print(f'Requêtes par prospect : {legacy:.2f} s ({2 * PROSPECTS} requêtes, {legacy_duplicates} doublons)')
+    print(f'Index : {indexed * 1000:.0f} ms (0 requête, {indexed_duplicates} doublons)')
+
+
+if __name__ == '__main__':
+    main()
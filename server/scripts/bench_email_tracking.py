@@ -0,0 +1,108 @@
+"""
+Ingestion de 10 000 événements de tracking par seconde : latence de `track()`
+côté pixel, durée des flushs et retard d'écriture.
+
+Usage : BENCH_DATABASE_URL=postgresql://... python server/scripts/bench_email_tracking.py
+Les tables sont créées dans un schéma jetable `email_tracking_bench`.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from emailTrackingIngestService import EmailTrackingIngester, TrackingEventStore  # noqa: E402
+
+DSN = os.environ['BENCH_DATABASE_URL']
+SCHEMA = 'email_tracking_bench'
+RATE = int(os.getenv('BENCH_RATE', '10000'))
+DURATION = int(os.getenv('BENCH_SECONDS', '10'))
+EMAILS = int(os.getenv('BENCH_EMAILS', '20000'))
+PRODUCERS = 4
+
+
+def setup():
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}."EmailTracking" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(), email_id UUID NOT NULL UNIQUE,
+                delivered_at TIMESTAMP, opened_at TIMESTAMP, clicked_at TIMESTAMP, bounced_at TIMESTAMP,
+                status VARCHAR(50) NOT NULL DEFAULT 'sent'
+            );
+            CREATE TABLE {SCHEMA}."EmailEvent" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                email_id UUID NOT NULL REFERENCES {SCHEMA}."EmailTracking"(id),
+                event_type VARCHAR(50) NOT NULL, "timestamp" TIMESTAMP NOT NULL DEFAULT NOW(),
+                user_agent TEXT, ip_address VARCHAR(45), link_url TEXT, metadata JSONB
+            );
+            CREATE INDEX ON {SCHEMA}."EmailEvent" (email_id);
+        """)
+        email_ids = [str(uuid.uuid4()) for _ in range(EMAILS)]
+        cur.execute(f'INSERT INTO {SCHEMA}."EmailTracking" (email_id) SELECT unnest(%s::uuid[])', (email_ids,))
+    conn.close()
+    return email_ids
+
+
+def produce(ingester, email_ids, rate, latencies, seed):
+    rng = random.Random(seed)
+    interval = 1 / rate
+    next_at = time.perf_counter()
+    end = next_at + DURATION
+    while next_at < end:
+        email_id = rng.choice(email_ids)
+        kind = rng.random()
+        started = time.perf_counter()
+        if kind < 0.8:
+            ingester.track_open(email_id, user_agent='Mozilla/5.0', ip_address='203.0.113.7')
+        elif kind < 0.97:
+            ingester.track_click(email_id, 'https://www.profitum.fr/simulateur')
+        else:
+            ingester.track(email_id, 'bounced')
+        latencies.append(time.perf_counter() - started)
+        next_at += interval
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+if __name__ == '__main__':
+    email_ids = setup()
+    store = TrackingEventStore(lambda: psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}'))
+    ingester = EmailTrackingIngester(store, flush_interval_ms=250, flush_max_events=5000)
+    latencies = [[] for _ in range(PRODUCERS)]
+    threads = [threading.Thread(target=produce, args=(ingester, email_ids, RATE / PRODUCERS, latencies[i], i))
+               for i in range(PRODUCERS)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    max_backlog = 0
+    while any(t.is_alive() for t in threads):
+        max_backlog = max(max_backlog, ingester.pending())
+        time.sleep(0.05)
+    produced_in = time.perf_counter() - started
+    ingester.close()
+    drained_in = time.perf_counter() - started
+
+    all_latencies = [v for chunk in latencies for v in chunk]
+    stats = ingester.stats
+    print(f'événements : {stats["received"]} en {produced_in:.1f}s ({stats["received"] / produced_in:.0f}/s)')
+    print(f'track() p50 {percentile(all_latencies, 0.5) * 1e6:.1f} µs  '
+          f'p99 {percentile(all_latencies, 0.99) * 1e6:.1f} µs  max {max(all_latencies) * 1e3:.2f} ms')
+    print(f'flushs : {stats["flushes"]}  événements écrits : {stats["events_written"]}  '
+          f'mises à jour de statut : {stats["status_updates"]}  perdus : {stats["dropped"]}')
+    print(f'tampon max : {max_backlog}  vidage final après {drained_in - produced_in:.2f}s')
+    print(f'transactions : {stats["flushes"]} contre {stats["received"]} (deux écritures chacune) avec trackEvent')
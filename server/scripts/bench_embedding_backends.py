@@ -0,0 +1,115 @@
+"""
+Choix du backend d'inférence du service d'embedding : dérive par rapport à la
+référence float32 (PyTorch) sur le corpus "Question", puis débit et latences
+par backend et taille de lot.
+
+Dérive (`compare_embeddings`) : cosinus référence / backend texte par texte,
+écart des similarités entre questions, accord sur le plus proche voisin et
+rappel des 5 plus proches voisins de chaque question.
+Débit : `encode` répété sur des lots de 1, 8, 32 et 128 questions pendant
+BENCH_SECONDS secondes ; textes/s et latence p50 / p95 / p99 par lot.
+
+Le backend retenu est le plus rapide sur les lots de 32 dont la dérive reste
+dans les seuils BENCH_MIN_TOP1 (accord du plus proche voisin, 0.98 par défaut)
+et BENCH_MIN_COSINE (cosinus moyen, 0.99).
+
+Usage : BENCH_DATABASE_URL=postgresql://... EMBEDDING_MODEL=all-MiniLM-L6-v2 \\
+        python server/scripts/bench_embedding_backends.py
+(lecture seule de "Question" ; BENCH_BACKENDS=torch,onnx,onnx-int8, EMBEDDING_THREADS)
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from embeddingModelService import EmbeddingModel, compare_embeddings, configure_threads  # noqa: E402
+
+DSN = os.getenv('BENCH_DATABASE_URL')
+BACKENDS = os.getenv('BENCH_BACKENDS', 'torch,onnx,onnx-int8').split(',')
+BATCH_SIZES = (1, 8, 32, 128)
+SECONDS = float(os.getenv('BENCH_SECONDS', '5'))
+MIN_TOP1 = float(os.getenv('BENCH_MIN_TOP1', '0.98'))
+MIN_COSINE = float(os.getenv('BENCH_MIN_COSINE', '0.99'))
+
+
+def load_questions():
+    conn = psycopg2.connect(DSN)
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT texte FROM "Question" WHERE texte IS NOT NULL AND texte <> \'\' ORDER BY id')
+            return [row[0] for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def throughput(model, texts, batch_size):
+    latencies, done, position = [], 0, 0
+    deadline = time.perf_counter() + SECONDS
+    while time.perf_counter() < deadline or len(latencies) < 5:
+        batch = [texts[(position + i) % len(texts)] for i in range(batch_size)]
+        position += batch_size
+        start = time.perf_counter()
+        model.encode(batch, batch_size=batch_size)
+        latencies.append(time.perf_counter() - start)
+        done += batch_size
+    p50, p95, p99 = np.percentile(latencies, (50, 95, 99)) * 1000
+    return done / sum(latencies), p50, p95, p99
+
+
+def main():
+    if not DSN:
+        print('BENCH_DATABASE_URL requis')
+        sys.exit(1)
+    texts = load_questions()
+    threads = configure_threads(1)
+    print(f"Modèle : {os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')}, {len(texts)} questions, "
+          f'{threads} thread(s)')
+
+    models, embeddings = {}, {}
+    for backend in ['torch'] + [b for b in BACKENDS if b != 'torch']:
+        model = EmbeddingModel(backend=backend)
+        model.warmup()
+        models[backend] = model
+        embeddings[backend] = model.encode(texts, batch_size=32)
+        print(f"  {backend:<10} chargement {model.stats['load_seconds']:.2f}s, "
+              f"préchauffage {model.stats['warmup_seconds']:.3f}s")
+
+    print('\nDérive par rapport à torch float32')
+    print(f"{'backend':<12}{'cos moyen':>11}{'cos p01':>10}{'cos min':>10}{'Δsim moy':>10}"
+          f"{'Δsim max':>10}{'top-1':>8}{'rappel@5':>10}")
+    drift = {}
+    for backend in models:
+        if backend == 'torch':
+            continue
+        d = drift[backend] = compare_embeddings(embeddings['torch'], embeddings[backend])
+        print(f"{backend:<12}{d['cosine_mean']:>11.5f}{d['cosine_p01']:>10.5f}{d['cosine_min']:>10.5f}"
+              f"{d['similarity_mean_abs_diff']:>10.5f}{d['similarity_max_abs_diff']:>10.5f}"
+              f"{d['top1_agreement']:>8.3f}{d['recall_at_k']:>10.3f}")
+
+    print('\nDébit et latence par lot')
+    print(f"{'backend':<12}{'lot':>5}{'textes/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    speed = {}
+    for backend in BACKENDS:
+        for batch_size in BATCH_SIZES:
+            rate, p50, p95, p99 = throughput(models[backend], texts, batch_size)
+            if batch_size == 32:
+                speed[backend] = rate
+            print(f'{backend:<12}{batch_size:>5}{rate:>10.0f}{p50:>8.2f}ms{p95:>8.2f}ms{p99:>8.2f}ms')
+
+    eligible = [b for b in speed if b == 'torch' or (drift[b]['top1_agreement'] >= MIN_TOP1
+                                                     and drift[b]['cosine_mean'] >= MIN_COSINE)]
+    if not eligible:
+        print('\nAucun backend mesuré ne respecte les seuils de dérive')
+        return
+    best = max(eligible, key=speed.get)
+    print(f'\nBackend retenu : {best} ({speed[best]:.0f} textes/s par lots de 32, '
+          f'seuils top-1 >= {MIN_TOP1}, cosinus moyen >= {MIN_COSINE})')
+
+
+if __name__ == '__main__':
+    main()
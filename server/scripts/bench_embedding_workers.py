@@ -0,0 +1,131 @@
+"""
+Démarrage et mémoire du service d'embedding sous gunicorn, avec 1, 4 et 8
+workers : modèle préchargé dans le master avant le fork (EMBEDDING_PRELOAD=1)
+contre une copie chargée par chaque worker (EMBEDDING_PRELOAD=0).
+
+Pour chaque configuration : temps entre le lancement de gunicorn et le moment
+où tous les workers répondent 200 sur /ready, puis, après quelques /embed par
+worker, RSS, PSS (pages partagées réparties entre processus) et mémoire privée
+par worker, lues dans /proc/<pid>/smaps_rollup (Linux).
+
+Usage : EMBEDDING_MODEL=all-MiniLM-L6-v2 python server/scripts/bench_embedding_workers.py
+(BENCH_WORKERS=1,4,8, BENCH_PORT=5077)
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+CONFIG = os.path.join(SERVER_DIR, 'gunicorn.embedding.conf.py')
+WORKER_COUNTS = [int(n) for n in os.getenv('BENCH_WORKERS', '1,4,8').split(',')]
+PORT = int(os.getenv('BENCH_PORT', '5077'))
+TIMEOUT = 600
+EMBEDS_PER_WORKER = 20
+
+
+def get(path):
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{PORT}{path}', timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+    except (urllib.error.URLError, ConnectionError):
+        return None, None
+
+
+def post_embed(text):
+    request = urllib.request.Request(f'http://127.0.0.1:{PORT}/embed', data=json.dumps({'text': text}).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        response.read()
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(p) for p in f.read().split()]
+
+
+def memory(pid):
+    """RSS, PSS et mémoire privée en Mo."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return values['Rss'], values['Pss'], values['Private_Clean'] + values['Private_Dirty']
+
+
+def concurrently(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run(workers, preload):
+    env = dict(os.environ, EMBEDDING_WORKERS=str(workers), EMBEDDING_PRELOAD='1' if preload else '0',
+               EMBEDDING_BIND=f'127.0.0.1:{PORT}')
+    start = time.perf_counter()
+    master = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', CONFIG, 'embeddingService:app'],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready, lock = set(), threading.Lock()
+
+        def poll():
+            while len(ready) < workers and time.perf_counter() - start < TIMEOUT:
+                status, body = get('/ready')
+                if status == 200:
+                    with lock:
+                        ready.add(body['pid'])
+                else:
+                    time.sleep(0.05)
+
+        # Plusieurs sondes simultanées : chaque worker finit par en recevoir une
+        concurrently(workers * 2, poll)
+        startup = time.perf_counter() - start
+        if len(ready) < workers:
+            raise RuntimeError(f'{len(ready)}/{workers} workers prêts après {TIMEOUT}s')
+
+        def embed():
+            for i in range(EMBEDS_PER_WORKER):
+                post_embed(f"Question {i} : quel est votre chiffre d'affaires annuel ?")
+
+        concurrently(workers, embed)
+        rows = [memory(pid) for pid in children(master.pid)]
+        return {
+            'startup': startup,
+            'master_rss': memory(master.pid)[0],
+            'rss': sum(r[0] for r in rows) / len(rows),
+            'pss': sum(r[1] for r in rows) / len(rows),
+            'private': sum(r[2] for r in rows) / len(rows),
+            'total_pss': memory(master.pid)[1] + sum(r[1] for r in rows)
+        }
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+
+
+def main():
+    print(f"Modèle : {os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')}, "
+          f"backend {os.getenv('EMBEDDING_BACKEND', 'torch')}, {os.cpu_count()} cœur(s)")
+    print(f"{'mode':<12}{'workers':>8}{'démarrage':>11}{'RSS/worker':>12}{'PSS/worker':>12}"
+          f"{'privé/worker':>14}{'RSS master':>12}{'PSS total':>11}")
+    for workers in WORKER_COUNTS:
+        for preload in (False, True):
+            r = run(workers, preload)
+            print(f"{'préchargé' if preload else 'par worker':<12}{workers:>8}{r['startup']:>10.2f}s"
+                  f"{r['rss']:>9.0f} Mo{r['pss']:>9.0f} Mo{r['private']:>11.0f} Mo"
+                  f"{r['master_rss']:>9.0f} Mo{r['total_pss']:>8.0f} Mo")
+
+
+if __name__ == '__main__':
+    main()
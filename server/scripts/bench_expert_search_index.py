@@ -0,0 +1,156 @@
+"""
+Recherche d'experts : CTE de scoring SQL (schéma de ExpertSearchService.searchExperts)
+contre ExpertSearchIndex en mémoire, pour plusieurs tailles de vivier.
+
+Usage : BENCH_DATABASE_URL=postgresql://... python server/scripts/bench_expert_search_index.py
+Les tables sont créées dans un schéma jetable `expert_search_bench`.
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import Json, execute_values
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from expertSearchIndexService import load_index  # noqa: E402
+
+DSN = os.getenv('BENCH_DATABASE_URL')
+SCHEMA = 'expert_search_bench'
+POOLS = [int(n) for n in os.getenv('BENCH_POOLS', '1000,10000,50000').split(',')]
+SEARCHES = 50
+SPECIALIZATIONS = ['TICPE', 'URSSAF', 'DFS', 'Foncier', 'CEE', 'MSA', 'Optimisation énergie', 'Chronotachygraphes']
+CITIES = [('Paris', 48.8566, 2.3522), ('Lyon', 45.764, 4.8357), ('Marseille', 43.2965, 5.3698),
+          ('Lille', 50.6292, 3.0573), ('Bordeaux', 44.8378, -0.5792), ('Nantes', 47.2184, -1.5536)]
+
+SQL = """
+    WITH expert_base AS (
+        SELECT e.id, e.name, e.specializations, e.location, e.rating, e.client_fee_percentage AS compensation,
+               COUNT(DISTINCT ea.id) AS assignment_count,
+               COUNT(DISTINCT CASE WHEN ea.status = 'completed' THEN ea.id END) AS completed_assignments,
+               AVG(ea.client_rating) AS avg_client_rating
+        FROM "Expert" e
+        LEFT JOIN "ExpertAssignment" ea ON e.id = ea.expert_id
+        WHERE e.status = 'active' AND e.approval_status = 'approved'
+          AND e.specializations @> %(specs)s AND e.rating >= %(min_rating)s
+          AND e.client_fee_percentage <= %(max_fee)s
+          AND 2 * 6371 * asin(sqrt(power(sin(radians(e.latitude - %(lat)s) / 2), 2)
+              + cos(radians(%(lat)s)) * cos(radians(e.latitude))
+              * power(sin(radians(e.longitude - %(lon)s) / 2), 2))) <= %(distance)s
+        GROUP BY e.id
+    ), scored_experts AS (
+        SELECT *,
+               COALESCE(ARRAY_LENGTH(ARRAY(SELECT UNNEST(specializations) INTERSECT SELECT UNNEST(%(specs)s)), 1), 0)
+                   * 40.0 / GREATEST(ARRAY_LENGTH(specializations, 1), 1)
+               + rating * 5.0
+               + CASE WHEN completed_assignments >= 20 THEN 20.0 WHEN completed_assignments >= 10 THEN 15.0
+                      WHEN completed_assignments >= 5 THEN 10.0 WHEN completed_assignments >= 1 THEN 5.0 ELSE 0 END
+               + CASE WHEN avg_client_rating >= 4.5 THEN 15.0 WHEN avg_client_rating >= 4.0 THEN 12.0
+                      WHEN avg_client_rating >= 3.5 THEN 8.0 WHEN avg_client_rating >= 3.0 THEN 4.0 ELSE 0 END
+                   AS relevance_score
+        FROM expert_base
+    )
+    SELECT id, relevance_score FROM scored_experts ORDER BY relevance_score DESC LIMIT 10
+"""
+
+
+def setup(pool):
+    rng = random.Random(pool)
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f'SET search_path = {SCHEMA}')
+        cur.execute("""
+            CREATE TABLE "Expert" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(), name TEXT, company_name TEXT,
+                specializations TEXT[], experience TEXT, location TEXT, rating NUMERIC, description TEXT,
+                client_fee_percentage NUMERIC, disponibilites JSONB, certifications JSONB, status TEXT,
+                approval_status TEXT, latitude DOUBLE PRECISION, longitude DOUBLE PRECISION,
+                created_at TIMESTAMPTZ DEFAULT NOW()
+            );
+            CREATE TABLE "ExpertAssignment" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(), expert_id UUID, status TEXT, client_rating NUMERIC
+            );
+            CREATE INDEX ON "ExpertAssignment" (expert_id);
+            CREATE INDEX ON "Expert" USING gin (specializations);
+        """)
+        rows = []
+        for i in range(pool):
+            city, lat, lon = rng.choice(CITIES)
+            rows.append((f'Expert {i}', rng.sample(SPECIALIZATIONS, rng.randint(1, 3)), f'{city}, France',
+                         rng.choice([3, 3.5, 4, 4.5, 5]), rng.choice([10, 15, 20, 30]),
+                         Json({'available': rng.random() < 0.5}), Json({'ISO': rng.random() < 0.3}),
+                         'active' if rng.random() < 0.9 else 'inactive', 'approved',
+                         lat + rng.uniform(-0.3, 0.3), lon + rng.uniform(-0.3, 0.3)))
+        execute_values(cur, """
+            INSERT INTO "Expert" (name, specializations, location, rating, client_fee_percentage, disponibilites,
+                                  certifications, status, approval_status, latitude, longitude)
+            VALUES %s
+        """, rows, page_size=5000)
+        cur.execute("""
+            INSERT INTO "ExpertAssignment" (expert_id, status, client_rating)
+            SELECT e.id, (ARRAY['completed', 'in_progress'])[1 + (random() * 1.99)::int], 3 + (random() * 2)::int
+            FROM "Expert" e, generate_series(1, 8)
+        """)
+        cur.execute('ANALYZE "Expert"')
+        cur.execute('ANALYZE "ExpertAssignment"')
+    conn.close()
+
+
+def connect():
+    return psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def main():
+    if not DSN:
+        print('BENCH_DATABASE_URL requis')
+        return
+    rng = random.Random(1)
+    queries = []
+    for _ in range(SEARCHES):
+        _, lat, lon = rng.choice(CITIES)
+        queries.append({'specializations': rng.sample(SPECIALIZATIONS, 1), 'minRating': 3.5,
+                        'priceRange': {'max': 20}, 'near': {'latitude': lat, 'longitude': lon},
+                        'maxDistance': 50})
+
+    for pool in POOLS:
+        setup(pool)
+        conn = connect()
+        sql_times = []
+        for q in queries:
+            start = time.perf_counter()
+            with conn.cursor() as cur:
+                cur.execute(SQL, {'specs': q['specializations'], 'min_rating': q['minRating'],
+                                  'max_fee': q['priceRange']['max'], 'lat': q['near']['latitude'],
+                                  'lon': q['near']['longitude'], 'distance': q['maxDistance']})
+                cur.fetchall()
+            sql_times.append(time.perf_counter() - start)
+        conn.close()
+
+        start = time.perf_counter()
+        index = load_index(connect)
+        load = time.perf_counter() - start
+        index_times = []
+        for q in queries:
+            start = time.perf_counter()
+            index.search(q, limit=10)
+            index_times.append(time.perf_counter() - start)
+
+        print(f'{pool} experts : SQL médiane {statistics.median(sql_times) * 1000:.1f} ms '
+              f'(p95 {percentile(sql_times, 0.95) * 1000:.1f}) ; index médiane '
+              f'{statistics.median(index_times) * 1000:.2f} ms (p95 {percentile(index_times, 0.95) * 1000:.2f}) ; '
+              f'chargement {load:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Notifications de messages : une ligne par destinataire et par message
+(createMessageNotifications), contre notifications glissantes regroupées
+(MessageNotificationFanout).
+
+Usage : BENCH_DATABASE_URL=postgresql://... python server/scripts/bench_message_notification_fanout.py
+Les tables sont créées dans un schéma jetable `message_notification_bench`.
+"""
+
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from messageNotificationFanoutService import (  # noqa: E402
+    MessageNotificationFanout,
+    MessageNotificationStore,
+)
+
+DSN = os.getenv('BENCH_DATABASE_URL')
+SCHEMA = 'message_notification_bench'
+CONVERSATIONS = int(os.getenv('BENCH_CONVERSATIONS', '100'))
+MESSAGES = int(os.getenv('BENCH_MESSAGES', '5000'))
+# Messages par fenêtre d'écriture (échange rapide : ~2 s de trafic)
+WINDOW = int(os.getenv('BENCH_WINDOW', '250'))
+
+
+def setup():
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}."ConversationParticipant" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(), conversation_id UUID NOT NULL,
+                user_id UUID NOT NULL, user_type TEXT NOT NULL, is_active BOOLEAN NOT NULL DEFAULT true
+            );
+            CREATE INDEX ON {SCHEMA}."ConversationParticipant" (conversation_id);
+            CREATE TABLE {SCHEMA}."MessageNotification" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(), user_id UUID NOT NULL, user_type TEXT NOT NULL,
+                conversation_id UUID NOT NULL, message_id UUID, title TEXT, body TEXT,
+                is_read BOOLEAN NOT NULL DEFAULT false, message_count INTEGER NOT NULL DEFAULT 1,
+                created_at TIMESTAMPTZ, updated_at TIMESTAMPTZ
+            );
+            CREATE TABLE {SCHEMA}.legacy_notification (LIKE {SCHEMA}."MessageNotification" INCLUDING DEFAULTS);
+            CREATE UNIQUE INDEX ON {SCHEMA}."MessageNotification" (user_id, user_type, conversation_id)
+                WHERE is_read = false;
+        """)
+        participants = {}
+        for _ in range(CONVERSATIONS):
+            conversation = str(uuid.uuid4())
+            participants[conversation] = [(str(uuid.uuid4()), 'client'), (str(uuid.uuid4()), 'expert')]
+        execute_values(cur, f'INSERT INTO {SCHEMA}."ConversationParticipant" (conversation_id, user_id, user_type) VALUES %s',
+                       [(c, u, t) for c, members in participants.items() for u, t in members])
+    conn.close()
+    return participants
+
+
+def connect():
+    return psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+
+
+def main():
+    if not DSN:
+        print('BENCH_DATABASE_URL requis')
+        return
+    participants = setup()
+    conversations = list(participants)
+    t0 = datetime.now(timezone.utc)
+    messages = []
+    for i in range(MESSAGES):
+        conversation = conversations[i % CONVERSATIONS]
+        sender = participants[conversation][i // CONVERSATIONS % 2][0]
+        messages.append({'id': str(uuid.uuid4()), 'conversation_id': conversation, 'sender_id': sender,
+                         'sender_name': 'Bench', 'content': f'message {i}', 'created_at': t0 + timedelta(milliseconds=i)})
+
+    # Chemin actuel : lecture des participants puis insertion, à chaque message
+    conn = connect()
+    started = time.perf_counter()
+    for message in messages:
+        with conn.cursor() as cur:
+            cur.execute("""SELECT user_id, user_type FROM "ConversationParticipant"
+                           WHERE conversation_id = %s AND user_id <> %s AND is_active = true""",
+                        (message['conversation_id'], message['sender_id']))
+            rows = [(u, t, message['conversation_id'], message['id'], 'Nouveau message', message['content'],
+                     message['created_at']) for u, t in cur.fetchall()]
+            execute_values(cur, """INSERT INTO legacy_notification
+                                   (user_id, user_type, conversation_id, message_id, title, body, created_at)
+                                   VALUES %s""", rows)
+        conn.commit()
+    legacy = time.perf_counter() - started
+
+    fanout = MessageNotificationFanout(MessageNotificationStore(connect), autostart=False)
+    publish = 0.0
+    started = time.perf_counter()
+    for i, message in enumerate(messages, 1):
+        before = time.perf_counter()
+        fanout.publish(message)
+        publish += time.perf_counter() - before
+        if i % WINDOW == 0:
+            fanout.flush()
+    fanout.flush()
+    coalesced = time.perf_counter() - started
+
+    with conn.cursor() as cur:
+        cur.execute('SELECT count(*) FROM legacy_notification')
+        legacy_rows = cur.fetchone()[0]
+        cur.execute('SELECT count(*), sum(message_count) FROM "MessageNotification"')
+        rows, total = cur.fetchone()
+    conn.close()
+
+    print(f'{MESSAGES} messages, {CONVERSATIONS} conversations')
+    print(f'Une ligne par message : {legacy:.2f} s, {legacy_rows} lignes, '
+          f'{legacy / MESSAGES * 1000:.2f} ms dans le chemin d\'envoi')
+    print(f'Regroupé : {coalesced:.2f} s, {rows} lignes ({total} messages), '
+          f'{publish / MESSAGES * 1_000_000:.1f} µs dans le chemin d\'envoi')
+
+
+if __name__ == '__main__':
+    main()
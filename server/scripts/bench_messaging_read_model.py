@@ -0,0 +1,125 @@
+"""
+Marquage lu et badge non lus : mise à jour `is_read` message par message et
+COUNT (messaging-service.ts), contre filigrane et compteurs matérialisés
+(MessagingReadModel).
+
+Usage : BENCH_DATABASE_URL=postgresql://... python server/scripts/bench_messaging_read_model.py
+Les tables sont créées dans un schéma jetable `messaging_read_bench`.
+"""
+
+import os
+import sys
+import time
+import uuid
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from messagingReadModelService import MessagingReadModel  # noqa: E402
+
+DSN = os.getenv('BENCH_DATABASE_URL')
+SCHEMA = 'messaging_read_bench'
+CONVERSATIONS = int(os.getenv('BENCH_CONVERSATIONS', '200'))
+MESSAGES = int(os.getenv('BENCH_MESSAGES', '500'))
+
+
+def setup():
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}."Conversation" (
+                id UUID PRIMARY KEY, last_message_at TIMESTAMPTZ, updated_at TIMESTAMPTZ
+            );
+            CREATE TABLE {SCHEMA}."ConversationParticipant" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(), conversation_id UUID NOT NULL,
+                user_id UUID NOT NULL, user_type TEXT NOT NULL, is_active BOOLEAN NOT NULL DEFAULT true,
+                last_read_at TIMESTAMPTZ, last_read_message_id UUID,
+                unread_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX ON {SCHEMA}."ConversationParticipant" (conversation_id, user_id);
+            CREATE TABLE {SCHEMA}."Message" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(), conversation_id UUID NOT NULL,
+                sender_id UUID NOT NULL, sender_type TEXT, sender_name TEXT, content TEXT,
+                message_type TEXT, metadata JSONB, is_read BOOLEAN,
+                created_at TIMESTAMPTZ, updated_at TIMESTAMPTZ
+            );
+            CREATE INDEX ON {SCHEMA}."Message" (conversation_id, created_at DESC, id DESC);
+            CREATE INDEX ON {SCHEMA}."Message" (conversation_id) WHERE is_read = false;
+            CREATE TABLE {SCHEMA}.user_unread_counters (
+                user_id UUID NOT NULL, user_type TEXT NOT NULL,
+                unread_total INTEGER NOT NULL DEFAULT 0, updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (user_id, user_type)
+            );
+        """)
+        client, expert = str(uuid.uuid4()), str(uuid.uuid4())
+        conversations = [str(uuid.uuid4()) for _ in range(CONVERSATIONS)]
+        cur.execute(f'INSERT INTO {SCHEMA}."Conversation" (id) SELECT unnest(%s::uuid[])', (conversations,))
+        cur.execute(f"""INSERT INTO {SCHEMA}."ConversationParticipant" (conversation_id, user_id, user_type, unread_count)
+                        SELECT c, %s::uuid, 'client', %s FROM unnest(%s::uuid[]) c
+                        UNION ALL SELECT c, %s::uuid, 'expert', 0 FROM unnest(%s::uuid[]) c""",
+                    (client, MESSAGES, conversations, expert, conversations))
+        cur.execute(f"""INSERT INTO {SCHEMA}."Message" (conversation_id, sender_id, content, is_read, created_at)
+                        SELECT c, %s::uuid, 'message ' || g, false, NOW() - (g || ' seconds')::interval
+                        FROM unnest(%s::uuid[]) c, generate_series(1, %s) g""", (expert, conversations, MESSAGES))
+        cur.execute(f"""INSERT INTO {SCHEMA}.user_unread_counters (user_id, user_type, unread_total)
+                        VALUES (%s, 'client', %s)""", (client, CONVERSATIONS * MESSAGES))
+        cur.execute(f'ANALYZE {SCHEMA}."Message"')
+    conn.close()
+    return client, conversations
+
+
+def connect():
+    return psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+
+
+def main():
+    if not DSN:
+        print('BENCH_DATABASE_URL requis')
+        return
+    client, conversations = setup()
+    half = len(conversations) // 2
+
+    # Une connexion par opération des deux côtés, comme MessagingReadModel
+    started = time.perf_counter()
+    for _ in range(100):
+        conn = connect()
+        with conn.cursor() as cur:
+            cur.execute("""SELECT count(*) FROM "Message" m JOIN "ConversationParticipant" p
+                           ON p.conversation_id = m.conversation_id AND p.user_id = %s
+                           WHERE m.is_read = false AND m.sender_id <> %s""", (client, client))
+            cur.fetchone()
+        conn.close()
+    legacy_badge = (time.perf_counter() - started) / 100
+    started = time.perf_counter()
+    for conversation in conversations[:half]:
+        conn = connect()
+        with conn.cursor() as cur:
+            cur.execute("""UPDATE "Message" SET is_read = true
+                           WHERE conversation_id = %s AND sender_id <> %s AND is_read = false""",
+                        (conversation, client))
+            cur.execute("""UPDATE "ConversationParticipant" SET last_read_at = NOW()
+                           WHERE conversation_id = %s AND user_id = %s""", (conversation, client))
+        conn.commit()
+        conn.close()
+    legacy_read = (time.perf_counter() - started) / half
+
+    model = MessagingReadModel(connect)
+    started = time.perf_counter()
+    for _ in range(100):
+        model.unread_total(client, 'client')
+    badge = (time.perf_counter() - started) / 100
+    started = time.perf_counter()
+    for conversation in conversations[half:]:
+        model.mark_read(conversation, client)
+    read = (time.perf_counter() - started) / half
+
+    print(f'Badge non lus : COUNT {legacy_badge * 1000:.2f} ms, compteur {badge * 1000:.2f} ms')
+    print(f'Marquer lue une conversation de {MESSAGES} messages : '
+          f'is_read {legacy_read * 1000:.2f} ms, filigrane {read * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Temps de résolution d'une étape du simulateur selon la taille de la banque de
+questions : réévaluation complète (comportement actuel) contre graphe compilé.
+
+Usage : python server/scripts/bench_questionnaire_graph.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from questionnaireGraphService import QuestionnaireGraph, _compile_operator, _is_missing  # noqa: E402
+
+PRODUCTS = ['TICPE', 'URSSAF', 'DFS', 'FONCIER', 'MSA', 'CEE', 'ENERGIE', 'SOLID']
+
+
+def synthetic_bank(size, seed=42):
+    rng = random.Random(seed)
+    questions = []
+    for i in range(size):
+        question = {'id': f'q-{i}', 'question_id': f'Q_{i:05d}', 'question_order': i,
+                    'produits_cibles': rng.sample(PRODUCTS, 2), 'conditions': {}}
+        # Chaque question conditionnelle dépend d'une question proche (branches courtes)
+        if i >= 5 and rng.random() < 0.6:
+            parent = rng.randrange(max(0, i - 20), i)
+            question['conditions'] = {'depends_on': f'Q_{parent:05d}', 'value': 'Oui', 'operator': 'equals'}
+        questions.append(question)
+    return questions
+
+
+def naive_step(questions, answers):
+    """Réévaluation de toutes les conditions, comme findNextVisibleQuestion()."""
+    for question in questions:
+        conditions = question['conditions']
+        if not conditions:
+            if question['id'] not in answers:
+                return question
+            continue
+        answer = answers.get(conditions['depends_on'])
+        if not _is_missing(answer) and _compile_operator('equals', conditions['value'])(answer):
+            if question['id'] not in answers:
+                return question
+    return None
+
+
+def run(size, steps=200):
+    questions = synthetic_bank(size)
+    codes = {q['question_id']: q['id'] for q in questions}
+    for q in questions:
+        if q['conditions']:
+            q['conditions']['depends_on'] = codes[q['conditions']['depends_on']]
+    graph = QuestionnaireGraph(questions)
+    session = graph.new_session()
+    answers = {}
+
+    naive, compiled = 0.0, 0.0
+    for _ in range(steps):
+        start = time.perf_counter()
+        question = naive_step(questions, answers)
+        naive += time.perf_counter() - start
+        if question is None:
+            break
+        answers[question['id']] = 'Oui'
+
+        start = time.perf_counter()
+        session.apply_answers({question['id']: 'Oui'})
+        session.next_question()
+        compiled += time.perf_counter() - start
+    return naive / steps * 1e6, compiled / steps * 1e6
+
+
+if __name__ == '__main__':
+    print(f"{'questions':>10} {'réévaluation (µs/étape)':>26} {'graphe compilé (µs/étape)':>28}")
+    for size in (60, 600, 6000, 60000):
+        naive, compiled = run(size)
+        print(f'{size:>10} {naive:>26.1f} {compiled:>28.1f}')
@@ -0,0 +1,98 @@
+"""
+Surcoût par requête du middleware de métriques : sur une app WSGI vide
+(surcoût isolé), puis sur une app Flask minimale avec et sans `init_app`
+(mesures alternées, meilleur de 5 passes).
+
+Usage : python server/scripts/bench_request_metrics.py
+"""
+
+import io
+import os
+import sys
+import time
+
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from requestMetricsService import (  # noqa: E402
+    LatencyHistogram,
+    MetricsMiddleware,
+    RequestMetrics,
+    init_app,
+    timed,
+)
+
+REQUESTS = int(os.getenv('BENCH_REQUESTS', '20000'))
+
+
+def make_app(instrumented):
+    app = Flask(__name__)
+    if instrumented:
+        init_app(app, RequestMetrics())
+
+    @app.route('/api/audits/<audit_id>')
+    def audit(audit_id):
+        with timed('db'):
+            pass
+        return jsonify({'success': True, 'id': audit_id})
+    return app
+
+
+def environ(path):
+    return {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'SERVER_NAME': 'bench', 'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+            'SERVER_PROTOCOL': 'HTTP/1.1'}
+
+
+def empty_app(environ, start_response):
+    environ[MetricsMiddleware.ROUTE_KEY] = '/api/audits/<audit_id>'
+    start_response('200 OK', [])
+    return [b'{}']
+
+
+def request(wsgi, path):
+    body = wsgi(environ(path), lambda status, headers, exc_info=None: None)
+    try:
+        return b''.join(body)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+
+def run(wsgi):
+    for i in range(1000):
+        request(wsgi, f'/api/audits/{i}')
+    started = time.perf_counter()
+    for i in range(REQUESTS):
+        request(wsgi, f'/api/audits/{i}')
+    return (time.perf_counter() - started) / REQUESTS
+
+
+if __name__ == '__main__':
+    histogram = LatencyHistogram()
+    started = time.perf_counter()
+    for i in range(REQUESTS):
+        histogram.record(i * 1e-6)
+    record_cost = (time.perf_counter() - started) / REQUESTS
+
+    bare = min(run(empty_app) for _ in range(5))
+    wrapped = min(run(MetricsMiddleware(empty_app, RequestMetrics())) for _ in range(5))
+    print(f'middleware seul : {(wrapped - bare) * 1e6:.1f} µs/requête (record() {record_cost * 1e6:.2f} µs)')
+
+    plain, measured = make_app(False).wsgi_app, make_app(True).wsgi_app
+    base = instrumented = float('inf')
+    for _ in range(5):
+        base = min(base, run(plain))
+        instrumented = min(instrumented, run(measured))
+    print(f'{REQUESTS} requêtes Flask en WSGI direct')
+    print(f'sans métriques : {base * 1e6:.1f} µs/requête')
+    print(f'avec métriques : {instrumented * 1e6:.1f} µs/requête  '
+          f'(surcoût {(instrumented - base) * 1e6:.1f} µs)')
+    metrics = RequestMetrics()
+    for i in range(200):
+        for status in ('200', '404', '500'):
+            metrics.observe(f'/api/route/{i}', 'GET', status, 0.01, {'db': 0.002})
+    started = time.perf_counter()
+    text = metrics.render()
+    print(f'/metrics pour 600 séries : {(time.perf_counter() - started) * 1e3:.1f} ms, {len(text)} octets')
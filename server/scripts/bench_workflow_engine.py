@@ -0,0 +1,157 @@
+"""
+Validation en masse de documents : transitions une par une (schéma de
+executeWorkflowStep, actions exécutées en série) contre WorkflowEngine
+(lot d'événements, une écriture par instance) + OutboxDispatcher (actions en
+parallèle). La latence d'une action (envoi d'email, API de signature...) est
+simulée par BENCH_ACTION_MS.
+
+Usage : BENCH_DATABASE_URL=postgresql://... python server/scripts/bench_workflow_engine.py
+Les tables sont créées dans un schéma jetable `workflow_engine_bench`.
+"""
+
+import os
+import sys
+import time
+import uuid
+
+import psycopg2
+from psycopg2.extras import Json, execute_values
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from workflowEngineService import (  # noqa: E402
+    CompiledWorkflow,
+    OutboxDispatcher,
+    WorkflowEngine,
+    WorkflowStore,
+    outbox_rows,
+)
+
+DSN = os.getenv('BENCH_DATABASE_URL')
+SCHEMA = 'workflow_engine_bench'
+INSTANCES = int(os.getenv('BENCH_INSTANCES', '200'))
+ACTION_SECONDS = int(os.getenv('BENCH_ACTION_MS', '10')) / 1000
+WORKERS = int(os.getenv('BENCH_WORKERS', '16'))
+
+STEPS = [
+    ('upload', 1, ['always'], ['send_notification']),
+    ('validation', 2, ['if_sensitive'], ['validate_eligibility', 'create_task']),
+    ('analyse', 3, ['if_expert_assigned'], ['calculate_commission', 'generate_invoice']),
+    ('archive', 4, ['always'], ['archive_document']),
+]
+
+
+def setup():
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f'SET search_path = {SCHEMA}')
+        cur.execute("""
+            CREATE TABLE "WorkflowTemplate" (id TEXT PRIMARY KEY, version TEXT);
+            CREATE TABLE "WorkflowStep" (
+                id TEXT PRIMARY KEY, workflow_id TEXT, name TEXT, "order" INT, required BOOLEAN,
+                conditions TEXT[], condition_params JSONB, actions TEXT[], action_params JSONB, notifications JSONB
+            );
+            CREATE TABLE "WorkflowInstance" (
+                id UUID PRIMARY KEY, template_id TEXT, document_id UUID, client_id UUID, expert_id UUID,
+                status TEXT, current_step INT, completed_at TIMESTAMPTZ
+            );
+        """)
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'migrations',
+                               '20251222_create_workflow_outbox.sql')) as f:
+            cur.execute(f.read().replace('BEGIN;', '').replace('COMMIT;', ''))
+        cur.execute("INSERT INTO \"WorkflowTemplate\" VALUES ('fiscal_v1', '1.0')")
+        for step_id, order, conditions, actions in STEPS:
+            cur.execute('INSERT INTO "WorkflowStep" VALUES (%s, %s, %s, %s, true, %s, %s, %s, %s, %s)',
+                        (step_id, 'fiscal_v1', step_id, order, conditions, Json({}), actions, Json({}),
+                         Json({'on_complete': True, 'recipients': ['client'], 'template': step_id})))
+    conn.close()
+
+
+def reset_instances():
+    ids = [str(uuid.uuid4()) for _ in range(INSTANCES)]
+    conn = connect()
+    with conn, conn.cursor() as cur:
+        cur.execute('TRUNCATE "WorkflowInstance", workflow_outbox')
+        execute_values(cur, 'INSERT INTO "WorkflowInstance" VALUES %s',
+                       [(i, 'fiscal_v1', None, None, str(uuid.uuid4()), 'pending', 0, None) for i in ids])
+    conn.close()
+    return ids
+
+
+def connect():
+    return psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+
+
+def slow_action(payload):
+    time.sleep(ACTION_SECONDS)
+
+
+def sequential(ids):
+    """Relecture instance + template par étape, actions en série, écriture d'état par étape."""
+    actions = 0
+    conn = connect()
+    try:
+        for instance_id in ids:
+            for step_number in range(len(STEPS)):
+                with conn.cursor() as cur:
+                    cur.execute("""SELECT id::text, template_id, expert_id::text, status, current_step
+                                   FROM "WorkflowInstance" WHERE id = %s""", (instance_id,))
+                    row = cur.fetchone()
+                    instance = dict(zip(('id', 'template_id', 'expert_id', 'status', 'current_step'), row))
+                    cur.execute('SELECT id, version FROM "WorkflowTemplate" WHERE id = %s', (row[1],))
+                    template = {'id': row[1], 'steps': []}
+                    cur.execute("""SELECT id, "order", required, conditions, condition_params, actions,
+                                          action_params, notifications
+                                   FROM "WorkflowStep" WHERE workflow_id = %s ORDER BY "order" """, (row[1],))
+                    columns = [d[0] for d in cur.description]
+                    template['steps'] = [dict(zip(columns, r)) for r in cur.fetchall()]
+                    step, _ = CompiledWorkflow(template).transition(instance, step_number, None)
+                    for _ in outbox_rows(step, instance, None, None):
+                        slow_action(None)
+                        actions += 1
+                    if step.next_step is None:
+                        cur.execute("""UPDATE "WorkflowInstance" SET status = 'completed', completed_at = NOW()
+                                       WHERE id = %s""", (instance_id,))
+                    else:
+                        cur.execute("""UPDATE "WorkflowInstance" SET current_step = %s, status = 'in_progress'
+                                       WHERE id = %s""", (step.next_step, instance_id))
+                conn.commit()
+    finally:
+        conn.close()
+    return actions
+
+
+def main():
+    if not DSN:
+        print('BENCH_DATABASE_URL requis')
+        return
+    setup()
+    print(f'{INSTANCES} documents, {len(STEPS)} étapes, action simulée {ACTION_SECONDS * 1000:.0f} ms')
+
+    ids = reset_instances()
+    start = time.perf_counter()
+    actions = sequential(ids)
+    unit = time.perf_counter() - start
+    print(f'Transitions une par une : {unit * 1000:.0f} ms ({actions} actions)')
+
+    ids = reset_instances()
+    store = WorkflowStore(connect)
+    engine = WorkflowEngine(store)
+    events = [{'instance_id': i, 'step_number': n} for i in ids for n in range(len(STEPS))]
+    start = time.perf_counter()
+    engine.execute_steps(events)
+    transitions = time.perf_counter() - start
+    handlers = {a: slow_action for a in ('send_notification', 'create_task', 'generate_invoice',
+                                         'request_signature', 'step_notification')}
+    dispatcher = OutboxDispatcher(store, handlers, workers=WORKERS, batch_size=WORKERS * 4, autostart=False)
+    dispatched = dispatcher.drain()
+    dispatcher.close()
+    total = time.perf_counter() - start
+    print(f'Moteur groupé : transitions {transitions * 1000:.0f} ms, total avec {WORKERS} workers '
+          f'{total * 1000:.0f} ms ({dispatched} actions) — x{unit / total:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,16 @@
+import os
+import sys
+
 from flask import Flask, request, jsonify
-from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from embeddingModelService import EmbeddingModel, ModelNotReady, init_app as init_model  # noqa: E402
+from requestMetricsService import RequestMetrics, init_app as init_metrics, timed  # noqa: E402
 
 app = Flask(__name__)
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+init_metrics(app, RequestMetrics())
+model = init_model(app, EmbeddingModel(os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')))
 
 @app.route('/embed', methods=['POST'])
 def embed():
@@ -10,8 +18,13 @@ def embed():
     text = data.get('text')
     if not text:
         return jsonify({'error': 'No text provided'}), 400
-    embedding = model.encode(text).tolist()
+    try:
+        with timed('embed'):
+            embedding = model.encode(text).tolist()
+    except ModelNotReady as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     return jsonify({'embedding': embedding})
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000) 
\ No newline at end of file
+    model.warmup()
+    app.run(host='0.0.0.0', port=5000)
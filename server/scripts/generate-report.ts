@@ -0,0 +1,57 @@
+/**
+ * Pont de génération des rapports pour le worker Python (reportWorkerService.py)
+ * Usage: ts-node server/scripts/generate-report.ts <morning|daily_v2> '<params JSON>'
+ *
+ * Écrit sur stdout une ligne JSON par événement :
+ *   {"event":"section","name":"rdvTomorrow","data":[...]}  résultat partiel
+ *   {"event":"result","data":{...}}                         rapport complet
+ * Les logs des services sont redirigés vers stderr pour ne pas mélanger les flux.
+ */
+
+// IMPORTANT: Charger le .env AVANT d'importer les services qui en dépendent
+import * as dotenv from 'dotenv';
+import * as path from 'path';
+
+dotenv.config({ path: path.join(__dirname, '../.env') });
+
+// stdout est réservé aux événements JSON
+console.log = console.error;
+console.info = console.error;
+
+import { MorningReportService } from '../src/services/morning-report-service';
+import { DailyActivityReportServiceV2 } from '../src/services/daily-activity-report-service-v2';
+
+function emit(event: Record<string, unknown>): void {
+  process.stdout.write(JSON.stringify(event) + '\n');
+}
+
+async function generateReport(type: string, params: { date?: string; adminId?: string; adminType?: string }) {
+  const reportDate = params.date ? new Date(params.date) : new Date();
+
+  switch (type) {
+    case 'morning':
+      return MorningReportService.generateMorningReport(reportDate, false);
+    case 'daily_v2':
+      return DailyActivityReportServiceV2.generateDailyReport(
+        reportDate,
+        params.adminId,
+        params.adminType,
+        false,
+        (name, data) => emit({ event: 'section', name, data })
+      );
+    default:
+      throw new Error(`Type de rapport inconnu: ${type}`);
+  }
+}
+
+const [type, rawParams] = process.argv.slice(2);
+
+generateReport(type, rawParams ? JSON.parse(rawParams) : {})
+  .then(result => {
+    emit({ event: 'result', data: result });
+    process.exit(0);
+  })
+  .catch(error => {
+    console.error('❌ Erreur génération rapport:', error?.message || error);
+    process.exit(1);
+  });
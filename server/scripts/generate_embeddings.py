@@ -1,6 +1,14 @@
+import json
+import os
+import sys
+
 import psycopg2
 from sentence_transformers import SentenceTransformer
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+
+from queryProfilerService import ProfiledConnection, profile_queries  # noqa: E402
+
 # Paramètres de connexion à la base Supabase
 DB_HOST = "gvvlsgtubqfxdztldunj.supabase.co"
 DB_NAME = "postgres"
@@ -14,28 +22,31 @@ conn = psycopg2.connect(
     dbname=DB_NAME,
     user=DB_USER,
     password=DB_PASS,
-    port=DB_PORT
+    port=DB_PORT,
+    connection_factory=ProfiledConnection
 )
 cur = conn.cursor()
 
 # Charge le modèle d'embedding (MiniLM)
 model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
 
-# Récupère toutes les questions
-cur.execute('SELECT id, texte FROM "Question"')
-rows = cur.fetchall()
-
-for qid, texte in rows:
-    embedding = model.encode(texte)
-    # Format PostgreSQL vector : string de floats séparés par virgule
-    embedding_str = ','.join([str(x) for x in embedding])
-    # Met à jour la colonne embedding
-    cur.execute(
-        'UPDATE "Question" SET embedding = %s WHERE id = %s',
-        (f'[{embedding_str}]', qid)
-    )
-
-conn.commit()
+with profile_queries('generate_embeddings') as profile:
+    # Récupère toutes les questions
+    cur.execute('SELECT id, texte FROM "Question"')
+    rows = cur.fetchall()
+
+    for qid, texte in rows:
+        embedding = model.encode(texte)
+        # Format PostgreSQL vector : string de floats séparés par virgule
+        embedding_str = ','.join([str(x) for x in embedding])
+        # Met à jour la colonne embedding
+        cur.execute(
+            'UPDATE "Question" SET embedding = %s WHERE id = %s',
+            (f'[{embedding_str}]', qid)
+        )
+
+    conn.commit()
 cur.close()
 conn.close()
-print("Embeddings générés et insérés avec succès !") 
\ No newline at end of file
+print("Embeddings générés et insérés avec succès !")
+print(json.dumps({key: profile.report()[key] for key in ('queries', 'db_ms', 'n_plus_one')}, ensure_ascii=False)) 
\ No newline at end of file
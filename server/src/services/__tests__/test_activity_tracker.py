@@ -0,0 +1,143 @@
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activityTrackerService import (  # noqa: E402
+    ActivityStore,
+    ActivityTracker,
+    should_track,
+)
+
+DSN = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'activity_tracker_test'
+T0 = datetime(2025, 12, 15, 9, 0, tzinfo=timezone.utc)
+C1 = '00000000-0000-4000-8000-00000000000c'
+E1 = '00000000-0000-4000-8000-00000000000e'
+A1 = '00000000-0000-4000-8000-00000000000a'
+
+
+class DataError(Exception):
+    pgcode = '22P02'
+
+
+class MemoryStore:
+    def __init__(self, failures=0, error=None):
+        self.writes = []
+        self.failures = failures
+        self.error = error or RuntimeError('base indisponible')
+
+    def write(self, table, rows):
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        self.writes.append((table, list(rows)))
+        return len(rows)
+
+
+class Clock:
+    def __init__(self):
+        self.now = T0
+
+    def __call__(self):
+        return self.now
+
+
+def test_requests_are_coalesced_per_user_and_resolution():
+    store, clock = MemoryStore(), Clock()
+    tracker = ActivityTracker(store, resolution_seconds=60, clock=clock, autostart=False)
+    for second in range(30):
+        clock.now = T0 + timedelta(seconds=second)
+        tracker.record('client', C1)
+    tracker.record('expert', E1)
+    tracker.record('apporteur', A1)
+    tracker.record('admin', str(uuid.uuid4()))
+
+    assert tracker.flush() == 3
+    assert dict((table, rows) for table, rows in store.writes) == {
+        'Client': [(C1, T0 + timedelta(seconds=29))],
+        'Expert': [(E1, T0 + timedelta(seconds=29))],
+        'ApporteurAffaires': [(A1, T0 + timedelta(seconds=29))]
+    }
+
+    # Dans la résolution de la valeur écrite : aucune nouvelle écriture
+    clock.now = T0 + timedelta(seconds=60)
+    assert tracker.record('client', C1) is False
+    assert tracker.flush() == 0
+    clock.now = T0 + timedelta(seconds=90)
+    assert tracker.record('client', C1) is True
+    assert tracker.flush() == 1
+    assert tracker.stats['skipped'] == 1
+
+
+def test_failed_flush_is_requeued_and_excluded_paths():
+    store, clock = MemoryStore(failures=1), Clock()
+    tracker = ActivityTracker(store, clock=clock, autostart=False)
+    tracker.record('client', C1)
+    assert tracker.flush() == 0
+    assert tracker.stats['errors'] == 1
+    tracker.close()
+    assert store.writes == [('Client', [(C1, T0)])]
+
+    assert should_track('/api/client/dossiers')
+    assert not should_track('/api/auth/refresh')
+
+
+def test_rows_are_written_in_id_order():
+    store, clock = MemoryStore(), Clock()
+    tracker = ActivityTracker(store, clock=clock, autostart=False)
+    ids = [str(uuid.UUID(int=i)) for i in (7, 3, 9, 1)]
+    for user_id in ids:
+        tracker.record('client', user_id)
+    tracker.flush()
+    assert store.writes == [('Client', [(user_id, T0) for user_id in sorted(ids)])]
+
+
+@pytest.mark.skipif(not DSN, reason='TEST_DATABASE_URL non défini')
+def test_bulk_update_never_moves_activity_backwards():
+    import psycopg2
+
+    recent, stale = str(uuid.uuid4()), str(uuid.uuid4())
+    admin = psycopg2.connect(DSN)
+    with admin, admin.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f'CREATE TABLE {SCHEMA}."Expert" (id UUID PRIMARY KEY, last_activity_at TIMESTAMPTZ)')
+        cur.execute(f'INSERT INTO {SCHEMA}."Expert" VALUES (%s, %s), (%s, NULL)',
+                    (recent, T0 + timedelta(hours=1), stale))
+    admin.close()
+
+    store = ActivityStore(lambda: psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}'))
+    tracker = ActivityTracker(store, clock=lambda: T0, autostart=False)
+    tracker.record('expert', recent)
+    tracker.record('expert', stale)
+    tracker.flush()
+
+    conn = psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+    with conn.cursor() as cur:
+        cur.execute('SELECT id::text, last_activity_at FROM "Expert"')
+        rows = dict(cur.fetchall())
+    conn.close()
+    assert rows[recent] == T0 + timedelta(hours=1)
+    assert rows[stale] == T0
+
+
+def test_malformed_ids_are_rejected_and_data_errors_are_dropped():
+    store, clock = MemoryStore(failures=1, error=DataError('invalid input syntax for type uuid')), Clock()
+    tracker = ActivityTracker(store, clock=clock, autostart=False)
+    assert tracker.record('client', 'c-1') is False
+    assert tracker.record('client', C1.upper()) is True
+    tracker.record('expert', E1)
+    assert tracker.stats['rejected'] == 1
+
+    # Le lot Client (écrit en premier) échoue en erreur de données : abandonné, pas rejoué
+    assert tracker.flush() == 1
+    assert tracker.stats['rejected'] == 2 and tracker.stats['errors'] == 1
+    assert tracker.flush() == 0
+    assert store.writes == [('Expert', [(E1, T0)])]
+    # Un utilisateur abandonné n'est pas considéré comme écrit
+    assert tracker.record('client', C1) is True
@@ -0,0 +1,216 @@
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adminStatsCounterService import (  # noqa: E402
+    NOTIFICATION_SCOPE,
+    RDV_SCOPE,
+    StatsCounterMaintainer,
+    StatsCounterStore,
+    net_deltas,
+    row_deltas,
+)
+
+DSN = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'admin_stats_counters_test'
+
+
+def _notification(**fields):
+    row = {'user_type': 'admin', 'notification_type': 'dossier_soumis', 'is_read': False,
+           'priority': 'normal', 'status': 'unread', 'hidden_in_list': False}
+    row.update(fields)
+    return row
+
+
+def test_deltas_follow_scope_and_transitions():
+    unread = _notification(priority='urgent')
+    assert row_deltas(NOTIFICATION_SCOPE, None, unread) == {
+        (NOTIFICATION_SCOPE, 'total'): 1, (NOTIFICATION_SCOPE, 'type:dossier_soumis'): 1,
+        (NOTIFICATION_SCOPE, 'unread'): 1, (NOTIFICATION_SCOPE, 'urgent'): 1}
+    # Lecture : seul le compteur non lu bouge
+    assert row_deltas(NOTIFICATION_SCOPE, unread, {**unread, 'is_read': True}) == {
+        (NOTIFICATION_SCOPE, 'unread'): -1}
+    # Masquée ou remplacée : sort entièrement du périmètre
+    assert row_deltas(NOTIFICATION_SCOPE, unread, {**unread, 'status': 'replaced'})[
+        (NOTIFICATION_SCOPE, 'total')] == -1
+    assert row_deltas(NOTIFICATION_SCOPE, None, _notification(notification_type='rdv_reminder')) == {}
+    assert row_deltas(NOTIFICATION_SCOPE, None, _notification(user_type='client')) == {}
+    # NULL hors périmètre, comme `status != 'replaced'` / `hidden_in_list = false` en SQL
+    assert row_deltas(NOTIFICATION_SCOPE, None, _notification(status=None)) == {}
+    assert row_deltas(NOTIFICATION_SCOPE, None, _notification(hidden_in_list=None)) == {}
+    assert (NOTIFICATION_SCOPE, 'unread') not in row_deltas(NOTIFICATION_SCOPE, None, _notification(is_read=None))
+
+    rdv = {'status': 'proposed', 'scheduled_date': date(2025, 12, 20)}
+    assert row_deltas(RDV_SCOPE, rdv, {**rdv, 'status': 'completed'}) == {
+        (RDV_SCOPE, 'status:proposed'): -1, (RDV_SCOPE, 'status:completed'): 1,
+        (RDV_SCOPE, 'pending_date:2025-12-20'): -1}
+
+
+class MemoryStore:
+    def __init__(self):
+        self.counters = {}
+        self.recounted_at = {}
+        self.applied = 0
+
+    def apply(self, batches):
+        self.applied += 1
+        deltas = net_deltas(batches, self.recounted_at)
+        for key, delta in deltas.items():
+            self.counters[key] = self.counters.get(key, 0) + delta
+        return len(deltas)
+
+
+class WallClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_events_are_netted_before_write():
+    store = MemoryStore()
+    maintainer = StatsCounterMaintainer(store, autostart=False)
+    row = _notification()
+    for _ in range(50):
+        maintainer.record_notification(None, row)
+        maintainer.record_notification(row, {**row, 'is_read': True})
+    maintainer.record_notification({**row, 'is_read': True}, None)
+    assert maintainer.flush() == 2
+    assert store.applied == 1
+    assert store.counters == {(NOTIFICATION_SCOPE, 'total'): 49, (NOTIFICATION_SCOPE, 'type:dossier_soumis'): 49}
+    assert maintainer.flush() == 0
+
+
+def test_deltas_recorded_before_a_recount_are_not_applied_twice():
+    store, wall = MemoryStore(), WallClock()
+    maintainer = StatsCounterMaintainer(store, wall_clock=wall, autostart=False)
+    maintainer.record_notification(None, _notification(notification_type='a'))
+    wall.now += 1
+    # Un autre processus recompte ici : la première notification y est déjà comptée
+    store.recounted_at[NOTIFICATION_SCOPE] = wall.now - 0.5
+    maintainer.record_notification(None, _notification(notification_type='b'))
+    maintainer.record_rdv(None, {'status': 'proposed'})
+    assert maintainer.flush() == 4
+    assert store.counters == {(NOTIFICATION_SCOPE, 'total'): 1, (NOTIFICATION_SCOPE, 'type:b'): 1,
+                              (NOTIFICATION_SCOPE, 'unread'): 1, (RDV_SCOPE, 'status:proposed'): 1}
+
+
+@pytest.fixture()
+def connect():
+    import psycopg2
+
+    admin = psycopg2.connect(DSN)
+    with admin, admin.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}.notification (
+                id SERIAL PRIMARY KEY, user_type TEXT, notification_type TEXT, is_read BOOLEAN,
+                priority TEXT, status TEXT, hidden_in_list BOOLEAN DEFAULT false
+            );
+            CREATE TABLE {SCHEMA}."RDV" (
+                id SERIAL PRIMARY KEY, status TEXT, scheduled_date DATE, scheduled_time TIME
+            );
+            CREATE TABLE {SCHEMA}.stats_counters (
+                scope TEXT NOT NULL, key TEXT NOT NULL, value BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(), PRIMARY KEY (scope, key)
+            );
+        """)
+    admin.close()
+    yield lambda: psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+
+
+@pytest.mark.skipif(not DSN, reason='TEST_DATABASE_URL non défini')
+def test_counters_match_full_recount(connect):
+    maintainer = StatsCounterMaintainer(StatsCounterStore(connect), cache_seconds=0, autostart=False)
+    maintainer.reconcile()
+
+    rng = random.Random(7)
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute('SELECT CURRENT_DATE')
+    today = cur.fetchone()[0]
+    notifications, rdvs = {}, {}
+    for _ in range(300):
+        if notifications and rng.random() < 0.4:
+            nid = rng.choice(list(notifications))
+            old = notifications[nid]
+            new = {**old, 'is_read': rng.random() < 0.5, 'status': rng.choice(['unread', 'late', 'replaced'])}
+            cur.execute('UPDATE notification SET is_read = %s, status = %s WHERE id = %s',
+                        (new['is_read'], new['status'], nid))
+        else:
+            old = None
+            new = _notification(notification_type=rng.choice(['a', 'b', 'rdv_reminder']),
+                                priority=rng.choice(['normal', 'high', 'urgent']),
+                                user_type=rng.choice(['admin', 'admin', 'client']))
+            cur.execute("""INSERT INTO notification (user_type, notification_type, is_read, priority, status)
+                           VALUES (%(user_type)s, %(notification_type)s, %(is_read)s, %(priority)s, %(status)s)
+                           RETURNING id""", new)
+            nid = cur.fetchone()[0]
+        conn.commit()
+        notifications[nid] = new
+        maintainer.record_notification(old, new)
+
+        rdv = {'status': rng.choice(['proposed', 'scheduled', 'completed', 'cancelled']),
+               'scheduled_date': today + timedelta(days=rng.randint(-3, 3)), 'scheduled_time': '23:59'}
+        cur.execute('INSERT INTO "RDV" (status, scheduled_date, scheduled_time) VALUES '
+                    '(%(status)s, %(scheduled_date)s, %(scheduled_time)s) RETURNING id', rdv)
+        rdvs[cur.fetchone()[0]] = rdv
+        conn.commit()
+        maintainer.record_rdv(None, rdv)
+    conn.close()
+    maintainer.flush()
+
+    incremental = (maintainer.notification_stats(), maintainer.rdv_stats())
+    maintainer.reconcile()
+    recounted = (maintainer.notification_stats(), maintainer.rdv_stats())
+    for stats in incremental + recounted:
+        stats.pop('last_updated')
+    assert incremental == recounted
+
+    expected_overdue = sum(1 for r in rdvs.values()
+                           if r['status'] in ('proposed', 'scheduled') and r['scheduled_date'] < today)
+    assert recounted[1]['total_overdue'] == expected_overdue
+    assert recounted[1]['total_today'] == sum(1 for r in rdvs.values() if r['scheduled_date'] == today)
+
+
+@pytest.mark.skipif(not DSN, reason='TEST_DATABASE_URL non défini')
+def test_recount_is_serialized_and_pending_deltas_of_other_processes_are_not_double_counted(connect):
+    store = StatsCounterStore(connect)
+    worker, reconciler = (StatsCounterMaintainer(store, cache_seconds=0, autostart=False) for _ in range(2))
+    assert worker.reconcile() is not None
+
+    conn = connect()
+    with conn, conn.cursor() as cur:
+        cur.execute("""INSERT INTO notification (user_type, notification_type, is_read, priority, status)
+                       VALUES ('admin', 'a', false, 'high', 'unread'), ('admin', 'b', NULL, 'normal', NULL)""")
+    worker.record_notification(None, _notification(notification_type='a', priority='high'))
+    worker.record_notification(None, _notification(notification_type='b', is_read=None, status=None))
+
+    # Recomptage par un autre processus avant l'écriture des deltas du premier
+    holder = connect()
+    with holder.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('stats_counters_recount'))")
+        assert reconciler.reconcile() is None  # recomptage en cours ailleurs
+    holder.rollback()
+    assert reconciler.reconcile() is not None
+    assert reconciler.reconcile(force=False) is None  # déjà fait dans l'intervalle
+
+    assert worker.flush() == 0
+    stats = worker.notification_stats()
+    assert (stats['total_unread'], stats['total_high_priority'], stats['total_by_type']) == (1, 1, {'a': 1})
+
+    with conn, conn.cursor() as cur:
+        cur.execute("UPDATE notification SET is_read = true WHERE notification_type = 'a'")
+    worker.record_notification(_notification(notification_type='a', priority='high'),
+                               _notification(notification_type='a', priority='high', is_read=True))
+    assert worker.flush() == 1
+    assert worker.notification_stats()['total_unread'] == 0
+    conn.close()
+    holder.close()
@@ -0,0 +1,232 @@
+import os
+import sys
+import threading
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answerLogService import AnswerLogStore, AnswerPersistenceService  # noqa: E402
+
+DSN = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'answer_log_test'
+
+requires_db = pytest.mark.skipif(not DSN, reason='TEST_DATABASE_URL non défini')
+
+
+class MemoryStore:
+    """Double de `AnswerLogStore` : journal en liste, compaction par fusion ordonnée."""
+
+    def __init__(self, failures=0, sessions=('s-1', 's-2')):
+        self.sessions = set(sessions)
+        self.lookups = []
+        self.rows = {}
+        self.log = []
+        self.appends = []
+        self.failures = failures
+
+    def session_exists(self, session_token):
+        self.lookups.append(session_token)
+        return session_token in self.sessions
+
+    def append(self, deltas):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('base indisponible')
+        self.appends.append(sorted(token for token, _ in deltas))
+        self.log.extend((token, dict(delta)) for token, delta in deltas)
+
+    def compact(self, session_tokens=None):
+        moved = [(t, d) for t, d in self.log if session_tokens is None or t in session_tokens]
+        self.log = [(t, d) for t, d in self.log if (t, d) not in moved]
+        for token, delta in moved:
+            self.rows.setdefault(token, {}).update(delta)
+        return len({t for t, _ in moved})
+
+    def read_answers(self, session_token):
+        answers = dict(self.rows.get(session_token, {}))
+        for token, delta in self.log:
+            if token == session_token:
+                answers.update(delta)
+        return answers
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_service(store, clock):
+    return AnswerPersistenceService(store, debounce_ms=300, max_delay_ms=2000, clock=clock, autostart=False)
+
+
+def test_bursts_are_debounced_and_capped_by_max_delay():
+    store, clock = MemoryStore(), Clock()
+    service = make_service(store, clock)
+    service.save_answers('s-1', {'secteur': 'transport'})
+    service.save_answers('s-2', {'effectif': 3})
+    clock.now += 0.2
+    service.save_answers('s-1', {'effectif': 12})
+    assert service.flush(only_due=True) == 0
+
+    clock.now += 0.15  # s-2 inactive depuis 350 ms, s-1 depuis 150 ms
+    assert service.flush(only_due=True) == 1
+    assert store.log == [('s-2', {'effectif': 3})]
+
+    # Rafale continue : la fenêtre de debounce glisse, max_delay force l'écriture
+    for _ in range(10):
+        clock.now += 0.2
+        service.save_answers('s-1', {'effectif': 15})
+        flushed = service.flush(only_due=True)
+        if flushed:
+            break
+    assert flushed == 1 and clock.now - 100.0 >= 2.0
+    assert store.log[-1] == ('s-1', {'secteur': 'transport', 'effectif': 15})
+    assert service.stats == {'answers_received': 12, 'deltas_written': 2, 'flushes': 2, 'compactions': 0,
+                             'unknown_sessions': 0}
+
+
+def test_failed_append_is_requeued_without_overwriting_newer_answers():
+    store, clock = MemoryStore(failures=1), Clock()
+    service = make_service(store, clock)
+    service.save_answers('s-1', {'effectif': 5, 'secteur': 'btp'})
+    with pytest.raises(RuntimeError):
+        service.flush()
+    service.save_answers('s-1', {'effectif': 8})
+    assert service.flush() == 1
+    assert store.log == [('s-1', {'effectif': 8, 'secteur': 'btp'})]
+
+
+def test_reads_flush_only_their_session_and_finalize_compacts():
+    store, clock = MemoryStore(), Clock()
+    service = make_service(store, clock)
+    service.save_answers('s-1', {'secteur': 'transport'})
+    service.save_answers('s-2', {'effectif': 3})
+    assert service.get_answers('s-1') == {'secteur': 'transport'}
+    assert store.appends == [['s-1']]
+
+    service.save_answers('s-1', {'secteur': 'btp'})
+    assert service.finalize('s-1') == {'secteur': 'btp'}
+    assert store.rows['s-1'] == {'secteur': 'btp'} and store.log == []
+    service.close()
+    assert store.log == [('s-2', {'effectif': 3})]
+
+
+def test_unknown_session_is_refused_before_buffering():
+    store, clock = MemoryStore(), Clock()
+    service = make_service(store, clock)
+    assert service.save_answers('inconnue', {'secteur': 'btp'}) == {'success': False,
+                                                                    'error': 'Simulation non trouvée'}
+    assert service.save_answers('s-1', {'secteur': 'btp'})['success'] is True
+    service.save_answers('s-1', {'effectif': 4})
+    service.flush()
+    assert store.log == [('s-1', {'secteur': 'btp', 'effectif': 4})]
+    assert service.stats['unknown_sessions'] == 1
+    # Session connue : vérifiée une seule fois par processus
+    assert store.lookups == ['inconnue', 's-1']
+
+
+def connect():
+    import psycopg2
+
+    return psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+
+
+@pytest.fixture()
+def session_token():
+    import psycopg2
+
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}.simulations (
+                id UUID PRIMARY KEY, session_token TEXT UNIQUE, answers JSONB NOT NULL DEFAULT '{{}}',
+                updated_at TIMESTAMPTZ
+            )
+        """)
+        migration = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'migrations',
+                                 '20251214_create_simulation_answer_log.sql')
+        cur.execute(f'SET search_path = {SCHEMA}')
+        cur.execute(open(migration, encoding='utf-8').read().replace('BEGIN;', '').replace('COMMIT;', ''))
+        token = str(uuid.uuid4())
+        cur.execute('INSERT INTO simulations (id, session_token) VALUES (%s, %s)', (token, token))
+    conn.close()
+    yield token
+
+
+@requires_db
+def test_concurrent_saves_lose_no_answers(session_token):
+    store = AnswerLogStore(connection_factory=connect)
+    # Plusieurs « processus » indépendants écrivent dans la même session pendant les compactions
+    services = [AnswerPersistenceService(store, debounce_ms=5, max_delay_ms=20, compact_interval_s=0.05)
+                for _ in range(4)]
+
+    def answer(worker):
+        service = services[worker % len(services)]
+        for q in range(25):
+            service.save_answers(session_token, {f'q{worker}-{q}': q})
+
+    threads = [threading.Thread(target=answer, args=(w,)) for w in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for service in services:
+        service.close()
+
+    merged = store.read_answers(session_token)
+    assert len(merged) == 200
+    store.compact()
+    conn = connect()
+    with conn.cursor() as cur:
+        cur.execute('SELECT answers FROM simulations WHERE session_token = %s', (session_token,))
+        answers = cur.fetchone()[0]
+        cur.execute('SELECT count(*) FROM simulation_answer_log')
+        remaining = cur.fetchone()[0]
+    conn.close()
+    assert answers == merged
+    assert remaining == 0
+
+
+@requires_db
+def test_last_write_wins_and_read_your_writes(session_token):
+    store = AnswerLogStore(connection_factory=connect)
+    service = AnswerPersistenceService(store, debounce_ms=10_000, autostart=False)
+    service.save_answers(session_token, {'secteur': 'transport', 'effectif': 5})
+    service.flush()
+    service.save_answers(session_token, {'effectif': 12})
+    service.save_answers(session_token, {'effectif': 15})
+
+    # Lecture avant toute compaction : ligne + journal + tampon
+    assert service.get_answers(session_token) == {'secteur': 'transport', 'effectif': 15}
+    assert service.stats['deltas_written'] == 2  # la rafale n'a produit qu'un delta
+
+    assert store.merge_direct(session_token, {'secteur': 'btp'}) == 2
+    assert service.finalize(session_token) == {'secteur': 'btp', 'effectif': 15}
+
+
+@requires_db
+def test_unknown_session_is_refused_and_orphan_deltas_are_purged(session_token):
+    store = AnswerLogStore(connection_factory=connect)
+    service = AnswerPersistenceService(store, autostart=False)
+    assert service.save_answers('inconnue', {'secteur': 'btp'})['success'] is False
+    assert service.flush() == 0
+
+    # Deltas d'une session supprimée après leur écriture
+    service.save_answers(session_token, {'secteur': 'btp'})
+    service.flush()
+    query = connect()
+    with query, query.cursor() as cur:
+        cur.execute('DELETE FROM simulations WHERE session_token = %s', (session_token,))
+    assert store.compact() == 0
+    assert store.merge_direct('inconnue', {'secteur': 'btp'}) is None
+    with query, query.cursor() as cur:
+        cur.execute('SELECT count(*) FROM simulation_answer_log')
+        assert cur.fetchone()[0] == 0
+    query.close()
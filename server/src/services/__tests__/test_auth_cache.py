@@ -0,0 +1,172 @@
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from authCacheService import (  # noqa: E402
+    RevocationFilter,
+    RevocationStore,
+    TokenRejected,
+    TokenVerifier,
+    cached_jwt_required,
+)
+
+DSN = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'auth_cache_test'
+T0 = datetime(2025, 12, 16, 9, 0, tzinfo=timezone.utc)
+
+
+class Clock:
+    def __init__(self):
+        self.now = T0.timestamp()
+
+    def __call__(self):
+        return self.now
+
+
+class CountingDecoder:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.calls = 0
+
+    def __call__(self, token):
+        self.calls += 1
+        if token not in self.tokens:
+            raise TokenRejected('Signature invalide')
+        return dict(self.tokens[token])
+
+
+class MemoryRevocations:
+    def __init__(self):
+        self.rows = []
+        self.queries = []
+
+    def fetch_revoked(self, since):
+        self.queries.append(since)
+        rows = [r for r in self.rows if since is None or r[1] > since]
+        return rows, T0
+
+
+def test_verified_claims_are_cached_until_expiry_and_lru_bounded():
+    clock = Clock()
+    exp = clock.now + 60
+    decoder = CountingDecoder({f't{i}': {'sub': f'u{i}', 'exp': exp} for i in range(3)})
+    verifier = TokenVerifier(decoder=decoder, max_entries=2, clock=clock)
+
+    for _ in range(5):
+        assert verifier.verify('t0')['sub'] == 'u0'
+    assert decoder.calls == 1
+    verifier.verify('t1')
+    verifier.verify('t0')
+    verifier.verify('t2')  # évince t1, le moins récemment utilisé
+    assert len(verifier) == 2
+    verifier.verify('t1')
+    assert decoder.calls == 4
+    assert verifier.stats['evicted'] == 2
+
+    clock.now = exp + 1
+    with pytest.raises(TokenRejected):
+        verifier.verify('forged')
+    verifier.verify('t0')  # expiré en cache : nouvelle vérification
+    assert decoder.calls == 6
+
+
+def test_revocation_is_checked_on_cached_tokens_and_refreshed_incrementally():
+    clock = Clock()
+    store = MemoryRevocations()
+    revocation = RevocationFilter(store, refresh_seconds=5, overlap_seconds=5, clock=clock)
+    decoder = CountingDecoder({'t': {'sub': 'u', 'jti': 's-1', 'exp': clock.now + 600}})
+    verifier = TokenVerifier(decoder=decoder, revocation=revocation, clock=clock)
+
+    assert verifier.verify('t')['jti'] == 's-1'
+    assert store.queries == [None]
+    store.rows.append(('s-1', T0 + timedelta(seconds=3), T0 + timedelta(hours=1)))
+    verifier.verify('t')  # pas encore rafraîchi
+    clock.now += 5
+    with pytest.raises(TokenRejected):
+        verifier.verify('t')
+    assert store.queries[1] == T0 - timedelta(seconds=5)
+    assert decoder.calls == 1
+    assert verifier.stats['revoked'] == 1
+
+
+def test_cached_decorator_keeps_flask_jwt_extended_checks():
+    flask = pytest.importorskip('flask')
+    extension = pytest.importorskip('flask_jwt_extended')
+
+    app = flask.Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'secret-de-test-suffisamment-long-pour-hs256'
+    extension.JWTManager(app)
+    store = MemoryRevocations()
+    verifier = TokenVerifier(decoder=CountingDecoder({}), revocation=RevocationFilter(store, refresh_seconds=0))
+
+    @app.route('/moi')
+    @cached_jwt_required(verifier)
+    def me():
+        return {'id': extension.get_jwt_identity(), 'type': extension.get_jwt()['type']}
+
+    with app.app_context():
+        access = extension.create_access_token('u-1')
+        refresh = extension.create_refresh_token('u-1')
+    client = app.test_client()
+
+    def get(token=None):
+        return client.get('/moi', headers={'Authorization': f'Bearer {token}'} if token else {})
+
+    for _ in range(3):
+        response = get(access)
+        assert response.status_code == 200 and response.json == {'id': 'u-1', 'type': 'access'}
+    assert verifier.stats['misses'] == 1 and verifier.stats['hits'] == 2
+
+    # Un refresh token n'ouvre pas une vue protégée, comme avec @jwt_required()
+    response = get(refresh)
+    assert response.status_code == 401 and response.json['success'] is False
+    assert get().status_code == 401
+    assert get(access[:-2] + 'xx').status_code == 401
+
+    # Révocation via la blocklist de flask-jwt-extended, y compris pour un token en cache
+    with app.app_context():
+        jti = extension.decode_token(access)['jti']
+    store.rows.append((jti, T0, None))
+    assert get(access).status_code == 401
+
+
+@pytest.mark.skipif(not DSN, reason='TEST_DATABASE_URL non défini')
+def test_store_reads_revocations_after_watermark():
+    import psycopg2
+
+    active, revoked, expired = (str(uuid.uuid4()) for _ in range(3))
+    admin = psycopg2.connect(DSN)
+    with admin, admin.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}.user_sessions (
+                id UUID PRIMARY KEY, user_id UUID, is_active BOOLEAN DEFAULT true,
+                expires_at TIMESTAMPTZ, revoked_at TIMESTAMPTZ
+            )
+        """)
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}.user_sessions (id, expires_at, revoked_at, is_active) VALUES
+              (%s, NOW() + interval '1 day', NULL, true),
+              (%s, NOW() + interval '1 day', NOW() - interval '1 minute', false),
+              (%s, NOW() - interval '1 day', NOW() - interval '2 days', false)
+        """, (active, revoked, expired))
+    admin.close()
+
+    connect = lambda: psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')  # noqa: E731
+    revocation = RevocationFilter(RevocationStore(connect), refresh_seconds=0)
+    assert revocation.is_revoked(revoked)
+    assert not revocation.is_revoked(active)
+    assert not revocation.is_revoked(expired)
+
+    conn = connect()
+    with conn, conn.cursor() as cur:
+        cur.execute('UPDATE user_sessions SET is_active = false, revoked_at = NOW() WHERE id = %s', (active,))
+    conn.close()
+    assert revocation.is_revoked(active)
+    assert len(revocation) == 2
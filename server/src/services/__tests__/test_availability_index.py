@@ -0,0 +1,102 @@
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from availabilityIndexService import (  # noqa: E402
+    AvailabilityIndex,
+    rdv_masks,
+    working_hours_from,
+)
+
+MONDAY = date(2025, 12, 22)
+EXPERT, CLIENT, APPORTEUR = ('expert', 'e1'), ('client', 'c1'), ('apporteur', 'a1')
+
+
+def test_disponibilites_formats():
+    assert working_hours_from({'available': False}) == {}
+    assert working_hours_from({'working_hours': {'start': '08:30', 'end': '12:00', 'days': [1, 3]}}) == {
+        1: [('08:30', '12:00')], 3: [('08:30', '12:00')]}
+    assert working_hours_from({'Lundi': ['09:00-12:00', '14:00-18:00'], 'mardi': {'debut': '10:00', 'fin': '16:00'}}) == {
+        1: [('09:00', '12:00'), ('14:00', '18:00')], 2: [('10:00', '16:00')]}
+    assert working_hours_from({'jours': ['vendredi'], 'horaires': '09:00-11:00'}) == {5: [('09:00', '11:00')]}
+    assert working_hours_from({'available': True}) is None
+    # RDV qui passe minuit
+    assert set(rdv_masks('2025-12-22', '23:30:00', 60)) == {MONDAY, MONDAY + timedelta(days=1)}
+
+
+def test_common_slots_and_incremental_updates():
+    index = AvailabilityIndex()
+    index.set_disponibilites('e1', {'lundi': ['09:00-12:00'], 'mardi': ['14:00-16:00']})
+    index.apply_rdv({'id': 'r1', 'expert_id': 'e1', 'scheduled_date': MONDAY, 'scheduled_time': '09:00',
+                     'duration_minutes': 60, 'status': 'scheduled'})
+    index.apply_rdv({'id': 'r2', 'client_id': 'c1', 'scheduled_date': MONDAY, 'scheduled_time': '10:15',
+                     'duration_minutes': 30, 'status': 'proposed'})
+
+    slots = index.common_slots([EXPERT, CLIENT], MONDAY, MONDAY + timedelta(days=6), 60, limit=3)
+    assert slots == [{'date': '2025-12-22', 'start_time': '10:45', 'end_time': '11:45'},
+                     {'date': '2025-12-23', 'start_time': '14:00', 'end_time': '15:00'},
+                     {'date': '2025-12-23', 'start_time': '15:00', 'end_time': '16:00'}]
+    assert index.common_slots([EXPERT, CLIENT], MONDAY, MONDAY + timedelta(days=6), 60, limit=3,
+                              max_per_day=1)[1:] == [{'date': '2025-12-23', 'start_time': '14:00', 'end_time': '15:00'}]
+
+    # Deux RDV qui se chevauchent : annuler l'un garde l'autre
+    index.apply_change('RDV', {'eventType': 'INSERT', 'new': {
+        'id': 'r3', 'expert_id': 'e1', 'client_id': 'c2', 'scheduled_date': '2025-12-22',
+        'scheduled_time': '09:30:00', 'duration_minutes': 60, 'status': 'confirmed'}})
+    index.apply_change('RDV', {'eventType': 'UPDATE', 'new': {'id': 'r1', 'status': 'cancelled'}})
+    assert not index.is_free([EXPERT], MONDAY, '09:45', 15)
+    assert index.is_free([EXPERT], MONDAY, '09:00', 30)
+    assert index.is_free([EXPERT], MONDAY, '09:30', 60, ignore_rdv='r3')
+    assert not index.is_free([EXPERT], MONDAY, '12:00', 30)
+    index.apply_change('RDV', {'eventType': 'DELETE', 'old': {'id': 'r3'}})
+    assert index.common_slots([EXPERT, CLIENT], MONDAY, MONDAY, 60, limit=3) == [
+        {'date': '2025-12-22', 'start_time': '09:00', 'end_time': '10:00'},
+        {'date': '2025-12-22', 'start_time': '10:45', 'end_time': '11:45'}]
+
+    # Déplacement d'un RDV
+    index.apply_rdv({'id': 'r2', 'client_id': 'c1', 'scheduled_date': MONDAY + timedelta(days=1),
+                     'scheduled_time': '14:00', 'duration_minutes': 120, 'status': 'scheduled'})
+    assert index.common_slots([EXPERT, CLIENT, APPORTEUR], MONDAY, MONDAY + timedelta(days=1), 180) == [
+        {'date': '2025-12-22', 'start_time': '09:00', 'end_time': '12:00'}]
+    assert index.common_slots([EXPERT], MONDAY, MONDAY, 60, not_before=datetime(2025, 12, 22, 10, 20)) == [
+        {'date': '2025-12-22', 'start_time': '10:30', 'end_time': '11:30'}]
+
+
+def test_matches_brute_force():
+    rng = random.Random(4)
+    index = AvailabilityIndex()
+    busy = {}
+    people = [('expert', f'e{i}') for i in range(3)] + [('client', f'c{i}') for i in range(3)]
+    for n in range(300):
+        expert, client = rng.choice(people[:3]), rng.choice(people[3:])
+        day = MONDAY + timedelta(days=rng.randrange(14))
+        start = rng.randrange(8 * 4, 19 * 4) * 15
+        duration = rng.choice([30, 45, 60, 90])
+        index.book(f'r{n}', [expert, client], day, f'{start // 60:02d}:{start % 60:02d}', duration)
+        busy[f'r{n}'] = ([expert, client], day, start, start + duration)
+    for n in rng.sample(range(300), 100):
+        index.cancel(f'r{n}')
+        del busy[f'r{n}']
+
+    def free(participants, day, start, end):
+        if day.weekday() >= 5 or start < 9 * 60 or end > 18 * 60:
+            return False
+        return not any(set(p) & set(participants) and d == day and s < end and start < e
+                       for p, d, s, e in busy.values())
+
+    for participants in ([people[0], people[3]], [people[1], people[4], people[5]]):
+        expected = []
+        for offset in range(14):
+            day = MONDAY + timedelta(days=offset)
+            start = 0
+            while start + 60 <= 24 * 60:
+                if free(participants, day, start, start + 60):
+                    expected.append({'date': day.isoformat(), 'start_time': f'{start // 60:02d}:{start % 60:02d}',
+                                     'end_time': f'{(start + 60) // 60:02d}:{start % 60:02d}'})
+                    start += 60
+                else:
+                    start += 15
+        assert index.common_slots(participants, MONDAY, MONDAY + timedelta(days=13), 60, limit=1000) == expected
@@ -0,0 +1,124 @@
+import os
+import sys
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulkSequenceSchedulerService import (  # noqa: E402
+    BulkSequenceScheduler,
+    ScheduledEmailStore,
+    SequencePlanner,
+)
+
+DSN = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'bulk_sequence_test'
+PARIS = ZoneInfo('Europe/Paris')
+# Vendredi 12 décembre 2025, 17h30 à Paris
+START = datetime(2025, 12, 12, 17, 30, tzinfo=PARIS)
+STEPS = [
+    {'step_number': 1, 'delay_days': 0, 'subject': 'Bonjour', 'body': 'Premier contact'},
+    {'step_number': 2, 'delay_days': 3, 'subject': 'Relance', 'body': 'Deuxième contact'}
+]
+
+
+def test_plan_respects_business_hours_caps_and_step_delays():
+    planner = SequencePlanner({'a': (12, 60), 'b': (12, 60)}, seed=1)
+    prospects = [{'id': f'p{i}'} for i in range(300)]
+    emails = planner.plan(prospects, STEPS, START)
+    assert len(emails) == 600
+
+    per_hour, per_day = Counter(), Counter()
+    for email in emails:
+        local = email['scheduled_for'].astimezone(PARIS)
+        assert local.weekday() < 5 and 9 <= local.hour < 18
+        assert email['scheduled_for'] >= START
+        per_hour[(email['mailbox'], local.date(), local.hour)] += 1
+        per_day[(email['mailbox'], local.date())] += 1
+    # 60 par jour étalés sur 9 heures : au plus 7 par heure
+    assert max(per_hour.values()) <= 7
+    assert max(per_day.values()) <= 60
+    assert per_day[('a', START.date())] == 3
+
+    by_prospect = {}
+    for email in emails:
+        by_prospect.setdefault(email['prospect_id'], {})[email['step_number']] = email['scheduled_for']
+    for steps in by_prospect.values():
+        assert steps[2] - steps[1] >= timedelta(days=3)
+
+
+def test_reserved_slots_and_replan_preserve_order_and_gaps():
+    planner = SequencePlanner({'a': (1, 9)}, jitter_minutes=0, seed=2)
+    monday = datetime(2025, 12, 15, 9, 0, tzinfo=PARIS)
+    planner.load_reserved([('a', monday + timedelta(minutes=10)), (None, monday)])
+    first = planner.plan([{'id': 'p1'}], STEPS[:1], monday)[0]
+    assert first['scheduled_for'].astimezone(PARIS).hour == 10
+
+    paused = [
+        {'id': 'e2', 'prospect_id': 'p1', 'step_number': 2, 'mailbox': 'a',
+         'scheduled_for': monday + timedelta(days=2, hours=3)},
+        {'id': 'e1', 'prospect_id': 'p1', 'step_number': 1, 'mailbox': 'a',
+         'scheduled_for': monday - timedelta(days=1)}
+    ]
+    updates = {u['id']: u['scheduled_for'] for u in planner.replan(paused, monday)}
+    assert updates['e1'].astimezone(PARIS).hour == 11
+    assert updates['e2'] - updates['e1'] >= timedelta(days=3, hours=3) - timedelta(hours=1)
+
+
+@pytest.mark.skipif(not DSN, reason='TEST_DATABASE_URL non défini')
+def test_launch_pause_resume_and_overdue_replan():
+    import psycopg2
+
+    admin = psycopg2.connect(DSN)
+    with admin, admin.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}.prospects (
+                id UUID PRIMARY KEY, emailing_status TEXT, updated_at TIMESTAMPTZ
+            );
+            CREATE TABLE {SCHEMA}.prospect_email_scheduled (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                prospect_id UUID NOT NULL REFERENCES {SCHEMA}.prospects(id),
+                sequence_id UUID, step_number INTEGER NOT NULL,
+                subject TEXT NOT NULL, body TEXT NOT NULL, content_hash VARCHAR(64),
+                scheduled_for TIMESTAMPTZ NOT NULL, status TEXT NOT NULL DEFAULT 'scheduled',
+                mailbox TEXT, updated_at TIMESTAMPTZ DEFAULT NOW()
+            );
+        """)
+        ids = [str(uuid.uuid4()) for _ in range(50)]
+        cur.execute(f'INSERT INTO {SCHEMA}.prospects (id) SELECT unnest(%s::uuid[])', (ids,))
+    admin.close()
+
+    now = [datetime(2025, 12, 15, 8, 0, tzinfo=PARIS)]
+    store = ScheduledEmailStore(lambda: psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}'))
+    scheduler = BulkSequenceScheduler(store, {'a': (12, 100)}, clock=lambda: now[0])
+    sequence_id = str(uuid.uuid4())
+    result = scheduler.launch(sequence_id, [{'id': i} for i in ids], STEPS)
+    assert result['scheduled'] == 100
+    assert scheduler.launch(sequence_id, [{'id': ids[0]}], STEPS)['skipped'] == [ids[0]]
+
+    assert scheduler.pause(ids[:10]) == 20
+    now[0] += timedelta(days=1)
+    assert scheduler.resume(ids[:10]) == 20
+
+    # Arrêt du service pendant une semaine : tout est en retard
+    now[0] += timedelta(days=7)
+    assert scheduler.replan_overdue() == 100
+
+    conn = psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM prospect_email_scheduled WHERE status = 'scheduled' AND scheduled_for < %s",
+                    (now[0],))
+        assert cur.fetchone()[0] == 0
+        cur.execute("""SELECT count(*) FROM prospect_email_scheduled a JOIN prospect_email_scheduled b
+                       ON a.prospect_id = b.prospect_id AND a.step_number = 1 AND b.step_number = 2
+                       WHERE b.scheduled_for < a.scheduled_for + interval '3 days'""")
+        assert cur.fetchone()[0] == 0
+        cur.execute("SELECT count(*) FROM prospects WHERE emailing_status = 'queued'")
+        assert cur.fetchone()[0] == 50
+    conn.close()
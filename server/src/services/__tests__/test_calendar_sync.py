@@ -0,0 +1,202 @@
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calendarSyncService import (  # noqa: E402
+    IncrementalCalendarSync,
+    SyncTokenExpired,
+    google_event_to_rdv,
+    local_fingerprint,
+)
+
+INTEGRATION = {
+    'id': 'integration-1',
+    'calendar_id': 'primary',
+    'user_id': 'expert-1',
+    'user_type': 'expert',
+    'access_token': 'token',
+    'sync_direction': 'bidirectional'
+}
+
+
+class FakeCalendarApi:
+    """Fausse API Google Calendar : journal de changements + jetons de synchronisation."""
+
+    def __init__(self):
+        self.events = {}
+        self.changes = []  # (sequence, event_id)
+        self.sequence = 0
+        self.expired_tokens = set()
+        self.list_calls = []
+        self.batch_calls = []
+        self.fail_next = {}  # titre de l'événement -> statuts à renvoyer
+
+    def put(self, event_id, summary, day='2025-12-15', hour='10:00:00', status='confirmed', **extra):
+        self.sequence += 1
+        self.events[event_id] = {
+            'id': event_id, 'etag': f'"{self.sequence}"', 'status': status, 'summary': summary,
+            'start': {'dateTime': f'{day}T{hour}'}, 'end': {'dateTime': f'{day}T11:00:00'}, **extra
+        }
+        self.changes.append((self.sequence, event_id))
+
+    def list_events(self, calendar_id, sync_token=None, time_min=None, page_token=None):
+        self.list_calls.append(sync_token)
+        if sync_token in self.expired_tokens:
+            raise SyncTokenExpired(calendar_id)
+        since = int(sync_token) if sync_token else 0
+        changed = {event_id for seq, event_id in self.changes if seq > since}
+        items = [self.events[e] for e in sorted(changed)
+                 if sync_token or self.events[e]['status'] != 'cancelled']
+        offset = int(page_token or 0)
+        page = items[offset:offset + 2]
+        response = {'items': page}
+        if offset + 2 < len(items):
+            response['nextPageToken'] = str(offset + 2)
+        else:
+            response['nextSyncToken'] = str(self.sequence)
+        return response
+
+    def batch(self, calendar_id, operations):
+        self.batch_calls.append(len(operations))
+        responses = []
+        for index, operation in enumerate(operations):
+            forced = self.fail_next.get(operation['body']['summary'])
+            if forced:
+                responses.append({'status': forced.pop(0), 'body': None})
+                continue
+            event_id = operation['event_id'] or f'g-{uuid.uuid4().hex[:8]}'
+            self.sequence += 1
+            event = dict(operation['body'], id=event_id, etag=f'"{self.sequence}"')
+            self.events[event_id] = event
+            self.changes.append((self.sequence, event_id))
+            responses.append({'status': 200, 'body': event})
+        return responses
+
+
+class MemoryStore:
+    def __init__(self):
+        self.sync_token = None
+        self.fingerprints = {}
+        self.rdvs = {}
+        self.write_batches = 0
+
+    def load_state(self, integration_id):
+        return self.sync_token, {k: dict(v) for k, v in self.fingerprints.items()}
+
+    def save_state(self, integration_id, sync_token, upserts, deletes):
+        for google_id in deletes:
+            self.fingerprints.pop(google_id, None)
+        self.fingerprints.update({k: dict(v) for k, v in upserts.items()})
+        if sync_token is not None:
+            self.sync_token = sync_token
+
+    def reset_state(self, integration_id):
+        self.sync_token = None
+
+    def apply_remote_changes(self, integration, rows, deleted_rdv_ids):
+        if rows or deleted_rdv_ids:
+            self.write_batches += 1
+        for rdv_id in deleted_rdv_ids:
+            self.rdvs[rdv_id]['status'] = 'cancelled'
+        for row in rows:
+            self.rdvs[row['id']] = dict(row)
+        return {row['metadata']['googleEventId']: row['id'] for row in rows}
+
+    def fetch_local_rdvs(self, integration, since):
+        return [dict(r) for r in self.rdvs.values()]
+
+
+def make_engine(api, store):
+    sleeps = []
+    engine = IncrementalCalendarSync(store=store, api_factory=lambda integration: api,
+                                     sleep=sleeps.append)
+    return engine, sleeps
+
+
+def test_incremental_pull_uses_sync_token_and_skips_unchanged():
+    api, store = FakeCalendarApi(), MemoryStore()
+    for i in range(5):
+        api.put(f'evt-{i}', f'RDV {i}')
+    engine, _ = make_engine(api, store)
+
+    first = engine.sync_calendar(dict(INTEGRATION, sync_direction='import'))
+    assert first['eventsCreated'] == 5
+    assert store.write_batches == 1
+    assert api.list_calls == [None, None, None]  # 3 pages, synchronisation initiale
+
+    api.put('evt-2', 'RDV 2 déplacé', hour='14:00:00')
+    second = engine.sync_calendar(dict(INTEGRATION, sync_direction='import'))
+    assert second['eventsProcessed'] == 1
+    assert second['eventsUpdated'] == 1
+    assert api.list_calls[-1] is not None
+    assert len(store.rdvs) == 5
+
+    third = engine.sync_calendar(dict(INTEGRATION, sync_direction='import'))
+    assert third['eventsProcessed'] == 0
+
+
+def test_cancelled_event_and_expired_token():
+    api, store = FakeCalendarApi(), MemoryStore()
+    api.put('evt-1', 'RDV 1')
+    api.put('evt-2', 'RDV 2')
+    engine, _ = make_engine(api, store)
+    engine.sync_calendar(dict(INTEGRATION, sync_direction='import'))
+
+    api.put('evt-1', 'RDV 1', status='cancelled')
+    result = engine.sync_calendar(dict(INTEGRATION, sync_direction='import'))
+    assert result['eventsDeleted'] == 1
+    assert 'evt-1' not in store.fingerprints
+
+    api.expired_tokens.add(store.sync_token)
+    result = engine.sync_calendar(dict(INTEGRATION, sync_direction='import'))
+    assert api.list_calls[-1] is None
+    assert result['eventsCreated'] == 0 and result['eventsUpdated'] == 0  # etags inchangés
+
+
+def test_push_batches_with_backoff_and_no_echo():
+    api, store = FakeCalendarApi(), MemoryStore()
+    for i in range(60):
+        rdv_id = str(uuid.uuid4())
+        store.rdvs[rdv_id] = {'id': rdv_id, 'title': f'Local {i}', 'notes': '',
+                              'scheduled_date': '2025-12-20', 'scheduled_time': '09:00:00',
+                              'duration_minutes': 30, 'meeting_type': 'video', 'location': None,
+                              'meeting_url': None, 'status': 'confirmed', 'metadata': {}}
+    api.fail_next['Local 3'] = [429, 503]
+    engine, sleeps = make_engine(api, store)
+
+    result = engine.sync_calendar(dict(INTEGRATION, sync_direction='export'))
+    assert result['eventsCreated'] == 60
+    assert result['errors'] == []
+    assert api.batch_calls == [50, 1, 1, 10]
+    assert len(sleeps) == 2
+
+    # Les événements créés reviennent par le jeton de synchronisation : ni import ni ré-export
+    result = engine.sync_calendar(INTEGRATION)
+    assert result['eventsCreated'] == 0 and result['eventsUpdated'] == 0
+    assert api.batch_calls == [50, 1, 1, 10]
+
+    rdv = next(iter(store.rdvs.values()))
+    rdv['title'] = 'Titre modifié'
+    assert local_fingerprint(rdv) != store.fingerprints[next(
+        g for g, e in store.fingerprints.items() if e['rdv_id'] == rdv['id'])]['local_fingerprint']
+    result = engine.sync_calendar(dict(INTEGRATION, sync_direction='export'))
+    assert result['eventsUpdated'] == 1
+    assert api.batch_calls[-1] == 1
+
+
+def test_utc_and_offset_times_are_converted_to_paris_time():
+    winter = google_event_to_rdv({'id': 'evt-z', 'start': {'dateTime': '2025-12-15T09:30:00Z'},
+                                  'end': {'dateTime': '2025-12-15T10:15:00Z'}}, INTEGRATION, None)
+    assert (winter['scheduled_date'], winter['scheduled_time'], winter['duration_minutes']) == (
+        '2025-12-15', '10:30:00', 45)
+    # Heure d'été, et changement de jour local
+    summer = google_event_to_rdv({'id': 'evt-s', 'start': {'dateTime': '2025-07-01T22:30:00Z'}},
+                                 INTEGRATION, None)
+    assert (summer['scheduled_date'], summer['scheduled_time']) == ('2025-07-02', '00:30:00')
+    offset = google_event_to_rdv({'id': 'evt-o', 'start': {'dateTime': '2025-12-15T09:30:00-05:00'}},
+                                 INTEGRATION, None)
+    assert offset['scheduled_time'] == '15:30:00'
+    all_day = google_event_to_rdv({'id': 'evt-d', 'start': {'date': '2025-12-15'}}, INTEGRATION, None)
+    assert (all_day['scheduled_date'], all_day['scheduled_time']) == ('2025-12-15', '00:00:00')
@@ -0,0 +1,151 @@
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from documentStatusBatchService import (  # noqa: E402
+    DocumentStatusEvaluator,
+    DocumentStatusStore,
+    document_status,
+    notification_for,
+)
+
+DSN = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'document_status_batch_test'
+NOW = datetime(2025, 12, 21, 12, 0, tzinfo=timezone.utc)
+
+
+def _evaluate(**fields):
+    row = {'id': 'd1', 'created_at': NOW - timedelta(days=3), 'company_name': None,
+           'client_name': 'Dupont', 'product_name': 'TICPE'}
+    row.update(fields)
+    status = document_status(row, NOW)
+    return status, notification_for(row['id'], row, status)
+
+
+def test_rules_match_node_checker():
+    status, notification = _evaluate()
+    assert status['days_waiting_documents'] == 3
+    assert notification['notification_type'] == 'waiting_documents'
+    assert notification['priority'] == 'medium'
+    assert notification['message'] == 'Dossier TICPE - Client Dupont - Depuis 3 jours'
+
+    status, notification = _evaluate(documents_total=2, documents_pending=1, documents_validated=1,
+                                     first_document_at=NOW - timedelta(days=6), company_name='ACME')
+    assert notification['notification_type'] == 'documents_to_validate'
+    assert notification['priority'] == 'urgent'
+    assert notification['message'] == 'Dossier TICPE - Client ACME - 1 document en attente depuis 6 jours'
+
+    assert _evaluate(documents_total=1, documents_pending=1, expert_validation_status='validated')[1] is None
+
+    status, notification = _evaluate(documents_total=2, documents_pending=0, documents_validated=2,
+                                     admin_eligibility_status='validated', product_name=None)
+    assert status['all_documents_validated']
+    assert notification['notification_type'] == 'dossier_complete'
+    assert notification['metadata']['action_required'] == 'select_expert'
+    assert notification['title'] == '✅ Dossier de pré-éligibilité complet - Dossier'
+
+    # Documents tous rejetés : aucune notification
+    assert _evaluate(documents_total=1, documents_pending=0, documents_validated=0)[1] is None
+
+
+class MemoryStore:
+    def __init__(self, rows):
+        self.rows = rows
+        self.saved = {}
+
+    def iter_chunks(self, chunk_size, pending_only, dossier_ids):
+        rows = [{**r, 'previous_status_key': self.saved.get(r['id'])} for r in self.rows]
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size], NOW
+
+    def save(self, states):
+        for dossier_id, key, _, _ in states:
+            self.saved[dossier_id] = key
+        return len(states)
+
+
+def test_only_changed_dossiers_are_returned():
+    rows = [{'id': f'd{i}', 'created_at': NOW - timedelta(days=1)} for i in range(5)]
+    store = MemoryStore(rows)
+    evaluator = DocumentStatusEvaluator(store, chunk_size=2)
+    assert len(evaluator.evaluate()) == 5
+    assert evaluator.evaluate() == []
+
+    rows[1].update(documents_total=1, documents_pending=1, first_document_at=NOW)
+    # Seuil de priorité franchi (2 jours d'attente)
+    rows[3]['created_at'] = NOW - timedelta(days=2)
+    changed = evaluator.evaluate()
+    assert [c['client_produit_id'] for c in changed] == ['d1', 'd3']
+    assert changed[0]['notification']['notification_type'] == 'documents_to_validate'
+    assert changed[1]['notification']['priority'] == 'medium'
+
+
+@pytest.mark.skipif(not DSN, reason='TEST_DATABASE_URL non défini')
+def test_batch_store_reads_joined_chunks():
+    import psycopg2
+
+    admin = psycopg2.connect(DSN)
+    with admin, admin.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}."Client" (id UUID PRIMARY KEY, company_name TEXT, name TEXT);
+            CREATE TABLE {SCHEMA}."ProduitEligible" (id UUID PRIMARY KEY, nom TEXT);
+            CREATE TABLE {SCHEMA}."ClientProduitEligible" (
+                id UUID PRIMARY KEY, "clientId" UUID, "produitId" UUID, statut TEXT,
+                admin_eligibility_status TEXT, expert_validation_status TEXT,
+                created_at TIMESTAMPTZ DEFAULT NOW()
+            );
+            CREATE TABLE {SCHEMA}."ClientProcessDocument" (
+                id SERIAL PRIMARY KEY, client_produit_id UUID, validation_status TEXT,
+                created_at TIMESTAMPTZ DEFAULT NOW()
+            );
+            CREATE TABLE {SCHEMA}.dossier_document_status (
+                client_produit_id UUID PRIMARY KEY, status_key TEXT NOT NULL, notification_type TEXT,
+                priority TEXT, evaluated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+        """)
+    admin.close()
+
+    def connect():
+        return psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+
+    client_id, product_id = str(uuid.uuid4()), str(uuid.uuid4())
+    dossiers = sorted(str(uuid.uuid4()) for _ in range(7))
+    conn = connect()
+    with conn, conn.cursor() as cur:
+        cur.execute('INSERT INTO "Client" VALUES (%s, %s, %s)', (client_id, None, 'Martin'))
+        cur.execute('INSERT INTO "ProduitEligible" VALUES (%s, %s)', (product_id, 'URSSAF'))
+        for i, dossier_id in enumerate(dossiers):
+            cur.execute("""INSERT INTO "ClientProduitEligible"
+                           (id, "clientId", "produitId", admin_eligibility_status, created_at)
+                           VALUES (%s, %s, %s, %s, NOW() - interval '6 days')""",
+                        (dossier_id, client_id, product_id, 'validated' if i == 6 else None))
+        for status in (None, 'validated', 'rejected'):
+            cur.execute('INSERT INTO "ClientProcessDocument" (client_produit_id, validation_status) '
+                        'VALUES (%s, %s)', (dossiers[0], status))
+    conn.close()
+
+    evaluator = DocumentStatusEvaluator(DocumentStatusStore(connect), chunk_size=3)
+    changed = {c['client_produit_id']: c for c in evaluator.evaluate(pending_only=True)}
+    assert len(changed) == 6 and dossiers[6] not in changed
+    first = changed[dossiers[0]]
+    assert first['status']['pending_documents_count'] == 1
+    assert first['status']['validated_documents_count'] == 1
+    assert first['notification']['message'] == 'Dossier URSSAF - Client Martin - 1 document en attente depuis 0 jour'
+    assert changed[dossiers[1]]['notification']['priority'] == 'high'
+
+    assert evaluator.evaluate(pending_only=True) == []
+    conn = connect()
+    with conn, conn.cursor() as cur:
+        cur.execute("UPDATE \"ClientProcessDocument\" SET validation_status = 'validated' "
+                    'WHERE validation_status IS NULL')
+    conn.close()
+    changed = evaluator.evaluate(pending_only=True)
+    assert [c['client_produit_id'] for c in changed] == [dossiers[0]]
+    assert changed[0]['notification'] is None
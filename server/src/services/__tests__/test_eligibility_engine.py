@@ -0,0 +1,87 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eligibilityEngineService import EligibilityRuleEngine, map_answers_to_variables  # noqa: E402
+
+PRODUCTS = [{'id': str(i), 'nom': nom} for i, nom in enumerate(
+    ['TICPE', 'DFS', 'FONCIER', 'CEE', 'URSSAF', 'Recouvrement', 'Logiciel Solid'])]
+
+RULES = [
+    {'produit_nom': 'TICPE', 'rule_type': 'combined', 'priority': 1, 'conditions': {
+        'operator': 'AND', 'rules': [
+            {'question_id': 'GENERAL_001', 'operator': 'equals', 'value': 'Transport et Logistique'},
+            {'question_id': 'TICPE_001', 'operator': 'equals', 'value': 'Oui'},
+            {'question_id': 'litres_carburant_mois', 'operator': 'greater_than', 'value': 1000}]}},
+    {'produit_nom': 'DFS', 'rule_type': 'combined', 'priority': 1, 'conditions': {
+        'operator': 'OR', 'rules': [
+            {'question_id': 'TICPE_003', 'operator': 'includes', 'value': 'Poids lourds'},
+            {'question_id': 'nb_chauffeurs', 'operator': '>=', 'value': 5}]}},
+    {'produit_nom': 'FONCIER', 'rule_type': 'simple', 'priority': 1,
+     'conditions': {'question_id': 'GENERAL_004', 'operator': 'equals', 'value': 'Oui'}},
+    {'produit_nom': 'CEE', 'rule_type': 'simple', 'priority': 1,
+     'conditions': {'question_id': 'contrats_energie', 'operator': 'equals', 'value': 'Oui'}},
+    {'produit_nom': 'URSSAF', 'rule_type': 'simple', 'priority': 1,
+     'conditions': {'question_id': 'GENERAL_001', 'operator': 'not_equals', 'value': 'Association'}},
+    {'produit_nom': 'URSSAF', 'rule_type': 'simple', 'priority': 2,
+     'conditions': {'question_id': 'GENERAL_003', 'operator': 'in', 'value': ['10 à 49', '50 à 249', '250+']}},
+    {'produit_nom': 'Recouvrement', 'rule_type': 'simple', 'priority': 1, 'is_active': False,
+     'conditions': {'question_id': 'RECOUVR_001', 'operator': 'equals', 'value': 'Oui'}},
+    {'produit_nom': 'Logiciel Solid', 'rule_type': 'simple', 'priority': 1,
+     'conditions': {'question_id': 'GENERAL_002', 'operator': 'less_than', 'value': 2000000}},
+]
+
+ANSWERS = {
+    'GENERAL_001': 'Transport et Logistique', 'GENERAL_002': '1500000', 'GENERAL_003': '10 à 49',
+    'GENERAL_004': 'Non', 'TICPE_001': 'Oui', 'TICPE_002': '2500', 'TICPE_003': ['Poids lourds', 'Utilitaires'],
+    'ENERGIE_GAZ_FACTURES': 'Oui', 'ENERGIE_GAZ_MONTANT': '800'
+}
+
+
+def test_mapper_matches_sql_function():
+    mapped = map_answers_to_variables(ANSWERS)
+    assert mapped['secteur'] == 'Transport et Logistique'
+    assert mapped['litres_carburant_mois'] == 2500
+    assert mapped['montant_factures_gaz_mois'] == 800
+    assert mapped['montant_factures_energie_mois'] == 800
+    assert mapped['contrats_energie'] == 'Oui'
+    assert map_answers_to_variables({'TICPE_002': 'beaucoup'})['litres_carburant_mois'] == 0
+
+
+def test_single_pass_evaluation():
+    engine = EligibilityRuleEngine(PRODUCTS, RULES)
+    assert engine.evaluate(ANSWERS) == {
+        'TICPE': True, 'DFS': True, 'FONCIER': False, 'CEE': True, 'URSSAF': True,
+        'Recouvrement': True,  # règle inactive : éligible par défaut, comme la fonction SQL
+        'Logiciel Solid': True
+    }
+    verdicts = engine.evaluate(dict(ANSWERS, TICPE_002='900', GENERAL_001='Association'))
+    assert not verdicts['TICPE'] and not verdicts['URSSAF']
+    # Réponse manquante : la condition est fausse
+    assert not engine.evaluate({})['FONCIER']
+
+
+def test_batch_matches_single_evaluation():
+    engine = EligibilityRuleEngine(PRODUCTS, RULES)
+    rng = random.Random(7)
+    answer_sets = []
+    for _ in range(300):
+        answer_sets.append({
+            key: rng.choice(values) for key, values in {
+                'GENERAL_001': ['Transport et Logistique', 'BTP', 'Association', None],
+                'GENERAL_002': ['100000', '2000000', '5000000', ''],
+                'GENERAL_003': ['1 à 9', '10 à 49', '250+', None],
+                'GENERAL_004': ['Oui', 'Non'],
+                'TICPE_001': ['Oui', 'Non'],
+                'TICPE_002': ['500', '1000', '1001', 'n/a'],
+                'TICPE_003': [['Poids lourds'], ['Utilitaires'], [], 'Poids lourds'],
+                'DFS_001': ['4', '5', '12', None],
+                'ENERGIE_ELEC_FACTURES': ['Oui', 'Non'],
+            }.items()
+        })
+    matrix = engine.evaluate_batch(answer_sets)
+    assert matrix.shape == (300, len(PRODUCTS))
+    for row, answers in zip(matrix, answer_sets):
+        assert dict(zip(engine.product_names, row.tolist())) == engine.evaluate(answers)
@@ -0,0 +1,149 @@
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulkSequenceSchedulerService import BulkSequenceScheduler, content_hash  # noqa: E402
+from emailDedupIndexService import DedupStore, EmailDedupIndex  # noqa: E402
+
+DSN = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'email_dedup_index_test'
+T0 = datetime(2025, 12, 20, 9, 0, tzinfo=timezone.utc)
+
+
+class MemoryStore:
+    def __init__(self, rows):
+        self.rows = rows
+        self.loads = []
+
+    def load(self, consume, since=None):
+        self.loads.append(since)
+        rows = [r[:3] for r in self.rows if since is None or r[3] >= since]
+        for i in range(0, len(rows), 2):
+            consume(rows[i:i + 2])
+        return T0
+
+
+def test_lookup_events_and_snapshot_restart(tmp_path):
+    h1, h2 = content_hash('Bonjour', 'Premier contact'), content_hash('Relance', 'Second')
+    store = MemoryStore([('sent', 'p1', h1, T0), ('scheduled', 'p2', h2, T0), ('released', 'p3', h1, T0)])
+    index = EmailDedupIndex(store, snapshot_path=str(tmp_path / 'dedup.bin'), capacity=10)
+    assert index.load() == 3
+    assert index.contains('p1', h1) and index.contains('p2', h2)
+    assert not index.contains('p3', h1) and not index.contains('p1', h2)
+    assert index.stats['bloom_negatives'] >= 1
+
+    # Annulation : libère un contenu programmé, jamais un contenu envoyé
+    index.release([('p2', h2), ('p1', h1)])
+    assert not index.contains('p2', h2) and index.contains('p1', h1)
+    index.add_scheduled([(f'p{i}', h2) for i in range(2000)])
+    index.add_sent([('p5', h1)])
+    assert index.duplicates([('p5', h1), ('p6', h1), ('p1999', h2)]) == [('p5', h1), ('p1999', h2)]
+    index.save()
+
+    later = datetime(2025, 12, 20, 10, 0, tzinfo=timezone.utc)
+    store.rows.append(('released', 'p1999', h2, later))
+    restarted = EmailDedupIndex(store, snapshot_path=str(tmp_path / 'dedup.bin'))
+    # Recouvrement de 5 minutes : les lignes proches de la sauvegarde sont relues
+    assert restarted.load() == 4
+    assert store.loads[-1] == datetime(2025, 12, 20, 8, 55, tzinfo=timezone.utc)
+    assert len(restarted) == len(index) - 1
+    assert restarted.contains('p5', h1) and restarted.contains('p0', h2)
+    assert not restarted.contains('p1999', h2)
+
+
+@pytest.mark.parametrize('keep', [10, 60, -3])
+def test_truncated_snapshot_falls_back_to_full_load(tmp_path, keep):
+    h1 = content_hash('Bonjour', 'Premier contact')
+    store = MemoryStore([('sent', 'p1', h1, T0), ('scheduled', 'p2', h1, T0)])
+    path = tmp_path / 'dedup.bin'
+    index = EmailDedupIndex(store, snapshot_path=str(path))
+    index.load()
+    index.save()
+    # En-tête partiel, corps partiel, filtre de Bloom amputé
+    path.write_bytes(path.read_bytes()[:keep])
+
+    restarted = EmailDedupIndex(store, snapshot_path=str(path))
+    assert restarted.load() == 2
+    assert store.loads[-1] is None
+    assert restarted.contains('p1', h1) and restarted.contains('p2', h1)
+
+
+class SchedulerStore:
+    def __init__(self):
+        self.inserted = []
+
+    def load_steps(self, sequence_id):
+        return []
+
+    def already_scheduled(self, sequence_id, prospect_ids):
+        return set()
+
+    def load_reserved(self, since, excluded_ids=()):
+        return []
+
+    def insert(self, sequence_id, emails):
+        self.inserted.extend(emails)
+        return len(emails)
+
+
+def test_bulk_launch_skips_prospects_with_duplicate_content():
+    steps = [{'step_number': 1, 'delay_days': 0, 'subject': 'Bonjour', 'body': 'Premier contact'},
+             {'step_number': 2, 'delay_days': 3, 'subject': 'Relance', 'body': 'Second'}]
+    index = EmailDedupIndex(MemoryStore([('sent', 'p2', content_hash('Relance', 'Second'), T0)]))
+    index.load()
+    store = SchedulerStore()
+    scheduler = BulkSequenceScheduler(store, {'a': (12, 100)}, clock=lambda: T0, dedup=index)
+
+    result = scheduler.launch('seq', [{'id': 'p1'}, {'id': 'p2'}], steps)
+    assert result['duplicates'] == ['p2'] and result['scheduled'] == 2
+    # Le relancement ne passe plus par la base pour détecter les doublons
+    assert scheduler.launch('seq', [{'id': 'p1'}], steps)['duplicates'] == ['p1']
+    assert len(store.inserted) == 2
+
+
+@pytest.mark.skipif(not DSN, reason='TEST_DATABASE_URL non défini')
+def test_database_load_and_catch_up():
+    import psycopg2
+
+    admin = psycopg2.connect(DSN)
+    with admin, admin.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}.prospects_emails (
+                id SERIAL PRIMARY KEY, prospect_id UUID, content_hash VARCHAR(64),
+                is_duplicate_archived BOOLEAN, created_at TIMESTAMPTZ DEFAULT NOW()
+            );
+            CREATE TABLE {SCHEMA}.prospect_email_scheduled (
+                id SERIAL PRIMARY KEY, prospect_id UUID, content_hash VARCHAR(64), status TEXT,
+                updated_at TIMESTAMPTZ DEFAULT NOW()
+            );
+            INSERT INTO {SCHEMA}.prospects_emails (prospect_id, content_hash, is_duplicate_archived) VALUES
+                ('00000000-0000-0000-0000-000000000001', 'a', NULL),
+                ('00000000-0000-0000-0000-000000000002', 'a', true);
+            INSERT INTO {SCHEMA}.prospect_email_scheduled (prospect_id, content_hash, status) VALUES
+                ('00000000-0000-0000-0000-000000000003', 'b', 'scheduled'),
+                ('00000000-0000-0000-0000-000000000004', 'b', 'cancelled');
+        """)
+    admin.close()
+
+    store = DedupStore(lambda: psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}'), batch_size=1)
+    index = EmailDedupIndex(store)
+    assert index.load() == 2
+    assert index.contains('00000000-0000-0000-0000-000000000001', 'a')
+    assert not index.contains('00000000-0000-0000-0000-000000000002', 'a')
+    assert index.contains('00000000-0000-0000-0000-000000000003', 'b')
+    assert not index.contains('00000000-0000-0000-0000-000000000004', 'b')
+
+    conn = psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+    with conn, conn.cursor() as cur:
+        cur.execute("UPDATE prospect_email_scheduled SET status = 'cancelled', updated_at = NOW() WHERE content_hash = 'b'")
+    conn.close()
+    rows = []
+    store.load(rows.extend, since=T0)
+    index.apply_rows(rows)
+    assert not index.contains('00000000-0000-0000-0000-000000000003', 'b')
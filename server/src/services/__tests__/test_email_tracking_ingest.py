@@ -0,0 +1,142 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emailTrackingIngestService import (  # noqa: E402
+    EmailTrackingIngester,
+    TrackingEventStore,
+    TRANSPARENT_GIF,
+)
+
+DSN = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'email_tracking_test'
+E1, E2, E3 = (f'00000000-0000-4000-8000-00000000000{i}' for i in (1, 2, 3))
+
+
+class DataError(Exception):
+    pgcode = '22P02'
+
+
+class MemoryStore:
+    def __init__(self, failures=0, error=RuntimeError('base indisponible')):
+        self.writes = []
+        self.failures = failures
+        self.error = error
+
+    def write(self, events, updates):
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        self.writes.append((list(events), {k: (u.status, dict(u.timestamps)) for k, u in updates.items()}))
+
+
+def test_status_is_coalesced_to_highest_state_per_flush():
+    store = MemoryStore()
+    ingester = EmailTrackingIngester(store, autostart=False)
+    for _ in range(5):
+        assert ingester.track_open(E1) == TRANSPARENT_GIF
+    ingester.track_click(E1, 'https://www.profitum.fr')
+    ingester.track(E1, 'opened')
+    ingester.track(E2, 'delivered')
+    ingester.track(E3, 'clicked')
+    ingester.track(E3, 'bounced')
+    ingester.track(E3, 'opened')
+
+    assert ingester.flush() == (11, 3)
+    events, updates = store.writes[0]
+    assert len(events) == 11
+    assert updates[E1][0] == 'clicked'
+    assert set(updates[E1][1]) == {'opened_at', 'clicked_at'}
+    assert updates[E2][0] == 'delivered'
+    assert updates[E3][0] == 'bounced'
+    assert ingester.flush() == (0, 0)
+
+
+def test_failed_flush_is_requeued_and_buffer_is_bounded():
+    store = MemoryStore(failures=1)
+    ingester = EmailTrackingIngester(store, max_buffered_events=3, autostart=False)
+    for _ in range(4):
+        ingester.track(E1, 'opened')
+    assert ingester.stats['dropped'] == 1
+    with pytest.raises(RuntimeError):
+        ingester.flush()
+    ingester.track(E1, 'clicked')
+    assert ingester.flush() == (3, 1)
+    assert store.writes[0][1][E1][0] == 'clicked'
+    assert ingester.stats['dropped'] == 2
+
+
+def test_malformed_ids_are_rejected_and_data_errors_are_not_replayed():
+    store = MemoryStore()
+    ingester = EmailTrackingIngester(store, autostart=False)
+    assert ingester.track_open("x' OR 1=1 --") == TRANSPARENT_GIF
+    assert ingester.track('pas-un-uuid', 'clicked') is False
+    assert ingester.track(E1.upper(), 'opened') is True
+    assert ingester.stats['rejected'] == 2
+    assert ingester.flush() == (1, 1)
+    assert list(store.writes[0][1]) == [E1]
+
+    # Lot refusé par la base : abandonné, les écritures suivantes passent
+    store.failures, store.error = 1, DataError('invalid input syntax for type uuid')
+    ingester.track(E2, 'opened')
+    with pytest.raises(DataError):
+        ingester.flush()
+    assert ingester.pending() == 0 and ingester.stats['rejected'] == 3
+    ingester.track(E3, 'clicked')
+    assert ingester.flush() == (1, 1)
+    assert list(store.writes[1][1]) == [E3]
+
+
+@pytest.mark.skipif(not DSN, reason='TEST_DATABASE_URL non défini')
+def test_bulk_write_never_downgrades_status():
+    import psycopg2
+
+    admin = psycopg2.connect(DSN)
+    with admin, admin.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}."EmailTracking" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(), email_id UUID NOT NULL UNIQUE,
+                delivered_at TIMESTAMP, opened_at TIMESTAMP, clicked_at TIMESTAMP, bounced_at TIMESTAMP,
+                status VARCHAR(50) NOT NULL DEFAULT 'sent',
+                updated_at TIMESTAMP NOT NULL DEFAULT '2000-01-01'
+            );
+            CREATE TABLE {SCHEMA}."EmailEvent" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                email_id UUID NOT NULL REFERENCES {SCHEMA}."EmailTracking"(id),
+                event_type VARCHAR(50) NOT NULL, "timestamp" TIMESTAMP NOT NULL DEFAULT NOW(),
+                user_agent TEXT, ip_address VARCHAR(45), link_url TEXT, metadata JSONB
+            );
+        """)
+        opened, clicked = str(uuid.uuid4()), str(uuid.uuid4())
+        cur.execute(f"""INSERT INTO {SCHEMA}."EmailTracking" (email_id, status, clicked_at)
+                        VALUES (%s, 'sent', NULL), (%s, 'clicked', '2025-01-01')""", (opened, clicked))
+    admin.close()
+
+    store = TrackingEventStore(lambda: psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}'))
+    ingester = EmailTrackingIngester(store, autostart=False)
+    ingester.track_open(opened, user_agent='Mozilla')
+    ingester.track('d' * 8 + '-0000-0000-0000-000000000000', 'opened')  # email inconnu : ignoré
+    ingester.track_open(clicked)
+    ingester.track_click(clicked, 'https://www.profitum.fr')
+    ingester.flush()
+
+    conn = psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT email_id::text, status, opened_at IS NOT NULL, clicked_at, updated_at > '2000-01-01'
+            FROM "EmailTracking"
+        """)
+        rows = {r[0]: r[1:] for r in cur.fetchall()}
+        cur.execute('SELECT count(*) FROM "EmailEvent"')
+        assert cur.fetchone()[0] == 3
+    conn.close()
+    assert rows[opened][:2] == ('opened', True)
+    assert rows[clicked][0] == 'clicked'
+    assert str(rows[clicked][2]) == '2025-01-01 00:00:00'
+    assert rows[opened][3] and rows[clicked][3]
@@ -0,0 +1,179 @@
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import embeddingModelService  # noqa: E402
+import embeddingService  # noqa: E402
+from embeddingModelService import ONNX_METADATA, EmbeddingModel, ModelNotReady, compare_embeddings  # noqa: E402
+
+
+class FakeEncoder:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        if self.fail:
+            raise OSError('poids introuvables')
+        self.calls.append(list(texts))
+        return np.ones((len(texts), 384), dtype=np.float32)
+
+
+def loader_for(encoder, gate=None, loads=None):
+    def load(name):
+        if gate is not None:
+            gate.wait(5)
+        if loads is not None:
+            loads.append(name)
+        return encoder
+    return load
+
+
+def test_nothing_loaded_before_warmup_and_loaded_once():
+    loads = []
+    encoder = FakeEncoder()
+    model = EmbeddingModel('mini', loader_for(encoder, loads=loads))
+    assert not model.ready and loads == []
+    try:
+        model.encode(['a'])
+        assert False, 'encode avant préchauffage'
+    except ModelNotReady:
+        pass
+
+    threads = [threading.Thread(target=model.warmup) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == ['mini']
+    assert model.ready and model.stats['loaded_by_pid'] == os.getpid()
+    assert model.encode(['a', 'b']).shape == (2, 384)
+
+
+def test_live_and_ready_probes(monkeypatch):
+    gate = threading.Event()
+    model = EmbeddingModel('mini', loader_for(FakeEncoder(), gate=gate))
+    monkeypatch.setattr(embeddingService, 'model', model)
+    monkeypatch.setitem(embeddingService.app.extensions, 'embedding_model', model)
+    client = embeddingService.app.test_client()
+
+    thread = model.warmup_in_background()
+    assert client.get('/live').status_code == 200
+    response = client.get('/ready')
+    assert response.status_code == 503 and response.get_json()['status'] == 'loading'
+    response = client.post('/embed', json={'text': 'Nombre de salariés'})
+    assert response.status_code == 503 and response.headers['Retry-After'] == '1'
+
+    gate.set()
+    thread.join(5)
+    response = client.get('/ready')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'ready' and response.get_json()['shared'] is False
+    assert client.post('/embed', json={'text': 'Nombre de salariés'}).get_json()['dimension'] == 384
+
+
+def test_failed_warmup_reports_error_until_retry_succeeds():
+    encoder = FakeEncoder(fail=True)
+    model = EmbeddingModel('mini', loader_for(encoder))
+    model.warmup_in_background().join(5)
+    body, status = model.readiness()
+    assert status == 503 and body['status'] == 'error' and 'poids introuvables' in body['error']
+
+    encoder.fail = False
+    model.warmup()
+    body, status = model.readiness()
+    assert status == 200 and 'error' not in body
+
+
+def test_unknown_backend_is_rejected():
+    try:
+        EmbeddingModel('mini', backend='tensorrt')
+        assert False, 'backend inconnu accepté'
+    except ValueError as e:
+        assert 'onnx-int8' in str(e)
+    assert EmbeddingModel('mini', loader_for(FakeEncoder()), backend='tensorrt').backend == 'tensorrt'
+
+
+def test_compare_embeddings_reports_drift_and_neighbour_changes():
+    rng = np.random.default_rng(7)
+    baseline = rng.normal(size=(300, 32)).astype(np.float32)
+    same = compare_embeddings(baseline, baseline * 3)
+    assert same['cosine_min'] > 0.9999 and same['similarity_max_abs_diff'] < 1e-5
+    assert same['top1_agreement'] == 1.0 and same['recall_at_k'] == 1.0
+
+    noisy = compare_embeddings(baseline, baseline + rng.normal(scale=0.05, size=baseline.shape), chunk_size=64)
+    assert 0.99 < noisy['cosine_mean'] < 1.0 and noisy['cosine_min'] <= noisy['cosine_p01']
+    assert 0 < noisy['similarity_mean_abs_diff'] < noisy['similarity_max_abs_diff']
+
+    # Le texte 1 devient le plus proche voisin du texte 0 : l'accord top-1 chute pour 0
+    candidate = baseline.copy()
+    candidate[1] = baseline[0] + 0.001
+    moved = compare_embeddings(baseline, candidate, k=1)
+    assert moved['top1_agreement'] < 1.0 and moved['k'] == 1
+
+
+def slow_export(calls_dir):
+    def export(model_name, directory):
+        with open(os.path.join(calls_dir, str(os.getpid())), 'w'):
+            pass
+        with open(os.path.join(directory, 'model.onnx'), 'wb') as f:
+            f.write(b'graph')
+        time.sleep(0.3)  # fenêtre pendant laquelle les autres workers démarrent
+        with open(os.path.join(directory, ONNX_METADATA), 'w') as f:
+            json.dump({'model': model_name}, f)
+        return directory
+    return export
+
+
+def load_export(model_name):
+    return embeddingModelService._load_onnx(model_name, quantized=False)
+
+
+def test_concurrent_workers_export_onnx_once(tmp_path, monkeypatch):
+    calls_dir = tmp_path / 'calls'
+    calls_dir.mkdir()
+    target = tmp_path / 'onnx'
+    monkeypatch.setenv('EMBEDDING_ONNX_DIR', str(target))
+    monkeypatch.setattr(embeddingModelService, 'export_onnx', slow_export(str(calls_dir)))
+    monkeypatch.setattr(embeddingModelService, 'OnnxEncoder',
+                        lambda directory, quantized: sorted(os.listdir(directory)))
+
+    context = multiprocessing.get_context('fork')
+    with context.Pool(4) as pool:
+        listings = pool.map(load_export, ['mini'] * 4)
+    assert len(os.listdir(calls_dir)) == 1
+    assert listings == [[ONNX_METADATA, 'model.onnx']] * 4
+    # Ni répertoire temporaire ni export partiel laissés à côté de la cible
+    assert sorted(os.listdir(tmp_path)) == ['calls', 'onnx', 'onnx.lock']
+
+
+def test_failed_onnx_export_leaves_no_partial_directory(tmp_path, monkeypatch):
+    target = tmp_path / 'onnx'
+    target.mkdir()
+    (target / 'model.onnx').write_bytes(b'export interrompu')
+    monkeypatch.setenv('EMBEDDING_ONNX_DIR', str(target))
+
+    def failing_export(model_name, directory):
+        with open(os.path.join(directory, 'model.onnx'), 'wb') as f:
+            f.write(b'partiel')
+        raise ValueError('dérive')
+
+    monkeypatch.setattr(embeddingModelService, 'export_onnx', failing_export)
+    try:
+        load_export('mini')
+        assert False, 'export en échec accepté'
+    except ValueError:
+        pass
+    assert sorted(os.listdir(tmp_path)) == ['onnx', 'onnx.lock']
+
+    monkeypatch.setattr(embeddingModelService, 'export_onnx', slow_export(str(tmp_path)))
+    monkeypatch.setattr(embeddingModelService, 'OnnxEncoder', lambda directory, quantized: directory)
+    assert load_export('mini') == str(target)
+    assert (target / ONNX_METADATA).exists() and (target / 'model.onnx').read_bytes() == b'graph'
@@ -0,0 +1,154 @@
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from expertSearchIndexService import (  # noqa: E402
+    ExpertSearchIndex,
+    build_index,
+    covering_cells,
+    geohash,
+    json_contains,
+)
+
+SPECIALIZATIONS = ['TICPE', 'URSSAF', 'DFS', 'Foncier', 'CEE']
+CITIES = {'Paris': (48.8566, 2.3522), 'Lyon': (45.764, 4.8357), 'Marseille': (43.2965, 5.3698),
+          'Versailles': (48.8049, 2.1204), 'Lille': (50.6292, 3.0573)}
+
+
+def make_experts(count, seed=5):
+    rng = random.Random(seed)
+    experts = []
+    for i in range(count):
+        city = rng.choice(list(CITIES))
+        latitude, longitude = CITIES[city]
+        experts.append({
+            'id': f'e-{i}', 'name': f'Expert {i}', 'location': f'{city}, France',
+            'specializations': rng.sample(SPECIALIZATIONS, rng.randint(1, 3)),
+            'certifications': {'ISO': rng.random() < 0.3, 'CPA': rng.random() < 0.5},
+            'rating': rng.choice([None, 2.5, 3.0, 4.0, 4.5, 5.0]),
+            'client_fee_percentage': rng.choice([None, 10, 15, 20, 30]),
+            'experience': rng.choice(['5 ans', '10 ans', 'Senior']),
+            'disponibilites': {'available': rng.random() < 0.5, 'jours': ['lundi']},
+            'status': rng.choice(['active', 'active', 'inactive']),
+            'approval_status': rng.choice(['approved', 'approved', 'pending']),
+            'latitude': latitude + rng.uniform(-0.05, 0.05), 'longitude': longitude + rng.uniform(-0.05, 0.05),
+        })
+    return experts
+
+
+def distance(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+def reference(experts, assignments, criteria):
+    """Filtres et score du SQL de ExpertSearchService.searchExperts."""
+    scored = []
+    for e in experts:
+        if e['status'] != 'active' or e['approval_status'] != 'approved':
+            continue
+        if any(s not in e['specializations'] for s in criteria.get('specializations', [])):
+            continue
+        if any(e['certifications'].get(c) is not True for c in criteria.get('certifications', [])):
+            continue
+        if criteria.get('location') and criteria['location'].lower() not in e['location'].lower():
+            continue
+        if criteria.get('minRating') and (e['rating'] is None or e['rating'] < criteria['minRating']):
+            continue
+        if criteria.get('maxRating') and (e['rating'] is None or e['rating'] > criteria['maxRating']):
+            continue
+        price = criteria.get('priceRange', {})
+        fee = e['client_fee_percentage']
+        if price.get('min') and (fee is None or fee < price['min']):
+            continue
+        if price.get('max') and (fee is None or fee > price['max']):
+            continue
+        if criteria.get('availability') and not json_contains(e['disponibilites'], criteria['availability']):
+            continue
+        if criteria.get('near') and distance((criteria['near']['latitude'], criteria['near']['longitude']),
+                                             (e['latitude'], e['longitude'])) > criteria['maxDistance']:
+            continue
+        rows = assignments.get(e['id'], [])
+        completed = sum(1 for status, _ in rows if status == 'completed')
+        ratings = [r for _, r in rows if r is not None]
+        avg = sum(ratings) / len(ratings) if ratings else None
+        score = (e['rating'] or 0) * 5
+        if criteria.get('specializations'):
+            matches = len(set(e['specializations']) & set(criteria['specializations']))
+            score += matches * 40.0 / max(len(e['specializations']), 1)
+        score += 20 if completed >= 20 else 15 if completed >= 10 else 10 if completed >= 5 else 5 if completed else 0
+        if avg is not None:
+            score += 15 if avg >= 4.5 else 12 if avg >= 4 else 8 if avg >= 3.5 else 4 if avg >= 3 else 0
+        scored.append((e['id'], score))
+    return scored
+
+
+def test_search_matches_sql_filters_and_scores():
+    experts = make_experts(600)
+    index = build_index(experts)
+    rng = random.Random(9)
+    assignments = {}
+    for n in range(2000):
+        expert_id = f'e-{rng.randrange(600)}'
+        status, rating = rng.choice(['completed', 'in_progress']), rng.choice([None, 3, 4, 5])
+        assignments.setdefault(expert_id, []).append((status, rating))
+        index.apply_change('ExpertAssignment', {'eventType': 'INSERT', 'new': {
+            'id': f'a-{n}', 'expert_id': expert_id, 'status': status, 'client_rating': rating}})
+
+    paris = {'latitude': 48.8566, 'longitude': 2.3522}
+    for criteria in [{}, {'specializations': ['TICPE']}, {'specializations': ['TICPE', 'URSSAF'], 'minRating': 4},
+                     {'certifications': ['ISO'], 'priceRange': {'min': 12, 'max': 20}},
+                     {'location': 'lyon', 'maxRating': 4.5}, {'availability': {'available': True}},
+                     {'near': paris, 'maxDistance': 30}, {'near': paris, 'maxDistance': 500},
+                     {'near': paris, 'maxDistance': 2000, 'specializations': ['CEE']},
+                     {'specializations': ['Inconnue']}]:
+        expected = reference(experts, assignments, criteria)
+        result = index.search(criteria, limit=1000)
+        assert result['total'] == len(expected), criteria
+        assert sorted(e['id'] for e in result['experts']) == sorted(e for e, _ in expected), criteria
+        scores = dict(expected)
+        for expert in result['experts']:
+            assert expert['relevance_score'] == scores[expert['id']]
+        assert [e['relevance_score'] for e in result['experts']] == sorted(scores.values(), reverse=True)
+
+    top = index.search({'specializations': ['TICPE']}, page=2, limit=7)
+    full = index.search({'specializations': ['TICPE']}, limit=1000)
+    assert [e['id'] for e in top['experts']] == [e['id'] for e in full['experts']][7:14]
+
+
+def test_geohash_grid_covers_radius():
+    assert geohash(48.8566, 2.3522, 5) == 'u09tv'
+    precision, cells = covering_cells(48.8566, 2.3522, 30)
+    assert precision == 3 and geohash(48.8049, 2.1204, 3) in cells and len(cells) == 9
+    assert covering_cells(48.8566, 2.3522, 5000)[0] == 0
+
+
+def test_incremental_profile_updates():
+    index = ExpertSearchIndex(capacity=2)
+    base = {'status': 'active', 'approval_status': 'approved', 'certifications': {},
+            'latitude': 48.85, 'longitude': 2.35}
+    index.upsert({**base, 'id': 'a', 'specializations': ['TICPE'], 'rating': 4, 'client_fee_percentage': 10})
+    index.upsert({**base, 'id': 'b', 'specializations': ['TICPE', 'DFS'], 'rating': 5, 'client_fee_percentage': 25})
+    index.upsert({**base, 'id': 'c', 'specializations': ['DFS'], 'rating': 3, 'client_fee_percentage': 15})
+
+    result = index.search({'specializations': ['TICPE']})
+    assert [e['id'] for e in result['experts']] == ['a', 'b']
+    assert result['experts'][0]['relevance_score'] == 60 and result['experts'][0]['match_level'] == 'Très bon'
+
+    index.apply_change('Expert', {'eventType': 'UPDATE', 'new': {
+        **base, 'id': 'c', 'specializations': ['TICPE'], 'rating': 3, 'client_fee_percentage': 12,
+        'latitude': 45.76, 'longitude': 4.84}})
+    assert [e['id'] for e in index.search({'priceRange': {'max': 15}})['experts']] == ['a', 'c']
+    near = index.search({'near': {'latitude': 48.85, 'longitude': 2.35}, 'maxDistance': 50})
+    assert [e['id'] for e in near['experts']] == ['b', 'a']
+
+    for n in range(20):
+        index.set_assignment('c', f'x{n}', 'completed', 5)
+    assert index.search({'specializations': ['TICPE']})['experts'][0]['id'] == 'c'
+    index.apply_change('Expert', {'eventType': 'UPDATE', 'new': {**base, 'id': 'b', 'status': 'inactive'}})
+    index.apply_change('Expert', {'eventType': 'DELETE', 'old': {'id': 'a'}})
+    assert index.search({})['total'] == 1 and len(index) == 2
@@ -0,0 +1,124 @@
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from messageNotificationFanoutService import (  # noqa: E402
+    MembershipCache,
+    MessageNotificationFanout,
+    MessageNotificationStore,
+)
+
+DSN = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'message_notification_fanout_test'
+T0 = datetime(2025, 12, 19, 10, 0, tzinfo=timezone.utc)
+
+
+class MemoryStore:
+    def __init__(self, members):
+        self.members = members
+        self.loads = []
+        self.notifications = {}
+        self.batches = []
+        self.fail = False
+
+    def load_members(self, conversation_ids):
+        self.loads.append(list(conversation_ids))
+        return {cid: list(self.members.get(cid, [])) for cid in conversation_ids}
+
+    def upsert(self, rows):
+        if self.fail:
+            raise RuntimeError('base indisponible')
+        self.batches.append([row[:3] for row in rows])
+        for user_id, user_type, conversation_id, message_id, title, body, count, _, _ in rows:
+            key = (user_id, user_type, conversation_id)
+            previous = self.notifications.get(key, {'count': 0})
+            self.notifications[key] = {'count': previous['count'] + count, 'body': body, 'title': title}
+        return len(rows)
+
+
+def _message(conversation_id, sender, content, i):
+    return {'id': str(uuid.uuid4()), 'conversation_id': conversation_id, 'sender_id': sender,
+            'sender_name': sender.capitalize(), 'content': content, 'created_at': T0 + timedelta(seconds=i)}
+
+
+def test_exchange_is_coalesced_per_recipient_and_conversation():
+    store = MemoryStore({'c1': [('alice', 'client'), ('bob', 'expert')], 'c2': [('alice', 'client')]})
+    fanout = MessageNotificationFanout(store, MembershipCache(store), autostart=False)
+    for i in range(10):
+        fanout.publish(_message('c1', 'bob' if i % 2 == 0 else 'alice', f'message {i}', i))
+    fanout.publish(_message('c2', 'bob', 'x' * 150, 20))
+
+    assert fanout.flush() == 3
+    # Ordre (destinataire, type, conversation), comme upsert_message_notifications
+    assert store.batches[0] == [('alice', 'client', 'c1'), ('alice', 'client', 'c2'), ('bob', 'expert', 'c1')]
+    assert store.notifications[('alice', 'client', 'c1')] == {'count': 5, 'body': 'message 8',
+                                                               'title': 'Nouveau message de Bob'}
+    assert store.notifications[('bob', 'expert', 'c1')]['count'] == 5
+    assert store.notifications[('alice', 'client', 'c2')]['body'] == 'x' * 100 + '...'
+    # Une lecture groupée des participants, puis le cache
+    assert store.loads == [['c1', 'c2']]
+    fanout.publish(_message('c1', 'bob', 'encore', 30))
+    fanout.flush()
+    assert store.loads == [['c1', 'c2']]
+    assert store.notifications[('alice', 'client', 'c1')]['count'] == 6
+
+
+def test_known_recipients_skip_lookup_and_failures_are_retried():
+    store = MemoryStore({})
+    fanout = MessageNotificationFanout(store, MembershipCache(store), autostart=False)
+    fanout.publish(_message('c1', 'bob', 'bonjour', 0), [{'user_id': 'alice', 'user_type': 'client'}])
+    store.fail = True
+    with pytest.raises(RuntimeError):
+        fanout.flush()
+    fanout.publish(_message('c1', 'bob', 'toujours là ?', 1), [{'user_id': 'alice', 'user_type': 'client'}])
+    store.fail = False
+    assert fanout.flush() == 1
+    assert store.notifications[('alice', 'client', 'c1')]['count'] == 2
+    assert store.notifications[('alice', 'client', 'c1')]['body'] == 'toujours là ?'
+    assert store.loads == []
+
+
+@pytest.mark.skipif(not DSN, reason='TEST_DATABASE_URL non défini')
+def test_rolling_notification_upsert():
+    import psycopg2
+
+    admin = psycopg2.connect(DSN)
+    with admin, admin.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}."MessageNotification" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(), user_id UUID NOT NULL, user_type TEXT NOT NULL,
+                conversation_id UUID NOT NULL, message_id UUID, title TEXT, body TEXT,
+                is_read BOOLEAN NOT NULL DEFAULT false, message_count INTEGER NOT NULL DEFAULT 1,
+                created_at TIMESTAMPTZ, updated_at TIMESTAMPTZ
+            );
+            CREATE UNIQUE INDEX ON {SCHEMA}."MessageNotification" (user_id, user_type, conversation_id)
+                WHERE is_read = false;
+        """)
+    admin.close()
+
+    store = MessageNotificationStore(lambda: psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}'))
+    user, conversation = str(uuid.uuid4()), str(uuid.uuid4())
+
+    def row(count, body):
+        return (user, 'client', conversation, str(uuid.uuid4()), 'Nouveau message', body, count, T0, T0)
+
+    store.upsert([row(3, 'a')])
+    store.upsert([row(2, 'b')])
+    conn = psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+    with conn, conn.cursor() as cur:
+        cur.execute('SELECT message_count, body FROM "MessageNotification"')
+        assert cur.fetchall() == [(5, 'b')]
+        # Une fois lue, la notification suivante repart à zéro
+        cur.execute('UPDATE "MessageNotification" SET is_read = true')
+    store.upsert([row(1, 'c')])
+    with conn, conn.cursor() as cur:
+        cur.execute('SELECT message_count, body FROM "MessageNotification" WHERE is_read = false')
+        assert cur.fetchall() == [(1, 'c')]
+    conn.close()
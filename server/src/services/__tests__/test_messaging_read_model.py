@@ -0,0 +1,137 @@
+import os
+import sys
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from messagingReadModelService import (  # noqa: E402
+    MessagingReadModel,
+    decode_cursor,
+    encode_cursor,
+    is_read_by,
+)
+
+DSN = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'messaging_read_model_test'
+
+
+def test_cursor_round_trip_and_watermark_comparison():
+    at = datetime(2025, 12, 18, 10, 30, 0, 123456, tzinfo=timezone.utc)
+    message_id = str(uuid.uuid4())
+    assert decode_cursor(encode_cursor(at, message_id)) == (at, message_id)
+    with pytest.raises(ValueError):
+        decode_cursor('pas-un-curseur')
+
+    reader = str(uuid.uuid4())
+    message = {'id': 'b' * 8, 'sender_id': 'autre', 'created_at': at}
+    assert not is_read_by(message, reader, None)
+    assert is_read_by(message, reader, {'last_read_at': at, 'last_read_message_id': 'b' * 8})
+    assert not is_read_by(message, reader, {'last_read_at': at, 'last_read_message_id': 'a' * 8})
+    # Ancien filigrane sans identifiant : tout message à cette date est lu
+    assert is_read_by(message, reader, {'last_read_at': at, 'last_read_message_id': None})
+    assert is_read_by({**message, 'sender_id': reader}, reader, None)
+
+
+@pytest.fixture
+def model():
+    if not DSN:
+        pytest.skip('TEST_DATABASE_URL non défini')
+    import psycopg2
+
+    admin = psycopg2.connect(DSN)
+    with admin, admin.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}."Conversation" (
+                id UUID PRIMARY KEY, last_message_at TIMESTAMPTZ, updated_at TIMESTAMPTZ
+            );
+            CREATE TABLE {SCHEMA}."ConversationParticipant" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(), conversation_id UUID NOT NULL,
+                user_id UUID NOT NULL, user_type TEXT NOT NULL, is_active BOOLEAN NOT NULL DEFAULT true,
+                last_read_at TIMESTAMPTZ, last_read_message_id UUID,
+                unread_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE {SCHEMA}."Message" (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(), conversation_id UUID NOT NULL,
+                sender_id UUID NOT NULL, sender_type TEXT, sender_name TEXT, content TEXT,
+                message_type TEXT, metadata JSONB, is_read BOOLEAN,
+                created_at TIMESTAMPTZ, updated_at TIMESTAMPTZ
+            );
+            CREATE INDEX ON {SCHEMA}."Message" (conversation_id, created_at DESC, id DESC);
+            CREATE TABLE {SCHEMA}.user_unread_counters (
+                user_id UUID NOT NULL, user_type TEXT NOT NULL,
+                unread_total INTEGER NOT NULL DEFAULT 0, updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (user_id, user_type)
+            );
+        """)
+    admin.close()
+    return MessagingReadModel(lambda: psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}'))
+
+
+def _conversation(model, client, expert):
+    conversation_id = str(uuid.uuid4())
+    conn = model._connect()
+    with conn, conn.cursor() as cur:
+        cur.execute('INSERT INTO "Conversation" (id) VALUES (%s)', (conversation_id,))
+        cur.execute("""INSERT INTO "ConversationParticipant" (conversation_id, user_id, user_type)
+                       VALUES (%s, %s, 'client'), (%s, %s, 'expert')""",
+                    (conversation_id, client, conversation_id, expert))
+    conn.close()
+    return conversation_id
+
+
+def test_counters_follow_sends_and_reads(model):
+    client, expert = str(uuid.uuid4()), str(uuid.uuid4())
+    first = _conversation(model, client, expert)
+    second = _conversation(model, client, expert)
+    for i in range(5):
+        model.send_message(first, expert, 'expert', f'message {i}')
+    model.send_message(second, expert, 'expert', 'autre dossier')
+    model.send_message(first, client, 'client', 'réponse')
+
+    assert model.unread_total(client, 'client') == 6
+    assert model.unread_total(expert, 'expert') == 1
+    assert model.unread_by_conversation(client) == {first: 5, second: 1}
+
+    # Lecture partielle jusqu'au 3e message, puis complète
+    page = model.get_messages(first, viewer_id=client)['messages']
+    third = page[2]
+    assert model.mark_read(first, client, up_to=encode_cursor(third['created_at'], str(third['id']))) == 3
+    assert model.unread_total(client, 'client') == 3
+    assert [m['is_read'] for m in model.get_messages(first, viewer_id=client)['messages']] == \
+        [True, True, True, False, False, True]
+    assert model.mark_read(first, client) == 2
+    assert model.mark_read(first, client) == 0
+    assert model.unread_total(client, 'client') == 1
+
+    # Le recalcul depuis les filigranes retrouve les mêmes compteurs
+    conn = model._connect()
+    with conn, conn.cursor() as cur:
+        cur.execute('UPDATE "ConversationParticipant" SET unread_count = 42')
+        cur.execute('UPDATE user_unread_counters SET unread_total = 0')
+    conn.close()
+    model.rebuild_counters()
+    assert model.unread_total(client, 'client') == 1
+    assert model.unread_total(expert, 'expert') == 1
+
+
+def test_keyset_pagination_is_stable(model):
+    client, expert = str(uuid.uuid4()), str(uuid.uuid4())
+    conversation = _conversation(model, client, expert)
+    sent = [model.send_message(conversation, expert, 'expert', f'm{i}')['id'] for i in range(12)]
+
+    seen, cursor = [], None
+    while True:
+        page = model.get_messages(conversation, limit=5, before=cursor)
+        seen = [m['id'] for m in page['messages']] + seen
+        # Un nouveau message pendant la lecture ne décale pas les pages suivantes
+        if cursor is None:
+            model.send_message(conversation, expert, 'expert', 'nouveau')
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == sent
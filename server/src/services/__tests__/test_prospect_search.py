@@ -0,0 +1,92 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prospectSearchService import ProspectSearchIndex, build_index  # noqa: E402
+
+COMPANIES = ['Transports Martin', 'Boulangerie Dupont', 'Logistique Express', 'Garage Bernard', 'Martinez BTP']
+NAMES = ['Jean', 'Marie', 'Martine', 'Paul', 'Lucie', None]
+
+
+def make_prospects(count, seed=3):
+    rng = random.Random(seed)
+    prospects = []
+    for i in range(count):
+        firstname = rng.choice(NAMES)
+        company = rng.choice(COMPANIES)
+        prospects.append({
+            'id': f'p-{i}', 'email': f'contact{i}@{company.split()[0].lower()}.fr',
+            'firstname': firstname, 'lastname': rng.choice(['Durand', 'Martin', None]),
+            'company_name': company, 'source': rng.choice(['import_csv', 'google_maps', 'linkedin']),
+            'email_validity': rng.choice(['valid', 'risky', None]),
+            'enrichment_status': rng.choice(['pending', 'completed']),
+            'ai_status': 'pending', 'emailing_status': rng.choice(['pending', 'sent']),
+            'siren': rng.choice([None, '123456789']), 'score_priority': rng.choice([None, 10, 50, 90]),
+            'created_at': f'2025-11-{1 + i % 28:02d}T10:{i % 60:02d}:00Z', 'updated_at': None
+        })
+    return prospects
+
+
+def reference(prospects, sequences, sent, filters):
+    """Sémantique de ProspectService.listProspects, sans pagination."""
+    term = (filters.get('search') or '').lower()
+    rows = []
+    for p in prospects:
+        if any(filters.get(f) and p[f] != filters[f] for f in ('source', 'email_validity', 'emailing_status')):
+            continue
+        if filters.get('has_siren') is True and not p['siren']:
+            continue
+        if filters.get('has_sequences') is True and p['id'] not in sequences:
+            continue
+        if filters.get('has_sequences') is False and (p['id'] in sequences or p['id'] in sent):
+            continue
+        if filters.get('min_score_priority') is not None and (p['score_priority'] or -1) < filters['min_score_priority']:
+            continue
+        if term and not any(term in (p[f] or '').lower() for f in ('email', 'firstname', 'lastname', 'company_name')):
+            continue
+        rows.append(p['id'])
+    return rows
+
+
+def test_search_matches_list_prospects_semantics():
+    prospects = make_prospects(500)
+    index = build_index(prospects)
+    sequences = {f'p-{i}' for i in range(0, 500, 7)}
+    sent = {f'p-{i}' for i in range(0, 500, 11)}
+    for i in range(0, 500, 7):
+        index.apply_change('prospect_email_scheduled', {
+            'eventType': 'INSERT', 'new': {'id': f's-{i}', 'prospect_id': f'p-{i}', 'status': 'scheduled'}})
+    for i in range(0, 500, 11):
+        index.apply_change('prospects_emails', {
+            'eventType': 'INSERT', 'new': {'prospect_id': f'p-{i}', 'sent_at': '2025-12-01T08:00:00Z'}})
+
+    for filters in [{}, {'search': 'mart'}, {'search': 'ma'}, {'search': 'EXPRESS', 'source': 'linkedin'},
+                    {'has_sequences': True}, {'has_sequences': False, 'has_siren': True},
+                    {'min_score_priority': 50, 'email_validity': 'valid'}, {'search': 'introuvable'},
+                    {'source': 'manuel'}]:
+        expected = reference(prospects, sequences, sent, filters)
+        result = index.search(dict(filters, limit=1000))
+        assert result['total'] == len(expected), filters
+        assert sorted(result['ids']) == sorted(expected), filters
+
+
+def test_ranking_pagination_and_incremental_updates():
+    index = ProspectSearchIndex(capacity=2)
+    index.upsert({'id': 'a', 'email': 'x@a.fr', 'company_name': 'Les Martins', 'created_at': '2025-01-03'})
+    index.upsert({'id': 'b', 'email': 'y@b.fr', 'lastname': 'Martin', 'created_at': '2025-01-01'})
+    index.upsert({'id': 'c', 'email': 'z@c.fr', 'company_name': 'Martinez', 'created_at': '2025-01-02'})
+
+    # Égalité exacte, puis préfixe, puis sous-chaîne
+    assert index.search({'search': 'martin'})['ids'] == ['b', 'c', 'a']
+    page = index.search({'sort_by': 'created_at', 'sort_order': 'desc', 'limit': 2, 'page': 2})
+    assert page == {'ids': ['b'], 'total': 3, 'page': 2, 'limit': 2, 'total_pages': 2}
+
+    index.apply_change('prospects', {'eventType': 'UPDATE', 'new': {'id': 'b', 'email': 'y@b.fr', 'lastname': 'Durand'}})
+    assert index.search({'search': 'martin'})['ids'] == ['c', 'a']
+    index.apply_change('prospects', {'eventType': 'DELETE', 'old': {'id': 'c'}})
+    assert index.search({'search': 'martin'})['total'] == 1
+    index.upsert({'id': 'd', 'email': 'martin@d.fr', 'created_at': '2025-01-04'})
+    assert len(index) == 3
+    assert index.search({'search': 'martin'})['ids'] == ['d', 'a']
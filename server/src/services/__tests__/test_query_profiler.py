@@ -0,0 +1,72 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('psycopg2')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from queryProfilerService import (  # noqa: E402
+    ProfiledConnection,
+    QueryProfile,
+    fingerprint,
+    profile_queries,
+)
+
+DSN = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'query_profiler_test'
+
+
+def test_fingerprint_normalizes_literals_lists_and_rows():
+    assert fingerprint("SELECT *  FROM \"Client\" WHERE id = 'abc' -- commentaire\n AND n > 42") == \
+        fingerprint('SELECT * FROM "Client" WHERE id = %s AND n > %(n)s')
+    assert fingerprint('SELECT 1 FROM t WHERE id IN (1, 2, 3)') == fingerprint('SELECT 1 FROM t WHERE id IN (%s)')
+    assert fingerprint("INSERT INTO t (a, b) VALUES (1, 'x'),(2, 'y'), ( 3,'z' )") == \
+        'INSERT INTO t (a, b) VALUES (?, ?), ...'
+    assert fingerprint(b'SELECT col1 FROM "T2"') == 'SELECT col1 FROM "T2"'
+
+
+def test_profile_flags_repeated_fingerprints():
+    profile = QueryProfile('GET /api/dossiers', n_plus_one_threshold=3)
+    profile.record('SELECT * FROM "Dossier" WHERE client_id = %s', 0.001, 10)
+    for i in range(4):
+        profile.record(f"SELECT * FROM \"Document\" WHERE dossier_id = '{i}'", 0.002, 1)
+    report = profile.report()
+    assert report['queries'] == 5
+    assert report['distinct'] == 2
+    assert [item['calls'] for item in report['n_plus_one']] == [4]
+    assert report['n_plus_one'][0]['sql'] == 'SELECT * FROM "Document" WHERE dossier_id = ?'
+    assert report['fingerprints'][0]['rows'] == 4
+
+
+@pytest.mark.skipif(not DSN, reason='TEST_DATABASE_URL non défini')
+def test_profiled_connection_records_every_cursor_type():
+    import psycopg2
+    from psycopg2.extras import RealDictCursor, execute_values
+
+    conn = psycopg2.connect(DSN, connection_factory=ProfiledConnection)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+            cur.execute(f'CREATE SCHEMA {SCHEMA}')
+            cur.execute(f'CREATE TABLE {SCHEMA}.item (id INT PRIMARY KEY, label TEXT)')
+        with profile_queries('test', n_plus_one_threshold=5) as profile:
+            with conn.cursor() as cur:
+                execute_values(cur, f'INSERT INTO {SCHEMA}.item (id, label) VALUES %s',
+                               [(i, f'item {i}') for i in range(20)])
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                for i in range(6):
+                    cur.execute(f'SELECT * FROM {SCHEMA}.item WHERE id = %s', (i,))
+                    assert cur.fetchone()['id'] == i
+                cur.execute(f'SELECT * FROM {SCHEMA}.item')
+                assert len(cur.fetchall()) == 20
+        conn.rollback()
+    finally:
+        conn.close()
+
+    report = profile.report()
+    assert report['queries'] == 8
+    by_sql = {item['sql']: item for item in report['fingerprints']}
+    assert by_sql[f'INSERT INTO {SCHEMA}.item (id, label) VALUES (?, ?), ...']['rows'] == 20
+    assert by_sql[f'SELECT * FROM {SCHEMA}.item']['rows'] == 20
+    assert [item['sql'] for item in report['n_plus_one']] == [f'SELECT * FROM {SCHEMA}.item WHERE id = ?']
@@ -0,0 +1,71 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from questionnaireGraphService import QuestionnaireGraph, QuestionnaireGraphCache  # noqa: E402
+
+QUESTIONS = [
+    {'id': 'u-1', 'question_id': 'GENERAL_001', 'question_order': 1, 'conditions': {},
+     'produits_cibles': ['TICPE', 'DFS']},
+    {'id': 'u-2', 'question_id': 'TICPE_001', 'question_order': 3, 'produits_cibles': ['TICPE'],
+     'conditions': {'depends_on': 'GENERAL_001', 'value': 'Transport et Logistique', 'operator': 'equals'}},
+    {'id': 'u-3', 'question_id': 'TICPE_002', 'question_order': 4, 'produits_cibles': ['TICPE'],
+     'conditions': {'depends_on': 'TICPE_001', 'value': 'Oui', 'operator': 'equals'}},
+    {'id': 'u-4', 'question_id': 'GENERAL_003', 'question_order': 2, 'conditions': None,
+     'produits_cibles': ['URSSAF']},
+    {'id': 'u-5', 'question_id': 'URSSAF_001', 'question_order': 5, 'produits_cibles': ['URSSAF'],
+     'conditions': {'depends_on': 'u-4', 'value': 10, 'operator': 'greater_than'}},
+    {'id': 'u-6', 'question_id': 'ORPHELINE', 'question_order': 6,
+     'conditions': {'depends_on': 'INCONNUE', 'value': 'Oui'}},
+]
+
+
+def test_visibility_follows_answers_transitively():
+    session = QuestionnaireGraph(QUESTIONS).new_session()
+    assert [q['question_id'] for q in session.visible_questions()] == ['GENERAL_001', 'GENERAL_003']
+    assert session.next_question()['question_id'] == 'GENERAL_001'
+
+    change = session.apply_answers({'GENERAL_001': 'Transport et Logistique'})
+    assert change['shown'] == ['u-2']
+    assert change['products']['TICPE'] == {'visible_questions': 2, 'answered_questions': 1, 'complete': False}
+    assert session.next_question()['question_id'] == 'GENERAL_003'
+    assert session.next_question(after='GENERAL_003')['question_id'] == 'TICPE_001'
+
+    assert session.apply_answers({'u-2': 'Oui'})['shown'] == ['u-3']
+    # Changer la réponse racine masque toute la branche, même si TICPE_001 reste répondue
+    change = session.apply_answers({'GENERAL_001': 'BTP'})
+    assert change['hidden'] == ['u-2', 'u-3']
+    assert not session.is_visible('TICPE_002')
+    assert session.progress() == {'answered': 1, 'total': 2}
+    assert not session.is_visible('ORPHELINE')
+
+
+def test_numeric_condition_and_only_touched_products_reported():
+    session = QuestionnaireGraph(QUESTIONS).new_session({'GENERAL_003': '5'})
+    assert not session.is_visible('URSSAF_001')
+    change = session.apply_answers({'u-4': 25})
+    assert change['shown'] == ['u-5']
+    assert set(change['products']) == {'URSSAF'}
+    assert session.apply_answers({'u-4': 25}) == {'shown': [], 'hidden': [], 'products': {}}
+    assert session.answers() == {'u-4': 25}
+
+
+def test_cycles_are_rejected_and_cache_compiles_once():
+    cyclic = [
+        {'id': 'a', 'question_order': 1, 'conditions': {'depends_on': 'b', 'value': 'Oui'}},
+        {'id': 'b', 'question_order': 2, 'conditions': {'depends_on': 'a', 'value': 'Oui'}},
+    ]
+    with pytest.raises(ValueError):
+        QuestionnaireGraph(cyclic)
+
+    loads = []
+    now = [0.0]
+    cache = QuestionnaireGraphCache(loader=lambda: loads.append(1) or QUESTIONS,
+                                    ttl_seconds=60, clock=lambda: now[0])
+    assert cache.get() is cache.get()
+    now[0] = 61
+    cache.get()
+    assert len(loads) == 2
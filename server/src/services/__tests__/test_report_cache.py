@@ -0,0 +1,143 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportCacheService import ReportCache  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Double du client Redis partagé entre plusieurs instances (sans expiration)."""
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError('Redis indisponible')
+
+    def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    def mget(self, keys):
+        self._check()
+        return [self.data.get(key) for key in keys]
+
+    def setex(self, key, ttl, value):
+        self._check()
+        self.data[key] = value
+
+    def delete(self, *keys):
+        self._check()
+        for key in keys:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        self._check()
+        self.data[key] = str(int(self.data.get(key, b'0')) + 1).encode()
+        return int(self.data[key])
+
+
+class GatedCompute:
+    def __init__(self, value=None):
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self.calls = 0
+        self.value = value
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.gate.wait(5)
+        return self.value if self.value is not None else {'calls': self.calls}
+
+
+def make_cache(l2=None, clock=None):
+    return ReportCache(l2=l2 if l2 is not None else FakeRedis(), default_ttl=60, stale_ttl=120,
+                       tag_check_interval=5, clock=clock or FakeClock())
+
+
+def test_concurrent_misses_compute_once_and_late_leader_rechecks_cache():
+    cache = make_cache()
+    compute = GatedCompute()
+    results = []
+
+    def read():
+        results.append(cache.get_or_compute('morning', {'date': 'd'}, compute))
+
+    threads = [threading.Thread(target=read) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    compute.started.wait(5)
+    compute.gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert compute.calls == 1 and results == [{'calls': 1}] * 6
+
+    # Requête qui a vu le cache vide puis devient leader après la fin du vol précédent
+    key = cache.get_cache_key('morning', {'date': 'd'})
+    assert cache._single_flight(key, 'morning', compute, 60, cache._tags_for('morning', None)) == {'calls': 1}
+    assert compute.calls == 1
+
+
+def test_stale_entry_is_served_and_refreshed_once():
+    clock = FakeClock()
+    cache = make_cache(clock=clock)
+    cache.set('daily_v2', {'date': 'd'}, {'version': 1})
+    clock.now += 90  # périmée, encore dans la fenêtre de grâce
+
+    compute = GatedCompute({'version': 2})
+    served = [cache.get_or_compute('daily_v2', {'date': 'd'}, compute) for _ in range(5)]
+    assert served == [{'version': 1}] * 5
+    compute.started.wait(5)
+    compute.gate.set()
+    cache._refresher.shutdown(wait=True)
+    assert compute.calls == 1
+    assert cache.get('daily_v2', {'date': 'd'}) == {'version': 2}
+    stats = cache.get_stats()['reports']['daily_v2']
+    assert stats['stale_served'] == 5 and stats['stampede_coalesced'] == 4
+
+    # Au-delà de la grâce : plus rien n'est servi
+    clock.now += 60 + 121
+    assert cache.get('daily_v2', {'date': 'd'}) is None
+
+
+def test_custom_tags_are_honoured_by_get_and_shared_through_l2():
+    clock = FakeClock()
+    redis = FakeRedis()
+    writer, reader = make_cache(redis, clock), make_cache(redis, clock)
+    writer.set('morning', {'date': 'd'}, {'rdv': 3}, tags=['ExpertAgenda'])
+    assert writer.get('morning', {'date': 'd'}) == {'rdv': 3}
+    assert reader.get('morning', {'date': 'd'}) == {'rdv': 3}
+    assert reader.get_stats()['reports']['morning']['hits_l2'] == 1
+
+    # Une table hors des tags de l'entrée ne l'invalide pas, la sienne si
+    writer.on_table_changed('RDV')
+    assert writer.get('morning', {'date': 'd'}) == {'rdv': 3}
+    writer.on_table_changed('ExpertAgenda')
+    assert writer.get('morning', {'date': 'd'}) is None
+    # L'autre instance relit les versions de tags après `tag_check_interval`
+    assert reader.get('morning', {'date': 'd'}) == {'rdv': 3}
+    clock.now += 5
+    assert reader.get('morning', {'date': 'd'}) is None
+
+
+def test_l1_keeps_serving_when_l2_is_down():
+    redis = FakeRedis()
+    cache = make_cache(redis)
+    assert cache.get_or_compute('morning', {'date': 'd'}, lambda: {'ok': True}) == {'ok': True}
+    redis.down = True
+    assert cache.get_or_compute('morning', {'date': 'd'}, lambda: {'ok': False}) == {'ok': True}
+    cache.invalidate('morning')
+    assert cache.get_or_compute('morning', {'date': 'd'}, lambda: {'ok': False}) == {'ok': False}
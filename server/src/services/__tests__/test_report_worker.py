@@ -0,0 +1,186 @@
+import os
+import sys
+import textwrap
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reportGeneratorsService  # noqa: E402
+import reportWorkerService  # noqa: E402
+from reportWorkerService import PRIORITY_BATCH, PRIORITY_INTERACTIVE, ReportWorker, register_report  # noqa: E402
+
+
+@register_report('test_sections')
+def generate_sections(params, progress):
+    progress.update(40, partial={'rdv': params['rdv']}, message='rdv')
+    progress.update(80, partial={'dossiers': 2})
+    return {'total': params['rdv'] + 2}
+
+
+@register_report('test_slow')
+def generate_slow(params, progress):
+    progress.update(10, message='démarré')
+    time.sleep(30)
+    return {}
+
+
+class MemoryStore:
+    def __init__(self):
+        self.jobs = {}
+        self.claimed_types = []
+        self.progress = []
+
+    def add(self, job_id, report_type, priority=PRIORITY_BATCH, timeout_seconds=60, params=None):
+        self.jobs[job_id] = {'id': job_id, 'type': report_type, 'params': params or {}, 'priority': priority,
+                             'timeout_seconds': timeout_seconds, 'status': 'pending', 'cancel_requested': False,
+                             'order': len(self.jobs)}
+
+    def claim(self, limit, report_types):
+        self.claimed_types.append(list(report_types))
+        pending = sorted((j for j in self.jobs.values() if j['status'] == 'pending' and not j['cancel_requested']),
+                         key=lambda j: (-j['priority'], j['order']))[:limit]
+        for job in pending:
+            job['status'] = 'processing'
+        return [dict(job) for job in pending]
+
+    def update_progress(self, job_id, progress, partial, message):
+        self.progress.append((job_id, progress, partial, message))
+
+    def finish(self, job_id, status, result=None, error=None):
+        self.jobs[job_id].update(status=status, result=result, error=error)
+
+    def cancel(self, job_id):
+        self.jobs[job_id]['cancel_requested'] = True
+        return True
+
+    def cancel_requested(self, job_ids):
+        return [job_id for job_id in job_ids if self.jobs[job_id]['cancel_requested']]
+
+    def requeue_orphans(self):
+        pass
+
+
+def run_until(worker, store, job_ids, timeout=15):
+    deadline = time.monotonic() + timeout
+    while any(store.jobs[j]['status'] in ('pending', 'processing') for j in job_ids):
+        assert time.monotonic() < deadline, {j: store.jobs[j]['status'] for j in job_ids}
+        worker.tick()
+
+
+def make_worker(store, max_workers=1):
+    return ReportWorker(store, max_workers=max_workers, poll_interval=0.05, progress_flush_interval=0,
+                        cancel_check_interval=0)
+
+
+def test_claims_by_priority_and_merges_partial_results():
+    store = MemoryStore()
+    store.add('batch', 'test_sections', params={'rdv': 1})
+    store.add('interactive', 'test_sections', PRIORITY_INTERACTIVE, params={'rdv': 5})
+    worker = make_worker(store)
+    worker.tick()
+    assert store.jobs['interactive']['status'] != 'pending' and store.jobs['batch']['status'] == 'pending'
+    assert set(store.claimed_types[0]) >= {'test_sections', 'test_slow'}
+
+    run_until(worker, store, ['interactive', 'batch'])
+    assert store.jobs['interactive']['result'] == {'total': 7}
+    assert store.jobs['batch']['result'] == {'total': 3}
+    # Fusion clé par clé, comme partial_result || partial en base
+    merged, last_progress = {}, None
+    for job_id, progress, partial, _ in store.progress:
+        if job_id == 'interactive':
+            merged.update(partial or {})
+            last_progress = progress
+    assert merged == {'rdv': 5, 'dossiers': 2} and last_progress == 80.0
+
+
+def test_cancel_and_timeout_stop_only_their_own_job():
+    store = MemoryStore()
+    store.add('cancelled', 'test_slow')
+    store.add('expired', 'test_slow', timeout_seconds=1)
+    store.add('fast', 'test_sections', params={'rdv': 0})
+    worker = make_worker(store, max_workers=3)
+    worker.tick()
+    process = worker._running['cancelled'].process
+    store.cancel('cancelled')
+    run_until(worker, store, ['cancelled', 'expired', 'fast'])
+
+    assert store.jobs['cancelled']['status'] == 'cancelled' and not process.is_alive()
+    assert store.jobs['expired']['status'] == 'failed'
+    assert 'Délai maximal' in store.jobs['expired']['error']
+    # Les canaux des jobs arrêtés ne touchent pas aux autres : un nouveau job aboutit
+    assert store.jobs['fast']['status'] == 'completed'
+    store.add('after', 'test_sections', params={'rdv': 1})
+    run_until(worker, store, ['after'])
+    assert store.jobs['after']['result'] == {'total': 3}
+
+
+def test_unknown_type_fails_without_process_and_empty_registry_refuses_to_start(monkeypatch):
+    store = MemoryStore()
+    store.add('legacy', 'weekly_v1')
+    worker = make_worker(store)
+    worker.tick()
+    assert store.jobs['legacy']['status'] == 'failed'
+    assert 'Type de rapport inconnu' in store.jobs['legacy']['error'] and not worker._running
+
+    monkeypatch.setattr(reportWorkerService, 'REPORT_GENERATORS', {})
+    with pytest.raises(RuntimeError):
+        make_worker(MemoryStore()).run_forever()
+
+
+FAKE_BRIDGE = textwrap.dedent("""
+    import json, os, sys, time
+    report_type, params = sys.argv[1], json.loads(sys.argv[2])
+    with open(os.environ['BRIDGE_PID_FILE'], 'w') as f:
+        f.write(str(os.getpid()))
+    print('log de service sur stdout')
+    for name in ('pendingActions', 'rdvWithoutReports', 'rdvTomorrow'):
+        print(json.dumps({'event': 'section', 'name': name, 'data': [params['date']]}), flush=True)
+        time.sleep(params.get('pause', 0))
+    print(json.dumps({'event': 'result', 'data': {'type': report_type, 'reportDate': params['date']}}))
+""")
+
+
+def fake_bridge(tmp_path, monkeypatch):
+    script = tmp_path / 'bridge.py'
+    script.write_text(FAKE_BRIDGE)
+    monkeypatch.setenv('REPORT_BRIDGE_COMMAND', f'{sys.executable} {script}')
+    monkeypatch.setenv('BRIDGE_PID_FILE', str(tmp_path / 'bridge.pid'))
+    return tmp_path / 'bridge.pid'
+
+
+def test_existing_report_types_stream_sections_through_the_node_bridge(tmp_path, monkeypatch):
+    fake_bridge(tmp_path, monkeypatch)
+    assert {'morning', 'daily_v2'} <= set(reportWorkerService.load_generator_modules())
+    assert reportWorkerService.REPORT_GENERATORS['daily_v2'] is reportGeneratorsService.generate_daily_v2
+
+    store = MemoryStore()
+    store.add('daily', 'daily_v2', PRIORITY_INTERACTIVE, params={'date': '2025-12-15'})
+    worker = make_worker(store)
+    run_until(worker, store, ['daily'])
+    assert store.jobs['daily']['result'] == {'type': 'daily_v2', 'reportDate': '2025-12-15'}
+    merged = {}
+    for _, progress, partial, _ in store.progress:
+        merged.update(partial or {})
+    assert merged == {name: ['2025-12-15'] for name in reportGeneratorsService.DAILY_V2_SECTIONS}
+    assert progress == 90.0
+
+
+def test_timeout_also_stops_the_bridge_process(tmp_path, monkeypatch):
+    pid_file = fake_bridge(tmp_path, monkeypatch)
+    store = MemoryStore()
+    store.add('slow', 'morning', timeout_seconds=1, params={'date': '2025-12-15', 'pause': 30})
+    worker = make_worker(store)
+    run_until(worker, store, ['slow'])
+    assert store.jobs['slow']['status'] == 'failed'
+
+    bridge_pid = int(pid_file.read_text())
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            os.kill(bridge_pid, 0)
+        except ProcessLookupError:
+            break
+        assert time.monotonic() < deadline, 'script de génération toujours actif'
+        time.sleep(0.05)
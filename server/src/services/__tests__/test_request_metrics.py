@@ -0,0 +1,92 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from requestMetricsService import (  # noqa: E402
+    LatencyHistogram,
+    MetricsMiddleware,
+    RequestMetrics,
+    timed,
+)
+
+
+def test_histogram_percentiles_stay_within_relative_error():
+    rng = random.Random(3)
+    values = [rng.lognormvariate(-5, 1.5) for _ in range(50_000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    for q, estimate in zip((0.5, 0.95, 0.99), histogram.percentiles((0.5, 0.95, 0.99))):
+        exact = values[int(q * len(values)) - 1]
+        assert abs(estimate - exact) / exact < 0.02
+    assert histogram.count == 50_000
+    assert len(histogram.counts) == 1408
+
+
+def call(app, path, method='GET'):
+    statuses = []
+    body = app({'PATH_INFO': path, 'REQUEST_METHOD': method},
+               lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        content = b''.join(body)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return statuses[0], content
+
+
+def test_middleware_records_route_status_and_components():
+    def app(environ, start_response):
+        if environ['PATH_INFO'].startswith('/api/audits/'):
+            environ[MetricsMiddleware.ROUTE_KEY] = '/api/audits/<audit_id>'
+            with timed('db'):
+                pass
+            with timed('db'):
+                pass
+            start_response('200 OK', [])
+            return [b'{}']
+        start_response('404 NOT FOUND', [])
+        return [b'']
+
+    metrics = RequestMetrics()
+    wrapped = MetricsMiddleware(app, metrics)
+    for audit_id in range(3):
+        assert call(wrapped, f'/api/audits/{audit_id}')[0] == '200 OK'
+    call(wrapped, '/inconnu/1')
+    call(wrapped, '/inconnu/2')
+
+    assert metrics.requests[('/api/audits/<audit_id>', 'GET', '200')].count == 3
+    assert metrics.requests[('unmatched', 'GET', '404')].count == 2
+    assert metrics.components[('db', '/api/audits/<audit_id>')].count == 3
+
+    status, text = call(wrapped, '/metrics')
+    text = text.decode()
+    assert status == '200 OK'
+    assert 'http_request_duration_seconds{route="/api/audits/<audit_id>",method="GET",status="200",quantile="0.99"}' in text
+    assert 'http_request_duration_seconds_count{route="unmatched",method="GET",status="404"} 2' in text
+    assert 'http_request_component_seconds_count{component="db",route="/api/audits/<audit_id>"} 3' in text
+
+
+def test_metrics_are_aggregated_across_worker_processes(tmp_path):
+    metrics = RequestMetrics(multiprocess_dir=str(tmp_path), flush_interval=60)
+    metrics.observe('/api/embed', 'POST', '200', 0.010, {'embed': 0.008})
+    metrics.observe('/api/embed', 'POST', '200', 0.020)
+
+    pid = os.fork()
+    if pid == 0:
+        # Worker forké : ses mesures seules, pas celles héritées du parent
+        metrics.observe('/api/embed', 'POST', '200', 2.0, {'embed': 1.9})
+        metrics.flush()
+        os._exit(0 if metrics.requests[('/api/embed', 'POST', '200')].count == 1 else 1)
+    assert os.waitpid(pid, 0)[1] == 0
+
+    text = metrics.render()
+    assert len(list(tmp_path.glob('*.json'))) == 2
+    assert 'http_request_duration_seconds_count{route="/api/embed",method="POST",status="200"} 3' in text
+    assert 'http_request_duration_seconds{route="/api/embed",method="POST",status="200",quantile="0.99"} 2.0' in text
+    assert 'http_request_component_seconds_count{component="embed",route="/api/embed"} 2' in text
+    # Le processus qui répond n'a que ses propres compteurs en mémoire
+    assert metrics.requests[('/api/embed', 'POST', '200')].count == 2
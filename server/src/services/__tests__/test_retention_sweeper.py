@@ -0,0 +1,170 @@
+import os
+import sys
+import threading
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retentionSweeperService import ARCHIVE, DELETE, RetentionSweeper  # noqa: E402
+
+DSN = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'retention_sweeper_test'
+
+pytestmark = pytest.mark.skipif(not DSN, reason='TEST_DATABASE_URL non défini')
+
+
+class Crash(BaseException):
+    """Arrêt brutal du processus pendant un lot (non intercepté comme une erreur de stockage)."""
+
+
+class MemoryStorage:
+    """Double de `SupabaseArchiveStorage` : mêmes emplacements, mêmes cas « déjà fait »."""
+
+    archive_bucket = 'archives'
+
+    def __init__(self, files, failing=(), crash_after=None):
+        self.files = dict(files)
+        self.failing = set(failing)
+        self.crash_after = crash_after
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _call(self, operation, path):
+        with self._lock:
+            if self.crash_after is not None and len(self.calls) >= self.crash_after:
+                raise Crash()
+            self.calls.append((operation, path))
+        if path in self.failing:
+            raise Exception('Gateway timeout')
+
+    def archive(self, bucket, path):
+        self._call('archive', path)
+        location = (self.archive_bucket, f'{bucket}/{path}')
+        if (bucket, path) in self.files:
+            self.files[location] = self.files.pop((bucket, path))
+        return location
+
+    def delete(self, bucket, path):
+        self._call('delete', path)
+        self.files.pop((bucket, path), None)
+
+
+def connect():
+    import psycopg2
+
+    return psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+
+
+def query(sql, params=None):
+    conn = connect()
+    with conn, conn.cursor() as cur:
+        cur.execute(sql, params)
+        rows = cur.fetchall() if cur.description else None
+    conn.close()
+    return rows
+
+
+@pytest.fixture()
+def documents():
+    """Six documents à archiver (règle camelCase comme l'écrit RetentionService) et un hors règle."""
+    import psycopg2
+
+    conn = psycopg2.connect(DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f'SET search_path = {SCHEMA}')
+        cur.execute("""
+            CREATE TABLE "RetentionRules" (id TEXT PRIMARY KEY, "autoArchive" BOOLEAN, "autoDelete" BOOLEAN);
+            CREATE TABLE "DocumentFile" (
+                id UUID PRIMARY KEY, client_id UUID, bucket_name TEXT, file_path TEXT,
+                retention_rule_id TEXT REFERENCES "RetentionRules"(id), archived BOOLEAN NOT NULL DEFAULT false,
+                archived_at TIMESTAMPTZ, archive_date TIMESTAMPTZ, delete_date TIMESTAMPTZ, updated_at TIMESTAMPTZ
+            );
+            CREATE TABLE "RetentionAudit" (
+                id SERIAL PRIMARY KEY, document_id UUID, action TEXT, reason TEXT, performed_by TEXT,
+                performed_at TIMESTAMPTZ, metadata JSONB
+            );
+            CREATE TABLE "Litige" (client_id UUID, status TEXT);
+            CREATE TABLE "ControleFiscal" (client_id UUID, status TEXT);
+            INSERT INTO "RetentionRules" VALUES ('fiscal', true, true), ('manual', false, false);
+        """)
+        migration = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'migrations',
+                                 '20251211_create_retention_job_checkpoint.sql')
+        cur.execute(open(migration, encoding='utf-8').read().replace('BEGIN;', '').replace('COMMIT;', ''))
+
+        ids = sorted(str(uuid.uuid4()) for _ in range(7))
+        for i, document_id in enumerate(ids):
+            cur.execute("""
+                INSERT INTO "DocumentFile" (id, client_id, bucket_name, file_path, retention_rule_id,
+                                            archive_date, delete_date)
+                VALUES (%s, %s, 'documents', %s, %s, NOW() - interval '1 day', NOW() + interval '1 year')
+            """, (document_id, str(uuid.uuid4()), f'client/{i}.pdf', 'manual' if i == 6 else 'fiscal'))
+    conn.close()
+    yield ids
+
+
+def make_sweeper(storage):
+    return RetentionSweeper(connection_factory=connect, storage=storage, max_workers=1, batch_size=2)
+
+
+def stored_files(ids):
+    return {('documents', f'client/{i}.pdf'): f'pdf {i}'.encode() for i in range(len(ids))}
+
+
+def test_archive_records_new_location_and_partial_failures_are_retried(documents):
+    storage = MemoryStorage(stored_files(documents), failing={'client/1.pdf'})
+    stats = make_sweeper(storage).sweep(ARCHIVE)
+    assert stats == {'processed': 5, 'failed': 1, 'batches': 3}
+
+    rows = dict((str(r[0]), r[1:]) for r in query(
+        'SELECT id, archived, bucket_name, file_path FROM "DocumentFile"'))
+    assert rows[documents[0]] == (True, 'archives', 'documents/client/0.pdf')
+    assert storage.files[('archives', 'documents/client/0.pdf')] == b'pdf 0'
+    assert rows[documents[1]] == (False, 'documents', 'client/1.pdf')
+    assert rows[documents[6]] == (False, 'documents', 'client/6.pdf')  # autoArchive = false
+    failures = query("""SELECT document_id, metadata->>'error' FROM "RetentionAudit"
+                        WHERE reason = 'automatic_retention_failed'""")
+    assert [(str(d), e) for d, e in failures] == [(documents[1], 'Gateway timeout')]
+    assert query('SELECT count(*) FROM "RetentionJobCheckpoint"') == [(0,)]
+
+    # Le passage suivant ne reprend que le document en échec
+    storage.failing.clear()
+    storage.calls.clear()
+    assert make_sweeper(storage).sweep(ARCHIVE)['processed'] == 1
+    assert storage.calls == [('archive', 'client/1.pdf')]
+    assert make_sweeper(storage).sweep(ARCHIVE) == {'processed': 0, 'failed': 0, 'batches': 0}
+
+
+def test_crash_resumes_after_last_committed_batch_and_replay_is_harmless(documents):
+    storage = MemoryStorage(stored_files(documents), crash_after=3)
+    with pytest.raises(Crash):
+        make_sweeper(storage).sweep(ARCHIVE)
+    # Lot 1 validé ; le document 2 a été déplacé mais son lot n'a pas été validé
+    assert [str(r[0]) for r in query('SELECT last_document_id FROM "RetentionJobCheckpoint"')] == [documents[1]]
+    assert query('SELECT count(*) FROM "DocumentFile" WHERE archived') == [(2,)]
+
+    storage.crash_after = None
+    storage.calls.clear()
+    assert make_sweeper(storage).sweep(ARCHIVE)['processed'] == 4
+    assert [path for _, path in storage.calls] == [f'client/{i}.pdf' for i in range(2, 6)]
+    # Le fichier déjà déplacé avant le crash pointe bien vers l'archive
+    assert query('SELECT bucket_name, file_path FROM "DocumentFile" WHERE id = %s', (documents[2],)) == [
+        ('archives', 'documents/client/2.pdf')]
+    assert query('SELECT count(*) FROM "RetentionAudit" WHERE action = %s', (ARCHIVE,)) == [(6,)]
+
+
+def test_delete_uses_archived_location_and_respects_exceptions(documents):
+    storage = MemoryStorage(stored_files(documents))
+    make_sweeper(storage).sweep(ARCHIVE)
+    query('UPDATE "DocumentFile" SET delete_date = NOW() - interval \'1 day\'')
+    query('INSERT INTO "Litige" SELECT client_id, \'en_cours\' FROM "DocumentFile" WHERE id = %s', (documents[0],))
+
+    storage.calls.clear()
+    assert make_sweeper(storage).sweep(DELETE)['processed'] == 5
+    assert ('delete', 'documents/client/3.pdf') in storage.calls
+    assert set(storage.files) == {('archives', 'documents/client/0.pdf'), ('documents', 'client/6.pdf')}
+    remaining = sorted(str(r[0]) for r in query('SELECT id FROM "DocumentFile"'))
+    assert remaining == [documents[0], documents[6]]
@@ -0,0 +1,167 @@
+import base64
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamingEncryptionService import (  # noqa: E402
+    EncryptionError,
+    HEADER_LENGTH,
+    KeyCache,
+    StreamingEncryptionService,
+    WRAPPING_AES_GCM_AAD,
+    WRAPPING_NODE_LEGACY,
+)
+
+# Clé écrite par storeKey (encryption-service.ts, Node 20) : crypto.createCipher('aes-256-gcm',
+# clé maître 0x07 * 32) sur la clé de données 0x09 * 32, IV aléatoire en AAD
+NODE_MASTER_KEY = bytes([7]) * 32
+NODE_DATA_KEY = bytes([9]) * 32
+NODE_ENCRYPTED_KEY = base64.b64decode('LxPQxq5/q1wzRPAcso26Q6B439456ZCxoEH3tDxkv4mTrllpJGMlNAXDN1uIAOxY')
+NODE_IV = base64.b64decode('RPL4rPCmB+iH7cM/UWyW1g==')
+
+
+class InMemoryKeyStore:
+    """Double de `EncryptionKeyStore` sans base de données."""
+
+    def __init__(self):
+        self.rows = {}
+        self.fetch_count = 0
+
+    def insert_key(self, key_id, wrapped_key, nonce, key_version, encryption_level, user_id, document_id):
+        self.rows[key_id] = {'id': key_id, 'wrapped_key': wrapped_key, 'nonce': nonce,
+                             'key_version': key_version, 'key_wrapping': WRAPPING_AES_GCM_AAD,
+                             'user_id': user_id}
+
+    def insert_node_key(self, key_id, wrapped_key, iv, user_id, key_version='v1'):
+        self.rows[key_id] = {'id': key_id, 'wrapped_key': wrapped_key, 'nonce': iv,
+                             'key_version': key_version, 'key_wrapping': WRAPPING_NODE_LEGACY,
+                             'user_id': user_id}
+
+    def fetch_key(self, key_id):
+        self.fetch_count += 1
+        row = self.rows.get(key_id)
+        return dict(row) if row else None
+
+    def fetch_keys_by_version(self, key_version, after_id, limit):
+        rows = sorted((r for r in self.rows.values() if r['key_version'] == key_version),
+                      key=lambda r: r['id'])
+        if after_id:
+            rows = [r for r in rows if r['id'] > after_id]
+        return [dict(r) for r in rows[:limit]]
+
+    def update_wrapped_keys(self, updates):
+        for key_id, wrapped, nonce, version in updates:
+            self.rows[key_id].update(wrapped_key=wrapped, nonce=nonce, key_version=version,
+                                     key_wrapping=WRAPPING_AES_GCM_AAD)
+
+
+def make_service(store=None, version='v1', keyring=None, segment_size=1024):
+    keyring = keyring or {'v1': os.urandom(32)}
+    return StreamingEncryptionService(key_store=store or InMemoryKeyStore(),
+                                      master_keys=(version, keyring),
+                                      segment_size=segment_size)
+
+
+@pytest.mark.parametrize('size', [0, 1, 1023, 1024, 1025, 4096, 10_000])
+def test_roundtrip_and_ranges(size):
+    service = make_service()
+    plaintext = os.urandom(size)
+    encrypted = io.BytesIO()
+    meta = service.encrypt_document(io.BytesIO(plaintext), encrypted, 'user-1', 'doc-1')
+
+    restored = io.BytesIO()
+    service.decrypt_document(meta['encryptionKey'], 'user-1', io.BytesIO(encrypted.getvalue()), restored)
+    assert restored.getvalue() == plaintext
+
+    data_key = service.retrieve_key(meta['encryptionKey'], 'user-1')
+    for offset, length in [(0, 10), (1000, 50), (size - 5, 20), (size + 10, 5), (0, size)]:
+        offset = max(offset, 0)
+        got = service.decrypt_range(data_key, io.BytesIO(encrypted.getvalue()), offset, length)
+        assert got == plaintext[offset:offset + length]
+
+
+def test_tampering_and_truncation_are_detected():
+    service = make_service()
+    key_id, data_key = service.create_data_key('user-1', 'doc-1')
+    encrypted = io.BytesIO()
+    service.encrypt_stream(data_key, io.BytesIO(os.urandom(3000)), encrypted)
+    blob = encrypted.getvalue()
+
+    tampered = bytearray(blob)
+    tampered[HEADER_LENGTH + 5] ^= 1
+    with pytest.raises(EncryptionError):
+        b''.join(service.decrypt_stream(data_key, io.BytesIO(bytes(tampered))))
+
+    # Suppression du dernier segment : l'avant-dernier n'est pas marqué "dernier"
+    truncated = blob[:HEADER_LENGTH + 2 * (1024 + 16)]
+    with pytest.raises(EncryptionError):
+        b''.join(service.decrypt_stream(data_key, io.BytesIO(truncated)))
+
+
+def test_key_cache_and_access_control():
+    store = InMemoryKeyStore()
+    service = make_service(store)
+    key_id, data_key = service.create_data_key('user-1', 'doc-1')
+    service.key_cache.invalidate()
+
+    assert service.retrieve_key(key_id, 'user-1') == data_key
+    assert service.retrieve_key(key_id, 'user-1') == data_key
+    assert store.fetch_count == 1
+    with pytest.raises(EncryptionError):
+        service.retrieve_key(key_id, 'user-2')
+
+
+def test_key_cache_is_bounded_and_expires():
+    now = [0.0]
+    cache = KeyCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    cache.put('a', b'1', 'u')
+    cache.put('b', b'2', 'u')
+    cache.get('a')
+    cache.put('c', b'3', 'u')
+    assert cache.get('b') is None
+    assert cache.get('a') == (b'1', 'u')
+    now[0] = 11
+    assert cache.get('a') is None
+
+
+def test_rotate_keys_rewraps_without_touching_content():
+    store = InMemoryKeyStore()
+    old_master, new_master = os.urandom(32), os.urandom(32)
+    service = make_service(store, 'v1', {'v1': old_master})
+    plaintext = os.urandom(5000)
+    encrypted = io.BytesIO()
+    meta = service.encrypt_document(io.BytesIO(plaintext), encrypted, 'user-1', 'doc-1')
+
+    rotated_service = make_service(store, 'v2', {'v1': old_master, 'v2': new_master})
+    assert rotated_service.rotate_keys('v1', batch_size=1) == 1
+    assert store.rows[meta['encryptionKey']]['key_version'] == 'v2'
+
+    only_new = make_service(store, 'v2', {'v2': new_master})
+    restored = io.BytesIO()
+    only_new.decrypt_document(meta['encryptionKey'], 'user-1', io.BytesIO(encrypted.getvalue()), restored)
+    assert restored.getvalue() == plaintext
+
+
+def test_node_wrapped_keys_are_read_and_converted_by_rotation():
+    store = InMemoryKeyStore()
+    store.insert_node_key('00000000-0000-4000-8000-000000000001', NODE_ENCRYPTED_KEY, NODE_IV, 'user-1')
+    store.insert_node_key('00000000-0000-4000-8000-000000000002', b'\x00' * 48, NODE_IV, 'user-1')
+    python_key_id, python_data_key = make_service(store, 'v1', {'v1': NODE_MASTER_KEY}).create_data_key('user-1', 'doc')
+
+    legacy = make_service(store, 'v1', {'v1': NODE_MASTER_KEY})
+    assert legacy.retrieve_key('00000000-0000-4000-8000-000000000001', 'user-1') == NODE_DATA_KEY
+
+    # La clé corrompue est signalée et laissée en place, les autres sont ré-enveloppées
+    new_master = os.urandom(32)
+    rotated = make_service(store, 'v2', {'v1': NODE_MASTER_KEY, 'v2': new_master})
+    assert rotated.rotate_keys('v1', batch_size=1) == 2
+    assert store.rows['00000000-0000-4000-8000-000000000001']['key_wrapping'] == WRAPPING_AES_GCM_AAD
+    assert store.rows['00000000-0000-4000-8000-000000000002']['key_version'] == 'v1'
+
+    only_new = make_service(store, 'v2', {'v2': new_master})
+    assert only_new.retrieve_key('00000000-0000-4000-8000-000000000001', 'user-1') == NODE_DATA_KEY
+    assert only_new.retrieve_key(python_key_id, 'user-1') == python_data_key
@@ -0,0 +1,197 @@
+import os
+import sys
+import threading
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workflowEngineService import (  # noqa: E402
+    STEP_NOTIFICATION,
+    CompiledWorkflow,
+    OutboxDispatcher,
+    WorkflowEngine,
+    WorkflowStore,
+)
+
+DSN = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'workflow_engine_test'
+
+TEMPLATE = {
+    'id': 'audit_v1',
+    'version': '1.0',
+    'steps': [
+        {'id': 'analyse', 'order': 2, 'conditions': ['if_expert_assigned'], 'actions': ['calculate_commission']},
+        {'id': 'collecte', 'order': 1, 'conditions': ['always'], 'actions': ['create_task'],
+         'action_params': {'task_title': 'Collecte'},
+         'notifications': {'on_complete': True, 'recipients': ['client'], 'template': 'collecte'}},
+        {'id': 'validation', 'order': 3, 'conditions': ['if_amount_greater_than'],
+         'condition_params': {'threshold': 10000}, 'actions': ['generate_invoice', 'send_notification']},
+    ]
+}
+
+
+def test_template_compiles_to_ordered_transitions():
+    workflow = CompiledWorkflow(TEMPLATE)
+    assert [s.step_id for s in workflow.steps] == ['collecte', 'analyse', 'validation']
+    assert [s.next_step for s in workflow.steps] == [1, 2, None]
+    # Actions sans effet côté Node non déposées
+    assert workflow.steps[1].actions == ()
+
+    instance = {'status': 'pending', 'current_step': 1, 'expert_id': None}
+    assert workflow.transition(instance, 1, None) == (None, 'Conditions de workflow non remplies')
+    assert workflow.transition({**instance, 'expert_id': 'e'}, 1, None)[0].step_id == 'analyse'
+    assert workflow.transition(instance, 0, None)[1] == "Étape différente de l'étape courante"
+    assert workflow.transition({**instance, 'current_step': 2}, 2, {'amount': 500})[0] is None
+    assert workflow.transition({**instance, 'current_step': 2}, 2, {'amount': 20000})[0].step_id == 'validation'
+
+
+class MemoryStore:
+    def __init__(self, instances):
+        self.instances = instances
+        self.template_loads = 0
+        self.writes = []
+        self.outbox = []
+        self.settled = {'done': [], 'retry': [], 'failed': []}
+
+    def load_templates(self, template_ids):
+        self.template_loads += 1
+        return {TEMPLATE['id']: TEMPLATE} if TEMPLATE['id'] in template_ids else {}
+
+    def transition(self, instance_ids, apply):
+        states, outbox = apply({i: dict(self.instances[i]) for i in instance_ids if i in self.instances})
+        self.writes.append(states)
+        for instance_id, status, current_step in states:
+            self.instances[instance_id].update(status=status, current_step=current_step)
+        self.outbox.extend({'id': len(self.outbox) + n, 'action': a, 'payload': p, 'attempts': 1}
+                           for n, (_, _, a, p) in enumerate(outbox))
+
+    def claim(self, limit, lease_seconds):
+        claimed, self.outbox = self.outbox[:limit], self.outbox[limit:]
+        return claimed
+
+    def settle(self, done, retry, failed):
+        self.settled['done'] += done
+        self.settled['retry'] += retry
+        self.settled['failed'] += failed
+
+
+def _instance(instance_id, **fields):
+    row = {'id': instance_id, 'template_id': 'audit_v1', 'status': 'pending', 'current_step': 0,
+           'expert_id': 'expert', 'client_id': 'client', 'document_id': 'doc'}
+    row.update(fields)
+    return row
+
+
+def test_batch_writes_each_instance_once():
+    store = MemoryStore({'a': _instance('a'), 'b': _instance('b', expert_id=None), 'c': _instance('c')})
+    engine = WorkflowEngine(store)
+    outcomes = engine.execute_steps([
+        {'instance_id': 'a', 'step_number': 0},
+        {'instance_id': 'a', 'step_number': 1},
+        {'instance_id': 'a', 'step_number': 2, 'result': {'amount': 15000}},
+        {'instance_id': 'b', 'step_number': 0},
+        {'instance_id': 'b', 'step_number': 1},
+        {'instance_id': 'c', 'step_number': 0},
+        {'instance_id': 'c', 'step_number': 0},
+        {'instance_id': 'z', 'step_number': 0},
+    ])
+    assert [o['ok'] for o in outcomes] == [True, True, True, True, False, True, False, False]
+    assert outcomes[2]['status'] == 'completed'
+    assert outcomes[7]['error'] == 'Instance de workflow non trouvée'
+    assert len(store.writes) == 1
+    assert sorted(store.writes[0]) == [('a', 'completed', 2), ('b', 'in_progress', 1), ('c', 'in_progress', 1)]
+    actions = [row['action'] for row in store.outbox]
+    assert actions.count('create_task') == 3 and actions.count(STEP_NOTIFICATION) == 3
+    assert actions.count('generate_invoice') == 1
+
+    engine.execute_step('c', 1)
+    assert store.template_loads == 1
+
+
+def test_dispatcher_runs_actions_concurrently_and_retries():
+    store = MemoryStore({})
+    store.outbox = [{'id': i, 'action': 'send_notification', 'payload': {'n': i}, 'attempts': 1 + (i == 3) * 4}
+                    for i in range(6)]
+    barrier = threading.Barrier(3, timeout=5)
+
+    def send(payload):
+        if payload['n'] < 3:
+            # Trois actions du même lot en cours simultanément
+            barrier.wait()
+        if payload['n'] in (3, 4):
+            raise RuntimeError('SMTP indisponible')
+
+    dispatcher = OutboxDispatcher(store, {'send_notification': send}, workers=3, autostart=False)
+    assert dispatcher.drain() == 6
+    dispatcher.close()
+    assert sorted(store.settled['done']) == [0, 1, 2, 5]
+    assert store.settled['failed'] == [(3, 'SMTP indisponible')]
+    assert store.settled['retry'] == [(4, 'SMTP indisponible', 30)]
+
+
+@pytest.mark.skipif(not DSN, reason='TEST_DATABASE_URL non défini')
+def test_transitions_and_outbox_in_database():
+    import psycopg2
+
+    migration = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'migrations',
+                             '20251222_create_workflow_outbox.sql')
+    admin = psycopg2.connect(DSN)
+    with admin, admin.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f'SET search_path = {SCHEMA}')
+        cur.execute("""
+            CREATE TABLE "WorkflowTemplate" (id TEXT PRIMARY KEY, version TEXT);
+            CREATE TABLE "WorkflowStep" (
+                id TEXT PRIMARY KEY, workflow_id TEXT, name TEXT, "order" INT, required BOOLEAN,
+                conditions TEXT[], condition_params JSONB, actions TEXT[], action_params JSONB, notifications JSONB
+            );
+            CREATE TABLE "WorkflowInstance" (
+                id UUID PRIMARY KEY, template_id TEXT, document_id UUID, client_id UUID, expert_id UUID,
+                status TEXT, current_step INT, completed_at TIMESTAMPTZ
+            );
+        """)
+        with open(migration) as f:
+            cur.execute(f.read().replace('BEGIN;', '').replace('COMMIT;', ''))
+    admin.close()
+
+    def connect():
+        return psycopg2.connect(DSN, options=f'-csearch_path={SCHEMA}')
+
+    from psycopg2.extras import Json
+
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    conn = connect()
+    with conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO \"WorkflowTemplate\" VALUES ('audit_v1', '1.0')")
+        for step in TEMPLATE['steps']:
+            cur.execute('INSERT INTO "WorkflowStep" VALUES (%s, %s, %s, %s, true, %s, %s, %s, %s, %s)',
+                        (step['id'], 'audit_v1', step['id'], step['order'], step['conditions'],
+                         Json(step.get('condition_params', {})), step['actions'],
+                         Json(step.get('action_params', {})), Json(step.get('notifications', {}))))
+        for instance_id in ids:
+            cur.execute("INSERT INTO \"WorkflowInstance\" VALUES (%s, 'audit_v1', NULL, NULL, %s, 'pending', 0)",
+                        (instance_id, str(uuid.uuid4())))
+    conn.close()
+
+    store = WorkflowStore(connect)
+    engine = WorkflowEngine(store)
+    events = [{'instance_id': i, 'step_number': n, 'result': {'amount': 20000}} for i in ids for n in range(3)]
+    assert all(o['ok'] for o in engine.execute_steps(events))
+
+    sent = []
+    dispatcher = OutboxDispatcher(store, {'create_task': sent.append, 'generate_invoice': sent.append},
+                                  workers=4, batch_size=4, autostart=False)
+    assert dispatcher.drain() == 12
+    dispatcher.close()
+    assert len(sent) == 6
+
+    conn = connect()
+    with conn, conn.cursor() as cur:
+        cur.execute('SELECT status, current_step, completed_at IS NOT NULL FROM "WorkflowInstance"')
+        assert cur.fetchall() == [('completed', 2, True)] * 3
+        cur.execute('SELECT status, count(*) FROM workflow_outbox GROUP BY status')
+        assert dict(cur.fetchall()) == {'done': 12}
+    conn.close()
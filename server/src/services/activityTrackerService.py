@@ -0,0 +1,236 @@
+"""
+Suivi de `last_activity_at` avec écritures regroupées.
+
+`updateClientActivityMiddleware` (middleware/client-activity.ts) lance un
+UPDATE "Client" par requête authentifiée : un client qui navigue dans son
+tableau de bord écrit des dizaines de fois la même valeur par minute.
+
+`ActivityTracker` garde en mémoire la dernière activité de chaque
+utilisateur (client, expert, apporteur) et ne la marque à écrire que si elle
+avance d'au moins `resolution_seconds` par rapport à la valeur déjà écrite.
+Les utilisateurs modifiés sont écrits par un seul
+`UPDATE … FROM (VALUES …)` par table, à intervalle régulier et à l'arrêt.
+
+Un identifiant qui n'est pas un UUID est refusé dès `record` : une seule
+valeur invalide ferait échouer le cast `::uuid` de tout le lot de sa table.
+Un lot rejeté par la base pour une erreur de données est abandonné, pas
+remis en file.
+"""
+
+import atexit
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Type d'utilisateur -> table portant last_activity_at
+USER_TABLES = {
+    'client': 'Client',
+    'expert': 'Expert',
+    'apporteur': 'ApporteurAffaires'
+}
+
+# Mêmes exclusions que updateClientActivityMiddleware
+EXCLUDED_PATHS = ('/api/auth/login', '/api/auth/logout', '/api/auth/verify', '/api/auth/refresh')
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def should_track(path: str) -> bool:
+    return not any(path.startswith(excluded) for excluded in EXCLUDED_PATHS)
+
+
+def canonical_uuid(value: Any) -> Optional[str]:
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def is_data_error(error: Exception) -> bool:
+    """SQLSTATE de classe 22 (valeur invalide) : le même lot échouerait à chaque essai."""
+    return str(getattr(error, 'pgcode', None) or '').startswith('22')
+
+
+class ActivityStore:
+    """Écriture groupée de last_activity_at, une requête par table."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self._connect = connection_factory
+
+    def write(self, table: str, rows: List[Tuple[str, datetime]]) -> int:
+        from psycopg2.extras import execute_values
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                # Ne jamais reculer une valeur écrite par un autre processus
+                execute_values(cur, f"""
+                    UPDATE "{table}" AS t
+                    SET last_activity_at = v.at
+                    FROM (VALUES %s) AS v(id, at)
+                    WHERE t.id = v.id
+                      AND (t.last_activity_at IS NULL OR t.last_activity_at < v.at)
+                """, rows, template='(%s::uuid, %s::timestamptz)', page_size=1000)
+                updated = cur.rowcount
+            conn.commit()
+            return updated
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+class ActivityTracker:
+    """Dernière activité par utilisateur, écrite en différé et dédoublonnée."""
+
+    def __init__(self, store: Optional[ActivityStore] = None, resolution_seconds: float = 60,
+                 flush_interval_seconds: float = 30, clock: Callable[[], datetime] = _utcnow,
+                 autostart: bool = True):
+        self.store = store or ActivityStore()
+        self.resolution = resolution_seconds
+        self.flush_interval = flush_interval_seconds
+        self.clock = clock
+        self._dirty: Dict[Tuple[str, str], datetime] = {}
+        self._written: Dict[Tuple[str, str], datetime] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'recorded': 0, 'skipped': 0, 'rejected': 0, 'flushes': 0, 'rows_written': 0,
+                      'errors': 0}
+        if autostart:
+            self.start()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='activity-tracker', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def record(self, user_type: str, user_id: str, at: Optional[datetime] = None) -> bool:
+        """Note une activité ; retourne False si elle tombe dans la résolution déjà écrite."""
+        if user_type not in USER_TABLES or not user_id:
+            return False
+        user_id = canonical_uuid(user_id)
+        if user_id is None:
+            with self._lock:
+                self.stats['rejected'] += 1
+            return False
+        at = at or self.clock()
+        key = (user_type, user_id)
+        with self._lock:
+            self.stats['recorded'] += 1
+            written = self._written.get(key)
+            pending = self._dirty.get(key)
+            if pending is not None:
+                if at > pending:
+                    self._dirty[key] = at
+                return True
+            if written is not None and (at - written).total_seconds() < self.resolution:
+                self.stats['skipped'] += 1
+                return False
+            self._dirty[key] = at
+            return True
+
+    def flush(self) -> int:
+        """Écrit toutes les activités en attente ; retourne le nombre de lignes envoyées."""
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return 0
+            by_type: Dict[str, List[Tuple[str, datetime]]] = {}
+            for (user_type, user_id), at in dirty.items():
+                by_type.setdefault(user_type, []).append((user_id, at))
+
+            written = 0
+            failed: Dict[Tuple[str, str], datetime] = {}
+            dropped = set()
+            for user_type, rows in by_type.items():
+                table = USER_TABLES[user_type]
+                # Lignes triées par id : même ordre de verrouillage pour tous les workers
+                rows.sort()
+                try:
+                    self.store.write(table, rows)
+                    written += len(rows)
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    print(f'Erreur mise à jour last_activity_at ({table}) : {str(e)}')
+                    if is_data_error(e):
+                        self.stats['rejected'] += len(rows)
+                        dropped.update((user_type, user_id) for user_id, _ in rows)
+                        continue
+                    failed.update({(user_type, user_id): at for user_id, at in rows})
+
+            with self._lock:
+                for key, at in dirty.items():
+                    if key not in failed and key not in dropped:
+                        self._written[key] = at
+                # Les échecs reviennent dans le tampon, sans écraser une activité plus récente
+                for key, at in failed.items():
+                    if key not in self._dirty or self._dirty[key] < at:
+                        self._dirty[key] = at
+                self._prune()
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += written
+            return written
+
+    def _prune(self) -> None:
+        # Au-delà de la résolution, la valeur écrite ne sert plus au dédoublonnage
+        now = self.clock()
+        expired = [key for key, at in self._written.items() if (now - at).total_seconds() >= self.resolution]
+        for key in expired:
+            del self._written[key]
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f'Erreur écriture des activités : {str(e)}')
+
+
+def init_app(app, tracker: ActivityTracker) -> None:
+    """Enregistre l'activité des requêtes authentifiées d'une application Flask.
+
+    Le type d'utilisateur est lu dans les claims JWT (`type` ou `user_type`).
+    """
+    from flask import request
+    from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+
+    @app.after_request
+    def record_activity(response):
+        if response.status_code < 400 and should_track(request.path):
+            try:
+                if verify_jwt_in_request(optional=True):
+                    claims = get_jwt()
+                    user_type = claims.get('type') or claims.get('user_type')
+                    user_id = claims.get('database_id') or get_jwt_identity()
+                    tracker.record(user_type, user_id)
+            except Exception:
+                pass
+        return response
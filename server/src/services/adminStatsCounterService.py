@@ -0,0 +1,408 @@
+"""
+Compteurs de statistiques admin (notifications, RDV) maintenus par deltas.
+
+`ReportMaterializedViewsService.getNotificationStats` / `getRDVStats`
+(report-materialized-views.ts) recomptent toute la table "notification" ou
+"RDV" à chaque appel (`initializeViews` n'installe rien, le calcul direct est
+la règle), alors que les en-têtes du tableau de bord admin les interrogent en
+continu.
+
+`StatsCounterMaintainer` tient ces compteurs dans `stats_counters` :
+
+- chaque insertion / mise à jour / suppression connue (ancienne et nouvelle
+  ligne) est traduite en deltas, cumulés en mémoire puis écrits en un upsert ;
+- `reconcile()` recompte tout et remplace les compteurs, sur un rythme lent :
+  il corrige les écritures faites hors de ce processus (Node, SQL manuel) ;
+- la lecture des statistiques est une requête sur quelques dizaines de lignes,
+  plus un comptage borné aux RDV en attente du jour pour les retards.
+
+Un seul processus recompte à la fois (verrou consultatif exclusif, partagé par
+les écritures de deltas), et pas plus d'une fois par intervalle pour tous les
+processus. Chaque portée garde l'heure de début de son dernier comptage
+(portée `recount`) : les deltas enregistrés avant, dans n'importe quel
+processus, sont déjà comptés et sont écartés à l'écriture au lieu d'être
+appliqués une seconde fois.
+
+Périmètre notifications : celui de `get_notification_stats()` — admin,
+`hidden_in_list = false`, `status <> 'replaced'`, hors types RDV, non lues
+`is_read = false` ; une valeur NULL sort donc du périmètre, comme en SQL.
+"""
+
+import atexit
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+NOTIFICATION_SCOPE = 'admin_notification'
+RDV_SCOPE = 'rdv'
+RECOUNT_SCOPE = 'recount'
+RECOUNT_LOCK = 'stats_counters_recount'
+
+# Heure de début du comptage d'une portée (même instruction, donc même instantané)
+RECOUNT_MARK = f"""
+    marked AS (
+        INSERT INTO stats_counters (scope, key, value, updated_at)
+        VALUES ('{RECOUNT_SCOPE}', %(scope)s, 1, statement_timestamp())
+        ON CONFLICT (scope, key) DO UPDATE
+        SET value = stats_counters.value + 1, updated_at = EXCLUDED.updated_at
+    )
+"""
+EXCLUDED_NOTIFICATION_TYPES = ('rdv_reminder', 'rdv_confirmed', 'rdv_cancelled')
+PENDING_RDV_STATUSES = ('proposed', 'scheduled')
+
+Deltas = Dict[Tuple[str, str], int]
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def _day(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()[:10]
+    return str(value)[:10]
+
+
+def notification_keys(row: Optional[Dict[str, Any]]) -> List[str]:
+    """Compteurs auxquels une ligne "notification" contribue (aucun hors périmètre)."""
+    if (not row or row.get('user_type') != 'admin' or row.get('hidden_in_list') is not False
+            or row.get('status') in (None, 'replaced') or not row.get('notification_type')
+            or row.get('notification_type') in EXCLUDED_NOTIFICATION_TYPES):
+        return []
+    keys = ['total', f"type:{row.get('notification_type')}"]
+    if row.get('is_read') is False:
+        keys.append('unread')
+    if row.get('priority') == 'high':
+        keys.append('high_priority')
+    elif row.get('priority') == 'urgent':
+        keys.append('urgent')
+    if row.get('status') == 'late':
+        keys.append('overdue')
+    return keys
+
+
+def rdv_keys(row: Optional[Dict[str, Any]]) -> List[str]:
+    """Compteurs auxquels une ligne "RDV" contribue."""
+    if not row:
+        return []
+    day = _day(row.get('scheduled_date'))
+    keys = [f"status:{row['status']}"] if row.get('status') else []
+    if day:
+        keys.append(f'date:{day}')
+        if row.get('status') in PENDING_RDV_STATUSES:
+            keys.append(f'pending_date:{day}')
+    return keys
+
+
+def row_deltas(scope: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> Deltas:
+    keys_for = notification_keys if scope == NOTIFICATION_SCOPE else rdv_keys
+    deltas: Deltas = {}
+    for key in keys_for(old):
+        deltas[(scope, key)] = deltas.get((scope, key), 0) - 1
+    for key in keys_for(new):
+        deltas[(scope, key)] = deltas.get((scope, key), 0) + 1
+    return {k: v for k, v in deltas.items() if v}
+
+
+def net_deltas(batches: Iterable[Tuple[float, Deltas]], recounted_at: Dict[str, float]) -> Deltas:
+    """Somme des deltas enregistrés après le dernier recomptage de leur portée."""
+    net: Deltas = {}
+    for recorded_at, deltas in batches:
+        for (scope, key), delta in deltas.items():
+            if recorded_at <= recounted_at.get(scope, float('-inf')):
+                continue  # écriture déjà incluse dans le recomptage
+            net[(scope, key)] = net.get((scope, key), 0) + delta
+    return {k: v for k, v in net.items() if v}
+
+
+class StatsCounterStore:
+    """Table `stats_counters` et recomptage complet."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self._connect = connection_factory
+
+    def apply(self, batches: List[Tuple[float, Deltas]]) -> int:
+        """Écrit les deltas (heure d'enregistrement, deltas) postérieurs au dernier recomptage.
+
+        Returns:
+            int: Le nombre de compteurs modifiés
+        """
+        from psycopg2.extras import execute_values
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                # Partagé entre écritures, exclusif pendant un recomptage
+                cur.execute('SELECT pg_advisory_xact_lock_shared(hashtext(%s))', (RECOUNT_LOCK,))
+                cur.execute('SELECT key, extract(epoch FROM updated_at) FROM stats_counters WHERE scope = %s',
+                            (RECOUNT_SCOPE,))
+                deltas = net_deltas(batches, {key: float(at) for key, at in cur.fetchall()})
+                if deltas:
+                    # Clés triées : même ordre de verrouillage pour tous les processus
+                    execute_values(cur, """
+                        INSERT INTO stats_counters (scope, key, value, updated_at)
+                        VALUES %s
+                        ON CONFLICT (scope, key) DO UPDATE
+                        SET value = stats_counters.value + EXCLUDED.value, updated_at = EXCLUDED.updated_at
+                    """, [(scope, key, delta) for (scope, key), delta in sorted(deltas.items())],
+                        template='(%s, %s, %s, NOW())', page_size=1000)
+            conn.commit()
+            return len(deltas)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def recount(self, min_interval_seconds: float = 0) -> Optional[int]:
+        """Remplace tous les compteurs par un recomptage, en une transaction.
+
+        Returns:
+            Optional[int]: Le nombre de compteurs écrits, ou None si un autre processus
+            recompte ou l'a fait il y a moins de `min_interval_seconds`
+        """
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT pg_try_advisory_xact_lock(hashtext(%s))', (RECOUNT_LOCK,))
+                if not cur.fetchone()[0]:
+                    conn.rollback()
+                    return None
+                cur.execute("""
+                    SELECT NOW() - min(updated_at) < make_interval(secs => %s)
+                    FROM stats_counters WHERE scope = %s
+                """, (min_interval_seconds, RECOUNT_SCOPE))
+                if cur.fetchone()[0]:
+                    conn.rollback()
+                    return None
+                cur.execute('DELETE FROM stats_counters WHERE scope IN (%s, %s)', (NOTIFICATION_SCOPE, RDV_SCOPE))
+                cur.execute(f"""
+                    WITH scoped AS (
+                        SELECT notification_type, is_read, priority, status
+                        FROM notification
+                        WHERE user_type = 'admin'
+                          AND hidden_in_list = false
+                          AND status <> 'replaced'
+                          AND notification_type <> ALL(%(excluded)s)
+                    ), {RECOUNT_MARK}
+                    INSERT INTO stats_counters (scope, key, value, updated_at)
+                    SELECT %(scope)s, key, value, NOW() FROM (
+                        SELECT 'total' AS key, count(*) AS value FROM scoped
+                        UNION ALL SELECT 'unread', count(*) FILTER (WHERE is_read = false) FROM scoped
+                        UNION ALL SELECT 'high_priority', count(*) FILTER (WHERE priority = 'high') FROM scoped
+                        UNION ALL SELECT 'urgent', count(*) FILTER (WHERE priority = 'urgent') FROM scoped
+                        UNION ALL SELECT 'overdue', count(*) FILTER (WHERE status = 'late') FROM scoped
+                        UNION ALL SELECT 'type:' || notification_type, count(*) FROM scoped GROUP BY notification_type
+                    ) AS counts
+                    WHERE value > 0
+                """, {'scope': NOTIFICATION_SCOPE, 'excluded': list(EXCLUDED_NOTIFICATION_TYPES)})
+                written = cur.rowcount
+                cur.execute(f"""
+                    WITH {RECOUNT_MARK}
+                    INSERT INTO stats_counters (scope, key, value, updated_at)
+                    SELECT %(scope)s, key, count(*), NOW() FROM (
+                        SELECT 'status:' || status AS key FROM "RDV" WHERE status IS NOT NULL
+                        UNION ALL
+                        SELECT 'date:' || to_char(scheduled_date, 'YYYY-MM-DD') FROM "RDV"
+                        WHERE scheduled_date IS NOT NULL
+                        UNION ALL
+                        SELECT 'pending_date:' || to_char(scheduled_date, 'YYYY-MM-DD') FROM "RDV"
+                        WHERE scheduled_date IS NOT NULL AND status = ANY(%(pending)s)
+                    ) AS keys
+                    GROUP BY key
+                """, {'scope': RDV_SCOPE, 'pending': list(PENDING_RDV_STATUSES)})
+                written += cur.rowcount
+            conn.commit()
+            return written
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def read(self) -> Tuple[Dict[str, Dict[str, int]], str, int, datetime]:
+        """Compteurs par portée, date du jour, RDV du jour en retard et heure de la base."""
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT scope, key, value FROM stats_counters
+                    WHERE scope IN (%s, %s) AND value <> 0
+                """, (NOTIFICATION_SCOPE, RDV_SCOPE))
+                counters: Dict[str, Dict[str, int]] = {NOTIFICATION_SCOPE: {}, RDV_SCOPE: {}}
+                for scope, key, value in cur.fetchall():
+                    counters[scope][key] = value
+                # Seule partie dépendant de l'heure : RDV en attente plus tôt aujourd'hui
+                cur.execute("""
+                    SELECT to_char(CURRENT_DATE, 'YYYY-MM-DD'), NOW(), count(*) FROM "RDV"
+                    WHERE scheduled_date = CURRENT_DATE
+                      AND status = ANY(%s)
+                      AND scheduled_time < LOCALTIME
+                """, (list(PENDING_RDV_STATUSES),))
+                today, now, overdue_today = cur.fetchone()
+                return counters, today, overdue_today, now
+        finally:
+            conn.close()
+
+
+class StatsCounterMaintainer:
+    """Deltas cumulés en mémoire, écrits toutes les `flush_interval_seconds` ; recomptage périodique.
+
+    Les deltas sont regroupés par milliseconde d'enregistrement (`wall_clock`,
+    à comparer à l'heure de la base) pour écarter ceux qu'un recomptage inclut déjà.
+    """
+
+    def __init__(self, store: Optional[StatsCounterStore] = None, flush_interval_seconds: float = 2,
+                 reconcile_interval_seconds: float = 900, cache_seconds: float = 2,
+                 clock: Callable[[], float] = time.monotonic, wall_clock: Callable[[], float] = time.time,
+                 autostart: bool = True):
+        self.store = store or StatsCounterStore()
+        self.flush_interval = flush_interval_seconds
+        self.reconcile_interval = reconcile_interval_seconds
+        self.cache_seconds = cache_seconds
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self._pending: Dict[int, Deltas] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._snapshot: Optional[Tuple[float, Tuple]] = None
+        self._reconciled_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'events': 0, 'flushes': 0, 'reconciles': 0, 'errors': 0}
+        if autostart:
+            self.start()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='stats-counter-maintainer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def record(self, scope: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """Écriture validée : `old` None pour une insertion, `new` None pour une suppression."""
+        deltas = row_deltas(scope, old, new)
+        with self._lock:
+            self.stats['events'] += 1
+            if deltas:
+                self._merge(int(self.wall_clock() * 1000), deltas)
+
+    def _merge(self, bucket: int, deltas: Deltas) -> None:
+        pending = self._pending.setdefault(bucket, {})
+        for key, delta in deltas.items():
+            total = pending.get(key, 0) + delta
+            if total:
+                pending[key] = total
+            else:
+                pending.pop(key, None)
+
+    def record_notification(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        self.record(NOTIFICATION_SCOPE, old, new)
+
+    def record_rdv(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        self.record(RDV_SCOPE, old, new)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            batches = [(bucket / 1000, deltas) for bucket, deltas in sorted(pending.items()) if deltas]
+            if not batches:
+                return 0
+            try:
+                written = self.store.apply(batches)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f'Erreur écriture des compteurs de statistiques : {str(e)}')
+                with self._lock:
+                    for bucket, deltas in pending.items():
+                        self._merge(bucket, deltas)
+                raise
+            self.stats['flushes'] += 1
+            self._snapshot = None
+            return written
+
+    def reconcile(self, force: bool = True) -> Optional[int]:
+        """Recompte tout et remplace les compteurs.
+
+        Les deltas en attente ne sont pas abandonnés ici : à l'écriture, ceux
+        enregistrés avant le recomptage sont écartés, dans tous les processus.
+        Sans `force`, rien n'est fait si un autre processus recompte ou l'a fait
+        il y a moins de `reconcile_interval`.
+
+        Returns:
+            Optional[int]: Le nombre de compteurs écrits, ou None si le recomptage est sauté
+        """
+        with self._flush_lock:
+            written = self.store.recount(0 if force else self.reconcile_interval)
+            self._reconciled_at = self.clock()
+            if written is not None:
+                self._snapshot = None
+                self.stats['reconciles'] += 1
+            return written
+
+    def _read(self) -> Tuple:
+        now = self.clock()
+        snapshot = self._snapshot
+        if snapshot is not None and now - snapshot[0] < self.cache_seconds:
+            return snapshot[1]
+        values = self.store.read()
+        self._snapshot = (now, values)
+        return values
+
+    def notification_stats(self) -> Dict[str, Any]:
+        """Même forme que NotificationStats (report-materialized-views.ts)."""
+        counters, _, _, db_now = self._read()
+        counts = counters[NOTIFICATION_SCOPE]
+        return {
+            'total_unread': counts.get('unread', 0),
+            'total_high_priority': counts.get('high_priority', 0),
+            'total_urgent': counts.get('urgent', 0),
+            'total_overdue': counts.get('overdue', 0),
+            'total_by_type': {k[5:]: v for k, v in counts.items() if k.startswith('type:')},
+            'last_updated': db_now.isoformat()
+        }
+
+    def rdv_stats(self) -> Dict[str, Any]:
+        """Même forme que RDVStats (report-materialized-views.ts)."""
+        counters, today, overdue_today, db_now = self._read()
+        counts = counters[RDV_SCOPE]
+        overdue = overdue_today + sum(v for k, v in counts.items()
+                                      if k.startswith('pending_date:') and k[13:] < today)
+        return {
+            'total_today': counts.get(f'date:{today}', 0),
+            'total_overdue': overdue,
+            'total_by_status': {k[7:]: v for k, v in counts.items() if k.startswith('status:')},
+            'last_updated': db_now.isoformat()
+        }
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                if self._reconciled_at is None or self.clock() - self._reconciled_at >= self.reconcile_interval:
+                    self.reconcile(force=False)
+                self.flush()
+            except Exception as e:
+                print(f'Erreur maintenance des compteurs de statistiques : {str(e)}')
@@ -0,0 +1,322 @@
+"""
+Persistance des réponses du simulateur par journal d'ajouts.
+
+`POST /api/simulator/response` (routes/simulator.ts) relit toute la ligne
+`simulations` puis réécrit l'objet `answers` fusionné côté application : deux
+allers-retours par question, et des réponses perdues quand deux sauvegardes
+concurrentes (double-clic, plusieurs onglets) se croisent.
+
+Ce service :
+
+- regroupe les réponses d'une même session arrivant en rafale (debounce) ;
+- ajoute les deltas dans `simulation_answer_log` (un seul INSERT pour toutes
+  les sessions à écrire, sans verrou sur `simulations`) ;
+- compacte périodiquement le journal dans la ligne par une instruction
+  atomique `answers || delta` qui supprime les deltas appliqués ;
+- relit les réponses en fusionnant ligne + deltas non compactés, pour que la
+  lecture voie toujours les écritures précédentes.
+
+Aucune réponse n'est perdue en cas de concurrence : les deltas ne sont jamais
+réécrits, seulement ajoutés, et la compaction les applique dans l'ordre d'insertion.
+Comme la route Node (404), une session inconnue est refusée avant la mise en
+tampon ; les deltas d'une session supprimée depuis sont purgés à la compaction.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+# Deltas fusionnés dans l'ordre d'insertion : pour une même clé, le dernier l'emporte
+MERGED_LOG_SQL = """
+    SELECT jsonb_object_agg(e.key, e.value ORDER BY l.id)
+    FROM simulation_answer_log l
+    CROSS JOIN LATERAL jsonb_each(l.delta) e
+    WHERE l.session_token = s.session_token
+"""
+
+
+class AnswerLogStore:
+    """Accès SQL au journal `simulation_answer_log` et à `simulations.answers`."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self._connect = connection_factory
+
+    def append(self, deltas: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Ajoute les deltas de plusieurs sessions en un seul INSERT."""
+        if not deltas:
+            return
+        from psycopg2.extras import execute_values
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO simulation_answer_log (session_token, delta)
+                    VALUES %s
+                """, [(token, json.dumps(delta)) for token, delta in deltas],
+                    template='(%s, %s::jsonb)')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def session_exists(self, session_token: str) -> bool:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1 FROM simulations WHERE session_token = %s', (session_token,))
+                row = cur.fetchone()
+            conn.commit()
+            return row is not None
+        finally:
+            conn.close()
+
+    def merge_direct(self, session_token: str, delta: Dict[str, Any]) -> Optional[int]:
+        """Fusion atomique immédiate `answers || delta`, sans attendre la compaction.
+
+        Les deltas encore présents dans le journal pour la session sont appliqués
+        dans la même transaction, avant `delta`, pour conserver l'ordre des écritures.
+
+        Returns:
+            Optional[int]: Le nombre total de réponses, ou None si la session n'existe pas
+        """
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO simulation_answer_log (session_token, delta)
+                    VALUES (%s, %s::jsonb)
+                """, (session_token, json.dumps(delta)))
+                self._compact(cur, [session_token])
+                cur.execute("""
+                    SELECT (SELECT count(*) FROM jsonb_object_keys(answers))
+                    FROM simulations WHERE session_token = %s
+                """, (session_token,))
+                row = cur.fetchone()
+            conn.commit()
+            return row[0] if row else None
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def compact(self, session_tokens: Optional[List[str]] = None) -> int:
+        """Applique les deltas du journal aux lignes `simulations` et les supprime.
+
+        Returns:
+            int: Le nombre de sessions compactées
+        """
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                compacted = self._compact(cur, session_tokens)
+            conn.commit()
+            return compacted
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _compact(cur, session_tokens: Optional[List[str]]) -> int:
+        # Deltas sans session (supprimée depuis) : jamais applicables, ne pas les rescanner
+        cur.execute("""
+            DELETE FROM simulation_answer_log l
+            WHERE (%(tokens)s::text[] IS NULL OR l.session_token = ANY(%(tokens)s::text[]))
+              AND NOT EXISTS (SELECT 1 FROM simulations s WHERE s.session_token = l.session_token)
+        """, {'tokens': session_tokens})
+        if cur.rowcount:
+            print(f'Journal des réponses : {cur.rowcount} deltas orphelins supprimés')
+        # Les lignes `simulations` sont verrouillées (dans un ordre stable) avant la
+        # fusion, pour que deux compactions concurrentes appliquent les deltas dans
+        # l'ordre d'insertion
+        cur.execute("""
+            SELECT s.session_token FROM simulations s
+            WHERE s.session_token IN (
+                SELECT DISTINCT session_token FROM simulation_answer_log
+                WHERE %(tokens)s::text[] IS NULL OR session_token = ANY(%(tokens)s::text[])
+            )
+            ORDER BY s.session_token
+            FOR UPDATE
+        """, {'tokens': session_tokens})
+        locked = [row[0] for row in cur.fetchall()]
+        if not locked:
+            return 0
+        cur.execute("""
+            WITH moved AS (
+                DELETE FROM simulation_answer_log
+                WHERE session_token = ANY(%(tokens)s::text[])
+                RETURNING id, session_token, delta
+            ), merged AS (
+                SELECT m.session_token, jsonb_object_agg(e.key, e.value ORDER BY m.id) AS delta
+                FROM moved m
+                CROSS JOIN LATERAL jsonb_each(m.delta) e
+                GROUP BY m.session_token
+            )
+            UPDATE simulations s
+            SET answers = COALESCE(s.answers, '{}'::jsonb) || merged.delta,
+                updated_at = NOW()
+            FROM merged
+            WHERE s.session_token = merged.session_token
+        """, {'tokens': locked})
+        return cur.rowcount
+
+    def read_answers(self, session_token: str) -> Optional[Dict[str, Any]]:
+        """Réponses courantes : ligne `simulations` + deltas pas encore compactés."""
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT COALESCE(s.answers, '{{}}'::jsonb) || COALESCE(({MERGED_LOG_SQL}), '{{}}'::jsonb)
+                    FROM simulations s
+                    WHERE s.session_token = %s
+                """, (session_token,))
+                row = cur.fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        return row[0] if isinstance(row[0], dict) else json.loads(row[0])
+
+
+class AnswerPersistenceService:
+    """Tampon de réponses par session, écrit en différé dans le journal."""
+
+    def __init__(self, store: Optional[AnswerLogStore] = None, debounce_ms: int = 300,
+                 max_delay_ms: int = 2000, compact_interval_s: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic, max_known_sessions: int = 10_000,
+                 autostart: bool = True):
+        self.store = store or AnswerLogStore()
+        self.debounce = debounce_ms / 1000
+        self.max_delay = max_delay_ms / 1000
+        self.compact_interval = compact_interval_s
+        self.clock = clock
+        self.max_known_sessions = max_known_sessions
+        self._known_sessions: set = set()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._timestamps: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'answers_received': 0, 'deltas_written': 0, 'flushes': 0, 'compactions': 0,
+                      'unknown_sessions': 0}
+        if autostart:
+            self.start()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='answer-log-flusher', daemon=True)
+            self._thread.start()
+
+    def save_answers(self, session_token: str, responses: Dict[str, Any]) -> Dict[str, Any]:
+        """Enregistre des réponses ; l'écriture en base est différée et regroupée.
+
+        Returns:
+            Dict[str, Any]: `success` à False si la session n'existe pas (404 côté route)
+        """
+        if not session_token or not responses:
+            raise ValueError('session_token et responses sont requis')
+        if not self._session_exists(session_token):
+            with self._lock:
+                self.stats['unknown_sessions'] += 1
+            return {'success': False, 'error': 'Simulation non trouvée'}
+        now = self.clock()
+        with self._lock:
+            self._pending.setdefault(session_token, {}).update(responses)
+            first, _ = self._timestamps.get(session_token, (now, now))
+            self._timestamps[session_token] = (first, now)
+            self.stats['answers_received'] += len(responses)
+        return {'success': True, 'questions_saved': len(responses), 'queued': True}
+
+    def _session_exists(self, session_token: str) -> bool:
+        # Une session connue ne redevient pas inconnue : une lecture par session et par processus
+        if session_token in self._known_sessions:
+            return True
+        if not self.store.session_exists(session_token):
+            return False
+        with self._lock:
+            if len(self._known_sessions) >= self.max_known_sessions:
+                self._known_sessions.clear()
+            self._known_sessions.add(session_token)
+        return True
+
+    def flush(self, session_token: Optional[str] = None, only_due: bool = False) -> int:
+        """Écrit les deltas en attente (tous, ceux d'une session, ou ceux arrivés à échéance)."""
+        with self._flush_lock:
+            now = self.clock()
+            with self._lock:
+                if session_token is not None:
+                    tokens = [session_token] if session_token in self._pending else []
+                elif only_due:
+                    tokens = [t for t, (first, last) in self._timestamps.items()
+                              if now - last >= self.debounce or now - first >= self.max_delay]
+                else:
+                    tokens = list(self._pending)
+                deltas = [(t, self._pending.pop(t)) for t in tokens]
+                for t in tokens:
+                    self._timestamps.pop(t, None)
+            if not deltas:
+                return 0
+            try:
+                self.store.append(deltas)
+            except Exception:
+                # Remettre les deltas en tête du tampon sans écraser les réponses plus récentes
+                with self._lock:
+                    for token, delta in deltas:
+                        self._pending[token] = {**delta, **self._pending.get(token, {})}
+                        self._timestamps.setdefault(token, (now, now))
+                raise
+            self.stats['deltas_written'] += len(deltas)
+            self.stats['flushes'] += 1
+            return len(deltas)
+
+    def get_answers(self, session_token: str) -> Optional[Dict[str, Any]]:
+        self.flush(session_token)
+        return self.store.read_answers(session_token)
+
+    def finalize(self, session_token: str) -> Optional[Dict[str, Any]]:
+        """Écrit et compacte une session (avant le calcul d'éligibilité) et retourne ses réponses."""
+        self.flush(session_token)
+        self.store.compact([session_token])
+        return self.store.read_answers(session_token)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        last_compaction = time.monotonic()
+        tick = max(0.01, self.debounce / 2)
+        while not self._stop.wait(tick):
+            try:
+                self.flush(only_due=True)
+                if time.monotonic() - last_compaction >= self.compact_interval:
+                    self.store.compact()
+                    self.stats['compactions'] += 1
+                    last_compaction = time.monotonic()
+            except Exception as e:
+                print(f'Erreur écriture du journal des réponses : {str(e)}')
@@ -15,15 +15,23 @@ const supabase = createClient(
 
 export type ReportType = 'morning' | 'daily_v2';
 
+const REPORT_TYPES: ReportType[] = ['morning', 'daily_v2'];
+
+// Délai par défaut d'un job (colonne timeout_seconds, cf. reportWorkerService.py)
+const DEFAULT_TIMEOUT_SECONDS = 600;
+
 export interface ReportJob {
   id: string;
   type: ReportType;
-  status: 'pending' | 'processing' | 'completed' | 'failed';
+  status: 'pending' | 'processing' | 'completed' | 'failed' | 'cancelled';
   params: {
     date?: string;
     adminId?: string;
     adminType?: string;
   };
+  priority?: number;
+  timeout_seconds?: number;
+  cancel_requested?: boolean;
   result?: any;
   error?: string;
   created_at: string;
@@ -75,59 +83,57 @@ export class AsyncReportService {
 
   /**
    * Traiter la queue des rapports
+   * Quand le worker Python (reportWorkerService.py) est déployé (REPORT_WORKER=python),
+   * c'est lui qui consomme la queue : ce processus se contente d'y ajouter les jobs.
    */
   static async processQueue(): Promise<void> {
-    if (this.processing) {
-      return; // Déjà en cours de traitement
+    if (this.processing || process.env.REPORT_WORKER === 'python') {
+      return; // Déjà en cours de traitement, ou queue consommée par le worker Python
     }
 
     this.processing = true;
 
     try {
-      // Récupérer le prochain job en attente
-      const { data: job, error } = await supabase
-        .from(this.QUEUE_TABLE)
-        .select('*')
-        .eq('status', 'pending')
-        .order('created_at', { ascending: true })
-        .limit(1)
-        .single();
+      // Prise atomique (priorité, annulation, SKIP LOCKED) partagée avec le worker Python
+      const { data: jobs, error } = await supabase.rpc('claim_report_jobs', {
+        p_types: REPORT_TYPES,
+        p_limit: 1
+      });
 
+      const job: ReportJob | undefined = jobs?.[0];
       if (error || !job) {
         // Aucun job en attente
         return;
       }
 
-      console.log(`🔄 Traitement du job ${job.id} (type: ${job.type})`);
-
-      // Marquer comme en traitement
-      await supabase
-        .from(this.QUEUE_TABLE)
-        .update({
-          status: 'processing',
-          started_at: new Date().toISOString()
-        })
-        .eq('id', job.id);
+      console.log(`🔄 Traitement du job ${job.id} (type: ${job.type}, priorité ${job.priority ?? 0})`);
 
       try {
-        // Générer le rapport selon le type
-        let result: any;
-        const reportDate = job.params.date ? new Date(job.params.date) : new Date();
-
-        switch (job.type) {
-          case 'morning':
-            result = await MorningReportService.generateMorningReport(reportDate, false);
-            break;
-          case 'daily_v2':
-            result = await DailyActivityReportServiceV2.generateDailyReport(
-              reportDate,
-              job.params.adminId,
-              job.params.adminType,
-              false
-            );
-            break;
-          default:
-            throw new Error(`Type de rapport inconnu: ${job.type}`);
+        // Générer le rapport selon le type, dans le délai maximal du job
+        const result = await this.withTimeout(
+          this.generateReport(job),
+          (job.timeout_seconds || DEFAULT_TIMEOUT_SECONDS) * 1000
+        );
+
+        // Un job annulé pendant la génération n'est pas marqué terminé
+        const { data: current } = await supabase
+          .from(this.QUEUE_TABLE)
+          .select('cancel_requested')
+          .eq('id', job.id)
+          .single();
+
+        if (current?.cancel_requested) {
+          await supabase
+            .from(this.QUEUE_TABLE)
+            .update({
+              status: 'cancelled',
+              completed_at: new Date().toISOString()
+            })
+            .eq('id', job.id);
+
+          console.log(`🛑 Job ${job.id} annulé`);
+          setImmediate(() => this.processQueue());
+          return;
         }
 
         // Marquer comme terminé avec succès
@@ -136,6 +142,7 @@ export class AsyncReportService {
           .update({
             status: 'completed',
             result: result,
+            progress: 100,
             completed_at: new Date().toISOString()
           })
           .eq('id', job.id);
@@ -167,6 +174,38 @@ export class AsyncReportService {
     }
   }
 
+  /**
+   * Générer le rapport d'un job selon son type
+   */
+  private static async generateReport(job: ReportJob): Promise<any> {
+    const reportDate = job.params.date ? new Date(job.params.date) : new Date();
+
+    switch (job.type) {
+      case 'morning':
+        return MorningReportService.generateMorningReport(reportDate, false);
+      case 'daily_v2':
+        return DailyActivityReportServiceV2.generateDailyReport(
+          reportDate,
+          job.params.adminId,
+          job.params.adminType,
+          false
+        );
+      default:
+        throw new Error(`Type de rapport inconnu: ${job.type}`);
+    }
+  }
+
+  /**
+   * Rejeter si la génération dépasse le délai maximal du job
+   */
+  private static withTimeout<T>(promise: Promise<T>, timeoutMs: number): Promise<T> {
+    let timer: NodeJS.Timeout;
+    const timeout = new Promise<never>((_, reject) => {
+      timer = setTimeout(() => reject(new Error('Délai maximal de génération dépassé')), timeoutMs);
+    });
+    return Promise.race([promise, timeout]).finally(() => clearTimeout(timer));
+  }
+
   /**
    * Récupérer le statut d'un job
    */
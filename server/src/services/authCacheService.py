@@ -0,0 +1,293 @@
+"""
+Vérification JWT avec cache et filtre de révocation en mémoire.
+
+Chaque requête authentifiée refait la vérification HMAC et le décodage du
+token (`@jwt_required()` côté Flask, `jwt.verify` dans simpleAuthMiddleware),
+et la révocation passe par "user_sessions" (RefreshTokenService). Ici :
+
+- `TokenVerifier` garde les claims déjà vérifiés, indexés par l'empreinte
+  SHA-256 du token, jusqu'à son expiration, dans un LRU borné ;
+- `RevocationFilter` garde en mémoire les identifiants de tokens révoqués
+  (`jti` Flask ou `tokenId` des refresh tokens) encore valides, rafraîchi
+  par lecture incrémentale de `user_sessions.revoked_at`, sans requête par
+  appel.
+
+La révocation reste vérifiée à chaque appel, y compris sur un token en cache.
+`cached_jwt_required` branche ce cache sous `verify_jwt_in_request` :
+flask-jwt-extended garde ses contrôles (type de token, fraîcheur, blocklist).
+Les access tokens Node sans identifiant ne sont révocables que par expiration,
+comme aujourd'hui.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+class TokenRejected(Exception):
+    """Token invalide, expiré ou révoqué."""
+
+
+def token_id(claims: Dict[str, Any]) -> Optional[str]:
+    token_ref = claims.get('jti') or claims.get('tokenId')
+    return str(token_ref) if token_ref else None
+
+
+class RevocationStore:
+    """Lecture des sessions révoquées dans "user_sessions"."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self._connect = connection_factory
+
+    def fetch_revoked(self, since: Optional[datetime]) -> Tuple[List[Tuple[str, datetime, Optional[datetime]]], datetime]:
+        """Retourne les (id, revoked_at, expires_at) révoqués après `since` (tous les valides si None)
+        et l'heure de la base, filigrane initial quand aucune session n'est révoquée."""
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                if since is None:
+                    cur.execute("""
+                        SELECT id::text, revoked_at, expires_at
+                        FROM user_sessions
+                        WHERE revoked_at IS NOT NULL AND (expires_at IS NULL OR expires_at > NOW())
+                    """)
+                else:
+                    cur.execute("""
+                        SELECT id::text, revoked_at, expires_at
+                        FROM user_sessions
+                        WHERE revoked_at > %s
+                        ORDER BY revoked_at
+                    """, (since,))
+                rows = cur.fetchall()
+                cur.execute('SELECT NOW()')
+                return rows, cur.fetchone()[0]
+        finally:
+            conn.close()
+
+
+class RevocationFilter:
+    """Identifiants de tokens révoqués, rafraîchis toutes les `refresh_seconds`."""
+
+    def __init__(self, store: Optional[RevocationStore] = None, refresh_seconds: float = 5,
+                 overlap_seconds: float = 5, clock: Callable[[], float] = time.time):
+        self.store = store or RevocationStore()
+        self.refresh_interval = refresh_seconds
+        # Relecture d'une fenêtre déjà vue : une transaction validée en retard n'est pas manquée
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.clock = clock
+        self._revoked: Dict[str, float] = {}
+        self._watermark: Optional[datetime] = None
+        self._refreshed_at: Optional[float] = None
+        self._refresh_lock = threading.Lock()
+        self.stats = {'refreshes': 0, 'loaded': 0, 'errors': 0}
+
+    def refresh(self) -> int:
+        """Charge les révocations depuis le dernier filigrane ; retourne le nombre de lignes lues."""
+        since = None if self._watermark is None else self._watermark - self.overlap
+        rows, db_now = self.store.fetch_revoked(since)
+        now = self.clock()
+        revoked = dict(self._revoked)
+        for session_id, revoked_at, expires_at in rows:
+            expires = expires_at.timestamp() if expires_at is not None else float('inf')
+            if expires > now:
+                revoked[session_id] = expires
+            if self._watermark is None or revoked_at > self._watermark:
+                self._watermark = revoked_at
+        if self._watermark is None:
+            self._watermark = db_now
+        # Un token expiré est déjà refusé : inutile de garder sa révocation
+        self._revoked = {k: v for k, v in revoked.items() if v > now}
+        self._refreshed_at = now
+        self.stats['refreshes'] += 1
+        self.stats['loaded'] += len(rows)
+        return len(rows)
+
+    def _refresh_if_due(self) -> None:
+        if self._refreshed_at is not None and self.clock() - self._refreshed_at < self.refresh_interval:
+            return
+        first_load = self._refreshed_at is None
+        # Un seul appelant rafraîchit ; les autres lisent l'ensemble courant
+        if not self._refresh_lock.acquire(blocking=first_load):
+            return
+        try:
+            if self._refreshed_at is None or self.clock() - self._refreshed_at >= self.refresh_interval:
+                self.refresh()
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f'Erreur rafraîchissement des révocations : {str(e)}')
+            if first_load:
+                raise
+            self._refreshed_at = self.clock()
+        finally:
+            self._refresh_lock.release()
+
+    def add(self, session_id: str, expires_at: Optional[float] = None) -> None:
+        """Révocation locale immédiate (logout traité par ce processus)."""
+        revoked = dict(self._revoked)
+        revoked[session_id] = expires_at if expires_at is not None else float('inf')
+        self._revoked = revoked
+
+    def is_revoked(self, session_id: Optional[str]) -> bool:
+        if not session_id:
+            return False
+        self._refresh_if_due()
+        return session_id in self._revoked
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+def _pyjwt_decoder(secret: str, algorithms: Sequence[str], leeway: float) -> Callable[[str], Dict[str, Any]]:
+    import jwt
+
+    def decode(token: str) -> Dict[str, Any]:
+        try:
+            return jwt.decode(token, secret, algorithms=list(algorithms), leeway=leeway)
+        except jwt.InvalidTokenError as e:
+            raise TokenRejected(str(e)) from e
+    return decode
+
+
+class TokenVerifier:
+    """Claims vérifiés, mis en cache par empreinte de token jusqu'à l'expiration."""
+
+    def __init__(self, secret: Optional[str] = None, algorithms: Sequence[str] = ('HS256',),
+                 revocation: Optional[RevocationFilter] = None, max_entries: int = 10_000,
+                 leeway_seconds: float = 0, decoder: Optional[Callable[[str], Dict[str, Any]]] = None,
+                 clock: Callable[[], float] = time.time):
+        secret = secret or os.getenv('JWT_SECRET_KEY') or os.getenv('JWT_SECRET')
+        if decoder is None and not secret:
+            raise ValueError('Secret JWT manquant (JWT_SECRET_KEY)')
+        self.decode = decoder or _pyjwt_decoder(secret, algorithms, leeway_seconds)
+        self.revocation = revocation
+        self.max_entries = max_entries
+        self.leeway = leeway_seconds
+        self.clock = clock
+        self._cache: 'OrderedDict[bytes, Tuple[Dict[str, Any], float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'rejected': 0, 'revoked': 0, 'evicted': 0}
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """Retourne les claims du token ou lève TokenRejected."""
+        claims = self.claims(token)
+        if self.revocation is not None and self.revocation.is_revoked(token_id(claims)):
+            self.stats['revoked'] += 1
+            raise TokenRejected('Token révoqué')
+        return claims
+
+    def claims(self, token: str, decode: Optional[Callable[[str], Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Claims en cache ou décodés par `decode` (par défaut celui du vérificateur), sans contrôle de révocation."""
+        key = hashlib.sha256(token.encode()).digest()
+        now = self.clock()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                if entry[1] + self.leeway > now:
+                    self._cache.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return entry[0]
+                del self._cache[key]
+        self.stats['misses'] += 1
+        try:
+            claims = (decode or self.decode)(token)
+        except Exception:
+            self.stats['rejected'] += 1
+            raise
+        expires = claims.get('exp')
+        # Sans expiration, le token n'est jamais mis en cache
+        if expires is not None:
+            with self._lock:
+                self._cache[key] = (claims, float(expires))
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+                    self.stats['evicted'] += 1
+        return claims
+
+    def invalidate(self, token: str) -> None:
+        with self._lock:
+            self._cache.pop(hashlib.sha256(token.encode()).digest(), None)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+def install_token_cache(jwt_manager, verifier: TokenVerifier) -> None:
+    """Fait passer le décodage de flask-jwt-extended par le cache de `verifier`.
+
+    Seuls la vérification de signature et le décodage sont mis en cache : les
+    claims sont ceux que produit flask-jwt-extended (audience, émetteur, claims
+    par défaut) et `verify_jwt_in_request` garde tous ses contrôles (type de
+    token, fraîcheur, blocklist, chargement de l'utilisateur). Les révocations
+    de `verifier` passent par le `token_in_blocklist_loader`. Le vérificateur
+    doit être dédié à ce gestionnaire : ses entrées ont la forme des claims
+    flask-jwt-extended.
+    """
+    if jwt_manager.__dict__.get('_token_cache') is verifier:
+        return
+    decode_uncached = jwt_manager.__dict__.get('_decode_uncached', jwt_manager._decode_jwt_from_config)
+
+    def decode(encoded_token: str, csrf_value=None, allow_expired: bool = False) -> Dict[str, Any]:
+        if csrf_value is not None or allow_expired:
+            return decode_uncached(encoded_token, csrf_value, allow_expired)
+        # Copie : flask-jwt-extended range les claims dans `g`, la vue ne modifie pas l'entrée du cache
+        return dict(verifier.claims(encoded_token, decode_uncached))
+
+    jwt_manager._decode_uncached = decode_uncached
+    jwt_manager._decode_jwt_from_config = decode
+    jwt_manager._token_cache = verifier
+    if verifier.revocation is not None:
+        register_revocation_filter(jwt_manager, verifier.revocation)
+
+
+def cached_jwt_required(verifier: TokenVerifier, optional: bool = False, fresh: bool = False,
+                        refresh: bool = False, locations: Optional[Sequence[str]] = None):
+    """Équivalent de `@jwt_required(...)` passant par le cache de `verifier`.
+
+    La vérification reste celle de `verify_jwt_in_request` (un refresh token
+    n'ouvre pas une vue qui attend un access token) ; un token refusé donne
+    la réponse 401 des routes Flask au lieu des codes par défaut de l'extension.
+    """
+    def decorator(view: Callable):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            import jwt
+            from flask import current_app, jsonify
+            from flask_jwt_extended import verify_jwt_in_request
+            from flask_jwt_extended.exceptions import JWTExtendedException, NoAuthorizationError
+
+            install_token_cache(current_app.extensions['flask-jwt-extended'], verifier)
+            try:
+                verify_jwt_in_request(optional=optional, fresh=fresh, refresh=refresh, locations=locations)
+            except NoAuthorizationError:
+                return jsonify({'success': False, 'error': 'Token manquant'}), 401
+            except (JWTExtendedException, jwt.PyJWTError) as e:
+                return jsonify({'success': False, 'error': str(e) or 'Token invalide'}), 401
+            return current_app.ensure_sync(view)(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_revocation_filter(jwt_manager, revocation: RevocationFilter) -> None:
+    """Branche le filtre sur `@jwt_required()` (token_in_blocklist_loader)."""
+    @jwt_manager.token_in_blocklist_loader
+    def is_token_revoked(jwt_header, jwt_payload):
+        return revocation.is_revoked(token_id(jwt_payload))
+
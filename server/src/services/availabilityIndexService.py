@@ -0,0 +1,333 @@
+"""
+Index de disponibilités en bitmaps pour proposer des créneaux de RDV communs.
+
+Réserver un RDV entre un client, un expert et parfois un apporteur demande
+aujourd'hui de relire les "RDV" de chacun et leurs événements de calendrier
+(`calendarCacheService.getCachedEvents`), puis de comparer les horaires un à
+un ; `Expert.disponibilites` est un JSON sans structure imposée.
+
+Ici, chaque participant a, par jour, un bitmap de créneaux de 15 minutes
+(96 bits, entier Python) :
+
+- heures ouvrées : tirées de `disponibilites` (formats reconnus par
+  `working_hours_from`), sinon DEFAULT_WORKING_HOURS ;
+- occupation : un masque par RDV, les événements Google synchronisés étant
+  déjà des lignes "RDV" (calendarSyncService.py) ;
+- libre = ouvré & ~occupé. Les créneaux communs à N participants sont un ET
+  des bitmaps, et une durée de k créneaux un ET de k décalages.
+
+Réservation et annulation ne recalculent que les jours touchés, pour les
+seuls participants du RDV. Les heures sont locales (scheduled_date /
+scheduled_time des RDV).
+"""
+
+import os
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+# Statuts qui libèrent le créneau ; les autres (proposed, scheduled, confirmed...) l'occupent
+RELEASED_STATUSES = ('cancelled', 'refused', 'declined', 'rejected')
+PARTICIPANT_COLUMNS = {'client': 'client_id', 'expert': 'expert_id', 'apporteur': 'apporteur_id'}
+# Jours au format JavaScript (0 = dimanche), comme CalendarPreferences.working_hours.days
+DAY_NAMES = {'dimanche': 0, 'lundi': 1, 'mardi': 2, 'mercredi': 3, 'jeudi': 4, 'vendredi': 5, 'samedi': 6}
+DEFAULT_WORKING_HOURS: Dict[int, List[Tuple[str, str]]] = {day: [('09:00', '18:00')] for day in range(1, 6)}
+
+Participant = Tuple[str, str]
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def _minutes(value: Any) -> int:
+    if isinstance(value, time):
+        return value.hour * 60 + value.minute
+    hours, _, minutes = str(value).partition(':')
+    return int(hours) * 60 + int(minutes[:2] or 0)
+
+
+def range_mask(start_minute: int, end_minute: int) -> int:
+    """Créneaux couverts par [start, end[ en minutes depuis minuit (créneaux entamés inclus)."""
+    first = max(start_minute, 0) // SLOT_MINUTES
+    last = min(-(-end_minute // SLOT_MINUTES), SLOTS_PER_DAY)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def _ranges(value: Any) -> List[Tuple[str, str]]:
+    """'09:00-12:00', ['09:00-12:00', ...], {'start', 'end'} ou {'debut', 'fin'}."""
+    if isinstance(value, str):
+        start, _, end = value.partition('-')
+        return [(start.strip(), end.strip())] if end else []
+    if isinstance(value, dict):
+        start = value.get('start') or value.get('debut')
+        end = value.get('end') or value.get('fin')
+        return [(start, end)] if start and end else []
+    if isinstance(value, list):
+        return [r for item in value for r in _ranges(item)]
+    return []
+
+
+def working_hours_from(disponibilites: Any) -> Optional[Dict[int, List[Tuple[str, str]]]]:
+    """Heures ouvrées par jour (0 = dimanche) tirées de `Expert.disponibilites`.
+
+    Formats reconnus :
+    - {'available': false} : aucune heure ouvrée ;
+    - {'working_hours': {'start': '09:00', 'end': '18:00', 'days': [1, 2, 3, 4, 5]}} ;
+    - {'lundi': ['09:00-12:00', '14:00-18:00'], 'mardi': {...}, ...} ;
+    - {'jours': ['lundi', ...], 'horaires': {'debut': '09:00', 'fin': '18:00'}}.
+    None si rien n'est reconnu (heures par défaut).
+    """
+    if not isinstance(disponibilites, dict):
+        return None
+    if disponibilites.get('available') is False:
+        return {}
+    source = disponibilites.get('working_hours') or disponibilites.get('horaires_travail')
+    if isinstance(source, dict) and source.get('start') and source.get('end'):
+        days = source.get('days') or list(DEFAULT_WORKING_HOURS)
+        return {int(day) % 7: [(source['start'], source['end'])] for day in days}
+    by_day = {DAY_NAMES[key.lower()]: _ranges(value)
+              for key, value in disponibilites.items() if key.lower() in DAY_NAMES}
+    if by_day:
+        return {day: ranges for day, ranges in by_day.items() if ranges}
+    if disponibilites.get('jours') and disponibilites.get('horaires'):
+        ranges = _ranges(disponibilites['horaires'])
+        return {DAY_NAMES[d.lower()]: ranges for d in disponibilites['jours'] if d.lower() in DAY_NAMES}
+    return None
+
+
+def rdv_masks(scheduled_date: Any, scheduled_time: Any, duration_minutes: Optional[int]) -> Dict[date, int]:
+    """Créneaux occupés par un RDV, par jour (un RDV qui passe minuit touche deux jours)."""
+    if isinstance(scheduled_date, str):
+        scheduled_date = date.fromisoformat(scheduled_date[:10])
+    start = _minutes(scheduled_time)
+    end = start + (duration_minutes or 60)
+    masks = {}
+    day = scheduled_date
+    while end > 0:
+        mask = range_mask(start, end)
+        if mask:
+            masks[day] = mask
+        day += timedelta(days=1)
+        start, end = start - 24 * 60, end - 24 * 60
+    return masks
+
+
+def run_starts(mask: int, length: int) -> int:
+    """Bits de début des suites d'au moins `length` créneaux libres consécutifs."""
+    starts = mask
+    for shift in range(1, length):
+        starts &= mask >> shift
+    return starts
+
+
+class AvailabilityIndex:
+    """Bitmaps ouvré / occupé par participant et par jour, mis à jour par RDV."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.working: Dict[Participant, Dict[int, int]] = {}
+        # participant -> jour -> rdv_id -> masque
+        self.bookings: Dict[Participant, Dict[date, Dict[str, int]]] = {}
+        self.busy: Dict[Participant, Dict[date, int]] = {}
+        # rdv_id -> (participants, masques par jour), pour l'annulation
+        self.rdvs: Dict[str, Tuple[Tuple[Participant, ...], Dict[date, int]]] = {}
+        self.default_week = self._week(DEFAULT_WORKING_HOURS)
+
+    @staticmethod
+    def _week(hours: Dict[int, List[Tuple[str, str]]]) -> Dict[int, int]:
+        week = {}
+        for day, ranges in hours.items():
+            mask = 0
+            for start, end in ranges:
+                mask |= range_mask(_minutes(start), _minutes(end))
+            week[day] = mask
+        return week
+
+    # ------------------------------------------------------------------
+    # Mises à jour
+    # ------------------------------------------------------------------
+
+    def set_working_hours(self, participant: Participant, hours: Optional[Dict[int, List[Tuple[str, str]]]]) -> None:
+        """Heures ouvrées d'un participant (None : heures par défaut)."""
+        with self._lock:
+            if hours is None:
+                self.working.pop(participant, None)
+            else:
+                self.working[participant] = self._week(hours)
+
+    def set_disponibilites(self, expert_id: str, disponibilites: Any) -> None:
+        self.set_working_hours(('expert', str(expert_id)), working_hours_from(disponibilites))
+
+    def book(self, rdv_id: str, participants: Iterable[Participant], scheduled_date: Any,
+             scheduled_time: Any, duration_minutes: Optional[int]) -> None:
+        """Occupe (ou déplace) les créneaux d'un RDV pour ses participants."""
+        rdv_id = str(rdv_id)
+        masks = rdv_masks(scheduled_date, scheduled_time, duration_minutes)
+        participants = tuple(dict.fromkeys(participants))
+        with self._lock:
+            self._release(rdv_id)
+            for participant in participants:
+                days = self.bookings.setdefault(participant, {})
+                busy = self.busy.setdefault(participant, {})
+                for day, mask in masks.items():
+                    days.setdefault(day, {})[rdv_id] = mask
+                    busy[day] = busy.get(day, 0) | mask
+            self.rdvs[rdv_id] = (participants, masks)
+
+    def cancel(self, rdv_id: str) -> None:
+        with self._lock:
+            self._release(str(rdv_id))
+
+    def _release(self, rdv_id: str) -> None:
+        entry = self.rdvs.pop(rdv_id, None)
+        if entry is None:
+            return
+        participants, masks = entry
+        for participant in participants:
+            days = self.bookings.get(participant, {})
+            busy = self.busy.get(participant, {})
+            for day in masks:
+                booked = days.get(day)
+                if booked is None:
+                    continue
+                booked.pop(rdv_id, None)
+                # Union des RDV restants du jour : deux RDV qui se chevauchent restent occupés
+                union = 0
+                for mask in booked.values():
+                    union |= mask
+                if union:
+                    busy[day] = union
+                else:
+                    days.pop(day, None)
+                    busy.pop(day, None)
+
+    def apply_rdv(self, row: Dict[str, Any]) -> None:
+        """Réservation, déplacement ou annulation selon l'état de la ligne "RDV"."""
+        if row.get('status') in RELEASED_STATUSES or not row.get('scheduled_date') or not row.get('scheduled_time'):
+            self.cancel(row['id'])
+            return
+        participants = [(user_type, str(row[column])) for user_type, column in PARTICIPANT_COLUMNS.items()
+                        if row.get(column)]
+        self.book(row['id'], participants, row['scheduled_date'], row['scheduled_time'],
+                  row.get('duration_minutes'))
+
+    def apply_change(self, table: str, event: Dict[str, Any]) -> None:
+        """Applique un événement de changement (payload Supabase Realtime)."""
+        event_type = (event.get('eventType') or event.get('type') or '').upper()
+        new = event.get('new') or event.get('record') or {}
+        old = event.get('old') or event.get('old_record') or {}
+        if table == 'RDV':
+            if event_type == 'DELETE':
+                self.cancel(old.get('id'))
+            else:
+                self.apply_rdv(new)
+        elif table == 'Expert' and event_type != 'DELETE' and 'disponibilites' in new:
+            self.set_disponibilites(new['id'], new.get('disponibilites'))
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    def free_mask(self, participant: Participant, day: date) -> int:
+        week = self.working.get(participant, self.default_week)
+        return week.get((day.weekday() + 1) % 7, 0) & ~self.busy.get(participant, {}).get(day, 0) & FULL_DAY
+
+    def common_slots(self, participants: Iterable[Participant], start_date: date, end_date: date,
+                     duration_minutes: int = 60, limit: int = 3, max_per_day: Optional[int] = None,
+                     not_before: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Premiers créneaux où tous les participants sont libres pendant `duration_minutes`.
+
+        Retourne des {date, start_time, end_time}, du plus tôt au plus tard ;
+        `max_per_day` répartit les propositions sur plusieurs jours.
+        """
+        participants = list(dict.fromkeys(participants))
+        length = max(1, -(-duration_minutes // SLOT_MINUTES))
+        slots: List[Dict[str, Any]] = []
+        day = start_date
+        with self._lock:
+            while day <= end_date and len(slots) < limit:
+                mask = FULL_DAY
+                for participant in participants:
+                    mask &= self.free_mask(participant, day)
+                    if not mask:
+                        break
+                if not_before is not None and day <= not_before.date():
+                    if day < not_before.date():
+                        mask = 0
+                    else:
+                        mask &= ~range_mask(0, not_before.hour * 60 + not_before.minute)
+                starts = run_starts(mask, length) if mask else 0
+                taken = 0
+                while starts and len(slots) < limit and (max_per_day is None or taken < max_per_day):
+                    first = (starts & -starts).bit_length() - 1
+                    begin = datetime.combine(day, time()) + timedelta(minutes=first * SLOT_MINUTES)
+                    end = begin + timedelta(minutes=duration_minutes)
+                    slots.append({'date': day.isoformat(), 'start_time': begin.strftime('%H:%M'),
+                                  'end_time': end.strftime('%H:%M')})
+                    taken += 1
+                    # Propositions suivantes après la fin de celle-ci, sans chevauchement
+                    starts &= ~((1 << (first + length)) - 1)
+                day += timedelta(days=1)
+        return slots
+
+    def is_free(self, participants: Iterable[Participant], scheduled_date: Any, scheduled_time: Any,
+                duration_minutes: int = 60, ignore_rdv: Optional[str] = None) -> bool:
+        """Vérifie un créneau précis (avant réservation ou déplacement de `ignore_rdv`)."""
+        masks = rdv_masks(scheduled_date, scheduled_time, duration_minutes)
+        with self._lock:
+            for participant in participants:
+                for day, mask in masks.items():
+                    week = self.working.get(participant, self.default_week)
+                    if mask & ~week.get((day.weekday() + 1) % 7, 0):
+                        return False
+                    booked = self.bookings.get(participant, {}).get(day, {})
+                    for rdv_id, other in booked.items():
+                        if rdv_id != ignore_rdv and mask & other:
+                            return False
+        return True
+
+
+def load_index(connection_factory: Callable = get_db_connection, days_back: int = 1,
+               days_ahead: int = 120) -> AvailabilityIndex:
+    """Charge les heures ouvrées des experts et les RDV de la fenêtre ; les événements tiennent ensuite l'index."""
+    from psycopg2.extras import RealDictCursor
+
+    index = AvailabilityIndex()
+    conn = connection_factory()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT id::text AS id, disponibilites
+                FROM "Expert"
+                WHERE disponibilites IS NOT NULL
+            """)
+            for row in cur.fetchall():
+                index.set_disponibilites(row['id'], row['disponibilites'])
+            cur.execute("""
+                SELECT id::text AS id, client_id::text AS client_id, expert_id::text AS expert_id,
+                       apporteur_id::text AS apporteur_id, scheduled_date, scheduled_time,
+                       duration_minutes, status
+                FROM "RDV"
+                WHERE scheduled_date BETWEEN CURRENT_DATE - %s AND CURRENT_DATE + %s
+                  AND (status IS NULL OR status <> ALL(%s))
+            """, (days_back, days_ahead, list(RELEASED_STATUSES)))
+            for row in cur.fetchall():
+                index.apply_rdv(row)
+        conn.commit()
+    finally:
+        conn.close()
+    return index
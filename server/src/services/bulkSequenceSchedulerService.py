@@ -0,0 +1,507 @@
+"""
+Programmation groupée des séquences d'emails de prospection.
+
+`SequenceSchedulerService.scheduleSequenceBatch` et
+`ProspectService.scheduleSequenceForProspect` calculent les dates prospect
+par prospect (heures de travail, randomisation 0-2 h) puis insèrent chaque
+email : un import de 20 000 prospects prend des heures et tous les premiers
+emails partent au même moment. Ici :
+
+- chaque boîte d'envoi a une grille de créneaux : heures ouvrées numérotées
+  en continu (week-ends et nuits exclus), un masque de bits par heure et un
+  compteur par jour ; les créneaux sont espacés régulièrement dans l'heure
+  pour que le plafond journalier soit réparti sur toute la journée ;
+- `SequencePlanner.plan` place toutes les étapes de tous les prospects en
+  une passe par étape (pointeurs de saut sur les heures pleines), en
+  respectant les plafonds horaire / journalier et les envois déjà
+  programmés ;
+- `BulkSequenceScheduler` insère les emails par lots et ne replanifie que
+  les emails concernés à la reprise d'une pause ou après un arrêt du
+  service (emails programmés dans le passé et jamais envoyés).
+"""
+
+import hashlib
+import math
+import os
+import random
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from zoneinfo import ZoneInfo
+
+DEFAULT_MAILBOX = os.getenv('PROSPECT_MAILBOX', 'default')
+# Plafond horaire par défaut de canSendEmail (email-sending-utils.ts)
+DEFAULT_HOURLY_CAP = 12
+DEFAULT_DAILY_CAP = 100
+# Randomisation des étapes suivantes, comme addRandomizationToScheduledDate
+DEFAULT_JITTER_MINUTES = 120
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def content_hash(subject: str, body: str) -> str:
+    """Même empreinte que generateEmailContentHash (email-duplicate-checker.ts)."""
+    return hashlib.sha256(f'{subject}|||{body}'.encode()).hexdigest()
+
+
+class BusinessCalendar:
+    """Heures ouvrées numérotées en continu : l'heure n°0 est le lundi 1er janvier 2024 à `start_hour`."""
+
+    EPOCH = date(2024, 1, 1)
+
+    def __init__(self, timezone_name: str = 'Europe/Paris', start_hour: int = 9, end_hour: int = 18,
+                 workdays: Sequence[int] = (0, 1, 2, 3, 4)):
+        self.tz = ZoneInfo(timezone_name)
+        self.start_hour = start_hour
+        self.hours_per_day = end_hour - start_hour
+        self.workdays = sorted(workdays)
+        # Nombre de jours ouvrés parmi les `i` premiers jours de la semaine
+        self._prefix = [sum(1 for d in self.workdays if d < i) for i in range(8)]
+
+    def _day_ordinal(self, day: date) -> Tuple[int, bool]:
+        """Rang du premier jour ouvré >= `day`, et si `day` lui-même est ouvré."""
+        weeks, weekday = divmod((day - self.EPOCH).days, 7)
+        return weeks * len(self.workdays) + self._prefix[weekday], weekday in self.workdays
+
+    def _ordinal_day(self, ordinal: int) -> date:
+        weeks, rank = divmod(ordinal, len(self.workdays))
+        return self.EPOCH + timedelta(days=weeks * 7 + self.workdays[rank])
+
+    def locate(self, moment: datetime) -> Tuple[int, float]:
+        """Première heure ouvrée contenant ou suivant `moment`, et décalage (s) dans cette heure."""
+        local = moment.astimezone(self.tz)
+        ordinal, is_workday = self._day_ordinal(local.date())
+        hour = local.hour - self.start_hour
+        if not is_workday or hour < 0:
+            return ordinal * self.hours_per_day, 0.0
+        if hour >= self.hours_per_day:
+            return (ordinal + 1) * self.hours_per_day, 0.0
+        return ordinal * self.hours_per_day + hour, local.minute * 60 + local.second + local.microsecond / 1e6
+
+    def hour_start(self, hour_index: int) -> datetime:
+        ordinal, hour = divmod(hour_index, self.hours_per_day)
+        local = datetime.combine(self._ordinal_day(ordinal), dt_time(self.start_hour + hour), tzinfo=self.tz)
+        return local.astimezone(timezone.utc)
+
+
+class MailboxGrid:
+    """Créneaux d'une boîte d'envoi : un masque de bits par heure ouvrée, un compteur par jour."""
+
+    def __init__(self, hourly_cap: int, daily_cap: int, hours_per_day: int):
+        self.hours_per_day = hours_per_day
+        self.daily_cap = daily_cap
+        # Créneaux par heure : le plafond journalier est étalé sur la journée
+        self.slots_per_hour = max(1, min(hourly_cap, math.ceil(daily_cap / hours_per_day)))
+        self.slot_seconds = 3600 / self.slots_per_hour
+        self.full_mask = (1 << self.slots_per_hour) - 1
+        self.hours: Dict[int, int] = {}
+        self.days: Dict[int, int] = {}
+        self._skip: Dict[int, int] = {}
+
+    def _next_candidate(self, hour: int) -> int:
+        path = []
+        while hour in self._skip:
+            path.append(hour)
+            hour = self._skip[hour]
+        for visited in path:
+            self._skip[visited] = hour
+        return hour
+
+    def _mark_day_full(self, day: int) -> None:
+        first = day * self.hours_per_day
+        for hour in range(first, first + self.hours_per_day):
+            self._skip[hour] = first + self.hours_per_day
+
+    def reserve(self, hour: int, min_slot: int = 0) -> Tuple[int, int]:
+        """Premier créneau libre à partir de (`hour`, `min_slot`) ; retourne (heure, créneau)."""
+        while True:
+            hour = self._next_candidate(hour)
+            day = hour // self.hours_per_day
+            if self.days.get(day, 0) >= self.daily_cap:
+                self._mark_day_full(day)
+                hour, min_slot = (day + 1) * self.hours_per_day, 0
+                continue
+            mask = self.hours.get(hour, 0)
+            free = ~mask & self.full_mask & ~((1 << min_slot) - 1)
+            if free:
+                slot = (free & -free).bit_length() - 1
+                self._take(hour, slot, mask)
+                return hour, slot
+            if mask == self.full_mask:
+                self._skip[hour] = hour + 1
+            hour, min_slot = hour + 1, 0
+
+    def occupy(self, hour: int, offset_seconds: float) -> None:
+        """Compte un envoi déjà programmé (créneau le plus proche s'il est pris)."""
+        mask = self.hours.get(hour, 0)
+        slot = min(int(offset_seconds // self.slot_seconds), self.slots_per_hour - 1)
+        if mask >> slot & 1:
+            free = ~mask & self.full_mask
+            if not free:
+                # Heure déjà pleine : l'envoi compte quand même dans le jour
+                self.days[hour // self.hours_per_day] = self.days.get(hour // self.hours_per_day, 0) + 1
+                return
+            slot = (free & -free).bit_length() - 1
+        self._take(hour, slot, mask)
+
+    def _take(self, hour: int, slot: int, mask: int) -> None:
+        mask |= 1 << slot
+        self.hours[hour] = mask
+        day = hour // self.hours_per_day
+        self.days[day] = self.days.get(day, 0) + 1
+        if mask == self.full_mask:
+            self._skip[hour] = hour + 1
+        if self.days[day] >= self.daily_cap:
+            self._mark_day_full(day)
+
+
+class SequencePlanner:
+    """Placement des étapes de séquence sur les grilles des boîtes d'envoi."""
+
+    def __init__(self, mailboxes: Optional[Dict[str, Tuple[int, int]]] = None,
+                 calendar: Optional[BusinessCalendar] = None,
+                 jitter_minutes: float = DEFAULT_JITTER_MINUTES, seed: Optional[Any] = None):
+        self.calendar = calendar or BusinessCalendar()
+        mailboxes = mailboxes or {DEFAULT_MAILBOX: (DEFAULT_HOURLY_CAP, DEFAULT_DAILY_CAP)}
+        self.grids = {name: MailboxGrid(hourly, daily, self.calendar.hours_per_day)
+                      for name, (hourly, daily) in mailboxes.items()}
+        self.mailbox_names = list(self.grids)
+        self.jitter_seconds = jitter_minutes * 60
+        self.rng = random.Random(seed)
+
+    def load_reserved(self, rows: Iterable[Tuple[Optional[str], datetime]]) -> int:
+        """Occupe les créneaux des emails déjà programmés (boîte NULL = boîte par défaut)."""
+        count = 0
+        for mailbox, scheduled_for in rows:
+            grid = self.grids.get(mailbox or DEFAULT_MAILBOX)
+            if grid is None:
+                continue
+            hour, offset = self.calendar.locate(scheduled_for)
+            grid.occupy(hour, offset)
+            count += 1
+        return count
+
+    def _place(self, mailbox: str, desired: datetime) -> datetime:
+        grid = self.grids[mailbox]
+        hour, offset = self.calendar.locate(desired)
+        min_slot = math.ceil(offset / grid.slot_seconds - 1e-9)
+        if min_slot >= grid.slots_per_hour:
+            hour, min_slot = hour + 1, 0
+        hour, slot = grid.reserve(hour, min_slot)
+        # Position aléatoire dans le créneau : pas d'envoi à heure fixe
+        seconds = (slot + self.rng.uniform(0, 0.8)) * grid.slot_seconds
+        return self.calendar.hour_start(hour) + timedelta(seconds=int(seconds))
+
+    def assign_mailbox(self, index: int, prospect: Dict[str, Any]) -> str:
+        mailbox = prospect.get('mailbox')
+        if mailbox in self.grids:
+            return mailbox
+        return self.mailbox_names[index % len(self.mailbox_names)]
+
+    def plan(self, prospects: List[Dict[str, Any]], steps: List[Dict[str, Any]],
+             start: datetime) -> List[Dict[str, Any]]:
+        """Emails programmés de toutes les étapes pour tous les prospects.
+
+        Étape 1 au plus tôt à `start` ; étape n au plus tôt `delay_days` jours
+        après le créneau réel de l'étape n-1, plus la randomisation.
+        """
+        steps = sorted(steps, key=lambda s: s['step_number'])
+        mailboxes = [self.assign_mailbox(i, p) for i, p in enumerate(prospects)]
+        previous: List[datetime] = [start] * len(prospects)
+        planned: List[Dict[str, Any]] = []
+        for rank, step in enumerate(steps):
+            if rank == 0:
+                desired = list(previous)
+            else:
+                delay = timedelta(days=step.get('delay_days') or 0)
+                desired = [prev + delay + timedelta(seconds=self.rng.uniform(0, self.jitter_seconds))
+                           for prev in previous]
+            # Ordre chronologique : les premiers demandeurs prennent les premiers créneaux
+            for i in sorted(range(len(prospects)), key=desired.__getitem__):
+                slot = self._place(mailboxes[i], desired[i])
+                previous[i] = slot
+                planned.append({
+                    'prospect_id': prospects[i]['id'],
+                    'step_number': step['step_number'],
+                    'subject': step['subject'],
+                    'body': step['body'],
+                    'scheduled_for': slot,
+                    'mailbox': mailboxes[i]
+                })
+        return planned
+
+    def replan(self, emails: List[Dict[str, Any]], now: datetime) -> List[Dict[str, Any]]:
+        """Nouveaux créneaux pour des emails existants (reprise, retard après arrêt).
+
+        Par prospect, l'ordre des étapes et les écarts d'origine entre étapes
+        sont conservés ; la première étape repart au plus tôt à `now`.
+        """
+        by_prospect: Dict[str, List[Dict[str, Any]]] = {}
+        for email in emails:
+            by_prospect.setdefault(str(email['prospect_id']), []).append(email)
+        chains = [sorted(chain, key=lambda e: e['step_number']) for chain in by_prospect.values()]
+
+        updates: List[Dict[str, Any]] = []
+        positions = [0] * len(chains)
+        previous: List[Optional[Tuple[datetime, datetime]]] = [None] * len(chains)
+        pending = list(range(len(chains)))
+        while pending:
+            desired = {}
+            for c in pending:
+                email = chains[c][positions[c]]
+                original = email['scheduled_for']
+                if previous[c] is None:
+                    desired[c] = max(original, now)
+                else:
+                    original_prev, placed_prev = previous[c]
+                    desired[c] = placed_prev + max(original - original_prev, timedelta(0))
+            for c in sorted(pending, key=desired.__getitem__):
+                email = chains[c][positions[c]]
+                mailbox = email.get('mailbox') if email.get('mailbox') in self.grids else self.mailbox_names[0]
+                slot = self._place(mailbox, desired[c])
+                previous[c] = (email['scheduled_for'], slot)
+                updates.append({'id': email['id'], 'scheduled_for': slot, 'mailbox': mailbox})
+                positions[c] += 1
+            pending = [c for c in pending if positions[c] < len(chains[c])]
+        return updates
+
+
+class ScheduledEmailStore:
+    """Lectures et écritures groupées sur "prospect_email_scheduled"."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self._connect = connection_factory
+
+    def load_steps(self, sequence_id: str) -> List[Dict[str, Any]]:
+        from psycopg2.extras import RealDictCursor
+
+        conn = self._connect()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT step_number, delay_days, subject, body
+                    FROM prospect_email_sequence_steps
+                    WHERE sequence_id = %s AND is_active IS NOT FALSE
+                    ORDER BY step_number
+                """, (sequence_id,))
+                return [dict(row) for row in cur.fetchall()]
+        finally:
+            conn.close()
+
+    def load_reserved(self, since: datetime,
+                      excluded_ids: Sequence[str] = ()) -> List[Tuple[Optional[str], datetime]]:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT mailbox, scheduled_for
+                    FROM prospect_email_scheduled
+                    WHERE status = 'scheduled' AND scheduled_for >= %s
+                      AND NOT (id = ANY(%s::uuid[]))
+                """, (since, list(excluded_ids)))
+                return cur.fetchall()
+        finally:
+            conn.close()
+
+    def already_scheduled(self, sequence_id: str, prospect_ids: List[str]) -> Set[str]:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT DISTINCT prospect_id::text
+                    FROM prospect_email_scheduled
+                    WHERE sequence_id = %s AND prospect_id = ANY(%s::uuid[])
+                      AND status IN ('scheduled', 'paused', 'sent')
+                """, (sequence_id, prospect_ids))
+                return {row[0] for row in cur.fetchall()}
+        finally:
+            conn.close()
+
+    def insert(self, sequence_id: str, emails: List[Dict[str, Any]]) -> int:
+        from psycopg2.extras import execute_values
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO prospect_email_scheduled
+                        (prospect_id, sequence_id, step_number, subject, body, content_hash,
+                         scheduled_for, status, mailbox)
+                    VALUES %s
+                """, [(
+                    e['prospect_id'], sequence_id, e['step_number'], e['subject'], e['body'],
+                    content_hash(e['subject'], e['body']), e['scheduled_for'], 'scheduled', e['mailbox']
+                ) for e in emails], page_size=1000)
+                inserted = len(emails)
+                cur.execute("""
+                    UPDATE prospects SET emailing_status = 'queued', updated_at = NOW()
+                    WHERE id = ANY(%s::uuid[])
+                """, (list({str(e['prospect_id']) for e in emails}),))
+            conn.commit()
+            return inserted
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def pause(self, prospect_ids: List[str]) -> int:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE prospect_email_scheduled SET status = 'paused', updated_at = NOW()
+                    WHERE prospect_id = ANY(%s::uuid[]) AND status = 'scheduled'
+                """, (prospect_ids,))
+                paused = cur.rowcount
+            conn.commit()
+            return paused
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def fetch(self, status: str, prospect_ids: Optional[List[str]] = None,
+              before: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        from psycopg2.extras import RealDictCursor
+
+        conditions, params = ['status = %s'], [status]
+        if prospect_ids is not None:
+            conditions.append('prospect_id = ANY(%s::uuid[])')
+            params.append(prospect_ids)
+        if before is not None:
+            # Un prospect dont une étape est en retard est replanifié en entier
+            conditions.append("""prospect_id IN (
+                SELECT prospect_id FROM prospect_email_scheduled
+                WHERE status = %s AND scheduled_for < %s)""")
+            params.extend([status, before])
+        conn = self._connect()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(f"""
+                    SELECT id::text, prospect_id::text, step_number, scheduled_for, mailbox, content_hash
+                    FROM prospect_email_scheduled
+                    WHERE {' AND '.join(conditions)}
+                """, params)
+                return [dict(row) for row in cur.fetchall()]
+        finally:
+            conn.close()
+
+    def reschedule(self, updates: List[Dict[str, Any]]) -> int:
+        from psycopg2.extras import execute_values
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    UPDATE prospect_email_scheduled AS s
+                    SET scheduled_for = v.scheduled_for, mailbox = v.mailbox,
+                        status = 'scheduled', updated_at = NOW()
+                    FROM (VALUES %s) AS v(id, scheduled_for, mailbox)
+                    WHERE s.id = v.id AND s.status IN ('scheduled', 'paused')
+                """, [(u['id'], u['scheduled_for'], u['mailbox']) for u in updates],
+                    template='(%s::uuid, %s::timestamptz, %s)', page_size=1000)
+                updated = cur.rowcount
+            conn.commit()
+            return updated
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+class BulkSequenceScheduler:
+    """Lancement, pause, reprise et rattrapage des séquences par lots."""
+
+    def __init__(self, store: Optional[ScheduledEmailStore] = None,
+                 mailboxes: Optional[Dict[str, Tuple[int, int]]] = None,
+                 calendar: Optional[BusinessCalendar] = None,
+                 jitter_minutes: float = DEFAULT_JITTER_MINUTES,
+                 clock: Callable[[], datetime] = lambda: datetime.now(timezone.utc),
+                 dedup: Optional[Any] = None):
+        self.store = store or ScheduledEmailStore()
+        # EmailDedupIndex : anti-doublon de contenu sans requête par email
+        self.dedup = dedup
+        self.mailboxes = mailboxes
+        self.calendar = calendar or BusinessCalendar()
+        self.jitter_minutes = jitter_minutes
+        self.clock = clock
+
+    def _planner(self, now: datetime, seed: Any, excluded_ids: Sequence[str] = ()) -> SequencePlanner:
+        planner = SequencePlanner(self.mailboxes, self.calendar, self.jitter_minutes, seed)
+        planner.load_reserved(self.store.load_reserved(now, excluded_ids))
+        return planner
+
+    def launch(self, sequence_id: str, prospects: List[Dict[str, Any]],
+               steps: Optional[List[Dict[str, Any]]] = None,
+               start: Optional[datetime] = None) -> Dict[str, Any]:
+        """Programme la séquence pour tous les prospects qui ne l'ont pas déjà."""
+        now = self.clock()
+        steps = steps if steps is not None else self.store.load_steps(sequence_id)
+        if not steps:
+            raise ValueError('La séquence ne contient aucune étape')
+        # Anti-doublon de scheduleSequenceForProspect, en une requête
+        skipped = self.store.already_scheduled(sequence_id, [str(p['id']) for p in prospects])
+        targets = [p for p in prospects if str(p['id']) not in skipped]
+        duplicates: List[str] = []
+        if self.dedup is not None:
+            # Comme areEmailsAlreadyScheduledOrSent : un contenu déjà programmé ou envoyé écarte le prospect
+            hashes = [content_hash(s['subject'], s['body']) for s in steps]
+            duplicates = [str(p['id']) for p in targets
+                          if any(self.dedup.contains(str(p['id']), h) for h in hashes)]
+            if duplicates:
+                excluded = set(duplicates)
+                targets = [p for p in targets if str(p['id']) not in excluded]
+        planner = self._planner(now, seed=sequence_id)
+        emails = planner.plan(targets, steps, max(start or now, now))
+        inserted = self.store.insert(sequence_id, emails) if emails else 0
+        if self.dedup is not None and emails:
+            self.dedup.add_scheduled((e['prospect_id'], content_hash(e['subject'], e['body'])) for e in emails)
+        return {
+            'scheduled': inserted,
+            'prospects': len(targets),
+            'skipped': sorted(skipped),
+            'duplicates': duplicates,
+            'first_send': min((e['scheduled_for'] for e in emails), default=None),
+            'last_send': max((e['scheduled_for'] for e in emails), default=None)
+        }
+
+    def pause(self, prospect_ids: List[str]) -> int:
+        # Les créneaux libérés profitent aux prochains placements ; rien d'autre ne bouge
+        paused = self.store.pause(prospect_ids)
+        if self.dedup is not None and paused:
+            self.dedup.release((e['prospect_id'], e['content_hash'])
+                               for e in self.store.fetch('paused', prospect_ids=prospect_ids) if e['content_hash'])
+        return paused
+
+    def resume(self, prospect_ids: List[str]) -> int:
+        """Replanifie les emails en pause de ces prospects à partir de maintenant."""
+        now = self.clock()
+        paused = self.store.fetch('paused', prospect_ids=prospect_ids)
+        if not paused:
+            return 0
+        updates = self._planner(now, seed=now.isoformat()).replan(paused, now)
+        if self.dedup is not None:
+            self.dedup.add_scheduled((e['prospect_id'], e['content_hash']) for e in paused if e['content_hash'])
+        return self.store.reschedule(updates)
+
+    def replan_overdue(self) -> int:
+        """Après un arrêt : replanifie les séquences dont une étape programmée est passée."""
+        now = self.clock()
+        overdue = self.store.fetch('scheduled', before=now)
+        if not overdue:
+            return 0
+        # Les emails replanifiés ne doivent pas occuper leurs propres créneaux
+        planner = self._planner(now, seed=now.isoformat(), excluded_ids=[e['id'] for e in overdue])
+        return self.store.reschedule(planner.replan(overdue, now))
@@ -0,0 +1,582 @@
+"""
+Synchronisation incrémentale Google Calendar <-> RDV.
+
+`IntelligentSyncService.syncCalendar` (intelligent-sync-service.ts) relit à
+chaque passage une fenêtre de -30/+90 jours et réconcilie les événements un par
+un. Ce moteur :
+
+- conserve le `nextSyncToken` Google par intégration et ne récupère ensuite que
+  les événements modifiés depuis la dernière synchronisation (resynchronisation
+  complète uniquement si Google invalide le jeton, HTTP 410) ;
+- tient une table d'empreintes (etag Google + empreinte locale du RDV) pour
+  ignorer les événements inchangés et ne pas renvoyer vers Google nos propres écritures ;
+- écrit les RDV importés en masse et pousse les modifications locales par
+  requêtes batch Google (50 opérations max) avec backoff exponentiel sur les
+  erreurs de quota et les erreurs serveur.
+
+L'API Google est injectée (`GoogleCalendarApi` en production), ce qui permet de
+tester le moteur avec une fausse API en mémoire.
+"""
+
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+GOOGLE_API_URL = 'https://www.googleapis.com/calendar/v3'
+GOOGLE_BATCH_URL = 'https://www.googleapis.com/batch/calendar/v3'
+MAX_BATCH_SIZE = 50  # limite recommandée par Google pour un batch Calendar
+RETRYABLE_STATUSES = {403, 429, 500, 502, 503, 504}
+INITIAL_WINDOW_DAYS = 30
+LOCAL_TIMEZONE = ZoneInfo('Europe/Paris')
+
+USER_COLUMNS = {
+    'client': 'client_id',
+    'expert': 'expert_id',
+    'apporteur': 'apporteur_id'
+}
+
+
+class SyncTokenExpired(Exception):
+    """Le jeton de synchronisation n'est plus valide (HTTP 410) : resynchronisation complète."""
+
+
+class CalendarApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f'{status}: {message}')
+        self.status = status
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+# ============================================================================
+# API GOOGLE CALENDAR
+# ============================================================================
+
+class GoogleCalendarApi:
+    """Client REST minimal de Google Calendar v3 (liste incrémentale et batch)."""
+
+    def __init__(self, access_token: str, session=None, timeout: float = 30.0):
+        if session is None:
+            import requests
+
+            session = requests.Session()
+        self.session = session
+        self.timeout = timeout
+        self.headers = {'Authorization': f'Bearer {access_token}'}
+
+    def list_events(self, calendar_id: str, sync_token: Optional[str] = None,
+                    time_min: Optional[str] = None, page_token: Optional[str] = None) -> Dict[str, Any]:
+        params: Dict[str, Any] = {'maxResults': 2500, 'singleEvents': 'true'}
+        if sync_token:
+            params['syncToken'] = sync_token
+        elif time_min:
+            params['timeMin'] = time_min
+        if page_token:
+            params['pageToken'] = page_token
+
+        response = self.session.get(f'{GOOGLE_API_URL}/calendars/{calendar_id}/events',
+                                    params=params, headers=self.headers, timeout=self.timeout)
+        if response.status_code == 410:
+            raise SyncTokenExpired(calendar_id)
+        if response.status_code >= 400:
+            raise CalendarApiError(response.status_code, response.text)
+        return response.json()
+
+    def batch(self, calendar_id: str, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Exécute jusqu'à 50 opérations en une requête HTTP multipart.
+
+        Chaque opération est `{'method': 'insert'|'patch'|'delete', 'event_id', 'body'}` ;
+        le résultat est une liste `{'status', 'body'}` dans le même ordre.
+        """
+        boundary = f'batch_{uuid.uuid4().hex}'
+        parts = []
+        for index, operation in enumerate(operations):
+            path = f'/calendar/v3/calendars/{calendar_id}/events'
+            if operation['method'] == 'insert':
+                request_line = f'POST {path}'
+            elif operation['method'] == 'patch':
+                request_line = f'PATCH {path}/{operation["event_id"]}'
+            else:
+                request_line = f'DELETE {path}/{operation["event_id"]}'
+            body = json.dumps(operation.get('body') or {}) if operation['method'] != 'delete' else ''
+            parts.append(
+                f'--{boundary}\r\n'
+                'Content-Type: application/http\r\n'
+                f'Content-ID: <item-{index}>\r\n\r\n'
+                f'{request_line} HTTP/1.1\r\n'
+                'Content-Type: application/json\r\n\r\n'
+                f'{body}\r\n'
+            )
+        payload = ''.join(parts) + f'--{boundary}--\r\n'
+
+        response = self.session.post(GOOGLE_BATCH_URL, data=payload.encode(), timeout=self.timeout,
+                                     headers={**self.headers,
+                                              'Content-Type': f'multipart/mixed; boundary={boundary}'})
+        if response.status_code >= 400:
+            return [{'status': response.status_code, 'body': None} for _ in operations]
+        return _parse_batch_response(response.headers.get('Content-Type', ''), response.text,
+                                     len(operations))
+
+
+def _parse_batch_response(content_type: str, text: str, expected: int) -> List[Dict[str, Any]]:
+    boundary = content_type.split('boundary=')[-1].strip('"')
+    results: List[Dict[str, Any]] = [{'status': 500, 'body': None} for _ in range(expected)]
+    for part in text.split(f'--{boundary}'):
+        if 'HTTP/1.1' not in part:
+            continue
+        index = expected
+        for line in part.splitlines():
+            if line.lower().startswith('content-id:') and 'item-' in line:
+                index = int(line.split('item-')[-1].strip(' >'))
+                break
+        http_part = part[part.index('HTTP/1.1'):]
+        status = int(http_part.split()[1])
+        body_start = http_part.find('\r\n\r\n')
+        body_text = http_part[body_start + 4:].strip() if body_start >= 0 else ''
+        try:
+            body = json.loads(body_text) if body_text else None
+        except ValueError:
+            body = None
+        if 0 <= index < expected:
+            results[index] = {'status': status, 'body': body}
+    return results
+
+
+# ============================================================================
+# STOCKAGE (RDV, jetons, empreintes)
+# ============================================================================
+
+class CalendarSyncStore:
+    """Accès PostgreSQL : état de synchronisation, empreintes et RDV."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self._connect = connection_factory
+
+    def load_state(self, integration_id: str) -> Tuple[Optional[str], Dict[str, Dict[str, Any]]]:
+        from psycopg2.extras import RealDictCursor
+
+        conn = self._connect()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT sync_token FROM "GoogleCalendarSyncState"
+                    WHERE integration_id = %s
+                """, (integration_id,))
+                row = cur.fetchone()
+                cur.execute("""
+                    SELECT google_event_id, rdv_id, etag, local_fingerprint
+                    FROM "GoogleCalendarEventFingerprint"
+                    WHERE integration_id = %s
+                """, (integration_id,))
+                fingerprints = {
+                    r['google_event_id']: {
+                        'rdv_id': str(r['rdv_id']) if r['rdv_id'] else None,
+                        'etag': r['etag'],
+                        'local_fingerprint': r['local_fingerprint']
+                    }
+                    for r in cur.fetchall()
+                }
+        finally:
+            conn.close()
+        return (row['sync_token'] if row else None), fingerprints
+
+    def save_state(self, integration_id: str, sync_token: Optional[str],
+                   upserts: Dict[str, Dict[str, Any]], deletes: List[str]) -> None:
+        from psycopg2.extras import execute_values
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                if deletes:
+                    cur.execute("""
+                        DELETE FROM "GoogleCalendarEventFingerprint"
+                        WHERE integration_id = %s AND google_event_id = ANY(%s)
+                    """, (integration_id, deletes))
+                if upserts:
+                    execute_values(cur, """
+                        INSERT INTO "GoogleCalendarEventFingerprint"
+                        (integration_id, google_event_id, rdv_id, etag, local_fingerprint)
+                        VALUES %s
+                        ON CONFLICT (integration_id, google_event_id) DO UPDATE
+                        SET rdv_id = EXCLUDED.rdv_id,
+                            etag = EXCLUDED.etag,
+                            local_fingerprint = EXCLUDED.local_fingerprint,
+                            updated_at = NOW()
+                    """, [
+                        (integration_id, google_id, entry['rdv_id'], entry['etag'], entry['local_fingerprint'])
+                        for google_id, entry in upserts.items()
+                    ])
+                if sync_token is not None:
+                    cur.execute("""
+                        INSERT INTO "GoogleCalendarSyncState" (integration_id, sync_token, updated_at)
+                        VALUES (%s, %s, NOW())
+                        ON CONFLICT (integration_id) DO UPDATE
+                        SET sync_token = EXCLUDED.sync_token, updated_at = NOW()
+                    """, (integration_id, sync_token))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def reset_state(self, integration_id: str) -> None:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute('DELETE FROM "GoogleCalendarSyncState" WHERE integration_id = %s',
+                            (integration_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def apply_remote_changes(self, integration: Dict[str, Any], rows: List[Dict[str, Any]],
+                             deleted_rdv_ids: List[str]) -> Dict[str, str]:
+        """Insère / met à jour les RDV importés en une requête ; retourne google_id -> rdv_id."""
+        from psycopg2.extras import execute_values
+
+        if not rows and not deleted_rdv_ids:
+            return {}
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                if deleted_rdv_ids:
+                    cur.execute("""
+                        UPDATE "RDV" SET status = 'cancelled', updated_at = NOW()
+                        WHERE id = ANY(%s::uuid[])
+                    """, (deleted_rdv_ids,))
+                mapping = {}
+                if rows:
+                    result = execute_values(cur, """
+                        INSERT INTO "RDV"
+                        (id, {user_column}, title, notes, scheduled_date, scheduled_time,
+                         duration_minutes, meeting_type, location, meeting_url, status,
+                         category, source, created_by, metadata)
+                        VALUES %s
+                        ON CONFLICT (id) DO UPDATE
+                        SET title = EXCLUDED.title,
+                            notes = EXCLUDED.notes,
+                            scheduled_date = EXCLUDED.scheduled_date,
+                            scheduled_time = EXCLUDED.scheduled_time,
+                            duration_minutes = EXCLUDED.duration_minutes,
+                            meeting_type = EXCLUDED.meeting_type,
+                            location = EXCLUDED.location,
+                            meeting_url = EXCLUDED.meeting_url,
+                            metadata = EXCLUDED.metadata,
+                            updated_at = NOW()
+                        RETURNING id, metadata->>'googleEventId'
+                    """.format(user_column=USER_COLUMNS[integration['user_type']]), [
+                        (row['id'], integration['user_id'], row['title'], row['notes'],
+                         row['scheduled_date'], row['scheduled_time'], row['duration_minutes'],
+                         row['meeting_type'], row['location'], row['meeting_url'], row['status'],
+                         integration['user_type'], 'google', integration['user_id'],
+                         json.dumps(row['metadata']))
+                        for row in rows
+                    ], template='(%s::uuid, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb)',
+                        fetch=True)
+                    mapping = {google_id: str(rdv_id) for rdv_id, google_id in result}
+            conn.commit()
+            return mapping
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def fetch_local_rdvs(self, integration: Dict[str, Any], since: datetime) -> List[Dict[str, Any]]:
+        """RDV de l'utilisateur modifiés depuis `since`."""
+        from psycopg2.extras import RealDictCursor
+
+        conn = self._connect()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT id, title, notes, scheduled_date, scheduled_time, duration_minutes,
+                           meeting_type, location, meeting_url, status, dossier_id, metadata
+                    FROM "RDV"
+                    WHERE {user_column} = %s
+                      AND updated_at >= %s
+                """.format(user_column=USER_COLUMNS[integration['user_type']]),
+                    (integration['user_id'], since))
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+        return [dict(row, id=str(row['id'])) for row in rows]
+
+
+# ============================================================================
+# CONVERSIONS
+# ============================================================================
+
+def google_event_to_rdv(event: Dict[str, Any], integration: Dict[str, Any],
+                        rdv_id: Optional[str]) -> Dict[str, Any]:
+    """Convertit un événement Google en ligne RDV (cf. convertGoogleToProfitumEvent)."""
+    start = _parse_google_time(event.get('start') or {})
+    end = _parse_google_time(event.get('end') or {}) or start
+    duration = max(15, int((end - start).total_seconds() // 60)) if start and end else 60
+    conference = event.get('conferenceData') or {}
+    entry_points = conference.get('entryPoints') or [{}]
+    private = (event.get('extendedProperties') or {}).get('private') or {}
+    return {
+        # Identifiant déterministe : rejouer le même changement ne crée pas de doublon
+        'id': rdv_id or private.get('profitumEventId') or str(
+            uuid.uuid5(uuid.NAMESPACE_URL, f"{integration['id']}/{event['id']}")),
+        'title': event.get('summary') or 'Événement sans titre',
+        'notes': event.get('description') or '',
+        'scheduled_date': start.strftime('%Y-%m-%d') if start else None,
+        'scheduled_time': start.strftime('%H:%M:%S') if start else None,
+        'duration_minutes': duration,
+        'meeting_type': 'video' if conference else 'physical',
+        'location': event.get('location'),
+        'meeting_url': entry_points[0].get('uri'),
+        'status': 'confirmed',
+        'metadata': {
+            'googleEventId': event['id'],
+            'googleCalendarId': integration['calendar_id'],
+            'source': 'google',
+            'stepId': private.get('profitumStepId'),
+            'dossierId': private.get('profitumDossierId')
+        }
+    }
+
+
+def rdv_to_google_event(rdv: Dict[str, Any], integration: Dict[str, Any],
+                        timezone_name: str = LOCAL_TIMEZONE.key) -> Dict[str, Any]:
+    """Convertit un RDV en événement Google (cf. convertProfitumToGoogleEvent)."""
+    start = datetime.fromisoformat(f"{rdv['scheduled_date']}T{str(rdv['scheduled_time'])[:8]}")
+    end = start + timedelta(minutes=rdv.get('duration_minutes') or 60)
+    metadata = rdv.get('metadata') or {}
+    return {
+        'summary': rdv.get('title'),
+        'description': rdv.get('notes') or '',
+        'start': {'dateTime': start.isoformat(), 'timeZone': timezone_name},
+        'end': {'dateTime': end.isoformat(), 'timeZone': timezone_name},
+        'location': rdv.get('location'),
+        'status': 'cancelled' if rdv.get('status') == 'cancelled' else 'confirmed',
+        'extendedProperties': {
+            'private': {
+                'profitumEventId': rdv['id'],
+                'profitumUserId': integration['user_id'],
+                'profitumUserType': integration['user_type'],
+                'profitumDossierId': rdv.get('dossier_id'),
+                'profitumStepId': metadata.get('stepId')
+            }
+        }
+    }
+
+
+def local_fingerprint(rdv: Dict[str, Any]) -> str:
+    """Empreinte des champs synchronisés d'un RDV (détecte les vrais changements)."""
+    fields = [str(rdv.get(k) or '') for k in (
+        'title', 'notes', 'scheduled_date', 'scheduled_time', 'duration_minutes',
+        'meeting_type', 'location', 'meeting_url', 'status'
+    )]
+    return hashlib.sha1('\x1f'.join(fields).encode()).hexdigest()
+
+
+def _parse_google_time(value: Dict[str, Any]) -> Optional[datetime]:
+    raw = value.get('dateTime') or value.get('date')
+    if not raw:
+        return None
+    parsed = datetime.fromisoformat(raw.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        # Les RDV sont stockés en heure locale (scheduled_date / scheduled_time)
+        parsed = parsed.astimezone(LOCAL_TIMEZONE)
+    return parsed.replace(tzinfo=None)
+
+
+# ============================================================================
+# MOTEUR
+# ============================================================================
+
+class IncrementalCalendarSync:
+    """Synchronisation incrémentale d'une intégration Google Calendar."""
+
+    def __init__(self, store: Optional[CalendarSyncStore] = None,
+                 api_factory: Callable[[Dict[str, Any]], Any] = None,
+                 max_retries: int = 5, base_delay: float = 0.5, max_delay: float = 32.0,
+                 sleep: Callable[[float], None] = time.sleep,
+                 push_lookback: timedelta = timedelta(hours=24)):
+        # `push_lookback` doit couvrir l'intervalle entre deux synchronisations ;
+        # le recouvrement est sans coût grâce aux empreintes locales.
+        self.store = store or CalendarSyncStore()
+        self.api_factory = api_factory or (lambda integration: GoogleCalendarApi(integration['access_token']))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.push_lookback = push_lookback
+
+    def sync_calendar(self, integration: Dict[str, Any]) -> Dict[str, Any]:
+        """Synchronise selon `sync_direction` (import, export ou bidirectional).
+
+        Returns:
+            Dict[str, Any]: Le résultat au format `SyncResult` du service Node
+        """
+        started = time.time()
+        api = self.api_factory(integration)
+        result = {'success': True, 'eventsProcessed': 0, 'eventsCreated': 0,
+                  'eventsUpdated': 0, 'eventsDeleted': 0, 'errors': [], 'apiCalls': 0}
+        direction = integration.get('sync_direction') or 'bidirectional'
+        if direction not in ('import', 'export', 'bidirectional'):
+            raise ValueError('Direction de synchronisation invalide')
+
+        sync_token, fingerprints = self.store.load_state(integration['id'])
+        if direction in ('import', 'bidirectional'):
+            sync_token = self._pull(api, integration, sync_token, fingerprints, result)
+        if direction in ('export', 'bidirectional'):
+            self._push(api, integration, fingerprints, result)
+
+        result['success'] = not result['errors']
+        result['duration'] = int((time.time() - started) * 1000)
+        return result
+
+    # Import -----------------------------------------------------------
+
+    def _pull(self, api, integration: Dict[str, Any], sync_token: Optional[str],
+              fingerprints: Dict[str, Dict[str, Any]], result: Dict[str, Any]) -> Optional[str]:
+        try:
+            changes, next_token = self._list_changes(api, integration, sync_token, result)
+        except SyncTokenExpired:
+            print(f"Jeton de synchronisation expiré pour {integration['id']}, resynchronisation complète")
+            self.store.reset_state(integration['id'])
+            changes, next_token = self._list_changes(api, integration, None, result)
+
+        rows, deleted_rdv_ids, deleted_google_ids, pending = [], [], [], {}
+        for event in changes:
+            result['eventsProcessed'] += 1
+            google_id = event['id']
+            known = fingerprints.get(google_id)
+            if event.get('status') == 'cancelled':
+                if known:
+                    deleted_google_ids.append(google_id)
+                    if known.get('rdv_id'):
+                        deleted_rdv_ids.append(known['rdv_id'])
+                continue
+            if known and known.get('etag') == event.get('etag'):
+                continue  # inchangé (ou écho de notre propre écriture)
+            row = google_event_to_rdv(event, integration, known.get('rdv_id') if known else None)
+            if not row['scheduled_date']:
+                continue
+            rows.append(row)
+            pending[google_id] = {'etag': event.get('etag'), 'local_fingerprint': local_fingerprint(row),
+                                  'rdv_id': row['id'], 'is_new': known is None}
+
+        mapping = self.store.apply_remote_changes(integration, rows, deleted_rdv_ids)
+        upserts = {}
+        for google_id, entry in pending.items():
+            result['eventsCreated' if entry.pop('is_new') else 'eventsUpdated'] += 1
+            entry['rdv_id'] = mapping.get(google_id, entry['rdv_id'])
+            upserts[google_id] = entry
+            fingerprints[google_id] = entry
+        for google_id in deleted_google_ids:
+            fingerprints.pop(google_id, None)
+        result['eventsDeleted'] += len(deleted_google_ids)
+
+        # Le jeton n'est enregistré qu'une fois les changements appliqués
+        self.store.save_state(integration['id'], next_token, upserts, deleted_google_ids)
+        return next_token
+
+    def _list_changes(self, api, integration: Dict[str, Any], sync_token: Optional[str],
+                      result: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        time_min = None
+        if not sync_token:
+            time_min = (datetime.now(timezone.utc) - timedelta(days=INITIAL_WINDOW_DAYS)).isoformat()
+        changes, page_token = [], None
+        while True:
+            page = self._with_backoff(lambda: api.list_events(integration['calendar_id'], sync_token=sync_token,
+                                                              time_min=time_min, page_token=page_token))
+            result['apiCalls'] += 1
+            changes.extend(page.get('items') or [])
+            page_token = page.get('nextPageToken')
+            if not page_token:
+                return changes, page.get('nextSyncToken')
+
+    # Export -----------------------------------------------------------
+
+    def _push(self, api, integration: Dict[str, Any], fingerprints: Dict[str, Dict[str, Any]],
+              result: Dict[str, Any]) -> None:
+        by_rdv = {entry['rdv_id']: google_id for google_id, entry in fingerprints.items() if entry.get('rdv_id')}
+        since = datetime.now(timezone.utc) - self.push_lookback
+        operations, targets = [], []
+        for rdv in self.store.fetch_local_rdvs(integration, since):
+            fingerprint = local_fingerprint(rdv)
+            google_id = by_rdv.get(rdv['id'])
+            if google_id and fingerprints[google_id].get('local_fingerprint') == fingerprint:
+                continue
+            body = rdv_to_google_event(rdv, integration)
+            if google_id:
+                operations.append({'method': 'patch', 'event_id': google_id, 'body': body})
+            elif rdv.get('status') == 'cancelled':
+                continue
+            else:
+                operations.append({'method': 'insert', 'event_id': None, 'body': body})
+            targets.append((rdv, fingerprint, google_id))
+
+        upserts: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(operations), MAX_BATCH_SIZE):
+            chunk_ops = operations[start:start + MAX_BATCH_SIZE]
+            chunk_targets = targets[start:start + MAX_BATCH_SIZE]
+            responses = self._batch_with_backoff(api, integration['calendar_id'], chunk_ops, result)
+            for (rdv, fingerprint, google_id), operation, response in zip(chunk_targets, chunk_ops, responses):
+                result['eventsProcessed'] += 1
+                if response['status'] >= 300:
+                    result['errors'].append(f"Erreur export RDV {rdv['id']}: HTTP {response['status']}")
+                    continue
+                body = response.get('body') or {}
+                new_google_id = body.get('id') or google_id
+                entry = {'rdv_id': rdv['id'], 'etag': body.get('etag'), 'local_fingerprint': fingerprint}
+                upserts[new_google_id] = entry
+                fingerprints[new_google_id] = entry
+                result['eventsCreated' if operation['method'] == 'insert' else 'eventsUpdated'] += 1
+
+        if upserts:
+            self.store.save_state(integration['id'], None, upserts, [])
+
+    def _batch_with_backoff(self, api, calendar_id: str, operations: List[Dict[str, Any]],
+                            result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Envoie un batch puis rejoue uniquement les sous-requêtes en erreur temporaire."""
+        responses: List[Optional[Dict[str, Any]]] = [None] * len(operations)
+        remaining = list(range(len(operations)))
+        for attempt in range(self.max_retries + 1):
+            batch_responses = api.batch(calendar_id, [operations[i] for i in remaining])
+            result['apiCalls'] += 1
+            retry = []
+            for index, response in zip(remaining, batch_responses):
+                responses[index] = response
+                if response['status'] in RETRYABLE_STATUSES:
+                    retry.append(index)
+            if not retry or attempt == self.max_retries:
+                break
+            remaining = retry
+            self.sleep(self._delay(attempt))
+        return responses  # type: ignore[return-value]
+
+    def _with_backoff(self, call: Callable[[], Any]) -> Any:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return call()
+            except CalendarApiError as e:
+                if e.status not in RETRYABLE_STATUSES or attempt == self.max_retries:
+                    raise
+                self.sleep(self._delay(attempt))
+
+    def _delay(self, attempt: int) -> float:
+        # Backoff exponentiel avec jitter complet
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
@@ -96,7 +96,8 @@ export class DailyActivityReportServiceV2 {
     date: Date = new Date(), 
     adminId?: string, 
     adminType?: string,
-    useCache: boolean = true
+    useCache: boolean = true,
+    onSection?: (section: string, data: unknown) => void
   ): Promise<DailyReportDataV2> {
     const dateStr = date.toISOString().split('T')[0];
     const tomorrow = new Date(date);
@@ -116,6 +117,13 @@ export class DailyActivityReportServiceV2 {
 
     console.log(`📊 Génération rapport d'activité V2 pour le ${dateStr}`);
 
+    // Chaque section est publiée dès qu'elle est prête (résultats partiels du worker de rapports)
+    const section = <T>(name: string, promise: PromiseLike<T>, data: (value: T) => unknown): Promise<T> =>
+      Promise.resolve(promise).then(value => {
+        onSection?.(name, data(value));
+        return value;
+      });
+
     // ✅ PARALLÉLISATION : Exécuter les requêtes indépendantes en parallèle
     const [
       pendingActions,
@@ -123,15 +131,19 @@ export class DailyActivityReportServiceV2 {
       { data: rdvTomorrow, error: rdvTomorrowError }
     ] = await Promise.all([
       // 1. Actions non traitées
-      this.getPendingActions(adminId, adminType),
+      section('pendingActions', this.getPendingActions(adminId, adminType), value => value),
       
       // 2. RDV complétés sans rapport
-      this.getRDVWithoutReports(adminId, adminType),
+      section('rdvWithoutReports', this.getRDVWithoutReports(adminId, adminType), value => value),
       
       // 3. RDV du lendemain
-      BaseReportService.createBaseRDVQuery()
-        .eq('scheduled_date', tomorrowStr)
-        .order('scheduled_time', { ascending: true })
+      section(
+        'rdvTomorrow',
+        BaseReportService.createBaseRDVQuery()
+          .eq('scheduled_date', tomorrowStr)
+          .order('scheduled_time', { ascending: true }),
+        ({ data }) => BaseReportService.normalizeRDVs(data || [])
+      )
     ]);
 
     if (rdvTomorrowError) {
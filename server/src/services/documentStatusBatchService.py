@@ -0,0 +1,275 @@
+"""
+Évaluation groupée de l'état documentaire de tous les dossiers.
+
+`DocumentStatusChecker.checkDocumentStatus` (document-status-checker.ts)
+enchaîne pour chaque dossier trois lectures unitaires ("ClientProduitEligible",
+"Client", "ProduitEligible") puis la lecture de ses documents, et
+`getNotificationTypeForDossier` relit encore le dossier ; le cron de rappels
+(document-validation-reminder-service.ts) répète cela dossier par dossier.
+
+Ici, les dossiers sont lus par lots ordonnés par id, en une requête par lot
+qui joint client, produit, agrégats de "ClientProcessDocument" et dernier état
+connu. L'état et la notification sont calculés en mémoire avec les mêmes règles
+que le code Node ; seuls les dossiers dont l'état a changé depuis le passage
+précédent sont retournés, et leur nouvel état est écrit en un upsert par lot.
+"""
+
+import os
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_CHUNK_SIZE = 1000
+DAY_SECONDS = 86400
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def _days_since(moment: Optional[datetime], now: datetime) -> Optional[int]:
+    if moment is None:
+        return None
+    return int((now - moment).total_seconds() // DAY_SECONDS)
+
+
+def _plural(count: int) -> str:
+    return 's' if count > 1 else ''
+
+
+def document_status(row: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """Équivalent de checkDocumentStatus pour une ligne jointe (agrégats de documents inclus)."""
+    total = row.get('documents_total') or 0
+    pending = row.get('documents_pending') or 0
+    validated = row.get('documents_validated') or 0
+    has_uploaded = total > 0
+    return {
+        'has_uploaded_documents': has_uploaded,
+        'pending_documents_count': pending,
+        'validated_documents_count': validated,
+        'all_documents_validated': has_uploaded and pending == 0 and validated > 0,
+        'days_waiting_documents': None if has_uploaded else _days_since(row.get('created_at'), now),
+        'days_waiting_validation': (_days_since(row.get('first_document_at'), now)
+                                    if has_uploaded and pending > 0 else None),
+        'client_name': row.get('company_name') or row.get('client_name') or 'Client',
+        'product_name': row.get('product_name') or 'Dossier'
+    }
+
+
+def notification_for(dossier_id: str, row: Dict[str, Any], status: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Équivalent de getNotificationTypeForDossier, sans relecture du dossier."""
+    product, client = status['product_name'], status['client_name']
+
+    if not status['has_uploaded_documents']:
+        days = status['days_waiting_documents'] or 0
+        return {
+            'notification_type': 'waiting_documents',
+            'title': f'📋 En attente de documents - {product}',
+            'message': f'Dossier {product} - Client {client} - Depuis {days} jour{_plural(days)}',
+            'priority': 'high' if days >= 5 else 'medium' if days >= 2 else 'normal',
+            'metadata': {
+                'client_produit_id': dossier_id,
+                'client_name': client,
+                'product_name': product,
+                'days_waiting': days,
+                'status': 'waiting_documents'
+            }
+        }
+
+    if status['pending_documents_count'] > 0:
+        # Déjà validé par l'admin ou l'expert : pas de notification
+        if row.get('admin_eligibility_status') == 'validated' or row.get('expert_validation_status') == 'validated':
+            return None
+        days = status['days_waiting_validation'] or 0
+        pending = status['pending_documents_count']
+        return {
+            'notification_type': 'documents_to_validate',
+            'title': f'📋 Documents à valider - {product}',
+            'message': (f'Dossier {product} - Client {client} - {pending} document{_plural(pending)} '
+                        f'en attente depuis {days} jour{_plural(days)}'),
+            'priority': 'urgent' if days >= 5 else 'high' if days >= 2 else 'medium',
+            'metadata': {
+                'client_produit_id': dossier_id,
+                'client_name': client,
+                'product_name': product,
+                'pending_documents_count': pending,
+                'days_waiting': days,
+                'status': 'documents_to_validate'
+            }
+        }
+
+    if status['all_documents_validated'] and row.get('admin_eligibility_status') == 'validated':
+        return {
+            'notification_type': 'dossier_complete',
+            'title': f'✅ Dossier de pré-éligibilité complet - {product}',
+            'message': (f'Client {client} - Dossier de pré-éligibilité complet - '
+                        'Aider le client à trouver le bon expert'),
+            'priority': 'medium',
+            'metadata': {
+                'client_produit_id': dossier_id,
+                'client_name': client,
+                'product_name': product,
+                'status': 'dossier_complete',
+                'action_required': 'select_expert'
+            }
+        }
+    return None
+
+
+def status_key(status: Dict[str, Any], notification: Optional[Dict[str, Any]]) -> str:
+    """Empreinte de l'état : change avec la notification, sa priorité ou les compteurs de documents.
+
+    Le simple passage des jours n'en fait pas partie ; le franchissement d'un
+    seuil de priorité, si.
+    """
+    return '|'.join((
+        notification['notification_type'] if notification else 'none',
+        notification['priority'] if notification else '',
+        str(status['pending_documents_count']),
+        str(status['validated_documents_count']),
+        '1' if status['has_uploaded_documents'] else '0'
+    ))
+
+
+class DocumentStatusStore:
+    """Lecture par lots des dossiers joints à leurs documents, et états mémorisés."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self._connect = connection_factory
+
+    def iter_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE, pending_only: bool = False,
+                    dossier_ids: Optional[List[str]] = None) -> Iterator[Tuple[List[Dict[str, Any]], datetime]]:
+        """Lots de dossiers (avec agrégats de documents et état précédent) et heure de la base."""
+        from psycopg2.extras import RealDictCursor
+
+        conditions = ['d.id > %(after)s']
+        params: Dict[str, Any] = {'limit': chunk_size}
+        if pending_only:
+            # Même sélection que DocumentValidationReminderService.checkAndSendReminders
+            conditions.append("(d.admin_eligibility_status = 'pending' OR d.admin_eligibility_status IS NULL)")
+        if dossier_ids is not None:
+            conditions.append('d.id = ANY(%(ids)s::uuid[])')
+            params['ids'] = dossier_ids
+
+        after = '00000000-0000-0000-0000-000000000000'
+        conn = self._connect()
+        try:
+            while True:
+                params['after'] = after
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(f"""
+                        WITH chunk AS (
+                            SELECT d.id, d."clientId", d."produitId", d.statut, d.admin_eligibility_status,
+                                   d.expert_validation_status, d.created_at
+                            FROM "ClientProduitEligible" d
+                            WHERE {' AND '.join(conditions)}
+                            ORDER BY d.id
+                            LIMIT %(limit)s
+                        ),
+                        documents AS (
+                            SELECT client_produit_id,
+                                   count(*) AS documents_total,
+                                   count(*) FILTER (WHERE validation_status = 'validated') AS documents_validated,
+                                   count(*) FILTER (WHERE validation_status IS NULL
+                                                    OR validation_status NOT IN ('validated', 'rejected'))
+                                       AS documents_pending,
+                                   min(created_at) AS first_document_at
+                            FROM "ClientProcessDocument"
+                            WHERE client_produit_id IN (SELECT id FROM chunk)
+                            GROUP BY client_produit_id
+                        )
+                        SELECT chunk.id::text AS id, chunk.statut, chunk.admin_eligibility_status,
+                               chunk.expert_validation_status, chunk.created_at,
+                               c.company_name, c.name AS client_name, p.nom AS product_name,
+                               documents.documents_total, documents.documents_validated,
+                               documents.documents_pending, documents.first_document_at,
+                               s.status_key AS previous_status_key, NOW() AS db_now
+                        FROM chunk
+                        LEFT JOIN "Client" c ON c.id = chunk."clientId"
+                        LEFT JOIN "ProduitEligible" p ON p.id = chunk."produitId"
+                        LEFT JOIN documents ON documents.client_produit_id = chunk.id
+                        LEFT JOIN dossier_document_status s ON s.client_produit_id = chunk.id
+                        ORDER BY chunk.id
+                    """, params)
+                    rows = [dict(r) for r in cur.fetchall()]
+                conn.commit()
+                if not rows:
+                    return
+                yield rows, rows[0]['db_now']
+                if len(rows) < chunk_size:
+                    return
+                after = rows[-1]['id']
+        finally:
+            conn.close()
+
+    def save(self, states: List[Tuple[str, str, Optional[str], Optional[str]]]) -> int:
+        """states : (client_produit_id, status_key, notification_type, priority)."""
+        from psycopg2.extras import execute_values
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO dossier_document_status
+                        (client_produit_id, status_key, notification_type, priority, evaluated_at)
+                    VALUES %s
+                    ON CONFLICT (client_produit_id) DO UPDATE
+                    SET status_key = EXCLUDED.status_key,
+                        notification_type = EXCLUDED.notification_type,
+                        priority = EXCLUDED.priority,
+                        evaluated_at = EXCLUDED.evaluated_at
+                """, states, template='(%s::uuid, %s, %s, %s, NOW())', page_size=1000)
+                written = cur.rowcount
+            conn.commit()
+            return written
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+class DocumentStatusEvaluator:
+    """Balayage des dossiers : état documentaire et notification, changements uniquement."""
+
+    def __init__(self, store: Optional[DocumentStatusStore] = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.store = store or DocumentStatusStore()
+        self.chunk_size = chunk_size
+
+    def evaluate(self, pending_only: bool = False, dossier_ids: Optional[List[str]] = None,
+                 record: bool = True) -> List[Dict[str, Any]]:
+        """Retourne les dossiers dont l'état a changé depuis le passage précédent.
+
+        Chaque entrée : client_produit_id, status (checkDocumentStatus),
+        notification (getNotificationTypeForDossier, ou None) et previous_status_key.
+        `record=False` évalue sans mémoriser le nouvel état.
+        """
+        changed: List[Dict[str, Any]] = []
+        for rows, now in self.store.iter_chunks(self.chunk_size, pending_only, dossier_ids):
+            if now.tzinfo is None:
+                now = now.replace(tzinfo=timezone.utc)
+            states = []
+            for row in rows:
+                status = document_status(row, now)
+                notification = notification_for(row['id'], row, status)
+                key = status_key(status, notification)
+                if key == row.get('previous_status_key'):
+                    continue
+                changed.append({
+                    'client_produit_id': row['id'],
+                    'status': status,
+                    'notification': notification,
+                    'previous_status_key': row.get('previous_status_key')
+                })
+                states.append((row['id'], key, notification['notification_type'] if notification else None,
+                               notification['priority'] if notification else None))
+            if record and states:
+                self.store.save(states)
+        return changed
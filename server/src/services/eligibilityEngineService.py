@@ -0,0 +1,363 @@
+"""
+Moteur de règles d'éligibilité compilé (porte oui/non, sans calcul de montant).
+
+`evaluer_eligibilite_avec_calcul` parcourt les produits actifs un par un et,
+pour chacun, relit et interprète sa règle après avoir passé les réponses dans
+`mapper_reponses_vers_variables`. Ce moteur compile une fois toutes les règles
+de tous les produits en tables de prédicats :
+
+- égalité / appartenance : table valeur -> masque des atomes satisfaits ;
+- seuils numériques : seuils triés + masques cumulés (une bissection par variable) ;
+- chaque produit : clauses AND (masque requis) / OR (masque d'au moins un atome).
+
+Un jeu de réponses est évalué en une passe : un masque d'atomes est construit
+variable par variable, puis chaque produit se résout par une opération sur
+entiers. `evaluate_batch` évalue N jeux de réponses avec NumPy (matrice
+d'atomes N x A, produits matriciels pour les clauses).
+
+Les règles viennent de "EligibilityRules" (table lue par la fonction SQL) :
+    simple   : {"question_id": "GENERAL_001", "operator": "equals", "value": "..."}
+    combined : {"operator": "AND" | "OR", "rules": [{...}, {...}]}
+Une condition peut viser un code de question ou une variable mappée
+(`litres_carburant_mois`, `nb_chauffeurs`...).
+"""
+
+import bisect
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+NUMERIC_OPERATORS = ('greater_than', 'greater_or_equal', 'less_than', 'less_or_equal')
+OPERATOR_ALIASES = {
+    '=': 'equals', '==': 'equals', '!=': 'not_equals', '<>': 'not_equals',
+    '>': 'greater_than', '>=': 'greater_or_equal', '<': 'less_than', '<=': 'less_or_equal',
+    'contains': 'includes'
+}
+TRUTHY = ('oui', 'yes', 'true', '1')
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def _to_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value: Any) -> Optional[str]:
+    """Valeur comparée comme le fait `->>` en SQL (texte)."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def map_answers_to_variables(answers: Dict[str, Any]) -> Dict[str, Any]:
+    """Équivalent Python de `mapper_reponses_vers_variables` (20251112_update_mapper_reponses.sql)."""
+    renamed = {
+        'GENERAL_001': 'secteur', 'GENERAL_002': 'ca_tranche', 'GENERAL_003': 'nb_employes_tranche',
+        'GENERAL_004': 'proprietaire_locaux', 'GENERAL_005': 'contrats_energie',
+        'TICPE_001': 'possede_vehicules', 'TICPE_003': 'types_vehicules', 'RECOUVR_001': 'niveau_impayes'
+    }
+    numeric = {
+        'TICPE_002': 'litres_carburant_mois', 'DFS_001': 'nb_chauffeurs',
+        'FONCIER_001': 'montant_taxe_fonciere', 'CALCUL_ENERGIE_FACTURES': 'montant_factures_energie_mois'
+    }
+    result: Dict[str, Any] = {}
+    has_gaz = has_elec = False
+    gaz_amount = elec_amount = 0.0
+    for key, value in (answers or {}).items():
+        if key in renamed:
+            result[renamed[key]] = value
+        elif key in numeric:
+            result[numeric[key]] = _to_number(value) or 0
+        elif key == 'ENERGIE_GAZ_FACTURES':
+            has_gaz = (_text(value) or '').lower() in TRUTHY
+            result[key] = 1 if has_gaz else 0
+        elif key == 'ENERGIE_ELEC_FACTURES':
+            has_elec = (_text(value) or '').lower() in TRUTHY
+            result[key] = 1 if has_elec else 0
+        elif key == 'ENERGIE_GAZ_MONTANT':
+            gaz_amount = _to_number(value) or 0
+            result['montant_factures_gaz_mois'] = gaz_amount
+        elif key == 'ENERGIE_ELEC_MONTANT':
+            elec_amount = _to_number(value) or 0
+            result['montant_factures_elec_mois'] = elec_amount
+        else:
+            result[key] = value
+
+    # Compatibilité descendante : anciens champs énergie
+    answers = answers or {}
+    has_gaz = has_gaz or (_text(answers.get('general_energie_gaz')) or '').lower() in TRUTHY
+    gaz_amount = gaz_amount or _to_number(answers.get('energie_gaz_montant')) or 0
+    has_elec = has_elec or (_text(answers.get('general_energie_elec')) or '').lower() in TRUTHY
+    elec_amount = elec_amount or _to_number(answers.get('energie_elec_montant')) or 0
+
+    total_energy = _to_number(result.get('montant_factures_energie_mois')) or 0
+    if has_gaz or gaz_amount > 0:
+        total_energy += gaz_amount
+        result['montant_factures_gaz_mois'] = gaz_amount
+    if has_elec or elec_amount > 0:
+        total_energy += elec_amount
+        result['montant_factures_elec_mois'] = elec_amount
+    result['montant_factures_energie_mois'] = total_energy
+    if 'contrats_energie' not in result:
+        result['contrats_energie'] = 'Oui' if has_gaz or has_elec else 'Non'
+    return result
+
+
+class _VariableTable:
+    """Prédicats compilés d'une variable : tables d'égalité et seuils triés."""
+
+    def __init__(self):
+        self.equals: Dict[str, int] = {}      # valeur -> atomes equals / in satisfaits
+        self.includes: Dict[str, int] = {}    # élément -> atomes includes satisfaits
+        self.not_equals_all = 0               # atomes not_equals (vrais sauf valeur égale)
+        self.not_equals: Dict[str, int] = {}  # valeur -> atomes not_equals faux
+        self.thresholds: Dict[str, Tuple[List[float], List[int]]] = {}
+        self._raw_thresholds: Dict[str, List[Tuple[float, int]]] = {}
+
+    def add(self, operator: str, value: Any, atom: int) -> None:
+        bit = 1 << atom
+        if operator in NUMERIC_OPERATORS:
+            threshold = _to_number(value)
+            if threshold is not None:
+                self._raw_thresholds.setdefault(operator, []).append((threshold, bit))
+        elif operator == 'not_equals':
+            self.not_equals_all |= bit
+            key = _text(value)
+            self.not_equals[key] = self.not_equals.get(key, 0) | bit
+        elif operator == 'includes':
+            key = _text(value)
+            self.includes[key] = self.includes.get(key, 0) | bit
+        elif operator == 'in':
+            for item in value if isinstance(value, list) else [value]:
+                key = _text(item)
+                self.equals[key] = self.equals.get(key, 0) | bit
+        else:
+            key = _text(value)
+            self.equals[key] = self.equals.get(key, 0) | bit
+
+    def freeze(self) -> None:
+        # greater_* : atomes satisfaits = seuils < x (préfixe) ; less_* : seuils > x (suffixe)
+        for operator, pairs in self._raw_thresholds.items():
+            pairs.sort()
+            values = [t for t, _ in pairs]
+            masks = [0] * (len(pairs) + 1)
+            if operator.startswith('greater'):
+                for i, (_, bit) in enumerate(pairs):
+                    masks[i + 1] = masks[i] | bit
+            else:
+                for i in range(len(pairs) - 1, -1, -1):
+                    masks[i] = masks[i + 1] | pairs[i][1]
+            self.thresholds[operator] = (values, masks)
+
+    def match(self, value: Any) -> int:
+        if value is None or value == '' or value == []:
+            return 0
+        mask = 0
+        if isinstance(value, list):
+            for item in value:
+                mask |= self.includes.get(_text(item), 0)
+        else:
+            key = _text(value)
+            mask |= self.equals.get(key, 0) | self.includes.get(key, 0)
+            mask |= self.not_equals_all & ~self.not_equals.get(key, 0)
+        if self.thresholds:
+            number = _to_number(value) if not isinstance(value, list) else None
+            if number is not None:
+                for operator, (values, masks) in self.thresholds.items():
+                    if operator == 'greater_than':
+                        mask |= masks[bisect.bisect_left(values, number)]
+                    elif operator == 'greater_or_equal':
+                        mask |= masks[bisect.bisect_right(values, number)]
+                    elif operator == 'less_than':
+                        mask |= masks[bisect.bisect_right(values, number)]
+                    else:
+                        mask |= masks[bisect.bisect_left(values, number)]
+        return mask
+
+
+class EligibilityRuleEngine:
+    """Règles de tous les produits compilées en masques d'atomes."""
+
+    def __init__(self, products: List[Dict[str, Any]], rules: List[Dict[str, Any]]):
+        self.products = products
+        self.product_names = [p['nom'] for p in products]
+        self.atoms: List[Tuple[str, str, Any]] = []
+        self._atom_index: Dict[Tuple[str, str, str], int] = {}
+        self.variables: Dict[str, _VariableTable] = {}
+        # Clauses par produit : (est_un_OU, masque)
+        self.clauses: List[List[Tuple[bool, int]]] = [[] for _ in products]
+
+        position = {name: i for i, name in enumerate(self.product_names)}
+        for rule in sorted(rules, key=lambda r: r.get('priority') or 0):
+            product = position.get(rule.get('produit_nom'))
+            if product is None or rule.get('is_active') is False:
+                continue
+            conditions = rule.get('conditions') or {}
+            if rule.get('rule_type') == 'combined':
+                members = conditions.get('rules') or []
+                is_or = str(conditions.get('operator', 'AND')).upper() == 'OR'
+            else:
+                members, is_or = [conditions], False
+            mask = 0
+            for member in members:
+                atom = self._atom(member)
+                if atom is not None:
+                    mask |= 1 << atom
+            if mask:
+                self.clauses[product].append((is_or, mask))
+
+        for table in self.variables.values():
+            table.freeze()
+
+    def _atom(self, condition: Dict[str, Any]) -> Optional[int]:
+        variable = condition.get('question_id') or condition.get('variable')
+        if not variable:
+            return None
+        operator = condition.get('operator') or 'equals'
+        operator = OPERATOR_ALIASES.get(operator, operator)
+        value = condition.get('value')
+        key = (variable, operator, repr(value))
+        if key not in self._atom_index:
+            self._atom_index[key] = len(self.atoms)
+            self.atoms.append((variable, operator, value))
+            self.variables.setdefault(variable, _VariableTable()).add(operator, value, len(self.atoms) - 1)
+        return self._atom_index[key]
+
+    @staticmethod
+    def _record(answers: Dict[str, Any]) -> Dict[str, Any]:
+        # Les règles peuvent viser un code de question ou une variable mappée
+        return {**(answers or {}), **map_answers_to_variables(answers)}
+
+    def atom_mask(self, answers: Dict[str, Any]) -> int:
+        record = self._record(answers)
+        mask = 0
+        for variable, table in self.variables.items():
+            mask |= table.match(record.get(variable))
+        return mask
+
+    def evaluate(self, answers: Dict[str, Any]) -> Dict[str, bool]:
+        """Éligibilité oui/non de chaque produit pour un jeu de réponses (une passe)."""
+        atoms = self.atom_mask(answers)
+        result = {}
+        for name, clauses in zip(self.product_names, self.clauses):
+            result[name] = all((atoms & mask) != 0 if is_or else (atoms & mask) == mask
+                               for is_or, mask in clauses)
+        return result
+
+    def eligible_products(self, answers: Dict[str, Any]) -> List[Dict[str, Any]]:
+        verdicts = self.evaluate(answers)
+        return [p for p in self.products if verdicts[p['nom']]]
+
+    def evaluate_batch(self, answer_sets: Iterable[Dict[str, Any]]):
+        """Évalue N jeux de réponses ; retourne une matrice booléenne N x produits."""
+        import numpy as np
+
+        records = [self._record(answers) for answers in answer_sets]
+        n, a = len(records), len(self.atoms)
+        atoms = np.zeros((n, a), dtype=bool)
+        for variable, table in self.variables.items():
+            column = [record.get(variable) for record in records]
+            atoms |= self._batch_match(np, table, column, a)
+
+        clause_masks = [(product, is_or, mask)
+                        for product, clauses in enumerate(self.clauses) for is_or, mask in clauses]
+        if not clause_masks:
+            return np.ones((n, len(self.products)), dtype=bool)
+        members = np.zeros((a, len(clause_masks)), dtype=np.int32)
+        owners = np.zeros((len(clause_masks), len(self.products)), dtype=np.int32)
+        is_or = np.zeros(len(clause_masks), dtype=bool)
+        for c, (product, clause_or, mask) in enumerate(clause_masks):
+            members[self._bits(mask), c] = 1
+            owners[c, product] = 1
+            is_or[c] = clause_or
+        hits = atoms.astype(np.int32) @ members
+        satisfied = np.where(is_or, hits > 0, hits == members.sum(axis=0))
+        return ((~satisfied).astype(np.int32) @ owners) == 0
+
+    @staticmethod
+    def _bits(mask: int) -> List[int]:
+        bits = []
+        while mask:
+            low = mask & -mask
+            bits.append(low.bit_length() - 1)
+            mask ^= low
+        return bits
+
+    def _batch_match(self, np, table: _VariableTable, column: List[Any], width: int):
+        """Matrice N x A des atomes satisfaits par une variable, vectorisée par colonne."""
+        n = len(column)
+        out = np.zeros((n, width), dtype=bool)
+        present = np.array([v is not None and v != '' and v != [] for v in column], dtype=bool)
+        is_list = np.array([isinstance(v, list) for v in column], dtype=bool)
+        texts = np.array([_text(v) if not isinstance(v, list) else None for v in column], dtype=object)
+        scalar = present & ~is_list
+
+        for value, mask in list(table.equals.items()) + list(table.includes.items()):
+            out[:, self._bits(mask)] |= (scalar & (texts == value))[:, None]
+        for value, mask in table.includes.items():
+            contains = np.array([isinstance(v, list) and any(_text(i) == value for i in v) for v in column])
+            out[:, self._bits(mask)] |= contains[:, None]
+        if table.not_equals_all:
+            for value, mask in table.not_equals.items():
+                out[:, self._bits(mask)] |= (scalar & (texts != value))[:, None]
+
+        if table.thresholds:
+            numbers = np.array([_to_number(v) if s else np.nan for v, s in zip(column, scalar)], dtype=float)
+            for operator, (_, masks) in table.thresholds.items():
+                # masks[0] | masks[-1] : tous les atomes de seuil de cet opérateur
+                for atom in self._bits(masks[0] | masks[-1]):
+                    threshold = _to_number(self.atoms[atom][2])
+                    with np.errstate(invalid='ignore'):
+                        if operator == 'greater_than':
+                            hit = numbers > threshold
+                        elif operator == 'greater_or_equal':
+                            hit = numbers >= threshold
+                        elif operator == 'less_than':
+                            hit = numbers < threshold
+                        else:
+                            hit = numbers <= threshold
+                    out[:, atom] |= hit
+        return out
+
+
+def load_engine(connection_factory: Callable = get_db_connection) -> EligibilityRuleEngine:
+    """Compile les règles actives de tous les produits actifs."""
+    from psycopg2.extras import RealDictCursor
+
+    conn = connection_factory()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT id::text AS id, nom, type_produit
+                FROM "ProduitEligible"
+                WHERE active = true
+                ORDER BY nom
+            """)
+            products = [dict(row) for row in cur.fetchall()]
+            cur.execute("""
+                SELECT produit_nom, rule_type, conditions, priority, is_active
+                FROM "EligibilityRules"
+                WHERE is_active = true
+            """)
+            rules = [dict(row) for row in cur.fetchall()]
+    finally:
+        conn.close()
+    return EligibilityRuleEngine(products, rules)
@@ -0,0 +1,278 @@
+"""
+Index anti-doublon des emails de prospection en mémoire.
+
+`isEmailContentAlreadySent` et `areEmailsAlreadyScheduledOrSent`
+(utils/email-duplicate-checker.ts) interrogent "prospects_emails" et
+"prospect_email_scheduled" pour chaque prospect et chaque contenu, à la
+programmation comme à l'envoi.
+
+`EmailDedupIndex` garde tous les couples (prospect_id, content_hash) déjà
+programmés ou envoyés :
+
+- chaque couple est réduit à une clé de 64 bits (BLAKE2b), rangée dans un
+  ensemble « envoyés » (définitif) ou « programmés » (libéré à l'annulation) ;
+- un filtre de Bloom placé devant répond aux recherches négatives, cas
+  courant d'une nouvelle séquence, sans toucher aux ensembles ;
+- l'index est chargé une fois, tenu à jour par les événements de
+  programmation / envoi / annulation, et sauvegardé sur disque : au
+  redémarrage, seules les lignes modifiées depuis la sauvegarde sont relues.
+
+Mêmes règles que le code Node : statuts 'scheduled' et 'sent', doublons
+archivés ignorés. Probabilité de collision de clés (faux doublon) de l'ordre
+de n² / 2^65, soit moins de 10^-6 pour 5 millions de couples.
+"""
+
+import hashlib
+import math
+import os
+import struct
+import threading
+from array import array
+from datetime import datetime, timezone
+from typing import Callable, Iterable, List, Optional, Tuple
+
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+SNAPSHOT_MAGIC = b'PFDEDUP1'
+_HEADER = struct.Struct('<8sdQQQQI')
+
+Pair = Tuple[str, str]
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def pair_key(prospect_id: str, content_hash: str) -> int:
+    digest = hashlib.blake2b(f'{prospect_id}|{content_hash}'.lower().encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class BloomFilter:
+    """Filtre de Bloom sur des clés déjà hachées (double hachage sur les deux moitiés)."""
+
+    __slots__ = ('bits', 'size', 'hashes', 'capacity')
+
+    def __init__(self, capacity: int, false_positive_rate: float = BLOOM_FALSE_POSITIVE_RATE,
+                 bits: Optional[bytearray] = None, hashes: Optional[int] = None):
+        self.capacity = max(capacity, 1024)
+        size = int(-self.capacity * math.log(false_positive_rate) / (math.log(2) ** 2))
+        self.size = (size + 7) // 8 * 8
+        self.hashes = hashes or max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray(self.size // 8)
+        if len(self.bits) * 8 != self.size:
+            raise ValueError('Taille du filtre de Bloom incohérente')
+
+    def add(self, key: int) -> None:
+        h1, h2 = key & 0xFFFFFFFF, (key >> 32) | 1
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: int) -> bool:
+        h1, h2 = key & 0xFFFFFFFF, (key >> 32) | 1
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class DedupStore:
+    """Lecture des couples programmés / envoyés, complète ou depuis une date."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection, batch_size: int = 50_000):
+        self._connect = connection_factory
+        self.batch_size = batch_size
+
+    def load(self, consume: Callable[[List[Tuple[str, str, str]]], None],
+             since: Optional[datetime] = None) -> datetime:
+        """Passe les (source, prospect_id, content_hash) à `consume` par lots ; retourne l'heure de la base.
+
+        source : 'sent', 'scheduled' ou 'released' (programmation annulée / en pause).
+        """
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT NOW()')
+                db_now = cur.fetchone()[0]
+            # Curseur serveur : le chargement complet ne matérialise pas tout côté client
+            with conn.cursor(name='email_dedup_load') as cur:
+                cur.itersize = self.batch_size
+                cur.execute("""
+                    SELECT 'sent', prospect_id::text, content_hash
+                    FROM prospects_emails
+                    WHERE content_hash IS NOT NULL
+                      AND is_duplicate_archived IS NOT TRUE
+                      AND (%(since)s::timestamptz IS NULL OR created_at >= %(since)s)
+                    UNION ALL
+                    SELECT CASE WHEN status IN ('scheduled', 'sent') THEN status ELSE 'released' END,
+                           prospect_id::text, content_hash
+                    FROM prospect_email_scheduled
+                    WHERE content_hash IS NOT NULL
+                      AND (%(since)s::timestamptz IS NULL
+                           AND status IN ('scheduled', 'sent')
+                           OR updated_at >= %(since)s)
+                """, {'since': since})
+                while True:
+                    rows = cur.fetchmany(self.batch_size)
+                    if not rows:
+                        break
+                    consume(rows)
+            conn.commit()
+            return db_now
+        finally:
+            conn.close()
+
+
+class EmailDedupIndex:
+    """Couples (prospect, contenu) programmés ou envoyés, avec filtre de Bloom."""
+
+    def __init__(self, store: Optional[DedupStore] = None, snapshot_path: Optional[str] = None,
+                 capacity: int = 1_000_000, overlap_seconds: float = 300):
+        self.store = store or DedupStore()
+        self.snapshot_path = snapshot_path
+        self.overlap_seconds = overlap_seconds
+        self._sent: set = set()
+        self._scheduled: set = set()
+        self._bloom = BloomFilter(capacity)
+        self._watermark: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'bloom_negatives': 0, 'duplicates': 0}
+
+    # ===== CHARGEMENT =====
+
+    def load(self) -> int:
+        """Restaure la sauvegarde si elle existe, puis relit les changements depuis ; sinon charge tout."""
+        since = None
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            try:
+                self._read_snapshot(self.snapshot_path)
+                since = datetime.fromtimestamp(self._watermark_ts - self.overlap_seconds, timezone.utc)
+            except (OSError, ValueError, EOFError, struct.error) as e:
+                print(f'Sauvegarde anti-doublon illisible, rechargement complet : {str(e)}')
+                self._sent, self._scheduled = set(), set()
+                self._bloom = BloomFilter(self._bloom.capacity)
+        loaded = 0
+
+        def consume(rows: List[Tuple[str, str, str]]) -> None:
+            nonlocal loaded
+            self.apply_rows(rows)
+            loaded += len(rows)
+
+        self._watermark = self.store.load(consume, since)
+        return loaded
+
+    def apply_rows(self, rows: Iterable[Tuple[str, str, str]]) -> None:
+        with self._lock:
+            for source, prospect_id, content_hash in rows:
+                key = pair_key(prospect_id, content_hash)
+                if source == 'sent':
+                    self._sent.add(key)
+                    self._scheduled.discard(key)
+                    self._bloom.add(key)
+                elif source == 'scheduled':
+                    if key not in self._sent:
+                        self._scheduled.add(key)
+                        self._bloom.add(key)
+                else:
+                    self._scheduled.discard(key)
+            self._grow_bloom_if_needed()
+
+    def _grow_bloom_if_needed(self) -> None:
+        count = len(self._sent) + len(self._scheduled)
+        if count <= self._bloom.capacity:
+            return
+        bloom = BloomFilter(count * 2)
+        for key in self._sent:
+            bloom.add(key)
+        for key in self._scheduled:
+            bloom.add(key)
+        self._bloom = bloom
+
+    # ===== ÉVÉNEMENTS =====
+
+    def add_scheduled(self, pairs: Iterable[Pair]) -> None:
+        self.apply_rows(('scheduled', p, h) for p, h in pairs)
+
+    def add_sent(self, pairs: Iterable[Pair]) -> None:
+        self.apply_rows(('sent', p, h) for p, h in pairs)
+
+    def release(self, pairs: Iterable[Pair]) -> None:
+        """Programmation annulée ou en pause : le contenu peut de nouveau être programmé."""
+        self.apply_rows(('released', p, h) for p, h in pairs)
+
+    # ===== RECHERCHE =====
+
+    def contains(self, prospect_id: str, content_hash: str) -> bool:
+        key = pair_key(prospect_id, content_hash)
+        self.stats['lookups'] += 1
+        if key not in self._bloom:
+            self.stats['bloom_negatives'] += 1
+            return False
+        found = key in self._sent or key in self._scheduled
+        if found:
+            self.stats['duplicates'] += 1
+        return found
+
+    def duplicates(self, pairs: Iterable[Pair]) -> List[Pair]:
+        """Couples déjà programmés ou envoyés, dans l'ordre reçu."""
+        return [(p, h) for p, h in pairs if self.contains(p, h)]
+
+    def __len__(self) -> int:
+        return len(self._sent) + len(self._scheduled)
+
+    # ===== SAUVEGARDE =====
+
+    @property
+    def _watermark_ts(self) -> float:
+        return self._watermark.timestamp() if isinstance(self._watermark, datetime) else float(self._watermark)
+
+    def save(self, path: Optional[str] = None) -> str:
+        """Écrit la sauvegarde (écriture atomique par renommage)."""
+        path = path or self.snapshot_path
+        if not path or self._watermark is None:
+            raise ValueError('Index non chargé ou chemin de sauvegarde manquant')
+        with self._lock:
+            sent = array('Q', self._sent)
+            scheduled = array('Q', self._scheduled)
+            bloom = self._bloom
+            header = _HEADER.pack(SNAPSHOT_MAGIC, self._watermark_ts, len(sent), len(scheduled),
+                                  bloom.capacity, bloom.size, bloom.hashes)
+            temporary = f'{path}.tmp'
+            with open(temporary, 'wb') as f:
+                f.write(header)
+                sent.tofile(f)
+                scheduled.tofile(f)
+                f.write(bloom.bits)
+        os.replace(temporary, path)
+        return path
+
+    def _read_snapshot(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            magic, watermark, sent_count, scheduled_count, capacity, size, hashes = \
+                _HEADER.unpack(f.read(_HEADER.size))
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError('Format de sauvegarde inconnu')
+            expected = _HEADER.size + 8 * (sent_count + scheduled_count) + size // 8
+            if os.fstat(f.fileno()).st_size != expected:
+                raise ValueError('Sauvegarde tronquée ou incohérente avec son en-tête')
+            sent, scheduled = array('Q'), array('Q')
+            sent.fromfile(f, sent_count)
+            scheduled.fromfile(f, scheduled_count)
+            bits = bytearray(f.read(size // 8))
+        bloom = BloomFilter(capacity, bits=bits, hashes=hashes)
+        with self._lock:
+            self._sent = set(sent)
+            self._scheduled = set(scheduled)
+            self._bloom = bloom
+            self._watermark = watermark
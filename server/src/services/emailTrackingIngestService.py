@@ -0,0 +1,288 @@
+"""
+Ingestion groupée des événements de tracking email.
+
+`EmailTrackingService.trackEvent` insère une ligne "EmailEvent" puis met à
+jour "EmailTracking" à chaque hit de pixel ou de clic : deux écritures par
+événement, et une rafale d'écritures à chaque campagne. Ici :
+
+- `track()` ajoute l'événement dans un tampon mémoire et retourne
+  immédiatement (le pixel n'attend jamais la base) ;
+- un thread vide le tampon toutes les `flush_interval_ms` ou dès
+  `flush_max_events` événements : un INSERT groupé des événements et un seul
+  UPDATE par email, au statut le plus avancé atteint
+  (sent -> delivered -> opened -> clicked ; bounced / failed terminaux) ;
+- le statut n'est jamais rétrogradé et chaque horodatage `<statut>_at`
+  garde sa première valeur.
+
+Le pixel et les URLs de clic portent `EmailTracking.email_id` ; la clé
+étrangère de "EmailEvent".email_id vise `EmailTracking.id`, résolu par
+jointure dans l'INSERT. Cet identifiant vient d'une URL publique : un
+identifiant qui n'est pas un UUID est refusé dès `track()`, et un lot rejeté
+par la base pour une erreur de données n'est pas remis en tampon, pour qu'une
+seule ligne invalide ne bloque pas toutes les écritures suivantes.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+STATUS_BY_EVENT = {
+    'sent': 'sent',
+    'delivered': 'delivered',
+    'opened': 'opened',
+    'clicked': 'clicked',
+    'bounced': 'bounced',
+    'complained': 'bounced',
+    'failed': 'failed'
+}
+STATUS_RANK = {'sent': 0, 'delivered': 1, 'opened': 2, 'clicked': 3, 'bounced': 10, 'failed': 10}
+# Colonnes "EmailTracking".<statut>_at existantes
+TIMESTAMP_COLUMNS = ('delivered_at', 'opened_at', 'clicked_at', 'bounced_at')
+
+# GIF transparent 1x1 renvoyé par le pixel d'ouverture
+TRANSPARENT_GIF = bytes.fromhex(
+    '47494638396101000100800000000000ffffff21f90401000000002c00000000010001000002024401003b'
+)
+
+RANK_SQL = """CASE {column}
+    WHEN 'sent' THEN 0 WHEN 'delivered' THEN 1 WHEN 'opened' THEN 2 WHEN 'clicked' THEN 3
+    WHEN 'bounced' THEN 10 WHEN 'failed' THEN 10 ELSE 0 END"""
+
+
+def canonical_uuid(value: Any) -> Optional[str]:
+    """Forme canonique d'un UUID, ou None si `value` n'en est pas un."""
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def is_data_error(error: Exception) -> bool:
+    """Erreur de données (SQLSTATE classe 22) : rejouer le même lot échouerait de nouveau."""
+    return str(getattr(error, 'pgcode', None) or '').startswith('22')
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+class StatusUpdate:
+    """État coalescé d'un email pour un cycle de flush."""
+
+    __slots__ = ('status', 'timestamps')
+
+    def __init__(self):
+        self.status: Optional[str] = None
+        self.timestamps: Dict[str, datetime] = {}
+
+    def apply(self, event_type: str, at: datetime) -> None:
+        status = STATUS_BY_EVENT[event_type]
+        # Rang strictement supérieur : un statut terminal n'est remplacé par aucun autre
+        if self.status is None or STATUS_RANK[status] > STATUS_RANK[self.status]:
+            self.status = status
+        column = f'{status}_at'
+        if column in TIMESTAMP_COLUMNS and (column not in self.timestamps or at < self.timestamps[column]):
+            self.timestamps[column] = at
+
+    def merge(self, other: 'StatusUpdate') -> None:
+        """Fusionne un état plus ancien (remis en tampon après un échec)."""
+        if other.status and (self.status is None or STATUS_RANK[other.status] > STATUS_RANK[self.status]):
+            self.status = other.status
+        for column, at in other.timestamps.items():
+            if column not in self.timestamps or at < self.timestamps[column]:
+                self.timestamps[column] = at
+
+
+class TrackingEventStore:
+    """Écritures groupées dans "EmailEvent" et "EmailTracking"."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self._connect = connection_factory
+
+    def write(self, events: List[Dict[str, Any]], updates: Dict[str, StatusUpdate]) -> None:
+        from psycopg2.extras import execute_values
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                if events:
+                    execute_values(cur, """
+                        INSERT INTO "EmailEvent" (email_id, event_type, "timestamp", user_agent,
+                                                  ip_address, link_url, metadata)
+                        SELECT t.id, v.event_type, v.at, v.user_agent, v.ip_address, v.link_url, v.metadata
+                        FROM (VALUES %s) AS v(email_id, event_type, at, user_agent, ip_address, link_url, metadata)
+                        JOIN "EmailTracking" t ON t.email_id = v.email_id
+                    """, [(
+                        e['email_id'], e['event_type'], e['timestamp'], e.get('user_agent'),
+                        e.get('ip_address'), e.get('link_url'), json.dumps(e.get('metadata') or {})
+                    ) for e in events],
+                        template='(%s::uuid, %s, %s::timestamp, %s, %s, %s, %s::jsonb)',
+                        page_size=1000)
+                if updates:
+                    # Lignes triées par email_id : même ordre de verrouillage pour tous les workers
+                    execute_values(cur, f"""
+                        UPDATE "EmailTracking" t
+                        SET status = CASE WHEN {RANK_SQL.format(column='t.status')} >= v.rank
+                                          THEN t.status ELSE v.status END,
+                            delivered_at = COALESCE(t.delivered_at, v.delivered_at),
+                            opened_at = COALESCE(t.opened_at, v.opened_at),
+                            clicked_at = COALESCE(t.clicked_at, v.clicked_at),
+                            bounced_at = COALESCE(t.bounced_at, v.bounced_at),
+                            updated_at = NOW()
+                        FROM (VALUES %s) AS v(email_id, status, rank, delivered_at, opened_at, clicked_at, bounced_at)
+                        WHERE t.email_id = v.email_id
+                    """, [(
+                        email_id, update.status, STATUS_RANK[update.status],
+                        *(update.timestamps.get(column) for column in TIMESTAMP_COLUMNS)
+                    ) for email_id, update in sorted(updates.items())],
+                        template='(%s::uuid, %s, %s, %s::timestamp, %s::timestamp, %s::timestamp, %s::timestamp)',
+                        page_size=1000)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+class EmailTrackingIngester:
+    """Tampon d'événements de tracking vidé périodiquement par un thread."""
+
+    def __init__(self, store: Optional[TrackingEventStore] = None, flush_interval_ms: int = 500,
+                 flush_max_events: int = 2000, max_buffered_events: int = 200_000,
+                 autostart: bool = True):
+        self.store = store or TrackingEventStore()
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_events = flush_max_events
+        self.max_buffered_events = max_buffered_events
+        self._events: Deque[Dict[str, Any]] = deque()
+        self._updates: Dict[str, StatusUpdate] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'received': 0, 'dropped': 0, 'rejected': 0, 'flushes': 0, 'events_written': 0,
+                      'status_updates': 0, 'errors': 0, 'last_flush_ms': 0.0}
+        if autostart:
+            self.start()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='email-tracking-flusher', daemon=True)
+            self._thread.start()
+
+    def track(self, email_id: str, event_type: str, user_agent: Optional[str] = None,
+              ip_address: Optional[str] = None, link_url: Optional[str] = None,
+              metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """Enregistre un événement sans attendre la base ; False si l'identifiant n'est pas un UUID."""
+        if event_type not in STATUS_BY_EVENT:
+            raise ValueError(f"Type d'événement inconnu : {event_type}")
+        email_id = canonical_uuid(email_id)
+        if email_id is None:
+            with self._lock:
+                self.stats['rejected'] += 1
+            return False
+        at = datetime.now(timezone.utc).replace(tzinfo=None)
+        event = {'email_id': email_id, 'event_type': event_type, 'timestamp': at,
+                 'user_agent': user_agent, 'ip_address': ip_address, 'link_url': link_url,
+                 'metadata': metadata}
+        with self._lock:
+            self.stats['received'] += 1
+            # Le statut est toujours coalescé ; le détail est abandonné si la base ne suit plus
+            update = self._updates.get(email_id)
+            if update is None:
+                update = self._updates[email_id] = StatusUpdate()
+            update.apply(event_type, at)
+            if len(self._events) < self.max_buffered_events:
+                self._events.append(event)
+            else:
+                self.stats['dropped'] += 1
+            pending = len(self._events)
+        if pending >= self.flush_max_events:
+            self._wakeup.set()
+        return True
+
+    def track_open(self, email_id: str, user_agent: Optional[str] = None,
+                   ip_address: Optional[str] = None) -> bytes:
+        """Pixel d'ouverture : enregistre l'événement et retourne le GIF à servir."""
+        self.track(email_id, 'opened', user_agent=user_agent, ip_address=ip_address)
+        return TRANSPARENT_GIF
+
+    def track_click(self, email_id: str, url: str, user_agent: Optional[str] = None,
+                    ip_address: Optional[str] = None) -> str:
+        """Lien de clic : enregistre l'événement et retourne l'URL de redirection."""
+        self.track(email_id, 'clicked', user_agent=user_agent, ip_address=ip_address, link_url=url)
+        return url
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._events)
+
+    def flush(self) -> Tuple[int, int]:
+        """Écrit le tampon courant ; retourne (événements, emails mis à jour)."""
+        with self._flush_lock:
+            with self._lock:
+                events = list(self._events)
+                self._events.clear()
+                updates, self._updates = self._updates, {}
+            if not events and not updates:
+                return 0, 0
+            started = time.perf_counter()
+            try:
+                self.store.write(events, updates)
+            except Exception as e:
+                self.stats['errors'] += 1
+                if is_data_error(e):
+                    # Lot refusé par la base : le rejouer échouerait indéfiniment
+                    self.stats['rejected'] += len(events)
+                    raise
+                with self._lock:
+                    room = self.max_buffered_events - len(self._events)
+                    self._events.extendleft(reversed(events[:max(0, room)]))
+                    self.stats['dropped'] += max(0, len(events) - max(0, room))
+                    for email_id, update in updates.items():
+                        current = self._updates.get(email_id)
+                        if current is None:
+                            self._updates[email_id] = update
+                        else:
+                            current.merge(update)
+                raise
+            self.stats['flushes'] += 1
+            self.stats['events_written'] += len(events)
+            self.stats['status_updates'] += len(updates)
+            self.stats['last_flush_ms'] = (time.perf_counter() - started) * 1000
+            return len(events), len(updates)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                print(f'Erreur écriture des événements de tracking : {str(e)}')
+                time.sleep(self.flush_interval)
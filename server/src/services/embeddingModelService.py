@@ -0,0 +1,415 @@
+"""
+Modèle d'embedding chargé une fois, préchauffé explicitement et partagé entre workers.
+
+embeddingService.py et scripts/embed_service.py construisaient
+`SentenceTransformer('all-MiniLM-L6-v2')` à l'import : chaque worker gunicorn
+relisait les poids depuis le disque et en gardait sa propre copie, et ne
+répondait à rien, pas même au contrôle de santé, avant la fin du chargement.
+
+`EmbeddingModel` :
+
+- ne charge rien à l'import ; `warmup()` charge le modèle, encode quelques
+  textes (allocations et noyaux initialisés avant la première vraie requête)
+  puis marque le modèle prêt ;
+- avec gunicorn.embedding.conf.py (`preload_app`), le préchauffage a lieu une
+  fois dans le master avant le fork, puis `freeze_for_fork()` sort les objets
+  chargés du ramasse-miettes : les workers partagent les pages des poids en
+  copie sur écriture au lieu de les relire et de les dupliquer ;
+- sans préchargement (EMBEDDING_PRELOAD=0), chaque worker préchauffe en tâche
+  de fond et répond déjà à la sonde de vivacité ;
+- `init_app` ajoute /live (le processus répond) et /ready (503 tant que le
+  modèle n'est pas préchauffé) : l'orchestrateur retient le trafic d'un
+  worker qui démarre sans le redémarrer.
+
+Backend d'inférence (EMBEDDING_BACKEND) :
+
+- 'torch' (défaut) : `SentenceTransformer.encode` en float32 ;
+- 'onnx' / 'onnx-int8' : transformer, pooling moyen et normalisation exportés
+  une fois en ONNX (`export_onnx`, poids quantifiés en int8 dynamique pour le
+  second), tokenisation par `tokenizers` (Rust) et inférence ONNX Runtime,
+  sans charger PyTorch dans les workers ; l'export est écrit dans un
+  répertoire temporaire puis renommé sous verrou de fichier, pour que des
+  workers démarrés ensemble (EMBEDDING_PRELOAD=0) ne l'écrivent qu'une fois ;
+- `compare_embeddings` mesure la dérive d'un backend par rapport à la
+  référence float32 (scripts/bench_embedding_backends.py, sur les "Question").
+"""
+
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+DEFAULT_BACKEND = 'torch'
+ONNX_METADATA = 'embedding_onnx.json'
+ONNX_INPUTS = ('input_ids', 'attention_mask', 'token_type_ids')
+WARMUP_TEXTS = (
+    "Quel est le chiffre d'affaires annuel de votre entreprise ?",
+    'Combien de véhicules de plus de 7,5 tonnes possédez-vous ?',
+    'Êtes-vous propriétaire de vos locaux professionnels ?',
+    'Nombre de salariés',
+)
+
+
+# Threads de calcul par worker, fixés par configure_threads et repris par les sessions ONNX Runtime
+_threads: Optional[int] = None
+
+
+class ModelNotReady(RuntimeError):
+    """Le modèle n'est pas encore chargé et préchauffé."""
+
+
+def _load_sentence_transformer(model_name: str):
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
+
+
+# ===== BACKEND ONNX =====
+
+def onnx_directory(model_name: str) -> str:
+    """Répertoire de l'export ONNX : EMBEDDING_ONNX_DIR, sinon à côté du modèle ou dans le cache."""
+    configured = os.getenv('EMBEDDING_ONNX_DIR')
+    if configured:
+        return configured
+    if os.path.isdir(model_name):
+        return os.path.join(model_name, 'onnx')
+    return os.path.join(os.path.expanduser('~'), '.cache', 'profitum', 'embedding-onnx',
+                        model_name.replace('/', '--'))
+
+
+def export_onnx(model_name: str, directory: str) -> str:
+    """Exporte le modèle en ONNX float32 (model.onnx) et int8 dynamique (model.int8.onnx).
+
+    Le graphe inclut le pooling moyen et la normalisation L2 : sa sortie est
+    directement l'embedding. L'export float32 est comparé à
+    SentenceTransformer sur WARMUP_TEXTS avant d'écrire les métadonnées, qui
+    marquent l'export comme complet.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device='cpu')
+
+    class SentenceEmbedding(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            tokens = self.transformer(input_ids=input_ids, attention_mask=attention_mask,
+                                      token_type_ids=token_type_ids).last_hidden_state
+            mask = attention_mask.unsqueeze(-1).to(tokens.dtype)
+            pooled = (tokens * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+            return torch.nn.functional.normalize(pooled, p=2, dim=1)
+
+    os.makedirs(directory, exist_ok=True)
+    fp32_path = os.path.join(directory, 'model.onnx')
+    sample = torch.ones(2, 8, dtype=torch.long)
+    dynamic_axes: Dict[str, Dict[int, str]] = {name: {0: 'batch', 1: 'sequence'} for name in ONNX_INPUTS}
+    dynamic_axes['sentence_embedding'] = {0: 'batch'}
+    with torch.no_grad():
+        torch.onnx.export(SentenceEmbedding(model[0].auto_model.eval()), (sample, sample, torch.zeros_like(sample)),
+                          fp32_path, input_names=list(ONNX_INPUTS), output_names=['sentence_embedding'],
+                          dynamic_axes=dynamic_axes, opset_version=17, dynamo=False)
+    quantize_dynamic(fp32_path, os.path.join(directory, 'model.int8.onnx'), weight_type=QuantType.QInt8)
+
+    expected = model.encode(list(WARMUP_TEXTS), normalize_embeddings=True)
+    tokenizer = model.tokenizer
+    tokenizer.backend_tokenizer.save(os.path.join(directory, 'tokenizer.json'))
+    metadata_path = os.path.join(directory, ONNX_METADATA)
+    with open(metadata_path, 'w') as f:
+        json.dump({
+            'model': model_name,
+            'dimension': expected.shape[1],
+            'max_seq_length': model.max_seq_length,
+            'pad_id': tokenizer.pad_token_id,
+            'pad_token': tokenizer.pad_token
+        }, f, indent=2)
+
+    exported = OnnxEncoder(directory, quantized=False).encode(list(WARMUP_TEXTS))
+    if float((expected * exported).sum(axis=1).min()) < 0.9999:
+        os.remove(metadata_path)
+        raise ValueError(f"L'export ONNX de {model_name} ne reproduit pas SentenceTransformer "
+                         '(pooling moyen et normalisation attendus)')
+    return directory
+
+
+class OnnxEncoder:
+    """`encode` au sens de SentenceTransformer, sur un export de `export_onnx`."""
+
+    def __init__(self, directory: str, quantized: bool = True):
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(directory, ONNX_METADATA)) as f:
+            self.metadata = json.load(f)
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(self.metadata['max_seq_length'])
+        self.tokenizer.enable_padding(pad_id=self.metadata['pad_id'], pad_token=self.metadata['pad_token'])
+        # Le graphe est gardé en mémoire (partagé au fork) ; la session est créée par processus
+        with open(os.path.join(directory, 'model.int8.onnx' if quantized else 'model.onnx'), 'rb') as f:
+            self._graph = f.read()
+        self._lock = threading.Lock()
+        self._session = None
+        self._session_pid: Optional[int] = None
+
+    def _get_session(self):
+        # Les threads d'une session ONNX Runtime ne survivent pas au fork
+        with self._lock:
+            if self._session_pid != os.getpid():
+                import onnxruntime
+
+                options = onnxruntime.SessionOptions()
+                options.intra_op_num_threads = _threads or 0
+                options.inter_op_num_threads = 1
+                self._session = onnxruntime.InferenceSession(self._graph, options,
+                                                             providers=['CPUExecutionProvider'])
+                self._session_pid = os.getpid()
+            return self._session
+
+    def encode(self, texts, batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        session = self._get_session()
+        embeddings = np.empty((len(texts), self.metadata['dimension']), dtype=np.float32)
+        # Comme SentenceTransformer : lots de longueurs voisines, moins de remplissage
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in indices])
+            feed = {
+                'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+                'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64)
+            }
+            embeddings[indices] = session.run(None, feed)[0]
+        return embeddings[0] if single else embeddings
+
+
+def _load_onnx(model_name: str, quantized: bool) -> OnnxEncoder:
+    directory = os.path.abspath(onnx_directory(model_name))
+    if not os.path.exists(os.path.join(directory, ONNX_METADATA)):
+        _export_once(model_name, directory)
+    return OnnxEncoder(directory, quantized)
+
+
+def _export_once(model_name: str, directory: str) -> None:
+    """Exporte vers `directory` au plus une fois, même si plusieurs processus démarrent ensemble."""
+    import fcntl
+
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    with open(f'{directory}.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # Un autre worker a pu terminer l'export pendant l'attente du verrou
+        if os.path.exists(os.path.join(directory, ONNX_METADATA)):
+            return
+        print(f'Export ONNX de {model_name} vers {directory}...')
+        staging = tempfile.mkdtemp(prefix=f'.{os.path.basename(directory)}.', dir=parent)
+        try:
+            export_onnx(model_name, staging)
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)  # export interrompu, sans métadonnées
+            # Renommage atomique : les lecteurs voient l'export complet ou rien
+            os.replace(staging, directory)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+
+BACKEND_LOADERS: Dict[str, Callable[[str], Any]] = {
+    'torch': _load_sentence_transformer,
+    'onnx': lambda model_name: _load_onnx(model_name, quantized=False),
+    'onnx-int8': lambda model_name: _load_onnx(model_name, quantized=True),
+}
+
+
+class EmbeddingModel:
+    """Modèle d'embedding chargé à la demande, prêt seulement après préchauffage."""
+
+    def __init__(self, model_name: Optional[str] = None, loader: Optional[Callable[[str], Any]] = None,
+                 backend: Optional[str] = None):
+        self.model_name = model_name or os.getenv('EMBEDDING_MODEL', DEFAULT_MODEL)
+        self.backend = backend or os.getenv('EMBEDDING_BACKEND', DEFAULT_BACKEND)
+        if loader is None and self.backend not in BACKEND_LOADERS:
+            raise ValueError(f"Backend d'embedding inconnu : {self.backend} ({', '.join(BACKEND_LOADERS)})")
+        self._loader = loader or BACKEND_LOADERS[self.backend]
+        self._model = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[str] = None
+        self.stats: Dict[str, Any] = {'load_seconds': None, 'warmup_seconds': None, 'loaded_by_pid': None}
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def load(self):
+        with self._lock:
+            if self._model is None:
+                start = time.perf_counter()
+                self._model = self._loader(self.model_name)
+                self.stats['load_seconds'] = round(time.perf_counter() - start, 3)
+                self.stats['loaded_by_pid'] = os.getpid()
+            return self._model
+
+    def warmup(self, texts: Sequence[str] = WARMUP_TEXTS) -> None:
+        """Charge le modèle et encode `texts` ; le modèle n'est prêt qu'ensuite."""
+        try:
+            model = self.load()
+            start = time.perf_counter()
+            model.encode(list(texts), batch_size=len(texts))
+            self.stats['warmup_seconds'] = round(time.perf_counter() - start, 3)
+        except Exception as e:
+            self._error = str(e)
+            raise
+        self._error = None
+        self._ready.set()
+
+    def warmup_in_background(self) -> threading.Thread:
+        """Préchauffage dans un thread : le worker répond à /live pendant le chargement."""
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+
+        def run() -> None:
+            try:
+                self.warmup()
+            except Exception as e:
+                print(f"Échec du préchauffage du modèle d'embedding : {str(e)}")
+
+        self._thread = threading.Thread(target=run, name='embedding-warmup', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def encode(self, texts: List[str], **kwargs):
+        if not self._ready.is_set():
+            raise ModelNotReady(f"Modèle {self.model_name} en cours de chargement")
+        return self._model.encode(texts, **kwargs)
+
+    # ===== SONDES =====
+
+    def liveness(self) -> Dict[str, Any]:
+        return {'status': 'ok', 'pid': os.getpid()}
+
+    def readiness(self) -> Tuple[Dict[str, Any], int]:
+        if self.ready:
+            status = 'ready'
+        elif self._error:
+            status = 'error'
+        else:
+            status = 'loading'
+        body = {
+            'status': status,
+            'model': self.model_name,
+            'backend': self.backend,
+            'pid': os.getpid(),
+            # Poids chargés par le master avant le fork : partagés avec les autres workers
+            'shared': self.stats['loaded_by_pid'] not in (None, os.getpid()),
+            **self.stats
+        }
+        if self._error:
+            body['error'] = self._error
+        return body, 200 if self.ready else 503
+
+
+def freeze_for_fork() -> None:
+    """À appeler dans le master après le préchauffage, juste avant le fork des workers.
+
+    Les objets déjà chargés passent dans la génération permanente du
+    ramasse-miettes : les collectes des workers ne réécrivent plus leurs
+    en-têtes, et les pages correspondantes restent partagées.
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def configure_threads(workers: int, threads: Optional[int] = None) -> int:
+    """Threads de calcul par worker : `threads`, EMBEDDING_THREADS, sinon les cœurs répartis entre workers."""
+    global _threads
+    threads = threads or int(os.getenv('EMBEDDING_THREADS') or max(1, (os.cpu_count() or 1) // max(workers, 1)))
+    _threads = threads
+    # Backends ONNX : PyTorch n'est pas chargé, inutile de l'importer pour régler ses threads
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+    return threads
+
+
+# ===== DÉRIVE PAR RAPPORT À LA RÉFÉRENCE =====
+
+def _normalized(embeddings: np.ndarray) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def compare_embeddings(baseline: np.ndarray, candidate: np.ndarray, k: int = 5,
+                       chunk_size: int = 1024) -> Dict[str, float]:
+    """Dérive des embeddings `candidate` par rapport à `baseline` (mêmes textes, même ordre).
+
+    - cosinus entre les deux embeddings de chaque texte (moyenne, 1er centile, min) ;
+    - écart des similarités entre textes, ce que compare l'appariement des questions ;
+    - accord sur le plus proche voisin de chaque texte et rappel des k plus proches.
+    """
+    reference, other = _normalized(baseline), _normalized(candidate)
+    count = len(reference)
+    if count < 2 or other.shape != reference.shape:
+        raise ValueError('Au moins deux textes, embeddings de même forme attendus')
+    k = min(k, count - 1)
+    cosines = (reference * other).sum(axis=1)
+
+    diff_sum, diff_max, top1, overlap = 0.0, 0.0, 0, 0
+    for start in range(0, count, chunk_size):
+        rows = np.arange(start, min(start + chunk_size, count))
+        expected = reference[rows] @ reference.T
+        actual = other[rows] @ other.T
+        diff = np.abs(expected - actual)
+        diff[np.arange(len(rows)), rows] = 0
+        diff_sum += float(diff.sum())
+        diff_max = max(diff_max, float(diff.max()))
+        # Le texte lui-même n'est pas son propre voisin
+        expected[np.arange(len(rows)), rows] = -np.inf
+        actual[np.arange(len(rows)), rows] = -np.inf
+        top1 += int((expected.argmax(axis=1) == actual.argmax(axis=1)).sum())
+        expected_top = np.argpartition(-expected, k - 1, axis=1)[:, :k]
+        actual_top = np.argpartition(-actual, k - 1, axis=1)[:, :k]
+        overlap += sum(len(np.intersect1d(e, a)) for e, a in zip(expected_top, actual_top))
+
+    return {
+        'texts': count,
+        'cosine_mean': float(cosines.mean()),
+        'cosine_p01': float(np.percentile(cosines, 1)),
+        'cosine_min': float(cosines.min()),
+        'similarity_mean_abs_diff': diff_sum / (count * (count - 1)),
+        'similarity_max_abs_diff': diff_max,
+        'top1_agreement': top1 / count,
+        'recall_at_k': overlap / (count * k),
+        'k': k
+    }
+
+
+def init_app(app, model: EmbeddingModel) -> EmbeddingModel:
+    """Ajoute /live et /ready à une app Flask ; le modèle est retrouvé via app.extensions."""
+    from flask import jsonify
+
+    app.extensions['embedding_model'] = model
+
+    @app.route('/live', methods=['GET'])
+    def live():
+        return jsonify(app.extensions['embedding_model'].liveness())
+
+    @app.route('/ready', methods=['GET'])
+    def ready():
+        body, status = app.extensions['embedding_model'].readiness()
+        return jsonify(body), status
+
+    return model
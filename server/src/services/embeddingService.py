@@ -1,11 +1,15 @@
 from flask import Flask, request, jsonify
-from sentence_transformers import SentenceTransformer
-import numpy as np
+
+from embeddingModelService import EmbeddingModel, ModelNotReady, init_app as init_model
+from requestMetricsService import RequestMetrics, init_app as init_metrics, timed
 
 app = Flask(__name__)
+metrics = RequestMetrics()
+init_metrics(app, metrics)
 
-# Charger le modèle une seule fois au démarrage
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# Chargé par le master gunicorn avant le fork (gunicorn.embedding.conf.py),
+# ou par warmup() avant app.run : rien n'est lu depuis le disque à l'import
+model = init_model(app, EmbeddingModel())
 
 @app.route('/embed', methods=['POST'])
 def embed_text():
@@ -17,7 +21,8 @@ def embed_text():
             return jsonify({'error': 'Text is required'}), 400
         
         # Générer l'embedding
-        embedding = model.encode([text])[0]
+        with timed('embed'):
+            embedding = model.encode([text])[0]
         
         # Convertir en liste pour la sérialisation JSON
         embedding_list = embedding.tolist()
@@ -27,14 +32,18 @@ def embed_text():
             'dimension': len(embedding_list)
         })
     
+    except ModelNotReady as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'ok', 'model': 'all-MiniLM-L6-v2'})
+    return jsonify({'status': 'ok', 'model': model.model_name, 'ready': model.ready})
 
 if __name__ == '__main__':
     print("Démarrage du service d'embedding...")
-    print("Modèle: all-MiniLM-L6-v2")
-    app.run(host='localhost', port=5000, debug=False) 
\ No newline at end of file
+    print(f"Modèle: {model.model_name}")
+    model.warmup()
+    print(f"Modèle prêt (chargement {model.stats['load_seconds']}s, préchauffage {model.stats['warmup_seconds']}s)")
+    app.run(host='localhost', port=5000, debug=False) 
@@ -309,6 +309,8 @@ export class EncryptionService {
         id: keyId,
         encrypted_key: Buffer.concat([encryptedKey, keyTag]).toString('base64'),
         iv: keyIv.toString('base64'),
+        key_version: this.getMasterKeyVersion(),
+        key_wrapping: 'node-legacy',
         encryption_level: level,
         user_id: userId,
         document_id: documentId,
@@ -338,15 +340,20 @@ export class EncryptionService {
     }
     
     // Déchiffrer la clé
-    const masterKey = await this.getMasterKey();
+    const keyVersion = data.key_version || 'v1';
+    const masterKey = await this.getMasterKey(keyVersion);
     const encryptedKeyWithTag = Buffer.from(data.encrypted_key, 'base64');
     const keyIv = Buffer.from(data.iv, 'base64');
     
     const tag = encryptedKeyWithTag.slice(-this.tagLength);
     const encryptedKey = encryptedKeyWithTag.slice(0, -this.tagLength);
     
-    const keyDecipher = crypto.createDecipher('aes-256-gcm', masterKey);
-    keyDecipher.setAAD(keyIv);
+    // Clé enveloppée par streamingEncryptionService.py : nonce de 12 octets, AAD "<id>:<version>"
+    const wrappedByPython = data.key_wrapping === 'aes-gcm-aad';
+    const keyDecipher = wrappedByPython
+      ? crypto.createDecipheriv('aes-256-gcm', masterKey, keyIv)
+      : crypto.createDecipher('aes-256-gcm', masterKey);
+    keyDecipher.setAAD(wrappedByPython ? Buffer.from(`${keyId}:${keyVersion}`) : keyIv);
     keyDecipher.setAuthTag(tag);
     
     const key = Buffer.concat([
@@ -360,8 +367,11 @@ export class EncryptionService {
   /**
    * Obtenir la clé maître (depuis variable d'environnement ou service externe)
    */
-  private async getMasterKey(): Promise<Buffer> {
-    const masterKeyEnv = process.env.ENCRYPTION_MASTER_KEY;
+  private async getMasterKey(version?: string): Promise<Buffer> {
+    // Anciennes versions conservées pendant une rotation : ENCRYPTION_MASTER_KEY_<VERSION>
+    const masterKeyEnv = !version || version === this.getMasterKeyVersion()
+      ? process.env.ENCRYPTION_MASTER_KEY
+      : process.env[`ENCRYPTION_MASTER_KEY_${version.toUpperCase()}`];
     if (!masterKeyEnv) {
       throw new Error('Clé maître de chiffrement non configurée');
     }
@@ -369,6 +379,10 @@ export class EncryptionService {
     return Buffer.from(masterKeyEnv, 'base64');
   }
 
+  private getMasterKeyVersion(): string {
+    return process.env.ENCRYPTION_MASTER_KEY_VERSION || 'v1';
+  }
+
   /**
    * Vérifier les permissions d'accès
    */
@@ -0,0 +1,564 @@
+"""
+Index de recherche d'experts en mémoire (facettes, plages, grille géographique).
+
+`ExpertSearchService.searchExperts` (ExpertSearchService.ts) reconstruit à
+chaque recherche une CTE de scoring sur "Expert" jointe à "ExpertAssignment" ;
+`cacheService.getExperts` ne met en cache que la liste complète. Cet index
+maintient, un emplacement par expert :
+
+- des bitmaps (tableaux booléens NumPy) par statut, statut d'approbation,
+  spécialisation et certification ;
+- des colonnes triées (valeur, emplacement) pour la note et la rémunération
+  (client_fee_percentage) : une plage se lit par dichotomie ;
+- une grille geohash (préfixes de 1 à GEOHASH_PRECISION caractères) : un rayon
+  ne vérifie la distance que sur les experts des 9 cellules qui l'entourent ;
+- les composantes de pertinence qui ne dépendent pas de la recherche (note,
+  missions terminées, satisfaction client), précalculées.
+
+Une recherche intersecte les bitmaps, score les candidats et garde les k
+premiers (argpartition). Mêmes filtres et même score que le SQL Node ;
+différence voulue : le total est celui des experts filtrés (le code Node
+comptait tous les experts actifs). L'index se met à jour par événements de
+changement (format Supabase Realtime) sur "Expert" et "ExpertAssignment".
+"""
+
+import math
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+GEOHASH_PRECISION = 6
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+DOC_FIELDS = ('id', 'name', 'company_name', 'specializations', 'experience', 'location', 'rating',
+              'description', 'compensation', 'disponibilites', 'certifications', 'latitude', 'longitude')
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        target, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if target >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def geohash_cell_degrees(precision: int) -> Tuple[float, float]:
+    """(hauteur en latitude, largeur en longitude) d'une cellule, en degrés."""
+    bits = precision * 5
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def covering_cells(latitude: float, longitude: float, radius_km: float) -> Tuple[int, Set[str]]:
+    """Précision la plus fine dont la cellule et ses 8 voisines couvrent le cercle, et ces cellules.
+
+    Précision 0 : rayon trop grand, pas d'élagage géographique.
+    """
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_deg, lon_deg = geohash_cell_degrees(precision)
+        if lat_deg * KM_PER_DEGREE >= radius_km and lon_deg * KM_PER_DEGREE * cos_lat >= radius_km:
+            cells = set()
+            for dlat in (-lat_deg, 0.0, lat_deg):
+                for dlon in (-lon_deg, 0.0, lon_deg):
+                    lat = min(max(latitude + dlat, -89.999999), 89.999999)
+                    lon = (longitude + dlon + 180.0) % 360.0 - 180.0
+                    cells.add(geohash(lat, lon, precision))
+            return precision, cells
+    return 0, set()
+
+
+def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def json_contains(container: Any, contained: Any) -> bool:
+    """Sémantique de l'opérateur jsonb @>."""
+    if isinstance(contained, dict):
+        return isinstance(container, dict) and all(
+            key in container and json_contains(container[key], value) for key, value in contained.items())
+    if isinstance(contained, list):
+        if not isinstance(container, list):
+            return False
+        return all(any(json_contains(item, value) for item in container) for value in contained)
+    return container == contained
+
+
+def experience_points(completed: int) -> float:
+    if completed >= 20:
+        return 20.0
+    if completed >= 10:
+        return 15.0
+    if completed >= 5:
+        return 10.0
+    if completed >= 1:
+        return 5.0
+    return 0.0
+
+
+def satisfaction_points(avg_client_rating: Optional[float]) -> float:
+    if avg_client_rating is None:
+        return 0.0
+    if avg_client_rating >= 4.5:
+        return 15.0
+    if avg_client_rating >= 4.0:
+        return 12.0
+    if avg_client_rating >= 3.5:
+        return 8.0
+    if avg_client_rating >= 3.0:
+        return 4.0
+    return 0.0
+
+
+def match_level(score: float) -> str:
+    if score >= 80:
+        return 'Excellent'
+    if score >= 60:
+        return 'Très bon'
+    if score >= 40:
+        return 'Bon'
+    if score >= 20:
+        return 'Correct'
+    return 'Basique'
+
+
+def response_time(completed: int) -> str:
+    if completed >= 20:
+        return '2-4h'
+    if completed >= 10:
+        return '4-8h'
+    if completed >= 5:
+        return '8-12h'
+    if completed >= 1:
+        return '12-24h'
+    return '24-48h'
+
+
+class SortedColumn:
+    """Valeurs numériques triées avec leur emplacement ; plages par dichotomie.
+
+    Tant qu'aucune plage n'a été lue (chargement initial), les valeurs sont
+    seulement enregistrées et triées en une fois à la première lecture ;
+    ensuite chaque modification est une insertion / suppression en place.
+    """
+
+    def __init__(self):
+        self.keys = np.empty(0)
+        self.slots = np.empty(0, dtype=np.int64)
+        self.values: Dict[int, float] = {}
+        self._sorted = False
+
+    def _sort(self) -> None:
+        slots = np.fromiter(self.values.keys(), dtype=np.int64, count=len(self.values))
+        keys = np.fromiter(self.values.values(), dtype=np.float64, count=len(self.values))
+        order = np.lexsort((slots, keys))
+        self.keys, self.slots = keys[order], slots[order]
+        self._sorted = True
+
+    def remove(self, slot: int) -> None:
+        value = self.values.pop(slot, None)
+        if value is None or not self._sorted:
+            return
+        start = np.searchsorted(self.keys, value, 'left')
+        end = np.searchsorted(self.keys, value, 'right')
+        position = start + int(np.flatnonzero(self.slots[start:end] == slot)[0])
+        self.keys = np.delete(self.keys, position)
+        self.slots = np.delete(self.slots, position)
+
+    def set(self, slot: int, value: Optional[float]) -> None:
+        self.remove(slot)
+        if value is None or math.isnan(value):
+            return
+        self.values[slot] = value
+        if self._sorted:
+            position = np.searchsorted(self.keys, value, 'right')
+            self.keys = np.insert(self.keys, position, value)
+            self.slots = np.insert(self.slots, position, slot)
+
+    def between(self, low: Optional[float], high: Optional[float]) -> np.ndarray:
+        """Emplacements dont la valeur est dans [low, high] (bornes None : ouvertes)."""
+        if not self._sorted:
+            self._sort()
+        start = 0 if low is None else np.searchsorted(self.keys, low, 'left')
+        end = len(self.keys) if high is None else np.searchsorted(self.keys, high, 'right')
+        return self.slots[start:end]
+
+
+class ExpertSearchIndex:
+    """Facettes + colonnes triées + grille geohash + composantes de score, mis à jour incrémentalement."""
+
+    def __init__(self, capacity: int = 1024):
+        self._lock = threading.RLock()
+        self.capacity = capacity
+        self.slots: Dict[str, int] = {}
+        self.free_slots: List[int] = []
+        self.size = 0
+        self.docs: List[Optional[Dict[str, Any]]] = []
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.facets: Dict[str, Dict[Any, np.ndarray]] = {
+            facet: {} for facet in ('status', 'approval_status', 'specialization', 'certification')
+        }
+        self.ratings = SortedColumn()
+        self.compensations = SortedColumn()
+        self.geo_cells: Dict[str, Set[int]] = {}
+        self.geohashes: Dict[int, str] = {}
+        self.latitudes = np.full(capacity, np.nan)
+        self.longitudes = np.full(capacity, np.nan)
+        self.specialization_counts = np.zeros(capacity)
+        self.base_scores = np.zeros(capacity)
+        # expert_id -> assignment_id -> (statut, note client)
+        self.assignments: Dict[str, Dict[str, Tuple[Optional[str], Optional[float]]]] = {}
+
+    # ------------------------------------------------------------------
+    # Mises à jour
+    # ------------------------------------------------------------------
+
+    def _grow(self, needed: int) -> None:
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+
+        def resized(array: np.ndarray, fill: Any) -> np.ndarray:
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[:self.capacity] = array
+            return grown
+
+        self.alive = resized(self.alive, False)
+        for facet in self.facets.values():
+            for value in facet:
+                facet[value] = resized(facet[value], False)
+        self.latitudes = resized(self.latitudes, np.nan)
+        self.longitudes = resized(self.longitudes, np.nan)
+        self.specialization_counts = resized(self.specialization_counts, 0.0)
+        self.base_scores = resized(self.base_scores, 0.0)
+        self.capacity = capacity
+
+    def _facet(self, facet: str, value: Any) -> np.ndarray:
+        bitmap = self.facets[facet].get(value)
+        if bitmap is None:
+            bitmap = self.facets[facet][value] = np.zeros(self.capacity, dtype=bool)
+        return bitmap
+
+    def _facet_values(self, doc: Dict[str, Any]) -> List[Tuple[str, Any]]:
+        values = [('status', doc.get('status')), ('approval_status', doc.get('approval_status'))]
+        values += [('specialization', s) for s in set(doc.get('specializations') or [])]
+        certifications = doc.get('certifications') or {}
+        if isinstance(certifications, dict):
+            # Filtre Node : certifications @> {"<certification>": true}
+            values += [('certification', c) for c, held in certifications.items() if held is True]
+        return [(facet, value) for facet, value in values if value is not None]
+
+    def _unlink(self, slot: int) -> None:
+        doc = self.docs[slot]
+        if doc is None:
+            return
+        for facet, value in self._facet_values(doc):
+            self.facets[facet][value][slot] = False
+        self.ratings.remove(slot)
+        self.compensations.remove(slot)
+        cell = self.geohashes.pop(slot, None)
+        if cell is not None:
+            for precision in range(1, GEOHASH_PRECISION + 1):
+                members = self.geo_cells.get(cell[:precision])
+                if members is not None:
+                    members.discard(slot)
+                    if not members:
+                        del self.geo_cells[cell[:precision]]
+        self.latitudes[slot] = np.nan
+        self.longitudes[slot] = np.nan
+
+    def _refresh_score(self, expert_id: str, slot: int) -> None:
+        """Composantes de pertinence indépendantes de la recherche."""
+        rows = self.assignments.get(expert_id, {})
+        completed = sum(1 for status, _ in rows.values() if status == 'completed')
+        ratings = [r for _, r in rows.values() if r is not None]
+        avg_client_rating = sum(ratings) / len(ratings) if ratings else None
+        doc = self.docs[slot]
+        doc['assignment_count'] = len(rows)
+        doc['completed_assignments'] = completed
+        doc['avg_client_rating'] = avg_client_rating
+        self.base_scores[slot] = ((doc.get('rating') or 0) * 5.0 + experience_points(completed)
+                                  + satisfaction_points(avg_client_rating))
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        """Indexe (ou réindexe) un expert."""
+        expert_id = str(record['id'])
+        with self._lock:
+            slot = self.slots.get(expert_id)
+            if slot is None:
+                slot = self.free_slots.pop() if self.free_slots else self.size
+                if slot == self.size:
+                    self._grow(slot + 1)
+                    self.size += 1
+                    self.docs.append(None)
+                self.slots[expert_id] = slot
+            else:
+                self._unlink(slot)
+
+            doc = {key: record.get(key) for key in DOC_FIELDS}
+            doc['id'] = expert_id
+            doc['status'] = record.get('status')
+            doc['approval_status'] = record.get('approval_status')
+            if doc['compensation'] is None:
+                doc['compensation'] = record.get('client_fee_percentage')
+            for key in ('rating', 'compensation'):
+                if doc[key] is not None:
+                    doc[key] = float(doc[key])
+            self.docs[slot] = doc
+            for facet, value in self._facet_values(doc):
+                self._facet(facet, value)[slot] = True
+            self.ratings.set(slot, doc['rating'])
+            self.compensations.set(slot, doc['compensation'])
+            latitude, longitude = doc.get('latitude'), doc.get('longitude')
+            if latitude is not None and longitude is not None:
+                cell = geohash(float(latitude), float(longitude))
+                self.geohashes[slot] = cell
+                for precision in range(1, GEOHASH_PRECISION + 1):
+                    self.geo_cells.setdefault(cell[:precision], set()).add(slot)
+                self.latitudes[slot] = float(latitude)
+                self.longitudes[slot] = float(longitude)
+            self.specialization_counts[slot] = max(len(doc.get('specializations') or []), 1)
+            self.alive[slot] = True
+            self._refresh_score(expert_id, slot)
+
+    def delete(self, expert_id: str) -> None:
+        with self._lock:
+            slot = self.slots.pop(str(expert_id), None)
+            if slot is None:
+                return
+            self._unlink(slot)
+            self.docs[slot] = None
+            self.alive[slot] = False
+            self.base_scores[slot] = 0.0
+            self.free_slots.append(slot)
+
+    def set_assignment(self, expert_id: str, assignment_id: str, status: Optional[str],
+                       client_rating: Optional[float], active: bool = True) -> None:
+        """Ajoute, met à jour ou retire une ligne "ExpertAssignment" d'un expert."""
+        expert_id = str(expert_id)
+        with self._lock:
+            rows = self.assignments.setdefault(expert_id, {})
+            if active:
+                rows[str(assignment_id)] = (status, float(client_rating) if client_rating is not None else None)
+            else:
+                rows.pop(str(assignment_id), None)
+            if not rows:
+                del self.assignments[expert_id]
+            slot = self.slots.get(expert_id)
+            if slot is not None:
+                self._refresh_score(expert_id, slot)
+
+    def apply_change(self, table: str, event: Dict[str, Any]) -> None:
+        """Applique un événement de changement (payload Supabase Realtime)."""
+        event_type = (event.get('eventType') or event.get('type') or '').upper()
+        new = event.get('new') or event.get('record') or {}
+        old = event.get('old') or event.get('old_record') or {}
+        if table == 'Expert':
+            if event_type == 'DELETE':
+                self.delete(old.get('id'))
+            else:
+                self.upsert(new)
+        elif table == 'ExpertAssignment':
+            if old.get('expert_id') and old.get('expert_id') != new.get('expert_id'):
+                self.set_assignment(old['expert_id'], old.get('id'), None, None, active=False)
+            if event_type != 'DELETE' and new.get('expert_id'):
+                self.set_assignment(new['expert_id'], new.get('id'), new.get('status'), new.get('client_rating'))
+
+    # ------------------------------------------------------------------
+    # Recherche
+    # ------------------------------------------------------------------
+
+    def _range_mask(self, column: SortedColumn, low: Optional[float], high: Optional[float]) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        mask[column.between(low, high)] = True
+        return mask
+
+    def _filter_mask(self, criteria: Dict[str, Any]) -> Optional[np.ndarray]:
+        mask = self.alive[:self.size].copy()
+        for facet, value in (('status', 'active'), ('approval_status', 'approved')):
+            bitmap = self.facets[facet].get(value)
+            if bitmap is None:
+                return None
+            mask &= bitmap[:self.size]
+        for facet, key in (('specialization', 'specializations'), ('certification', 'certifications')):
+            for value in criteria.get(key) or []:
+                bitmap = self.facets[facet].get(value)
+                if bitmap is None:
+                    return None
+                mask &= bitmap[:self.size]
+
+        # Bornes ignorées quand elles valent 0, comme le code Node
+        min_rating, max_rating = criteria.get('minRating') or None, criteria.get('maxRating') or None
+        if min_rating is not None or max_rating is not None:
+            mask &= self._range_mask(self.ratings, min_rating, max_rating)
+        price = criteria.get('priceRange') or {}
+        if price.get('min') or price.get('max'):
+            mask &= self._range_mask(self.compensations, price.get('min') or None, price.get('max') or None)
+        return mask
+
+    def _geo_filter(self, slots: np.ndarray, near: Dict[str, Any], max_distance: float) -> Tuple[np.ndarray, np.ndarray]:
+        latitude, longitude = float(near['latitude']), float(near['longitude'])
+        precision, cells = covering_cells(latitude, longitude, max_distance)
+        if precision:
+            in_cells = np.zeros(self.size, dtype=bool)
+            for cell in cells:
+                members = self.geo_cells.get(cell)
+                if members:
+                    in_cells[np.fromiter(members, dtype=np.int64, count=len(members))] = True
+            slots = slots[in_cells[slots]]
+        distances = haversine_km(latitude, longitude, self.latitudes[slots], self.longitudes[slots])
+        keep = distances <= max_distance
+        return slots[keep], distances[keep]
+
+    def _scores(self, slots: np.ndarray, specializations: List[str]) -> np.ndarray:
+        scores = self.base_scores[slots].copy()
+        if specializations:
+            matches = np.zeros(len(slots))
+            for specialization in set(specializations):
+                bitmap = self.facets['specialization'].get(specialization)
+                if bitmap is not None:
+                    matches += bitmap[slots]
+            scores += matches * 40.0 / self.specialization_counts[slots]
+        return scores
+
+    def search(self, criteria: Optional[Dict[str, Any]] = None, page: int = 1, limit: int = 10) -> Dict[str, Any]:
+        """Experts classés par pertinence (critères de ExpertSearchCriteria) et nombre exact de résultats.
+
+        Critère supplémentaire `near` ({latitude, longitude}) : centre du rayon
+        `maxDistance` (km) ; sans `near`, `maxDistance` est ignoré comme côté Node.
+        """
+        criteria = criteria or {}
+        page = max(1, int(page or 1))
+        limit = max(1, int(limit or 10))
+        location = (criteria.get('location') or '').lower()
+        experience = (criteria.get('experience') or '').lower()
+        availability = criteria.get('availability')
+
+        with self._lock:
+            mask = self._filter_mask(criteria)
+            slots = np.flatnonzero(mask) if mask is not None else np.empty(0, dtype=np.int64)
+            distances = None
+            if len(slots) and criteria.get('near') and criteria.get('maxDistance'):
+                slots, distances = self._geo_filter(slots, criteria['near'], float(criteria['maxDistance']))
+            if location or experience or availability:
+                docs = self.docs
+                keep = np.fromiter((
+                    (not location or location in (docs[s].get('location') or '').lower())
+                    and (not experience or experience in (docs[s].get('experience') or '').lower())
+                    and (not availability or json_contains(docs[s].get('disponibilites'), availability))
+                    for s in slots.tolist()), dtype=bool, count=len(slots))
+                slots = slots[keep]
+                if distances is not None:
+                    distances = distances[keep]
+
+            total = len(slots)
+            offset = (page - 1) * limit
+            experts = []
+            if total > offset:
+                scores = self._scores(slots, criteria.get('specializations') or [])
+                wanted = min(offset + limit, total)
+                if wanted < total:
+                    top = np.argpartition(-scores, wanted - 1)[:wanted]
+                else:
+                    top = np.arange(total)
+                # Score décroissant, puis emplacement pour un ordre stable
+                top = top[np.lexsort((slots[top], -scores[top]))][offset:offset + limit]
+                for position in top.tolist():
+                    doc = self.docs[slots[position]]
+                    score = float(scores[position])
+                    completed = doc['completed_assignments']
+                    expert = {key: value for key, value in doc.items()
+                              if key not in ('status', 'approval_status', 'latitude', 'longitude')}
+                    disponibilites = doc.get('disponibilites')
+                    expert.update(
+                        relevance_score=score,
+                        match_percentage=round(score),
+                        match_level=match_level(score),
+                        availability_status='Disponible' if isinstance(disponibilites, dict)
+                        and disponibilites.get('available') else 'Indisponible',
+                        response_time=response_time(completed),
+                        success_rate=round(completed / doc['assignment_count'] * 100) if completed else 0
+                    )
+                    if distances is not None:
+                        expert['distance_km'] = round(float(distances[position]), 1)
+                    experts.append(expert)
+
+        return {
+            'experts': experts,
+            'total': total,
+            'page': page,
+            'limit': limit,
+            'total_pages': math.ceil(total / limit)
+        }
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+
+def load_index(connection_factory: Callable = get_db_connection, batch_size: int = 5000) -> ExpertSearchIndex:
+    """Construit l'index complet (au démarrage) ; les événements le tiennent ensuite à jour."""
+    from psycopg2.extras import RealDictCursor
+
+    index = ExpertSearchIndex()
+    conn = connection_factory()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT id::text AS id, expert_id::text AS expert_id, status, client_rating
+                FROM "ExpertAssignment"
+                WHERE expert_id IS NOT NULL
+            """)
+            for row in cur.fetchall():
+                index.set_assignment(row['expert_id'], row['id'], row['status'], row['client_rating'])
+
+        with conn.cursor('expert_search_index', cursor_factory=RealDictCursor) as cur:
+            cur.itersize = batch_size
+            cur.execute("""
+                SELECT id::text AS id, name, company_name, specializations, experience, location, rating,
+                       description, client_fee_percentage AS compensation, disponibilites, certifications,
+                       status, approval_status, latitude, longitude
+                FROM "Expert"
+            """)
+            for row in cur:
+                index.upsert(row)
+    finally:
+        conn.close()
+    return index
+
+
+def build_index(records: Iterable[Dict[str, Any]]) -> ExpertSearchIndex:
+    index = ExpertSearchIndex()
+    for record in records:
+        index.upsert(record)
+    return index
@@ -0,0 +1,260 @@
+"""
+Notifications de nouveaux messages regroupées par destinataire et conversation.
+
+`MessagingService.createMessageNotifications` (messaging-service.ts) relit
+les participants puis insère une ligne "MessageNotification" par
+destinataire et par message, dans le chemin d'envoi : un échange rapide
+produit des dizaines de notifications par minute et par participant.
+
+`MessageNotificationFanout` reçoit les messages envoyés sans attendre la
+base, les regroupe par (destinataire, conversation) sur une fenêtre courte et
+écrit une seule notification glissante par couple : tant qu'elle n'est pas
+lue, elle est mise à jour (`message_count`, dernier aperçu) au lieu d'être
+dupliquée. Une écriture groupée par fenêtre ; les participants sont gardés en
+cache par conversation.
+"""
+
+import atexit
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+PREVIEW_LENGTH = 100
+
+Recipient = Tuple[str, str]
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def preview(content: Optional[str]) -> str:
+    content = content or ''
+    return content[:PREVIEW_LENGTH] + '...' if len(content) > PREVIEW_LENGTH else content
+
+
+class MessageNotificationStore:
+    """Participants actifs et notifications glissantes dans "MessageNotification"."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self._connect = connection_factory
+
+    def load_members(self, conversation_ids: List[str]) -> Dict[str, List[Recipient]]:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT conversation_id::text, user_id::text, user_type
+                    FROM "ConversationParticipant"
+                    WHERE conversation_id = ANY(%s::uuid[]) AND is_active = true
+                """, (conversation_ids,))
+                members: Dict[str, List[Recipient]] = {cid: [] for cid in conversation_ids}
+                for conversation_id, user_id, user_type in cur.fetchall():
+                    members[conversation_id].append((user_id, user_type))
+                return members
+        finally:
+            conn.close()
+
+    def upsert(self, rows: List[Tuple]) -> int:
+        """rows : (user_id, user_type, conversation_id, message_id, title, body, message_count, at)."""
+        from psycopg2.extras import execute_values
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                # Au plus une notification non lue par (destinataire, conversation)
+                execute_values(cur, """
+                    INSERT INTO "MessageNotification" AS n
+                        (user_id, user_type, conversation_id, message_id, title, body,
+                         message_count, is_read, created_at, updated_at)
+                    VALUES %s
+                    ON CONFLICT (user_id, user_type, conversation_id) WHERE is_read = false
+                    DO UPDATE SET message_id = EXCLUDED.message_id,
+                                  title = EXCLUDED.title,
+                                  body = EXCLUDED.body,
+                                  message_count = n.message_count + EXCLUDED.message_count,
+                                  updated_at = EXCLUDED.updated_at
+                """, rows, template='(%s::uuid, %s, %s::uuid, %s::uuid, %s, %s, %s, false, %s, %s)',
+                    page_size=1000)
+                written = cur.rowcount
+            conn.commit()
+            return written
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+class MembershipCache:
+    """Participants actifs par conversation, relus après `ttl_seconds` ou sur invalidation."""
+
+    def __init__(self, store: MessageNotificationStore, ttl_seconds: float = 300,
+                 clock: Callable[[], float] = time.monotonic):
+        self.store = store
+        self.ttl = ttl_seconds
+        self.clock = clock
+        self._members: Dict[str, Tuple[List[Recipient], float]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get_many(self, conversation_ids: Iterable[str]) -> Dict[str, List[Recipient]]:
+        now = self.clock()
+        found: Dict[str, List[Recipient]] = {}
+        missing: List[str] = []
+        with self._lock:
+            for conversation_id in conversation_ids:
+                entry = self._members.get(conversation_id)
+                if entry is not None and now - entry[1] < self.ttl:
+                    found[conversation_id] = entry[0]
+                else:
+                    missing.append(conversation_id)
+        self.stats['hits'] += len(found)
+        if missing:
+            self.stats['misses'] += len(missing)
+            loaded = self.store.load_members(missing)
+            with self._lock:
+                for conversation_id, members in loaded.items():
+                    self._members[conversation_id] = (members, now)
+            found.update(loaded)
+        return found
+
+    def set(self, conversation_id: str, members: List[Recipient]) -> None:
+        with self._lock:
+            self._members[conversation_id] = (list(members), self.clock())
+
+    def invalidate(self, conversation_id: Optional[str] = None) -> None:
+        """À appeler à l'ajout ou au retrait d'un participant (toutes les conversations si None)."""
+        with self._lock:
+            if conversation_id is None:
+                self._members.clear()
+            else:
+                self._members.pop(conversation_id, None)
+
+
+class MessageNotificationFanout:
+    """Tampon des messages envoyés, écrit en notifications glissantes toutes les `window_seconds`."""
+
+    def __init__(self, store: Optional[MessageNotificationStore] = None,
+                 membership: Optional[MembershipCache] = None, window_seconds: float = 2,
+                 max_pending: int = 50_000, autostart: bool = True):
+        self.store = store or MessageNotificationStore()
+        self.membership = membership or MembershipCache(self.store)
+        self.window = window_seconds
+        self.max_pending = max_pending
+        # conversation -> messages de la fenêtre, avec destinataires s'ils sont déjà connus
+        self._pending: Dict[str, List[Tuple[Dict[str, Any], Optional[List[Recipient]]]]] = {}
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'published': 0, 'dropped': 0, 'flushes': 0, 'notifications': 0, 'errors': 0}
+        if autostart:
+            self.start()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='message-notification-fanout', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def publish(self, message: Dict[str, Any], recipients: Optional[Iterable[Dict[str, Any]]] = None) -> bool:
+        """Ajoute un message envoyé ; ne touche jamais la base.
+
+        `recipients` (user_id, user_type) évite la lecture des participants quand
+        l'appelant les connaît déjà (MessagingReadModel.send_message).
+        """
+        known = None
+        if recipients is not None:
+            known = [(str(r['user_id']), r['user_type']) for r in recipients]
+        with self._lock:
+            if self._pending_count >= self.max_pending:
+                self.stats['dropped'] += 1
+                return False
+            self._pending.setdefault(str(message['conversation_id']), []).append((message, known))
+            self._pending_count += 1
+            self.stats['published'] += 1
+        return True
+
+    def _coalesce(self, pending: Dict[str, List[Tuple[Dict[str, Any], Optional[List[Recipient]]]]]) -> List[Tuple]:
+        unresolved = [cid for cid, items in pending.items() if any(known is None for _, known in items)]
+        members = self.membership.get_many(unresolved) if unresolved else {}
+
+        # (destinataire, type, conversation) -> [nombre, dernier message]
+        grouped: Dict[Tuple[str, str, str], List[Any]] = {}
+        for conversation_id, items in pending.items():
+            for message, known in items:
+                sender_id = str(message['sender_id'])
+                recipients = known if known is not None else members.get(conversation_id, [])
+                for user_id, user_type in recipients:
+                    if user_id == sender_id:
+                        continue
+                    key = (user_id, user_type, conversation_id)
+                    entry = grouped.get(key)
+                    if entry is None:
+                        grouped[key] = [1, message]
+                    else:
+                        # Ordre de publication = ordre d'envoi : le dernier donne l'aperçu
+                        entry[0] += 1
+                        entry[1] = message
+
+        # Tri (destinataire, type, conversation) : même ordre de verrouillage que
+        # upsert_message_notifications côté Node et que les autres processus
+        rows = []
+        for (user_id, user_type, conversation_id), (count, message) in sorted(grouped.items(), key=lambda g: g[0]):
+            title = f"Nouveau message de {message.get('sender_name') or 'Système'}"
+            rows.append((user_id, user_type, conversation_id, str(message['id']), title,
+                         preview(message.get('content')), count, message['created_at'], message['created_at']))
+        return rows
+
+    def flush(self) -> int:
+        """Écrit la fenêtre courante ; retourne le nombre de notifications écrites ou mises à jour."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._pending_count = 0
+            if not pending:
+                return 0
+            try:
+                rows = self._coalesce(pending)
+                if rows:
+                    self.store.upsert(rows)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f'Erreur écriture des notifications de messages : {str(e)}')
+                # La fenêtre revient en tête du tampon pour le prochain passage
+                with self._lock:
+                    for conversation_id, items in pending.items():
+                        self._pending[conversation_id] = items + self._pending.get(conversation_id, [])
+                        self._pending_count += len(items)
+                raise
+            self.stats['flushes'] += 1
+            self.stats['notifications'] += len(rows)
+            return len(rows)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.window):
+            try:
+                self.flush()
+            except Exception:
+                pass
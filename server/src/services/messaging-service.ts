@@ -366,34 +366,16 @@ export class MessagingService {
    */
   private async createMessageNotifications(message: Message): Promise<void> {
     try {
-      // Récupérer les participants de la conversation
-      const { data: participants, error } = await supabase
-        .from('ConversationParticipant')
-        .select('user_id, user_type')
-        .eq('conversation_id', message.conversation_id)
-        .neq('user_id', message.sender_id)
-        .eq('is_active', true);
-
-      if (error || !participants) {
-        console.error('❌ Erreur récupération participants:', error);
-        return;
-      }
-
-      // Créer une notification pour chaque participant
-      const notifications = participants.map(participant => ({
-        user_id: participant.user_id,
-        user_type: participant.user_type,
-        conversation_id: message.conversation_id,
-        message_id: message.id,
-        title: `Nouveau message de ${message.sender_name}`,
-        body: message.content.length > 100 ? message.content.substring(0, 100) + '...' : message.content,
-        is_read: false,
-        created_at: new Date().toISOString()
-      }));
-
-      const { error: notificationError } = await supabase
-        .from('MessageNotification')
-        .insert(notifications);
+      // Une notification non lue par (participant, conversation) : l'index unique
+      // idx_message_notification_unread_rolling refuse un insert par message, la
+      // fonction SQL met à jour la notification existante (message_count + 1)
+      const { error: notificationError } = await supabase.rpc('upsert_message_notifications', {
+        p_conversation_id: message.conversation_id,
+        p_message_id: message.id,
+        p_sender_id: message.sender_id,
+        p_title: `Nouveau message de ${message.sender_name}`,
+        p_body: message.content.length > 100 ? message.content.substring(0, 100) + '...' : message.content
+      });
 
       if (notificationError) {
         console.error('❌ Erreur création notifications:', notificationError);
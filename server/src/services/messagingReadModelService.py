@@ -0,0 +1,308 @@
+"""
+Modèle de lecture de la messagerie : filigranes de lecture et compteurs non lus.
+
+`MessagingService.markMessagesAsRead` (messaging-service.ts) passe chaque
+"Message" non lu d'une conversation à `is_read = true` puis met à jour
+`last_read_at` du participant ; les badges comptent les lignes
+`is_read = false` et l'historique est paginé par `range(offset, …)`.
+
+Ici :
+
+- chaque "ConversationParticipant" porte un filigrane de lecture
+  `(last_read_at, last_read_message_id)` : un message est lu par ce
+  participant s'il est à ou avant le filigrane dans l'ordre `(created_at, id)` ;
+- `unread_count` du participant et `user_unread_counters.unread_total` sont
+  incrémentés à l'envoi et remis à zéro à la lecture : marquer lue une
+  conversation de 500 messages est une écriture, le badge une lecture par clé ;
+- l'historique est servi par curseur `(created_at, id)` : coût constant quelle
+  que soit la profondeur de la page.
+
+`is_read` sur "Message" n'est plus écrit par ce module.
+"""
+
+import base64
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Filigrane posé par l'ancien code (last_read_at seul) : tout message à cette date est lu
+LEGACY_WATERMARK_ID = 'ffffffff-ffff-ffff-ffff-ffffffffffff'
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def encode_cursor(created_at: datetime, message_id: str) -> str:
+    raw = f'{created_at.isoformat()}|{message_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), message_id
+    except Exception as e:
+        raise ValueError('Curseur de pagination invalide') from e
+
+
+class MessagingReadModel:
+    """Envoi, lecture et pagination des messages sur filigranes et compteurs matérialisés."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection, fanout: Optional[Any] = None):
+        self._connect = connection_factory
+        # MessageNotificationFanout : notifications écrites hors du chemin d'envoi
+        self.fanout = fanout
+
+    def send_message(self, conversation_id: str, sender_id: str, sender_type: str, content: str,
+                     sender_name: Optional[str] = None, message_type: str = 'text',
+                     metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Insère le message et incrémente les compteurs des autres participants actifs."""
+        from psycopg2.extras import Json, RealDictCursor, execute_values
+
+        conn = self._connect()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # Verrou des participants avant l'horodatage : un marquage concurrent
+                # ne peut pas poser un filigrane postérieur à ce message sans l'avoir vu
+                cur.execute("""
+                    UPDATE "ConversationParticipant"
+                    SET unread_count = unread_count + 1
+                    WHERE conversation_id = %s AND user_id <> %s AND is_active = true
+                    RETURNING user_id::text, user_type
+                """, (conversation_id, sender_id))
+                recipients = cur.fetchall()
+                cur.execute("""
+                    INSERT INTO "Message" (conversation_id, sender_id, sender_type, sender_name, content,
+                                           message_type, metadata, is_read, created_at, updated_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, false, clock_timestamp(), clock_timestamp())
+                    RETURNING *
+                """, (conversation_id, sender_id, sender_type, sender_name, content, message_type,
+                      Json(metadata or {})))
+                message = dict(cur.fetchone())
+                if recipients:
+                    # Ordre de verrouillage stable (user_id, user_type) : deux envois concurrents
+                    # vers des conversations qui se recouvrent ne s'interbloquent pas
+                    execute_values(cur, """
+                        INSERT INTO user_unread_counters (user_id, user_type, unread_total, updated_at)
+                        VALUES %s
+                        ON CONFLICT (user_id, user_type) DO UPDATE
+                        SET unread_total = user_unread_counters.unread_total + 1,
+                            updated_at = EXCLUDED.updated_at
+                    """, sorted({(r['user_id'], r['user_type']) for r in recipients}),
+                        template='(%s::uuid, %s, 1, NOW())')
+                cur.execute("""
+                    UPDATE "Conversation" SET last_message_at = %s, updated_at = NOW() WHERE id = %s
+                """, (message['created_at'], conversation_id))
+            conn.commit()
+            message['recipients'] = [dict(r) for r in recipients]
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        if self.fanout is not None:
+            self.fanout.publish(message, message['recipients'])
+        return message
+
+    def mark_read(self, conversation_id: str, user_id: str, up_to: Optional[str] = None) -> int:
+        """Avance le filigrane du participant ; retourne le nombre de messages passés à lu.
+
+        Sans `up_to` (curseur du dernier message affiché), le filigrane passe au
+        dernier message de la conversation et le compteur à zéro, sans compter.
+        Un filigrane ne recule jamais.
+        """
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT id, user_type, last_read_at, last_read_message_id::text, unread_count
+                    FROM "ConversationParticipant"
+                    WHERE conversation_id = %s AND user_id = %s
+                    FOR UPDATE
+                """, (conversation_id, user_id))
+                participant = cur.fetchone()
+                if participant is None:
+                    conn.rollback()
+                    return 0
+                participant_id, user_type, read_at, read_id, unread = participant
+
+                if up_to is None:
+                    cur.execute("""
+                        SELECT created_at, id::text FROM "Message"
+                        WHERE conversation_id = %s
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT 1
+                    """, (conversation_id,))
+                    latest = cur.fetchone()
+                    if latest is None:
+                        conn.rollback()
+                        return 0
+                    mark_at, mark_id = latest
+                    remaining = 0
+                else:
+                    mark_at, mark_id = decode_cursor(up_to)
+                    # Seuls les messages restant après le nouveau filigrane sont comptés
+                    cur.execute("""
+                        SELECT count(*) FROM "Message"
+                        WHERE conversation_id = %s AND sender_id <> %s AND (created_at, id) > (%s, %s::uuid)
+                    """, (conversation_id, user_id, mark_at, mark_id))
+                    remaining = min(cur.fetchone()[0], unread)
+
+                if read_at is not None and (read_at, read_id or LEGACY_WATERMARK_ID) >= (mark_at, mark_id):
+                    conn.rollback()
+                    return 0
+                cur.execute("""
+                    UPDATE "ConversationParticipant"
+                    SET last_read_at = %s, last_read_message_id = %s, unread_count = %s
+                    WHERE id = %s
+                """, (mark_at, mark_id, remaining, participant_id))
+                cleared = unread - remaining
+                if cleared:
+                    cur.execute("""
+                        UPDATE user_unread_counters
+                        SET unread_total = GREATEST(unread_total - %s, 0), updated_at = NOW()
+                        WHERE user_id = %s AND user_type = %s
+                    """, (cleared, user_id, user_type))
+            conn.commit()
+            return cleared
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def unread_total(self, user_id: str, user_type: str) -> int:
+        """Badge de la boîte de réception : une lecture par clé primaire."""
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT unread_total FROM user_unread_counters WHERE user_id = %s AND user_type = %s
+                """, (user_id, user_type))
+                row = cur.fetchone()
+                return row[0] if row else 0
+        finally:
+            conn.close()
+
+    def unread_by_conversation(self, user_id: str) -> Dict[str, int]:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT conversation_id::text, unread_count FROM "ConversationParticipant"
+                    WHERE user_id = %s AND is_active = true AND unread_count > 0
+                """, (user_id,))
+                return dict(cur.fetchall())
+        finally:
+            conn.close()
+
+    def get_messages(self, conversation_id: str, limit: int = DEFAULT_PAGE_SIZE,
+                     before: Optional[str] = None, viewer_id: Optional[str] = None) -> Dict[str, Any]:
+        """Page de messages en ordre chronologique, plus récents d'abord page par page.
+
+        `before` est le `next_cursor` de la page précédente. Si `viewer_id` est
+        donné, `is_read` est calculé depuis son filigrane.
+        """
+        from psycopg2.extras import RealDictCursor
+
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        conn = self._connect()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                if before is None:
+                    cur.execute("""
+                        SELECT * FROM "Message"
+                        WHERE conversation_id = %s
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s
+                    """, (conversation_id, limit + 1))
+                else:
+                    before_at, before_id = decode_cursor(before)
+                    cur.execute("""
+                        SELECT * FROM "Message"
+                        WHERE conversation_id = %s AND (created_at, id) < (%s, %s::uuid)
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s
+                    """, (conversation_id, before_at, before_id, limit + 1))
+                rows = [dict(r) for r in cur.fetchall()]
+                watermark = None
+                if viewer_id is not None:
+                    cur.execute("""
+                        SELECT last_read_at, last_read_message_id::text AS last_read_message_id
+                        FROM "ConversationParticipant"
+                        WHERE conversation_id = %s AND user_id = %s
+                    """, (conversation_id, viewer_id))
+                    watermark = cur.fetchone()
+        finally:
+            conn.close()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], str(rows[-1]['id'])) if has_more else None
+        if viewer_id is not None:
+            for row in rows:
+                row['is_read'] = is_read_by(row, viewer_id, watermark)
+        rows.reverse()
+        return {'messages': rows, 'next_cursor': next_cursor}
+
+    def rebuild_counters(self) -> int:
+        """Recalcule tous les compteurs depuis les filigranes (reprise, contrôle de dérive)."""
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE "ConversationParticipant" AS p
+                    SET unread_count = c.unread
+                    FROM (
+                        SELECT p2.id, count(m.id)::int AS unread
+                        FROM "ConversationParticipant" p2
+                        LEFT JOIN "Message" m
+                          ON m.conversation_id = p2.conversation_id
+                         AND m.sender_id <> p2.user_id
+                         AND (p2.last_read_at IS NULL
+                              OR (m.created_at, m.id) > (p2.last_read_at,
+                                  COALESCE(p2.last_read_message_id, %s::uuid)))
+                        GROUP BY p2.id
+                    ) AS c
+                    WHERE p.id = c.id AND p.unread_count IS DISTINCT FROM c.unread
+                """, (LEGACY_WATERMARK_ID,))
+                changed = cur.rowcount
+                cur.execute("""
+                    INSERT INTO user_unread_counters (user_id, user_type, unread_total, updated_at)
+                    SELECT user_id, user_type, COALESCE(sum(unread_count), 0), NOW()
+                    FROM "ConversationParticipant"
+                    WHERE is_active = true
+                    GROUP BY user_id, user_type
+                    ON CONFLICT (user_id, user_type) DO UPDATE
+                    SET unread_total = EXCLUDED.unread_total, updated_at = EXCLUDED.updated_at
+                    WHERE user_unread_counters.unread_total IS DISTINCT FROM EXCLUDED.unread_total
+                """)
+            conn.commit()
+            return changed
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def is_read_by(message: Dict[str, Any], user_id: str, watermark: Optional[Dict[str, Any]]) -> bool:
+    """Un message est lu par `user_id` s'il l'a envoyé ou s'il est à ou avant son filigrane."""
+    if str(message['sender_id']) == str(user_id):
+        return True
+    if not watermark or watermark.get('last_read_at') is None:
+        return False
+    return (message['created_at'], str(message['id'])) <= (watermark['last_read_at'],
+                                                           watermark.get('last_read_message_id') or LEGACY_WATERMARK_ID)
@@ -0,0 +1,432 @@
+"""
+Index de recherche en mémoire pour la liste des prospects (admin).
+
+`ProspectService.listProspects` fait un `ilike '%terme%'` sur quatre colonnes
+avec `count: 'exact'`, et dès que `has_sequences` est fourni, charge tous les
+prospects pour filtrer et paginer en mémoire. Cet index maintient :
+
+- un index inversé de trigrammes (trigramme -> emplacements) sur email,
+  prénom, nom et entreprise ; un terme de 3 caractères ou plus ne vérifie
+  que l'intersection des listes, la plus courte en premier ;
+- des bitmaps de facettes (tableaux booléens NumPy, un emplacement par
+  prospect) pour source, email_validity, enrichment_status, ai_status,
+  emailing_status, has_siren et has_sequences ;
+- des colonnes de tri (created_at, updated_at, score_priority).
+
+Une requête renvoie une page d'identifiants classés (égalité exacte, puis
+préfixe, puis sous-chaîne, puis tri demandé) et le nombre exact de résultats.
+L'index se met à jour par événements de changement (format Supabase Realtime :
+`eventType`, `new`, `old`) sur prospects, prospect_email_scheduled et
+prospects_emails.
+"""
+
+import math
+import os
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+FACETS = ('source', 'email_validity', 'enrichment_status', 'ai_status', 'emailing_status')
+TEXT_FIELDS = ('email', 'firstname', 'lastname', 'company_name')
+NUMERIC_SORTS = ('created_at', 'updated_at', 'score_priority')
+ACTIVE_SEQUENCE_STATUSES = ('scheduled', 'paused')
+SEPARATOR = '\x00'
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def trigrams(text: str) -> Set[str]:
+    """Trigrammes d'un texte, sans ceux qui chevauchent deux champs."""
+    return {text[i:i + 3] for i in range(len(text) - 2) if SEPARATOR not in text[i:i + 3]}
+
+
+def start_grams(text: str) -> Set[str]:
+    """Deux premiers caractères de chaque champ, marqués du séparateur (classement par préfixe)."""
+    return {SEPARATOR + field[:2] for field in text.split(SEPARATOR) if len(field) >= 2}
+
+
+def _epoch(value: Any) -> float:
+    if value is None:
+        return math.nan
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return math.nan
+
+
+class ProspectSearchIndex:
+    """Trigrammes + facettes + colonnes de tri, mis à jour incrémentalement."""
+
+    def __init__(self, capacity: int = 1024):
+        self._lock = threading.RLock()
+        self.capacity = capacity
+        self.slots: Dict[str, int] = {}
+        self.free_slots: List[int] = []
+        self.size = 0
+        self.docs: List[Optional[Dict[str, Any]]] = []
+        self.texts: List[str] = []
+        self.postings: Dict[str, Set[int]] = {}
+        self.exact: Dict[str, Set[int]] = {}
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.facets: Dict[str, Dict[Any, np.ndarray]] = {facet: {} for facet in FACETS}
+        self.flags: Dict[str, np.ndarray] = {
+            name: np.zeros(capacity, dtype=bool) for name in ('has_siren', 'has_sequences', 'has_sent_emails')
+        }
+        self.sort_keys: Dict[str, np.ndarray] = {
+            name: np.full(capacity, np.nan) for name in NUMERIC_SORTS
+        }
+        # prospect_id -> lignes prospect_email_scheduled actives ; prospects ayant reçu un email
+        self.active_sequences: Dict[str, Set[str]] = {}
+        self.sent_emails: Set[str] = set()
+
+    # ------------------------------------------------------------------
+    # Mises à jour
+    # ------------------------------------------------------------------
+
+    def _grow(self, needed: int) -> None:
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+
+        def resized(array: np.ndarray, fill: Any) -> np.ndarray:
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[:self.capacity] = array
+            return grown
+
+        self.alive = resized(self.alive, False)
+        for facet in self.facets.values():
+            for value in facet:
+                facet[value] = resized(facet[value], False)
+        for name in self.flags:
+            self.flags[name] = resized(self.flags[name], False)
+        for name in self.sort_keys:
+            self.sort_keys[name] = resized(self.sort_keys[name], np.nan)
+        self.capacity = capacity
+
+    def _facet(self, facet: str, value: Any) -> np.ndarray:
+        bitmap = self.facets[facet].get(value)
+        if bitmap is None:
+            bitmap = self.facets[facet][value] = np.zeros(self.capacity, dtype=bool)
+        return bitmap
+
+    def _unlink(self, slot: int) -> None:
+        doc = self.docs[slot]
+        if doc is None:
+            return
+        text = self.texts[slot]
+        for gram in trigrams(text) | start_grams(text):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(slot)
+                if not posting:
+                    del self.postings[gram]
+        for field in set(text.split(SEPARATOR)):
+            exact = self.exact.get(field)
+            if exact is not None:
+                exact.discard(slot)
+                if not exact:
+                    del self.exact[field]
+        for facet in FACETS:
+            if doc.get(facet) is not None:
+                self.facets[facet][doc[facet]][slot] = False
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        """Indexe (ou réindexe) un prospect."""
+        prospect_id = str(record['id'])
+        with self._lock:
+            slot = self.slots.get(prospect_id)
+            if slot is None:
+                slot = self.free_slots.pop() if self.free_slots else self.size
+                if slot == self.size:
+                    self._grow(slot + 1)
+                    self.size += 1
+                    self.docs.append(None)
+                    self.texts.append('')
+                self.slots[prospect_id] = slot
+            else:
+                self._unlink(slot)
+
+            doc = {key: record.get(key) for key in ('id',) + FACETS + TEXT_FIELDS}
+            doc['id'] = prospect_id
+            text = SEPARATOR.join((record.get(field) or '').lower() for field in TEXT_FIELDS)
+            self.docs[slot] = doc
+            self.texts[slot] = text
+            for gram in trigrams(text) | start_grams(text):
+                self.postings.setdefault(gram, set()).add(slot)
+            for field in text.split(SEPARATOR):
+                if field:
+                    self.exact.setdefault(field, set()).add(slot)
+            for facet in FACETS:
+                if doc.get(facet) is not None:
+                    self._facet(facet, doc[facet])[slot] = True
+            self.alive[slot] = True
+            self.flags['has_siren'][slot] = bool(record.get('siren'))
+            self.flags['has_sequences'][slot] = bool(self.active_sequences.get(prospect_id))
+            self.flags['has_sent_emails'][slot] = prospect_id in self.sent_emails
+            for name in NUMERIC_SORTS:
+                value = record.get(name)
+                self.sort_keys[name][slot] = (_epoch(value) if name != 'score_priority'
+                                              else (float(value) if value is not None else np.nan))
+
+    def delete(self, prospect_id: str) -> None:
+        with self._lock:
+            slot = self.slots.pop(str(prospect_id), None)
+            if slot is None:
+                return
+            self._unlink(slot)
+            self.docs[slot] = None
+            self.texts[slot] = ''
+            self.alive[slot] = False
+            for flag in self.flags.values():
+                flag[slot] = False
+            for keys in self.sort_keys.values():
+                keys[slot] = np.nan
+            self.free_slots.append(slot)
+
+    def set_sequence(self, prospect_id: str, scheduled_id: str, active: bool) -> None:
+        """Ajoute ou retire une ligne prospect_email_scheduled active d'un prospect."""
+        prospect_id = str(prospect_id)
+        with self._lock:
+            rows = self.active_sequences.setdefault(prospect_id, set())
+            if active:
+                rows.add(str(scheduled_id))
+            else:
+                rows.discard(str(scheduled_id))
+            if not rows:
+                del self.active_sequences[prospect_id]
+            slot = self.slots.get(prospect_id)
+            if slot is not None:
+                self.flags['has_sequences'][slot] = bool(rows)
+
+    def mark_email_sent(self, prospect_id: str) -> None:
+        prospect_id = str(prospect_id)
+        with self._lock:
+            self.sent_emails.add(prospect_id)
+            slot = self.slots.get(prospect_id)
+            if slot is not None:
+                self.flags['has_sent_emails'][slot] = True
+
+    def apply_change(self, table: str, event: Dict[str, Any]) -> None:
+        """Applique un événement de changement (payload Supabase Realtime)."""
+        event_type = (event.get('eventType') or event.get('type') or '').upper()
+        new = event.get('new') or event.get('record') or {}
+        old = event.get('old') or event.get('old_record') or {}
+        if table == 'prospects':
+            if event_type == 'DELETE':
+                self.delete(old.get('id'))
+            else:
+                self.upsert(new)
+        elif table == 'prospect_email_scheduled':
+            row = new if event_type != 'DELETE' else old
+            if row.get('prospect_id'):
+                active = event_type != 'DELETE' and row.get('status') in ACTIVE_SEQUENCE_STATUSES
+                self.set_sequence(row['prospect_id'], row.get('id'), active)
+        elif table == 'prospects_emails':
+            if event_type != 'DELETE' and new.get('prospect_id') and new.get('sent_at'):
+                self.mark_email_sent(new['prospect_id'])
+
+    # ------------------------------------------------------------------
+    # Recherche
+    # ------------------------------------------------------------------
+
+    def _filter_mask(self, filters: Dict[str, Any]) -> Optional[np.ndarray]:
+        mask = self.alive[:self.size].copy()
+        for facet in FACETS:
+            value = filters.get(facet)
+            if value:
+                bitmap = self.facets[facet].get(value)
+                if bitmap is None:
+                    return None
+                mask &= bitmap[:self.size]
+        if filters.get('has_siren') is True:
+            mask &= self.flags['has_siren'][:self.size]
+        has_sequences = filters.get('has_sequences')
+        if has_sequences is True:
+            mask &= self.flags['has_sequences'][:self.size]
+        elif has_sequences is False:
+            # Comme listProspects : ni séquence active, ni email déjà envoyé
+            mask &= ~self.flags['has_sequences'][:self.size] & ~self.flags['has_sent_emails'][:self.size]
+        if filters.get('min_score_priority') is not None:
+            with np.errstate(invalid='ignore'):
+                mask &= self.sort_keys['score_priority'][:self.size] >= float(filters['min_score_priority'])
+        return mask
+
+    def _text_candidates(self, term: str, mask: np.ndarray) -> np.ndarray:
+        grams = trigrams(term)
+        texts = self.texts
+        if grams:
+            postings = []
+            for gram in grams:
+                posting = self.postings.get(gram)
+                if not posting:
+                    return np.empty(0, dtype=np.int64)
+                postings.append(posting)
+            postings.sort(key=len)
+            candidates = postings[0].intersection(*postings[1:])
+            slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            slots = slots[mask[slots]]
+            if len(term) == 3:
+                # Un seul trigramme hors séparateur : la présence vaut correspondance
+                return slots
+        else:
+            # Terme de moins de 3 caractères : vérification directe des prospects filtrés
+            slots = np.flatnonzero(mask)
+        return np.fromiter((s for s in slots if term in texts[s]), dtype=np.int64)
+
+    def _order(self, slots: np.ndarray, sort_by: str, descending: bool, limit: int) -> np.ndarray:
+        """Les `limit` premiers emplacements selon le tri demandé (tous si limit >= len)."""
+        if sort_by in NUMERIC_SORTS:
+            keys = self.sort_keys[sort_by][slots]
+            if descending:
+                # Tri PostgreSQL : NULLS FIRST en ordre décroissant
+                keys = -np.where(np.isnan(keys), np.inf, keys)
+        else:
+            values = [(self.docs[s].get(sort_by) or '') if self.docs[s] else '' for s in slots]
+            order = sorted(range(len(slots)), key=values.__getitem__, reverse=descending)
+            keys = np.empty(len(slots))
+            keys[order] = np.arange(len(slots))
+
+        if limit < len(slots):
+            top = np.argpartition(keys, limit - 1)[:limit]
+            return slots[top[np.argsort(keys[top], kind='stable')]]
+        return slots[np.argsort(keys, kind='stable')]
+
+    def _ranked_page(self, slots: np.ndarray, term: str, sort_by: str, descending: bool,
+                     limit: int) -> List[int]:
+        """Les `limit` premiers résultats classés : champ égal au terme, puis champ
+        commençant par le terme, puis sous-chaîne ; le tri demandé départage.
+
+        Les niveaux sont remplis dans l'ordre de tri et la vérification du préfixe
+        s'arrête dès que la page est complète.
+        """
+        ordered = self._order(slots, sort_by, descending, len(slots))
+        texts = self.texts
+        exact = self.exact.get(term) or set()
+        starts = self.postings.get(SEPARATOR + term[:2], set()) if len(term) >= 2 else set()
+
+        def is_prefix(slot: int) -> bool:
+            return slot in starts and any(f.startswith(term) for f in texts[slot].split(SEPARATOR))
+
+        page: List[int] = []
+        if exact:
+            position = np.empty(self.size, dtype=np.int64)
+            position[ordered] = np.arange(len(ordered))
+            in_result = np.zeros(self.size, dtype=bool)
+            in_result[ordered] = True
+            matches = np.fromiter(exact, dtype=np.int64, count=len(exact))
+            matches = matches[in_result[matches]]
+            page = matches[np.argsort(position[matches], kind='stable')][:limit].tolist()
+        if len(page) < limit and starts:
+            for slot in ordered.tolist():
+                if slot not in exact and is_prefix(slot):
+                    page.append(slot)
+                    if len(page) == limit:
+                        break
+        if len(page) < limit:
+            for slot in ordered.tolist():
+                if slot not in exact and not is_prefix(slot):
+                    page.append(slot)
+                    if len(page) == limit:
+                        break
+        return page
+
+    def search(self, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Page d'identifiants + nombre exact, avec les filtres de listProspects."""
+        filters = filters or {}
+        page = max(1, int(filters.get('page') or 1))
+        limit = max(1, int(filters.get('limit') or 20))
+        sort_by = filters.get('sort_by') or 'created_at'
+        descending = (filters.get('sort_order') or 'desc') != 'asc'
+        term = (filters.get('search') or '').strip().lower()
+
+        with self._lock:
+            mask = self._filter_mask(filters)
+            if mask is None:
+                slots = np.empty(0, dtype=np.int64)
+            elif term:
+                slots = self._text_candidates(term, mask)
+            else:
+                slots = np.flatnonzero(mask)
+            total = len(slots)
+            offset = (page - 1) * limit
+            if not total:
+                ordered = []
+            elif term:
+                ordered = self._ranked_page(slots, term, sort_by, descending, offset + limit)
+            else:
+                ordered = self._order(slots, sort_by, descending, offset + limit)
+            ids = [self.docs[s]['id'] for s in ordered[offset:offset + limit]]
+
+        return {
+            'ids': ids,
+            'total': total,
+            'page': page,
+            'limit': limit,
+            'total_pages': math.ceil(total / limit)
+        }
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+
+def load_index(connection_factory: Callable = get_db_connection, batch_size: int = 5000) -> ProspectSearchIndex:
+    """Construit l'index complet (au démarrage) ; les événements le tiennent ensuite à jour."""
+    from psycopg2.extras import RealDictCursor
+
+    index = ProspectSearchIndex()
+    conn = connection_factory()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT id::text AS id, prospect_id::text AS prospect_id
+                FROM prospect_email_scheduled
+                WHERE status IN ('scheduled', 'paused')
+            """)
+            for row in cur.fetchall():
+                index.set_sequence(row['prospect_id'], row['id'], True)
+            cur.execute("""
+                SELECT DISTINCT prospect_id::text AS prospect_id
+                FROM prospects_emails
+                WHERE sent_at IS NOT NULL
+            """)
+            for row in cur.fetchall():
+                index.mark_email_sent(row['prospect_id'])
+
+        with conn.cursor('prospect_search_index', cursor_factory=RealDictCursor) as cur:
+            cur.itersize = batch_size
+            cur.execute("""
+                SELECT id::text AS id, email, firstname, lastname, company_name, source,
+                       email_validity, enrichment_status, ai_status, emailing_status,
+                       siren, score_priority, created_at, updated_at
+                FROM prospects
+            """)
+            for row in cur:
+                index.upsert(row)
+    finally:
+        conn.close()
+    return index
+
+
+def build_index(records: Iterable[Dict[str, Any]]) -> ProspectSearchIndex:
+    index = ProspectSearchIndex()
+    for record in records:
+        index.upsert(record)
+    return index
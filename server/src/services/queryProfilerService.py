@@ -0,0 +1,263 @@
+"""
+Instrumentation des requêtes psycopg2 et détection des N+1.
+
+Le code Python (routes/audit_progress.py, routes/preferences.py,
+scripts/generate_embeddings.py, apply_indexes.py) exécute des curseurs bruts
+sans aucune mesure. Ce module fournit :
+
+- `ProfiledConnection` : connexion psycopg2 (`connection_factory=`) dont
+  tous les curseurs, y compris `RealDictCursor`, mesurent `execute`,
+  `executemany` et `callproc` ;
+- une empreinte normalisée de chaque requête (littéraux, paramètres et
+  listes `IN (...)` / `VALUES (...)` remplacés) ;
+- `QueryProfile` : par requête HTTP ou par script, appels, durée et lignes
+  par empreinte, et signalement des empreintes répétées (N+1 probable) ;
+- `init_app` : profil par requête Flask, compteurs en en-têtes de réponse,
+  dump complet si l'en-tête `X-Query-Profile` est présent ou par
+  échantillonnage.
+
+Le temps de base est aussi reporté dans `requestMetricsService` (`db`).
+
+Usage :
+    conn = psycopg2.connect(dsn, connection_factory=ProfiledConnection)
+    with profile_queries('generate_embeddings') as profile:
+        ...
+    print(profile.report())
+"""
+
+import json
+import random
+import re
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from requestMetricsService import add_time
+
+PROFILE_HEADER = 'X-Query-Profile'
+N_PLUS_ONE_THRESHOLD = 5
+
+_current_profile: ContextVar[Optional['QueryProfile']] = ContextVar('query_profile', default=None)
+
+_COMMENTS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDERS = re.compile(r'%\(\w+\)s|%s')
+_NUMBERS = re.compile(r'(?<![\w"$])-?\d+(?:\.\d+)?\b')
+_IN_LISTS = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I)
+_VALUES_ROWS = re.compile(r'\bVALUES\s*\(([^()]*)\)(?:\s*,\s*\(\1\))+', re.I)
+_SPACES = re.compile(r'\s+')
+_COMMAS = re.compile(r'\s*,\s*')
+_PARENS = re.compile(r'\(\s+|\s+\)')
+
+_fingerprints: Dict[str, str] = {}
+_FINGERPRINT_CACHE_SIZE = 4096
+
+
+def fingerprint(sql: Any) -> str:
+    """Forme normalisée d'une requête : deux appels ne différant que par leurs valeurs coïncident."""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    elif not isinstance(sql, str):
+        # psycopg2.sql.Composed et assimilés
+        sql = str(sql)
+    cached = _fingerprints.get(sql)
+    if cached is not None:
+        return cached
+    normalized = _COMMENTS.sub(' ', sql)
+    normalized = _STRINGS.sub('?', normalized)
+    normalized = _PLACEHOLDERS.sub('?', normalized)
+    normalized = _NUMBERS.sub('?', normalized)
+    normalized = _SPACES.sub(' ', normalized).strip().rstrip(';')
+    normalized = _COMMAS.sub(', ', normalized)
+    normalized = _PARENS.sub(lambda m: m.group(0).strip(), normalized)
+    normalized = _IN_LISTS.sub('IN (...)', normalized)
+    normalized = _VALUES_ROWS.sub(r'VALUES (\1), ...', normalized)
+    if len(_fingerprints) < _FINGERPRINT_CACHE_SIZE:
+        _fingerprints[sql] = normalized
+    return normalized
+
+
+class QueryStats:
+    __slots__ = ('calls', 'total_seconds', 'max_seconds', 'rows')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'total_ms': round(self.total_seconds * 1000, 3),
+            'max_ms': round(self.max_seconds * 1000, 3),
+            'rows': self.rows
+        }
+
+
+class QueryProfile:
+    """Requêtes exécutées pendant une requête HTTP ou un script, agrégées par empreinte."""
+
+    def __init__(self, label: str = '', n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.label = label
+        self.threshold = n_plus_one_threshold
+        self.queries: Dict[str, QueryStats] = {}
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def record(self, sql: Any, seconds: float, rows: int) -> None:
+        key = fingerprint(sql)
+        stats = self.queries.get(key)
+        if stats is None:
+            stats = self.queries[key] = QueryStats()
+        stats.calls += 1
+        stats.total_seconds += seconds
+        if seconds > stats.max_seconds:
+            stats.max_seconds = seconds
+        if rows > 0:
+            stats.rows += rows
+        self.calls += 1
+        self.total_seconds += seconds
+
+    def repeated(self) -> List[Tuple[str, QueryStats]]:
+        """Empreintes exécutées au moins `threshold` fois : boucles par ligne probables."""
+        return sorted(((sql, stats) for sql, stats in self.queries.items() if stats.calls >= self.threshold),
+                      key=lambda item: item[1].calls, reverse=True)
+
+    def report(self) -> Dict[str, Any]:
+        ranked = sorted(self.queries.items(), key=lambda item: item[1].total_seconds, reverse=True)
+        return {
+            'label': self.label,
+            'queries': self.calls,
+            'distinct': len(self.queries),
+            'db_ms': round(self.total_seconds * 1000, 3),
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'n_plus_one': [{'sql': sql, **stats.as_dict()} for sql, stats in self.repeated()],
+            'fingerprints': [{'sql': sql, **stats.as_dict()} for sql, stats in ranked]
+        }
+
+
+class profile_queries:
+    """Active un profil pour le bloc (script, tâche, test)."""
+
+    def __init__(self, label: str = '', n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.profile = QueryProfile(label, n_plus_one_threshold)
+
+    def __enter__(self) -> QueryProfile:
+        self._token = _current_profile.set(self.profile)
+        return self.profile
+
+    def __exit__(self, *exc):
+        _current_profile.reset(self._token)
+        return False
+
+
+def current_profile() -> Optional[QueryProfile]:
+    return _current_profile.get()
+
+
+def _record(cursor, sql: Any, started: float) -> None:
+    elapsed = time.perf_counter() - started
+    add_time('db', elapsed)
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record(sql, elapsed, cursor.rowcount)
+
+
+class ProfiledCursorMixin:
+    """Mesure des méthodes d'exécution ; à combiner avec une classe de curseur psycopg2."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record(self, query, started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record(self, query, started)
+
+    def callproc(self, procname, parameters=None):
+        started = time.perf_counter()
+        try:
+            return super().callproc(procname, parameters)
+        finally:
+            _record(self, f'CALL {procname}', started)
+
+
+_cursor_classes: Dict[type, type] = {}
+
+
+def profiled_cursor_class(base: type) -> type:
+    """Sous-classe instrumentée de `base` (créée une fois par classe de curseur)."""
+    if issubclass(base, ProfiledCursorMixin):
+        return base
+    cls = _cursor_classes.get(base)
+    if cls is None:
+        cls = _cursor_classes[base] = type(f'Profiled{base.__name__}', (ProfiledCursorMixin, base), {})
+    return cls
+
+
+class ProfiledConnection(psycopg2.extensions.connection):
+    """Connexion dont tous les curseurs sont instrumentés."""
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = profiled_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+
+
+def connect(*args, **kwargs):
+    """`psycopg2.connect` avec une connexion instrumentée."""
+    kwargs.setdefault('connection_factory', ProfiledConnection)
+    return psycopg2.connect(*args, **kwargs)
+
+
+def init_app(app, sample_rate: float = 0.0, header: str = PROFILE_HEADER,
+             n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD,
+             sink: Callable[[str], None] = print, rng: Callable[[], float] = random.random) -> None:
+    """Profil des requêtes SQL par requête Flask.
+
+    Les compteurs sont toujours exposés en en-têtes (`X-Query-Count`,
+    `X-Query-Time-Ms`) et les N+1 probables toujours signalés ; le profil
+    complet n'est écrit que si l'en-tête `header` est présent ou par tirage
+    selon `sample_rate`.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def start_query_profile():
+        profile = QueryProfile(f'{request.method} {request.path}', n_plus_one_threshold)
+        g._query_profile = profile
+        g._query_profile_token = _current_profile.set(profile)
+        g._query_profile_dump = header in request.headers or (sample_rate > 0 and rng() < sample_rate)
+
+    @app.after_request
+    def finish_query_profile(response):
+        profile = g.pop('_query_profile', None)
+        if profile is None:
+            return response
+        response.headers['X-Query-Count'] = str(profile.calls)
+        response.headers['X-Query-Time-Ms'] = f'{profile.total_seconds * 1000:.1f}'
+        repeated = profile.repeated()
+        if g.pop('_query_profile_dump', False):
+            sink(json.dumps({'event': 'query_profile', **profile.report()}, ensure_ascii=False))
+        elif repeated:
+            sink(json.dumps({'event': 'query_n_plus_one', 'label': profile.label,
+                             'n_plus_one': [{'sql': sql, **stats.as_dict()} for sql, stats in repeated]},
+                            ensure_ascii=False))
+        return response
+
+    @app.teardown_request
+    def reset_query_profile(exc):
+        token = g.pop('_query_profile_token', None)
+        if token is not None:
+            _current_profile.reset(token)
@@ -0,0 +1,333 @@
+"""
+Graphe compilé du questionnaire du simulateur.
+
+Le simulateur (routes/simulator.ts, `questionsCache`) réévalue à chaque étape
+les `conditions` et `produits_cibles` de toutes les questions contre toutes
+les réponses. Ce module compile une fois la table "QuestionnaireQuestion" :
+
+- un DAG question -> questions dépendantes (`conditions.depends_on`), trié
+  topologiquement, avec des prédicats de condition précompilés ;
+- un index inverse clé de réponse (UUID ou code `question_id`) -> question,
+  et question -> produits ciblés ;
+- des masques de bits (un bit par question, dans l'ordre `question_order`)
+  pour la visibilité, les réponses et les questions de chaque produit.
+
+Après une réponse, `QuestionnaireSession.apply_answers` ne recalcule que les
+descendants de la question répondue et les produits concernés : le coût d'une
+étape dépend de la taille du sous-graphe touché, pas de la taille de la banque.
+
+Format des conditions (cf. corriger-conditions-questions.sql) :
+    {"depends_on": "TICPE_001", "value": "Oui", "operator": "equals"}
+Une liste de conditions est aussi acceptée (toutes doivent être vraies).
+"""
+
+import heapq
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or value == '' or value == []
+
+
+def _to_number(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _compile_operator(operator: str, expected: Any) -> Callable[[Any], bool]:
+    """Retourne le prédicat d'une condition, évalué sur une réponse présente."""
+    if operator == 'not_equals':
+        return lambda answer: answer != expected
+    if operator == 'includes':
+        return lambda answer: expected in answer if isinstance(answer, list) else answer == expected
+    if operator == 'in':
+        allowed = set(expected) if isinstance(expected, list) else {expected}
+        return lambda answer: (any(a in allowed for a in answer) if isinstance(answer, list)
+                               else answer in allowed)
+    if operator in ('greater_than', 'less_than'):
+        threshold = _to_number(expected)
+        if threshold is None:
+            return lambda answer: False
+        sign = 1 if operator == 'greater_than' else -1
+
+        def compare(answer: Any) -> bool:
+            number = _to_number(answer)
+            return number is not None and sign * (number - threshold) > 0
+        return compare
+    # 'equals' et opérateurs inconnus : comportement de client-simulation.ts
+    return lambda answer: answer == expected
+
+
+class QuestionnaireGraph:
+    """Questions compilées : positions, prédicats, dépendances et index inverses."""
+
+    def __init__(self, questions: List[Dict[str, Any]]):
+        ordered = sorted(enumerate(questions),
+                         key=lambda item: (item[1].get('question_order') or 0, item[0]))
+        self.questions: List[Dict[str, Any]] = [q for _, q in ordered]
+        self.size = len(self.questions)
+
+        # Index inverse : clé de réponse (UUID ou code) -> position
+        self.key_index: Dict[str, int] = {}
+        for pos, question in enumerate(self.questions):
+            for key in (question.get('question_id'), question.get('id')):
+                if key:
+                    self.key_index[str(key)] = pos
+
+        # Prédicats : position -> [(position parente, prédicat)] ; None = dépendance introuvable
+        self.predicates: List[Optional[List[Tuple[int, Callable[[Any], bool]]]]] = []
+        self.dependents: List[List[int]] = [[] for _ in range(self.size)]
+        for pos, question in enumerate(self.questions):
+            compiled: Optional[List[Tuple[int, Callable[[Any], bool]]]] = []
+            for condition in self._conditions(question):
+                parent = self.key_index.get(str(condition['depends_on']))
+                if parent is None:
+                    compiled = None
+                    break
+                predicate = _compile_operator(condition.get('operator') or 'equals', condition.get('value'))
+                compiled.append((parent, predicate))
+                self.dependents[parent].append(pos)
+            self.predicates.append(compiled)
+
+        self.topo_rank = self._topological_ranks()
+        self.roots_mask = 0
+        for pos, compiled in enumerate(self.predicates):
+            if compiled == []:
+                self.roots_mask |= 1 << pos
+
+        # Produits : produit -> masque de ses questions, position -> produits
+        self.product_masks: Dict[str, int] = {}
+        self.products_by_question: List[Tuple[str, ...]] = []
+        for pos, question in enumerate(self.questions):
+            products = tuple(question.get('produits_cibles') or ())
+            self.products_by_question.append(products)
+            for product in products:
+                self.product_masks[product] = self.product_masks.get(product, 0) | (1 << pos)
+
+    @staticmethod
+    def _conditions(question: Dict[str, Any]) -> List[Dict[str, Any]]:
+        conditions = question.get('conditions') or []
+        if isinstance(conditions, dict):
+            conditions = [conditions]
+        return [c for c in conditions if isinstance(c, dict) and c.get('depends_on')]
+
+    def _topological_ranks(self) -> List[int]:
+        indegree = [0] * self.size
+        for children in self.dependents:
+            for child in children:
+                indegree[child] += 1
+        ready = [pos for pos in range(self.size) if indegree[pos] == 0]
+        heapq.heapify(ready)
+        ranks = [0] * self.size
+        rank = 0
+        while ready:
+            pos = heapq.heappop(ready)
+            ranks[pos] = rank
+            rank += 1
+            for child in self.dependents[pos]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    heapq.heappush(ready, child)
+        if rank != self.size:
+            cyclic = [self.question_key(p) for p in range(self.size) if indegree[p] > 0]
+            raise ValueError(f'Conditions cycliques entre les questions : {", ".join(cyclic)}')
+        return ranks
+
+    def question_key(self, pos: int) -> str:
+        question = self.questions[pos]
+        return str(question.get('id') or question.get('question_id'))
+
+    def position(self, key: str) -> Optional[int]:
+        return self.key_index.get(str(key))
+
+    def new_session(self, answers: Optional[Dict[str, Any]] = None) -> 'QuestionnaireSession':
+        return QuestionnaireSession(self, answers)
+
+
+class QuestionnaireSession:
+    """État incrémental d'une simulation : réponses, visibilité, progression par produit."""
+
+    def __init__(self, graph: QuestionnaireGraph, answers: Optional[Dict[str, Any]] = None):
+        self.graph = graph
+        self.values: List[Any] = [None] * graph.size
+        self.extra_answers: Dict[str, Any] = {}
+        self.answered_mask = 0
+        self.visible_mask = 0
+        for pos in range(graph.size):
+            if self._evaluate(pos):
+                self.visible_mask |= 1 << pos
+        if answers:
+            self.apply_answers(answers)
+
+    def _evaluate(self, pos: int) -> bool:
+        compiled = self.graph.predicates[pos]
+        if compiled is None:
+            return False
+        for parent, predicate in compiled:
+            if not (self.visible_mask >> parent) & 1:
+                return False
+            answer = self.values[parent]
+            if _is_missing(answer) or not predicate(answer):
+                return False
+        return True
+
+    def apply_answers(self, answers: Dict[str, Any]) -> Dict[str, Any]:
+        """Applique des réponses et ne recalcule que les questions et produits touchés.
+
+        Returns:
+            Dict: questions devenues visibles / masquées et produits dont l'état a changé
+        """
+        graph = self.graph
+        touched = 0
+        queue: List[Tuple[int, int]] = []
+        queued: Set[int] = set()
+        for key, value in answers.items():
+            pos = graph.position(key)
+            if pos is None:
+                self.extra_answers[key] = value
+                continue
+            if self.values[pos] == value:
+                continue
+            self.values[pos] = value
+            bit = 1 << pos
+            if _is_missing(value):
+                self.answered_mask &= ~bit
+            else:
+                self.answered_mask |= bit
+            touched |= bit
+            for child in graph.dependents[pos]:
+                if child not in queued:
+                    queued.add(child)
+                    heapq.heappush(queue, (graph.topo_rank[child], child))
+
+        shown, hidden = [], []
+        while queue:
+            _, pos = heapq.heappop(queue)
+            bit = 1 << pos
+            visible = self._evaluate(pos)
+            if visible == bool(self.visible_mask & bit):
+                continue
+            self.visible_mask ^= bit
+            touched |= bit
+            (shown if visible else hidden).append(graph.question_key(pos))
+            for child in graph.dependents[pos]:
+                if child not in queued:
+                    queued.add(child)
+                    heapq.heappush(queue, (graph.topo_rank[child], child))
+
+        products = {}
+        for pos in self._positions(touched):
+            for product in graph.products_by_question[pos]:
+                if product not in products:
+                    products[product] = self.product_state(product)
+        return {'shown': shown, 'hidden': hidden, 'products': products}
+
+    @staticmethod
+    def _positions(mask: int):
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def is_visible(self, key: str) -> bool:
+        pos = self.graph.position(key)
+        return pos is not None and bool((self.visible_mask >> pos) & 1)
+
+    def next_question(self, after: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Prochaine question visible sans réponse (après `after` si fourni)."""
+        pending = self.visible_mask & ~self.answered_mask
+        if after is not None:
+            pos = self.graph.position(after)
+            if pos is not None:
+                pending &= ~((1 << (pos + 1)) - 1)
+        if not pending:
+            return None
+        return self.graph.questions[(pending & -pending).bit_length() - 1]
+
+    def visible_questions(self) -> List[Dict[str, Any]]:
+        return [self.graph.questions[pos] for pos in self._positions(self.visible_mask)]
+
+    def product_state(self, product: str) -> Dict[str, Any]:
+        mask = self.graph.product_masks.get(product, 0)
+        visible = (mask & self.visible_mask).bit_count()
+        answered = (mask & self.visible_mask & self.answered_mask).bit_count()
+        return {
+            'visible_questions': visible,
+            'answered_questions': answered,
+            'complete': visible > 0 and answered == visible
+        }
+
+    def progress(self) -> Dict[str, int]:
+        visible = self.visible_mask.bit_count()
+        answered = (self.visible_mask & self.answered_mask).bit_count()
+        return {'answered': answered, 'total': visible}
+
+    def answers(self) -> Dict[str, Any]:
+        """Réponses indexées par UUID de question (plus les clés inconnues du graphe)."""
+        result = dict(self.extra_answers)
+        for pos in self._positions(self.answered_mask):
+            result[self.graph.question_key(pos)] = self.values[pos]
+        return result
+
+
+def load_questions(connection_factory: Callable = get_db_connection) -> List[Dict[str, Any]]:
+    """Charge les questions avec les colonnes utilisées par getQuestionsWithCache()."""
+    from psycopg2.extras import RealDictCursor
+
+    conn = connection_factory()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT id::text AS id, question_id, question_text, question_type, question_order,
+                       section, options, validation_rules, importance, conditions,
+                       produits_cibles, phase
+                FROM "QuestionnaireQuestion"
+                ORDER BY question_order
+            """)
+            return [dict(row) for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+class QuestionnaireGraphCache:
+    """Graphe compilé partagé par le processus, recompilé à l'expiration (1 heure)."""
+
+    def __init__(self, loader: Callable[[], List[Dict[str, Any]]] = load_questions,
+                 ttl_seconds: float = 3600, clock: Callable[[], float] = time.monotonic):
+        self.loader = loader
+        self.ttl = ttl_seconds
+        self.clock = clock
+        self._graph: Optional[QuestionnaireGraph] = None
+        self._compiled_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> QuestionnaireGraph:
+        graph = self._graph
+        if graph is not None and self.clock() - self._compiled_at < self.ttl:
+            return graph
+        with self._lock:
+            if self._graph is None or self.clock() - self._compiled_at >= self.ttl:
+                self._graph = QuestionnaireGraph(self.loader())
+                self._compiled_at = self.clock()
+            return self._graph
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._graph = None
@@ -0,0 +1,405 @@
+"""
+Cache des rapports à deux niveaux avec recalcul unique (single-flight).
+
+Version Python de `ReportCacheService` (report-cache-service.ts) :
+
+- L1 : LRU en mémoire du processus, devant
+- L2 : Redis partagé, ou un substitut local si Redis n'est pas disponible ;
+- une seule exécution du calcul par clé, les requêtes concurrentes attendent
+  son résultat au lieu de recalculer le même rapport ;
+- stale-while-revalidate : une entrée expirée mais encore dans sa fenêtre de
+  grâce est servie immédiatement pendant qu'un recalcul est lancé en arrière-plan ;
+- invalidation par tags (les tables dont dépend le rapport) via des numéros de
+  version, sans parcourir les clés ; chaque entrée est validée avec les tags
+  enregistrés lors de son écriture ;
+- charge utile stockée compressée (JSON + zlib) dans le L2.
+
+Les statistiques par type de rapport (taux de hit, temps de recalcul, requêtes
+coalescées) sont exposées par `get_stats`.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+CACHE_PREFIX = 'report:'
+TAG_PREFIX = 'report-tag:'
+DEFAULT_TTL = 300  # REPORT_LIMITS.CACHE_TTL_SECONDS
+DEFAULT_STALE_TTL = 600
+
+# Tables lues par chaque rapport : une écriture sur l'une d'elles invalide le rapport
+REPORT_DEPENDENCIES: Dict[str, List[str]] = {
+    'morning': ['notification', 'RDV', 'ClientProduitEligible', 'EmailTracking'],
+    'daily_v2': ['notification', 'RDV', 'RDV_Report', 'ClientProduitEligible',
+                 'EmailTracking', 'Expert', 'simulations']
+}
+
+
+class LocalL2:
+    """Substitut local du L2 (dictionnaire avec expiration), utilisé sans Redis."""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._data: Dict[str, Tuple[Optional[float], Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                return None
+            return value
+
+    def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self.get(key) for key in keys]
+
+    def setex(self, key: str, ttl: int, value: bytes) -> None:
+        with self._lock:
+            self._data[key] = (self._clock() + ttl, value)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            _, value = self._data.get(key, (None, b'0'))
+            new_value = int(value) + 1
+            self._data[key] = (None, str(new_value).encode())
+            return new_value
+
+
+def create_l2():
+    """Retourne un client Redis si disponible, sinon le substitut local."""
+    try:
+        import redis
+
+        client = redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'),
+                                      socket_connect_timeout=0.5, socket_timeout=0.5)
+        client.ping()
+        return client
+    except Exception:
+        # Redis non disponible, continuer avec le cache local
+        return LocalL2()
+
+
+class _Entry:
+    __slots__ = ('data', 'fresh_until', 'stale_until', 'tag_versions')
+
+    def __init__(self, data: Any, fresh_until: float, stale_until: float,
+                 tag_versions: Dict[str, int]):
+        self.data = data
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.tag_versions = tag_versions
+
+
+class _Flight:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class ReportCache:
+    """Cache L1/L2 des rapports avec coalescence des recalculs."""
+
+    def __init__(self, l2=None, l1_max_entries: int = 256, default_ttl: int = DEFAULT_TTL,
+                 stale_ttl: int = DEFAULT_STALE_TTL, tag_check_interval: float = 1.0,
+                 refresh_workers: int = 2, clock: Callable[[], float] = time.time):
+        self.l2 = l2 if l2 is not None else create_l2()
+        self.l1_max_entries = l1_max_entries
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.tag_check_interval = tag_check_interval
+        self._clock = clock
+        self._l1: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._l1_lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._refreshing: set = set()
+        self._flights_lock = threading.Lock()
+        self._tag_versions: Dict[str, Tuple[float, int]] = {}
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers,
+                                             thread_name_prefix='report-cache-refresh')
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # API publique
+    # ------------------------------------------------------------------
+
+    def get_or_compute(self, report_type: str, params: Dict[str, Any],
+                       compute: Callable[[], Any], ttl: Optional[int] = None,
+                       tags: Optional[Iterable[str]] = None) -> Any:
+        """Retourne le rapport depuis le cache, ou le calcule une seule fois.
+
+        Args:
+            report_type (str): Le type de rapport (`morning`, `daily_v2`, ...)
+            params (Dict[str, Any]): Les paramètres du rapport (date, adminId, ...)
+            compute (Callable[[], Any]): La fonction de calcul du rapport (résultat sérialisable en JSON)
+            ttl (Optional[int]): La durée de fraîcheur en secondes
+            tags (Optional[Iterable[str]]): Les tables dont dépend le rapport,
+                par défaut celles de `REPORT_DEPENDENCIES`
+
+        Returns:
+            Any: Le rapport
+        """
+        key = self.get_cache_key(report_type, params)
+        tags = self._tags_for(report_type, tags)
+        ttl = ttl or self.default_ttl
+        now = self._clock()
+
+        entry, level = self._lookup(key, now)
+        if entry is not None:
+            if now < entry.fresh_until:
+                self._record(report_type, 'hits_l1' if level == 1 else 'hits_l2')
+                return entry.data
+            # Entrée périmée mais servable : recalcul en arrière-plan
+            self._record(report_type, 'stale_served')
+            self._refresh_in_background(key, report_type, compute, ttl, tags)
+            return entry.data
+
+        self._record(report_type, 'misses')
+        return self._single_flight(key, report_type, compute, ttl, tags)
+
+    def get(self, report_type: str, params: Dict[str, Any]) -> Optional[Any]:
+        """Lecture simple (équivalent de `ReportCacheService.get`), fraîche uniquement.
+
+        Les tags sont ceux fournis à `set` / `get_or_compute` lors de l'écriture.
+        """
+        key = self.get_cache_key(report_type, params)
+        entry, level = self._lookup(key, self._clock())
+        if entry is None or self._clock() >= entry.fresh_until:
+            self._record(report_type, 'misses')
+            return None
+        self._record(report_type, 'hits_l1' if level == 1 else 'hits_l2')
+        return entry.data
+
+    def set(self, report_type: str, params: Dict[str, Any], data: Any,
+            ttl: Optional[int] = None, tags: Optional[Iterable[str]] = None) -> None:
+        key = self.get_cache_key(report_type, params)
+        self._store(key, data, ttl or self.default_ttl, self._tags_for(report_type, tags))
+
+    def invalidate(self, report_type: str, params: Optional[Dict[str, Any]] = None) -> None:
+        """Invalide une entrée précise, ou toutes les entrées d'un type de rapport."""
+        if params is not None:
+            key = self.get_cache_key(report_type, params)
+            with self._l1_lock:
+                self._l1.pop(key, None)
+            self._l2_call('delete', key)
+        else:
+            self.invalidate_tags([f'type:{report_type}'])
+
+    def invalidate_tags(self, tags: Iterable[str]) -> None:
+        """Invalide tous les rapports dépendant de ces tags (ex. tables modifiées).
+
+        L'incrément de version rend les entrées existantes invalides sans les
+        parcourir ; elles sont ensuite évincées par le LRU ou leur expiration.
+        """
+        now = self._clock()
+        for tag in tags:
+            version = self._l2_call('incr', TAG_PREFIX + tag)
+            if version is None:
+                version = self._tag_versions.get(tag, (0, 0))[1] + 1
+            self._tag_versions[tag] = (now, int(version))
+
+    def on_table_changed(self, table: str) -> None:
+        """Point d'entrée pour les événements d'écriture sur une table."""
+        self.invalidate_tags([f'table:{table}'])
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            per_report = {}
+            for report_type, counters in self._stats.items():
+                hits = counters.get('hits_l1', 0) + counters.get('hits_l2', 0) + counters.get('stale_served', 0)
+                lookups = hits + counters.get('misses', 0)
+                recomputes = counters.get('recomputes', 0)
+                per_report[report_type] = {
+                    **counters,
+                    'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+                    'avg_recompute_ms': round(counters.get('recompute_ms', 0) / recomputes, 2) if recomputes else 0.0
+                }
+        return {
+            'l1_entries': len(self._l1),
+            'l2_backend': type(self.l2).__name__,
+            'reports': per_report
+        }
+
+    @staticmethod
+    def get_cache_key(report_type: str, params: Dict[str, Any]) -> str:
+        params_str = json.dumps(params, sort_keys=True, default=str)
+        digest = hashlib.sha1(params_str.encode()).hexdigest()[:32]
+        return f'{CACHE_PREFIX}{report_type}:{digest}'
+
+    # ------------------------------------------------------------------
+    # Interne
+    # ------------------------------------------------------------------
+
+    def _single_flight(self, key: str, report_type: str, compute: Callable[[], Any],
+                       ttl: int, tags: List[str]) -> Any:
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.waiters += 1
+
+        if not leader:
+            self._record(report_type, 'stampede_coalesced')
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            # Un vol précédent a pu se terminer entre la lecture du cache et la prise du rôle de leader
+            entry, _ = self._lookup(key, self._clock())
+            if entry is not None and self._clock() < entry.fresh_until:
+                flight.result = entry.data
+            else:
+                flight.result = self._compute_and_store(key, report_type, compute, ttl, tags)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def _refresh_in_background(self, key: str, report_type: str, compute: Callable[[], Any],
+                               ttl: int, tags: List[str]) -> None:
+        # Vérification et réservation sous le même verrou : un seul recalcul soumis par clé
+        with self._flights_lock:
+            if key in self._flights or key in self._refreshing:
+                self._record(report_type, 'stampede_coalesced')
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._single_flight(key, report_type, compute, ttl, tags)
+            except Exception as e:
+                print(f'Erreur recalcul rapport {report_type} en arrière-plan: {str(e)}')
+            finally:
+                with self._flights_lock:
+                    self._refreshing.discard(key)
+
+        try:
+            self._refresher.submit(refresh)
+        except RuntimeError:
+            # Pool arrêté : l'entrée périmée reste servie jusqu'à la fin de sa grâce
+            with self._flights_lock:
+                self._refreshing.discard(key)
+
+    def _compute_and_store(self, key: str, report_type: str, compute: Callable[[], Any],
+                           ttl: int, tags: List[str]) -> Any:
+        # Versions des tags lues avant le calcul : une invalidation pendant le calcul l'invalide
+        versions = self._current_tag_versions(tags, force=True)
+        started = time.perf_counter()
+        data = compute()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._record(report_type, 'recomputes')
+        self._record(report_type, 'recompute_ms', elapsed_ms)
+        with self._stats_lock:
+            counters = self._stats[report_type]
+            counters['max_recompute_ms'] = max(counters.get('max_recompute_ms', 0), elapsed_ms)
+        self._store(key, data, ttl, tags, versions)
+        return data
+
+    def _store(self, key: str, data: Any, ttl: int, tags: List[str],
+               versions: Optional[Dict[str, int]] = None) -> None:
+        now = self._clock()
+        versions = versions if versions is not None else self._current_tag_versions(tags, force=True)
+        entry = _Entry(data, now + ttl, now + ttl + self.stale_ttl, versions)
+        self._put_l1(key, entry)
+        envelope = {
+            'data': data,
+            'fresh_until': entry.fresh_until,
+            'stale_until': entry.stale_until,
+            'tags': versions
+        }
+        payload = zlib.compress(json.dumps(envelope, default=str).encode(), 6)
+        self._l2_call('setex', key, int(ttl + self.stale_ttl), payload)
+
+    def _lookup(self, key: str, now: float) -> Tuple[Optional[_Entry], int]:
+        with self._l1_lock:
+            entry = self._l1.get(key)
+        if entry is not None:
+            if now < entry.stale_until and self._tags_valid(entry):
+                with self._l1_lock:
+                    if key in self._l1:
+                        self._l1.move_to_end(key)
+                return entry, 1
+            with self._l1_lock:
+                if self._l1.get(key) is entry:
+                    del self._l1[key]
+
+        payload = self._l2_call('get', key)
+        if not payload:
+            return None, 0
+        try:
+            envelope = json.loads(zlib.decompress(payload))
+        except (zlib.error, ValueError):
+            return None, 0
+        entry = _Entry(envelope['data'], envelope['fresh_until'], envelope['stale_until'],
+                       envelope.get('tags', {}))
+        if now >= entry.stale_until or not self._tags_valid(entry):
+            return None, 0
+        self._put_l1(key, entry)
+        return entry, 2
+
+    def _tags_valid(self, entry: _Entry) -> bool:
+        return entry.tag_versions == self._current_tag_versions(list(entry.tag_versions))
+
+    def _put_l1(self, key: str, entry: _Entry) -> None:
+        with self._l1_lock:
+            self._l1[key] = entry
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _current_tag_versions(self, tags: List[str], force: bool = False) -> Dict[str, int]:
+        """Versions des tags, relues dans le L2 au plus toutes les `tag_check_interval` secondes."""
+        now = self._clock()
+        stale = [t for t in tags
+                 if force or now - self._tag_versions.get(t, (float('-inf'), 0))[0] >= self.tag_check_interval]
+        if stale:
+            values = self._l2_call('mget', [TAG_PREFIX + t for t in stale])
+            for tag, value in zip(stale, values or [None] * len(stale)):
+                known = self._tag_versions.get(tag, (0, 0))[1]
+                version = int(value) if value is not None else known
+                self._tag_versions[tag] = (now, max(version, known))
+        return {t: self._tag_versions[t][1] for t in tags}
+
+    @staticmethod
+    def _tags_for(report_type: str, tags: Optional[Iterable[str]]) -> List[str]:
+        tables = REPORT_DEPENDENCIES.get(report_type, []) if tags is None else list(tags)
+        return sorted({f'type:{report_type}', *(f'table:{t}' for t in tables)})
+
+    def _l2_call(self, method: str, *args):
+        try:
+            return getattr(self.l2, method)(*args)
+        except Exception:
+            # L2 non disponible, le L1 continue de servir
+            return None
+
+    def _record(self, report_type: str, counter: str, amount: float = 1) -> None:
+        with self._stats_lock:
+            counters = self._stats.setdefault(report_type, {})
+            counters[counter] = counters.get(counter, 0) + amount
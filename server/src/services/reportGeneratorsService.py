@@ -0,0 +1,73 @@
+"""
+Générateurs des rapports existants pour le worker de rapports.
+
+Les rapports `morning` et `daily_v2` sont calculés par les services Node
+(morning-report-service.ts, daily-activity-report-service-v2.ts). Plutôt que
+de dupliquer leurs requêtes, chaque job lance `scripts/generate-report.ts`,
+qui écrit une ligne JSON par section terminée puis le rapport complet :
+
+- les sections sont publiées en résultat partiel dès qu'elles arrivent (le
+  rapport d'activité quotidien, le plus lent, est consultable section par section) ;
+- le script tourne dans le groupe de processus du job : un délai dépassé ou
+  une annulation l'arrête avec lui.
+
+La commande est configurable par REPORT_BRIDGE_COMMAND (par défaut ts-node,
+lancé depuis le répertoire server).
+"""
+
+import json
+import os
+import shlex
+import subprocess
+from typing import Any, Dict, Optional, Sequence
+
+from reportWorkerService import ProgressReporter, register_report
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_BRIDGE_COMMAND = 'npx ts-node scripts/generate-report.ts'
+
+# Sections publiées par generateDailyReport (onSection), dans l'ordre de l'affichage
+DAILY_V2_SECTIONS = ('pendingActions', 'rdvWithoutReports', 'rdvTomorrow')
+
+
+def run_bridge(report_type: str, params: Dict[str, Any], progress: ProgressReporter,
+               sections: Sequence[str] = (), command: Optional[str] = None) -> Any:
+    """Génère un rapport via le script Node et relaie ses sections au worker.
+
+    Returns:
+        Any: Le rapport complet
+    """
+    args = shlex.split(command or os.getenv('REPORT_BRIDGE_COMMAND', DEFAULT_BRIDGE_COMMAND))
+    process = subprocess.Popen(args + [report_type, json.dumps(params)], cwd=SERVER_DIR,
+                               stdout=subprocess.PIPE, text=True)
+    result, received = None, 0
+    try:
+        for line in process.stdout:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get('event') == 'section':
+                received += 1
+                percent = 90 * received / len(sections) if sections else 50
+                progress.update(percent, partial={event['name']: event.get('data')}, message=event['name'])
+            elif event.get('event') == 'result':
+                result = event.get('data')
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode != 0 or result is None:
+        raise RuntimeError(f'Génération du rapport {report_type} échouée (code {returncode})')
+    return result
+
+
+@register_report('morning')
+def generate_morning(params: Dict[str, Any], progress: ProgressReporter) -> Any:
+    progress.update(0, message='Génération du rapport matinal')
+    return run_bridge('morning', params, progress)
+
+
+@register_report('daily_v2')
+def generate_daily_v2(params: Dict[str, Any], progress: ProgressReporter) -> Any:
+    progress.update(0, message='Génération du rapport d\'activité')
+    return run_bridge('daily_v2', params, progress, sections=DAILY_V2_SECTIONS)
@@ -0,0 +1,426 @@
+"""
+Worker de rapports asynchrones sur pool de processus.
+
+Remplace la boucle séquentielle de `AsyncReportService.processQueue`
+(async-report-service.ts) où un seul rapport lent bloquait toute la queue :
+
+- jusqu'à `max_workers` rapports s'exécutent en parallèle, chacun dans son processus ;
+- les jobs sont pris par priorité (demandes interactives des admins avant les
+  traitements nocturnes) puis par ancienneté, avec `FOR UPDATE SKIP LOCKED`
+  pour pouvoir lancer plusieurs workers ;
+- chaque job a un délai maximal et peut être annulé (`cancel_job`) : le
+  processus est alors arrêté ; chaque job parle au worker par son propre
+  `Pipe`, qu'un processus arrêté en cours d'écriture ne peut corrompre que
+  pour lui-même ;
+- les générateurs publient leur progression et des résultats partiels, écrits
+  dans `report_jobs` et consultables par l'interface via `get_job_status`.
+
+Un générateur est une fonction de niveau module enregistrée avec
+`register_report` et appelée avec `(params, progress)` :
+
+    @register_report('daily_v2')
+    def generate_daily(params, progress):
+        progress.update(50, partial={'rdv': rdv_section})
+        ...
+        return result
+
+Le worker ne prend que les types enregistrés ; les modules de générateurs
+sont importés au démarrage depuis REPORT_GENERATOR_MODULES (noms de modules
+séparés par des virgules, par défaut `reportGeneratorsService` qui fournit
+`morning` et `daily_v2`), et le worker refuse de démarrer sans générateur.
+Avec le worker déployé, définir REPORT_WORKER=python côté Node pour que
+`processQueue` laisse la queue à ce worker.
+"""
+
+import importlib
+import json
+import multiprocessing
+import os
+import signal
+import time
+import traceback
+from multiprocessing.connection import wait as wait_connections
+from typing import Any, Callable, Dict, List, Optional
+
+PRIORITY_INTERACTIVE = 10
+PRIORITY_BATCH = 0
+DEFAULT_TIMEOUT_SECONDS = 600
+DEFAULT_GENERATOR_MODULES = 'reportGeneratorsService'
+
+REPORT_GENERATORS: Dict[str, Callable[[Dict[str, Any], 'ProgressReporter'], Any]] = {}
+
+
+def register_report(report_type: str):
+    """Décorateur d'enregistrement d'un générateur de rapport."""
+    def decorator(func):
+        REPORT_GENERATORS[report_type] = func
+        return func
+    return decorator
+
+
+def load_generator_modules(modules: Optional[str] = None) -> List[str]:
+    """Importe les modules de générateurs (REPORT_GENERATOR_MODULES) ; retourne les types enregistrés."""
+    if modules is None:
+        modules = os.getenv('REPORT_GENERATOR_MODULES', DEFAULT_GENERATOR_MODULES)
+    for name in modules.split(','):
+        if name.strip():
+            importlib.import_module(name.strip())
+    return sorted(REPORT_GENERATORS)
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+class ProgressReporter:
+    """Transmet la progression d'un job du processus enfant vers le worker."""
+
+    def __init__(self, job_id: str, channel):
+        self.job_id = job_id
+        self._channel = channel
+
+    def update(self, percent: float, partial: Optional[Dict[str, Any]] = None,
+               message: Optional[str] = None) -> None:
+        """Publie l'avancement (0-100) et, éventuellement, un résultat partiel.
+
+        Les résultats partiels successifs sont fusionnés (clé par clé) côté worker.
+        """
+        self._channel.send(('progress', self.job_id, {
+            'progress': max(0.0, min(100.0, float(percent))),
+            'partial': partial,
+            'message': message
+        }))
+
+
+def _run_job(job_id: str, report_type: str, params: Dict[str, Any], channel) -> None:
+    """Point d'entrée du processus enfant."""
+    # Groupe de processus propre au job : l'arrêt du job arrête aussi ses sous-processus
+    os.setpgid(0, 0)
+    try:
+        generator = REPORT_GENERATORS.get(report_type)
+        if generator is None:
+            raise ValueError(f'Type de rapport inconnu: {report_type}')
+        result = generator(params, ProgressReporter(job_id, channel))
+        channel.send(('completed', job_id, result))
+    except Exception as e:
+        channel.send(('failed', job_id, {'error': str(e), 'trace': traceback.format_exc(limit=5)}))
+    finally:
+        channel.close()
+
+
+class ReportJobStore:
+    """Accès à la table `report_jobs`."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self._connect = connection_factory
+
+    def _execute(self, query: str, params: tuple = (), fetch: str = None):
+        from psycopg2.extras import RealDictCursor
+
+        conn = self._connect()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(query, params)
+                rows = cur.fetchall() if fetch == 'all' else cur.fetchone() if fetch == 'one' else None
+            conn.commit()
+            return rows
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def enqueue(self, report_type: str, params: Dict[str, Any], priority: int,
+                timeout_seconds: int) -> str:
+        row = self._execute("""
+            INSERT INTO report_jobs (type, status, params, priority, timeout_seconds)
+            VALUES (%s, 'pending', %s, %s, %s)
+            RETURNING id
+        """, (report_type, json.dumps(params), priority, timeout_seconds), fetch='one')
+        return str(row['id'])
+
+    def claim(self, limit: int, report_types: List[str]) -> List[Dict[str, Any]]:
+        """Prend les jobs en attente des types que ce worker sait générer.
+
+        Même fonction que `AsyncReportService.processQueue` (Node) : priorité puis
+        ancienneté, jobs annulés exclus, `FOR UPDATE SKIP LOCKED`.
+        """
+        return self._execute("""
+            SELECT id, type, params, priority, timeout_seconds
+            FROM claim_report_jobs(%s::text[], %s)
+        """, (report_types, limit), fetch='all')
+
+    def update_progress(self, job_id: str, progress: float,
+                        partial: Optional[Dict[str, Any]], message: Optional[str]) -> None:
+        self._execute("""
+            UPDATE report_jobs
+            SET progress = %s,
+                progress_message = COALESCE(%s, progress_message),
+                partial_result = COALESCE(partial_result, '{}'::jsonb) || COALESCE(%s::jsonb, '{}'::jsonb)
+            WHERE id = %s
+        """, (progress, message, json.dumps(partial, default=str) if partial else None, job_id))
+
+    def finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        self._execute("""
+            UPDATE report_jobs
+            SET status = %s,
+                result = %s,
+                error = %s,
+                progress = CASE WHEN %s = 'completed' THEN 100 ELSE progress END,
+                completed_at = NOW()
+            WHERE id = %s
+        """, (status, json.dumps(result, default=str) if result is not None else None,
+              error, status, job_id))
+
+    def cancel(self, job_id: str) -> bool:
+        row = self._execute("""
+            UPDATE report_jobs
+            SET cancel_requested = true,
+                status = CASE WHEN status = 'pending' THEN 'cancelled' ELSE status END,
+                completed_at = CASE WHEN status = 'pending' THEN NOW() ELSE completed_at END
+            WHERE id = %s AND status IN ('pending', 'processing')
+            RETURNING id
+        """, (job_id,), fetch='one')
+        return row is not None
+
+    def cancel_requested(self, job_ids: List[str]) -> List[str]:
+        if not job_ids:
+            return []
+        rows = self._execute("""
+            SELECT id FROM report_jobs
+            WHERE id = ANY(%s::uuid[]) AND cancel_requested = true
+        """, (job_ids,), fetch='all')
+        return [str(row['id']) for row in rows]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._execute("""
+            SELECT id, type, status, priority, progress, progress_message, partial_result,
+                   result, error, created_at, started_at, completed_at
+            FROM report_jobs WHERE id = %s
+        """, (job_id,), fetch='one')
+
+    def requeue_orphans(self) -> None:
+        """Remet en attente les jobs laissés `processing` par un worker arrêté."""
+        self._execute("""
+            UPDATE report_jobs
+            SET status = 'pending', started_at = NULL
+            WHERE status = 'processing' AND cancel_requested = false
+              AND started_at < NOW() - make_interval(secs => COALESCE(timeout_seconds, %s) * 2)
+        """, (DEFAULT_TIMEOUT_SECONDS,))
+
+
+class _RunningJob:
+    __slots__ = ('job_id', 'report_type', 'process', 'connection', 'deadline', 'last_flush', 'pending_progress')
+
+    def __init__(self, job_id: str, report_type: str, process, connection, deadline: float):
+        self.job_id = job_id
+        self.report_type = report_type
+        self.process = process
+        self.connection = connection
+        self.deadline = deadline
+        self.last_flush = 0.0
+        self.pending_progress: Optional[Dict[str, Any]] = None
+
+
+class ReportWorker:
+    """Ordonnance les jobs de rapports sur des processus enfants."""
+
+    def __init__(self, store: Optional[ReportJobStore] = None, max_workers: int = 4,
+                 poll_interval: float = 1.0, progress_flush_interval: float = 0.5,
+                 cancel_check_interval: float = 2.0):
+        self.store = store or ReportJobStore()
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.progress_flush_interval = progress_flush_interval
+        self.cancel_check_interval = cancel_check_interval
+        self._context = multiprocessing.get_context('fork')
+        self._running: Dict[str, _RunningJob] = {}
+        self._last_cancel_check = 0.0
+        self._stopping = False
+
+    # API utilisée par les routes ---------------------------------------
+
+    def enqueue_report(self, report_type: str, params: Optional[Dict[str, Any]] = None,
+                       interactive: bool = False,
+                       timeout_seconds: int = DEFAULT_TIMEOUT_SECONDS) -> str:
+        priority = PRIORITY_INTERACTIVE if interactive else PRIORITY_BATCH
+        job_id = self.store.enqueue(report_type, params or {}, priority, timeout_seconds)
+        print(f'Job rapport {report_type} créé avec l\'ID: {job_id} (priorité {priority})')
+        return job_id
+
+    def get_job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Statut, progression et résultat partiel d'un job (pour le polling de l'UI)."""
+        return self.store.get(job_id)
+
+    def get_job_result(self, job_id: str) -> Optional[Any]:
+        job = self.store.get(job_id)
+        if not job:
+            return None
+        if job['status'] == 'completed':
+            return job['result']
+        return job.get('partial_result')
+
+    def cancel_job(self, job_id: str) -> bool:
+        return self.store.cancel(job_id)
+
+    # Boucle du worker --------------------------------------------------
+
+    def run_forever(self) -> None:
+        if not REPORT_GENERATORS:
+            raise RuntimeError('Aucun générateur de rapport enregistré (REPORT_GENERATOR_MODULES)')
+        self.store.requeue_orphans()
+        try:
+            while not self._stopping:
+                self.tick()
+        finally:
+            self.shutdown()
+
+    def stop(self) -> None:
+        self._stopping = True
+
+    def tick(self) -> None:
+        """Une itération : démarrage des jobs, collecte des messages, délais, annulations."""
+        free_slots = self.max_workers - len(self._running)
+        if free_slots > 0 and not self._stopping:
+            for job in self.store.claim(free_slots, sorted(REPORT_GENERATORS)):
+                self._start(job)
+
+        self._drain_channel(timeout=self.poll_interval)
+        self._flush_progress()
+        self._enforce_deadlines()
+        self._check_cancellations()
+        self._reap_dead_processes()
+
+    def shutdown(self) -> None:
+        for running in list(self._running.values()):
+            self._terminate(running, 'failed', 'Worker arrêté avant la fin du rapport')
+
+    def _start(self, job: Dict[str, Any]) -> None:
+        job_id = str(job['id'])
+        params = job['params'] if isinstance(job['params'], dict) else json.loads(job['params'] or '{}')
+        timeout = job.get('timeout_seconds') or DEFAULT_TIMEOUT_SECONDS
+        if job['type'] not in REPORT_GENERATORS:
+            self.store.finish(job_id, 'failed', error=f'Type de rapport inconnu: {job["type"]}')
+            print(f'Job {job_id} échoué: type de rapport inconnu {job["type"]}')
+            return
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(target=_run_job, args=(job_id, job['type'], params, sender),
+                                        name=f'report-{job["type"]}-{job_id[:8]}', daemon=True)
+        process.start()
+        # Seul l'enfant garde l'extrémité d'écriture : sa fin se lit comme EOF
+        sender.close()
+        self._running[job_id] = _RunningJob(job_id, job['type'], process, receiver, time.monotonic() + timeout)
+        print(f'Traitement du job {job_id} (type: {job["type"]}, priorité {job.get("priority")})')
+
+    def _drain_channel(self, timeout: float) -> None:
+        if not self._running:
+            time.sleep(timeout)
+            return
+        connections = {running.connection: running for running in self._running.values()}
+        for connection in wait_connections(list(connections), timeout):
+            self._receive(connections[connection])
+
+    def _receive(self, running: _RunningJob) -> None:
+        """Lit les messages disponibles d'un job ; un canal fermé (EOF) est laissé à _reap_dead_processes."""
+        try:
+            while running.job_id in self._running and running.connection.poll():
+                kind, job_id, payload = running.connection.recv()
+                self._handle_message(running, kind, payload)
+        except (EOFError, OSError):
+            pass
+
+    def _handle_message(self, running: _RunningJob, kind: str, payload: Any) -> None:
+        job_id = running.job_id
+        if kind == 'progress':
+            previous = running.pending_progress
+            if previous and previous.get('partial') and payload.get('partial'):
+                payload['partial'] = {**previous['partial'], **payload['partial']}
+            elif previous and previous.get('partial'):
+                payload['partial'] = previous['partial']
+            running.pending_progress = payload
+        elif kind == 'completed':
+            self._flush_job_progress(running)
+            self.store.finish(job_id, 'completed', result=payload)
+            self._forget(running)
+            print(f'Job {job_id} terminé avec succès')
+        elif kind == 'failed':
+            self._flush_job_progress(running)
+            self.store.finish(job_id, 'failed', error=payload['error'])
+            self._forget(running)
+            print(f'Job {job_id} échoué: {payload["error"]}')
+
+    def _flush_progress(self) -> None:
+        now = time.monotonic()
+        for running in self._running.values():
+            if running.pending_progress and now - running.last_flush >= self.progress_flush_interval:
+                self._flush_job_progress(running)
+
+    def _flush_job_progress(self, running: _RunningJob) -> None:
+        progress = running.pending_progress
+        if not progress:
+            return
+        self.store.update_progress(running.job_id, progress['progress'],
+                                   progress.get('partial'), progress.get('message'))
+        running.pending_progress = None
+        running.last_flush = time.monotonic()
+
+    def _enforce_deadlines(self) -> None:
+        now = time.monotonic()
+        for running in list(self._running.values()):
+            if now >= running.deadline:
+                self._terminate(running, 'failed', 'Délai maximal de génération dépassé')
+
+    def _check_cancellations(self) -> None:
+        now = time.monotonic()
+        if not self._running or now - self._last_cancel_check < self.cancel_check_interval:
+            return
+        self._last_cancel_check = now
+        for job_id in self.store.cancel_requested(list(self._running)):
+            running = self._running.get(job_id)
+            if running:
+                self._terminate(running, 'cancelled', None)
+
+    def _reap_dead_processes(self) -> None:
+        for running in list(self._running.values()):
+            if not running.process.is_alive():
+                # Derniers messages écrits par l'enfant avant sa fin
+                self._receive(running)
+                if running.job_id in self._running:
+                    self._terminate(running, 'failed',
+                                    f'Processus arrêté (code {running.process.exitcode})')
+
+    def _terminate(self, running: _RunningJob, status: str, error: Optional[str]) -> None:
+        try:
+            # Le processus du job et ses sous-processus (script de génération)
+            os.killpg(running.process.pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            # Groupe pas encore créé par l'enfant, ou déjà vide
+            if running.process.is_alive():
+                running.process.terminate()
+        running.process.join(timeout=5)
+        self._flush_job_progress(running)
+        self.store.finish(running.job_id, status, error=error)
+        self._forget(running)
+        print(f'Job {running.job_id} {status}' + (f': {error}' if error else ''))
+
+    def _forget(self, running: _RunningJob) -> None:
+        self._running.pop(running.job_id, None)
+        running.process.join(timeout=1)
+        running.connection.close()
+
+
+if __name__ == '__main__':
+    # Les générateurs s'enregistrent dans le module `reportWorkerService`, pas dans `__main__`
+    import reportWorkerService
+
+    if not reportWorkerService.load_generator_modules():
+        raise SystemExit('Aucun générateur de rapport enregistré : définir REPORT_GENERATOR_MODULES')
+    reportWorkerService.ReportWorker(max_workers=int(os.getenv('REPORT_WORKERS', '4'))).run_forever()
@@ -0,0 +1,376 @@
+"""
+Histogrammes de latence par route et endpoint `/metrics` pour les apps Flask.
+
+`log_api_call` (logger.py) écrit `duration_ms` dans une ligne de log, et
+performanceMiddleware côté Node ne signale que les requêtes de plus de 1 s :
+aucun percentile n'est disponible sans relire les logs. Ce module fournit :
+
+- `LatencyHistogram` : histogramme log-linéaire à la HDR, mémoire fixe
+  (1 408 compteurs de 1 µs à ~134 s, erreur relative < 1,6 %) ;
+- `MetricsMiddleware` : middleware WSGI qui mesure chaque requête par
+  route (règle Flask, pas le chemin brut), méthode et statut ;
+- `timed('db')` / `timed('embed')` : temps passé en base ou dans le modèle,
+  cumulé par requête et agrégé séparément ;
+- `/metrics` au format texte Prometheus (summary p50 / p95 / p99).
+
+Les histogrammes vivent dans la mémoire du processus : sous gunicorn avec
+plusieurs workers, `/metrics` ne verrait que le worker qui répond. Avec
+`METRICS_MULTIPROC_DIR` (ou `multiprocess_dir`), chaque worker écrit un
+instantané de ses compteurs dans ce répertoire (au plus `flush_interval`
+secondes de retard) et `/metrics` additionne ceux de tous les workers. Les
+fichiers des workers arrêtés sont conservés pour que les compteurs restent
+monotones ; le répertoire est vidé au démarrage du master
+(cf. gunicorn.embedding.conf.py).
+
+Usage :
+    metrics = RequestMetrics()
+    init_app(app, metrics)
+    with timed('embed'):
+        vector = model.encode(texts)
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+QUANTILES = (0.5, 0.95, 0.99)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Temps cumulés de la requête en cours : composant -> secondes
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('request_timings', default=None)
+
+
+class LatencyHistogram:
+    """Histogramme HDR simplifié en microsecondes, 2 chiffres significatifs."""
+
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    HALF = SUB_BUCKETS >> 1
+    MAX_SHIFT = 20
+
+    __slots__ = ('counts', 'count', 'total_us', 'max_us', '_lock')
+
+    def __init__(self):
+        self.counts = [0] * (self.SUB_BUCKETS + self.MAX_SHIFT * self.HALF)
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def index(cls, value_us: int) -> int:
+        if value_us < cls.SUB_BUCKETS:
+            return value_us if value_us > 0 else 0
+        shift = min(value_us.bit_length() - cls.SUB_BUCKET_BITS, cls.MAX_SHIFT)
+        mantissa = min(value_us >> shift, cls.SUB_BUCKETS - 1)
+        return cls.SUB_BUCKETS + (shift - 1) * cls.HALF + mantissa - cls.HALF
+
+    @classmethod
+    def bucket_upper(cls, index: int) -> int:
+        """Plus grande valeur (µs) rangée dans le compteur `index`."""
+        if index < cls.SUB_BUCKETS:
+            return index
+        shift, offset = divmod(index - cls.SUB_BUCKETS, cls.HALF)
+        shift += 1
+        return ((offset + cls.HALF + 1) << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        value_us = int(seconds * 1_000_000)
+        index = self.index(value_us)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total_us += value_us
+            if value_us > self.max_us:
+                self.max_us = value_us
+
+    def snapshot(self) -> Dict:
+        """État sérialisable (compteurs non nuls seulement)."""
+        with self._lock:
+            return {'counts': [[i, c] for i, c in enumerate(self.counts) if c],
+                    'count': self.count, 'total_us': self.total_us, 'max_us': self.max_us}
+
+    def merge(self, snapshot: Dict) -> None:
+        """Ajoute un instantané d'un autre processus (les compteurs sont additifs)."""
+        with self._lock:
+            for index, bucket in snapshot['counts']:
+                self.counts[index] += bucket
+            self.count += snapshot['count']
+            self.total_us += snapshot['total_us']
+            self.max_us = max(self.max_us, snapshot['max_us'])
+
+    def percentiles(self, quantiles: Iterable[float] = QUANTILES) -> List[float]:
+        """Percentiles en secondes (borne haute du compteur, plafonnée au maximum observé)."""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+            max_us = self.max_us
+        if total == 0:
+            return [0.0 for _ in quantiles]
+        targets = sorted((max(1, int(q * total + 0.999999)), i) for i, q in enumerate(quantiles))
+        values = [0.0] * len(targets)
+        seen = 0
+        pos = 0
+        for index, bucket in enumerate(counts):
+            if not bucket:
+                continue
+            seen += bucket
+            while pos < len(targets) and seen >= targets[pos][0]:
+                values[targets[pos][1]] = min(self.bucket_upper(index), max_us) / 1_000_000
+                pos += 1
+            if pos == len(targets):
+                break
+        return values
+
+
+class RequestMetrics:
+    """Registre des histogrammes : requêtes et temps par composant."""
+
+    def __init__(self, quantiles: Tuple[float, ...] = QUANTILES,
+                 multiprocess_dir: Optional[str] = None, flush_interval: float = 1.0):
+        self.quantiles = quantiles
+        self.multiprocess_dir = multiprocess_dir or os.getenv('METRICS_MULTIPROC_DIR') or None
+        self.flush_interval = flush_interval
+        self.requests: Dict[Tuple[str, str, str], LatencyHistogram] = {}
+        self.components: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._snapshot_path: Optional[str] = None
+        self._dirty = False
+        if self.multiprocess_dir is not None:
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _histogram(self, registry: Dict, key: Tuple) -> LatencyHistogram:
+        histogram = registry.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = registry.setdefault(key, LatencyHistogram())
+        return histogram
+
+    def observe(self, route: str, method: str, status: str, seconds: float,
+                timings: Optional[Dict[str, float]] = None) -> None:
+        if self.multiprocess_dir is not None and self._pid != os.getpid():
+            self._attach_process()
+        self._histogram(self.requests, (route, method, status)).record(seconds)
+        if timings:
+            for component, spent in timings.items():
+                self._histogram(self.components, (component, route)).record(spent)
+        self._dirty = True
+
+    def _attach_process(self) -> None:
+        """Premier enregistrement dans ce processus : fichier d'instantané et écriture périodique."""
+        pid = os.getpid()
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._snapshot_path = os.path.join(self.multiprocess_dir, f'{pid}-{uuid.uuid4().hex[:8]}.json')
+        threading.Thread(target=self._flush_loop, args=(pid,), name='metrics-flush', daemon=True).start()
+        atexit.register(self.flush)
+
+    def _after_fork(self) -> None:
+        # Les mesures héritées sont déjà dans le fichier du parent ; verrous éventuellement pris au fork
+        self.requests = {}
+        self.components = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        self._snapshot_path = None
+        self._dirty = False
+
+    def _flush_loop(self, pid: int) -> None:
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                try:
+                    self.flush()
+                except OSError as e:
+                    print(f"⚠️ Écriture des métriques impossible: {e}")
+
+    def flush(self) -> None:
+        """Écrit l'instantané de ce processus dans `multiprocess_dir` (remplacement atomique)."""
+        if self._snapshot_path is None or self._pid != os.getpid():
+            return
+        with self._flush_lock:
+            self._dirty = False
+            snapshot = {
+                'requests': [[*key, histogram.snapshot()] for key, histogram in list(self.requests.items())],
+                'components': [[*key, histogram.snapshot()] for key, histogram in list(self.components.items())]
+            }
+            os.makedirs(self.multiprocess_dir, exist_ok=True)
+            temp_path = f'{self._snapshot_path}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, self._snapshot_path)
+
+    def _merged(self) -> Tuple[Dict[Tuple, LatencyHistogram], Dict[Tuple, LatencyHistogram]]:
+        """Additionne les instantanés de tous les processus du répertoire partagé."""
+        requests: Dict[Tuple, LatencyHistogram] = {}
+        components: Dict[Tuple, LatencyHistogram] = {}
+        try:
+            names = os.listdir(self.multiprocess_dir)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.multiprocess_dir, name), encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # worker en cours de remplacement de son fichier
+            for registry, entries in ((requests, snapshot['requests']), (components, snapshot['components'])):
+                for *key, data in entries:
+                    registry.setdefault(tuple(key), LatencyHistogram()).merge(data)
+        return requests, components
+
+    def render(self) -> str:
+        """Exposition au format texte Prometheus."""
+        requests, components = self.requests, self.components
+        if self.multiprocess_dir is not None:
+            self.flush()
+            requests, components = self._merged()
+        lines = ['# HELP http_request_duration_seconds Durée des requêtes HTTP par route',
+                 '# TYPE http_request_duration_seconds summary']
+        for (route, method, status), histogram in sorted(requests.items()):
+            labels = f'route="{_escape(route)}",method="{method}",status="{status}"'
+            lines.extend(_summary('http_request_duration_seconds', labels, histogram, self.quantiles))
+        lines.extend(['# HELP http_request_component_seconds Temps base / modèle cumulé par requête',
+                      '# TYPE http_request_component_seconds summary'])
+        for (component, route), histogram in sorted(components.items()):
+            labels = f'component="{component}",route="{_escape(route)}"'
+            lines.extend(_summary('http_request_component_seconds', labels, histogram, self.quantiles))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _summary(name: str, labels: str, histogram: LatencyHistogram, quantiles: Tuple[float, ...]) -> List[str]:
+    lines = [f'{name}{{{labels},quantile="{q}"}} {value:.6f}'
+             for q, value in zip(quantiles, histogram.percentiles(quantiles))]
+    lines.append(f'{name}_sum{{{labels}}} {histogram.total_us / 1_000_000:.6f}')
+    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+    return lines
+
+
+def add_time(component: str, seconds: float) -> None:
+    """Ajoute du temps au composant pour la requête en cours (sans effet hors requête)."""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[component] = timings.get(component, 0.0) + seconds
+
+
+class timed:
+    """Gestionnaire de contexte mesurant un bloc pour `add_time`."""
+
+    __slots__ = ('component', 'started')
+
+    def __init__(self, component: str):
+        self.component = component
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        add_time(self.component, time.perf_counter() - self.started)
+        return False
+
+
+class _RequestRecorder:
+    """État d'une requête : capte le statut et enregistre la mesure à la fermeture du corps."""
+
+    __slots__ = ('metrics', 'environ', 'start_response', 'started', 'timings', 'status', 'body')
+
+    def __init__(self, metrics: RequestMetrics, environ: Dict, start_response: Callable):
+        self.metrics = metrics
+        self.environ = environ
+        self.start_response = start_response
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.status = '500'
+        self.body: Iterable[bytes] = ()
+
+    def capture_status(self, status_line, headers, exc_info=None):
+        self.status = status_line[:3]
+        return self.start_response(status_line, headers, exc_info)
+
+    def record(self) -> None:
+        # Route non résolue : un seul libellé, pour borner la cardinalité
+        environ = self.environ
+        self.metrics.observe(environ.get(MetricsMiddleware.ROUTE_KEY) or 'unmatched',
+                             environ.get('REQUEST_METHOD', 'GET'), self.status,
+                             time.perf_counter() - self.started, self.timings)
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.record()
+
+
+class MetricsMiddleware:
+    """Middleware WSGI : une mesure par requête, `/metrics` servi sans passer par l'app."""
+
+    ROUTE_KEY = 'metrics.route'
+
+    def __init__(self, app: Callable, metrics: RequestMetrics, path: str = '/metrics'):
+        self.app = app
+        self.metrics = metrics
+        self.path = path
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') == self.path:
+            body = self.metrics.render().encode()
+            start_response('200 OK', [('Content-Type', PROMETHEUS_CONTENT_TYPE),
+                                      ('Content-Length', str(len(body)))])
+            return [body]
+
+        recorder = _RequestRecorder(self.metrics, environ, start_response)
+        _request_timings.set(recorder.timings)
+        try:
+            recorder.body = self.app(environ, recorder.capture_status)
+        except Exception:
+            recorder.record()
+            raise
+        return recorder
+
+
+def _route_labelling_request(base):
+    """Classe de requête qui recopie la règle de routage dans l'environ WSGI.
+
+    Flask affecte `request.url_rule` à la résolution de la route : la recopie
+    se fait là, sans hook `before_request` par requête.
+    """
+    class RouteLabellingRequest(base):
+        @property
+        def url_rule(self):
+            return self.__dict__.get('_metrics_url_rule')
+
+        @url_rule.setter
+        def url_rule(self, rule):
+            self.__dict__['_metrics_url_rule'] = rule
+            if rule is not None:
+                self.environ[MetricsMiddleware.ROUTE_KEY] = rule.rule
+
+    return RouteLabellingRequest
+
+
+def init_app(app, metrics: RequestMetrics, path: str = '/metrics') -> MetricsMiddleware:
+    """Installe le middleware sur une app Flask et libelle les mesures par règle de routage."""
+    app.request_class = _route_labelling_request(app.request_class)
+    middleware = MetricsMiddleware(app.wsgi_app, metrics, path)
+    app.wsgi_app = middleware
+    return middleware
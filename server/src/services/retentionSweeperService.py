@@ -0,0 +1,296 @@
+"""
+Job de rétention GED ensembliste (archivage et suppression automatiques).
+
+Remplace le parcours document par document de `RetentionService.autoArchiveDocuments`
+et `autoDeleteDocuments` (retention-service.ts) :
+
+- l'ensemble des documents éligibles est calculé par une seule requête jointe
+  aux règles de rétention et aux exceptions (litiges, contrôles fiscaux) ;
+- les déplacements / suppressions physiques passent par un pool de workers borné ;
+- les lignes `RetentionAudit` sont écrites en masse, par lot, dans la même
+  transaction courte que la mise à jour de `DocumentFile` et du point de reprise.
+
+Après un crash, le job reprend après le dernier lot validé grâce à la table
+`RetentionJobCheckpoint`. Les opérations de stockage sont idempotentes (un
+fichier déjà déplacé ou supprimé n'est pas une erreur), un lot rejoué est donc sans effet de bord.
+Un document archivé pointe ensuite (`bucket_name`, `file_path`) vers sa copie
+dans le bucket d'archivage.
+
+Les drapeaux des règles sont lus via `to_jsonb` : `RetentionService` écrit les
+règles telles quelles (`autoArchive`, `autoDelete`), une base migrée peut les
+avoir en snake_case. L'archivage suit le code TS (actif sauf drapeau à false) ;
+la suppression, irréversible, exige un drapeau explicitement à true.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ARCHIVE = 'archive'
+DELETE = 'delete'
+
+RULE_FLAGS = """
+    SELECT r.id,
+           COALESCE((to_jsonb(r) ->> 'autoArchive')::boolean,
+                    (to_jsonb(r) ->> 'auto_archive')::boolean, true) AS auto_archive,
+           COALESCE((to_jsonb(r) ->> 'autoDelete')::boolean,
+                    (to_jsonb(r) ->> 'auto_delete')::boolean, false) AS auto_delete
+    FROM "RetentionRules" r
+"""
+
+ELIGIBLE_QUERIES = {
+    ARCHIVE: f"""
+        WITH rules AS ({RULE_FLAGS})
+        SELECT d.id, d.bucket_name, d.file_path, r.id AS rule_id
+        FROM "DocumentFile" d
+        JOIN rules r ON r.id = d.retention_rule_id
+        WHERE d.archived = false
+          AND d.archive_date < NOW()
+          AND r.auto_archive
+          AND (%(after_id)s::uuid IS NULL OR d.id > %(after_id)s::uuid)
+        ORDER BY d.id
+        LIMIT %(limit)s
+    """,
+    DELETE: f"""
+        WITH rules AS ({RULE_FLAGS})
+        SELECT d.id, d.bucket_name, d.file_path, r.id AS rule_id
+        FROM "DocumentFile" d
+        JOIN rules r ON r.id = d.retention_rule_id
+        WHERE d.archived = true
+          AND d.delete_date < NOW()
+          AND r.auto_delete
+          AND NOT EXISTS (
+              SELECT 1 FROM "Litige" l
+              WHERE l.client_id = d.client_id AND l.status = 'en_cours'
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM "ControleFiscal" c
+              WHERE c.client_id = d.client_id AND c.status = 'en_cours'
+          )
+          AND (%(after_id)s::uuid IS NULL OR d.id > %(after_id)s::uuid)
+        ORDER BY d.id
+        LIMIT %(limit)s
+    """
+}
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+class SupabaseArchiveStorage:
+    """Opérations physiques sur le stockage Supabase."""
+
+    def __init__(self, client=None, archive_bucket: Optional[str] = None):
+        if client is None:
+            from supabase import create_client
+
+            client = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_SERVICE_ROLE_KEY'))
+        self.client = client
+        self.archive_bucket = archive_bucket or os.getenv('RETENTION_ARCHIVE_BUCKET', 'archives')
+
+    def archive(self, bucket: str, path: str) -> Tuple[str, str]:
+        """Copie le fichier dans le bucket d'archivage puis supprime l'original.
+
+        Returns:
+            Tuple[str, str]: Le nouvel emplacement (bucket, chemin) du fichier
+        """
+        location = (self.archive_bucket, f'{bucket}/{path}')
+        try:
+            content = self.client.storage.from_(bucket).download(path)
+        except Exception as e:
+            if _is_not_found(e):
+                return location  # déjà archivé lors d'un passage précédent
+            raise
+        self.client.storage.from_(self.archive_bucket).upload(location[1], content, {'upsert': 'true'})
+        self.client.storage.from_(bucket).remove([path])
+        return location
+
+    def delete(self, bucket: str, path: str) -> None:
+        candidates = [(bucket, path)]
+        if bucket != self.archive_bucket:
+            # Documents archivés avant que `DocumentFile` ne suive le nouvel emplacement
+            candidates.append((self.archive_bucket, f'{bucket}/{path}'))
+        for candidate_bucket, candidate_path in candidates:
+            try:
+                self.client.storage.from_(candidate_bucket).remove([candidate_path])
+            except Exception as e:
+                if not _is_not_found(e):
+                    raise
+
+
+def _is_not_found(error: Exception) -> bool:
+    message = str(error).lower()
+    return 'not found' in message or '404' in message
+
+
+class RetentionSweeper:
+    """Exécute l'archivage puis la suppression par lots, avec reprise sur incident."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection,
+                 storage: Optional[Any] = None, max_workers: int = 8,
+                 batch_size: int = 500, job_name: str = 'nightly_retention'):
+        self._connect = connection_factory
+        self.storage = storage or SupabaseArchiveStorage()
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.job_name = job_name
+
+    def run(self) -> Dict[str, Dict[str, int]]:
+        """Lance les deux phases ; retourne les compteurs par phase."""
+        return {
+            ARCHIVE: self.sweep(ARCHIVE),
+            DELETE: self.sweep(DELETE)
+        }
+
+    def sweep(self, phase: str) -> Dict[str, int]:
+        """Traite tous les documents éligibles pour une phase, lot par lot.
+
+        Args:
+            phase (str): `archive` ou `delete`
+
+        Returns:
+            Dict[str, int]: Les compteurs `processed`, `failed` et `batches`
+        """
+        if phase not in ELIGIBLE_QUERIES:
+            raise ValueError(f'Phase de rétention inconnue: {phase}')
+
+        stats = {'processed': 0, 'failed': 0, 'batches': 0}
+        conn = self._connect()
+        try:
+            after_id = self._load_checkpoint(conn, phase)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                while True:
+                    documents = self._fetch_eligible(conn, phase, after_id)
+                    if not documents:
+                        break
+                    succeeded, failed = self._apply_storage(pool, phase, documents)
+                    after_id = str(documents[-1]['id'])
+                    self._commit_batch(conn, phase, succeeded, failed, after_id)
+                    stats['processed'] += len(succeeded)
+                    stats['failed'] += len(failed)
+                    stats['batches'] += 1
+            self._clear_checkpoint(conn, phase)
+        finally:
+            conn.close()
+
+        print(f"Rétention {phase}: {stats['processed']} documents traités, "
+              f"{stats['failed']} en échec, {stats['batches']} lots")
+        return stats
+
+    def _fetch_eligible(self, conn, phase: str, after_id: Optional[str]) -> List[Dict]:
+        from psycopg2.extras import RealDictCursor
+
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(ELIGIBLE_QUERIES[phase], {'after_id': after_id, 'limit': self.batch_size})
+            rows = cur.fetchall()
+        conn.commit()  # ne pas garder de transaction ouverte pendant les I/O de stockage
+        return rows
+
+    def _apply_storage(self, pool: ThreadPoolExecutor, phase: str,
+                       documents: List[Dict]) -> Tuple[List[Dict], List[Tuple[Dict, str]]]:
+        operation = self.storage.archive if phase == ARCHIVE else self.storage.delete
+
+        def run(document):
+            try:
+                location = operation(document['bucket_name'], document['file_path'])
+                if phase == ARCHIVE:
+                    document['bucket_name'], document['file_path'] = location
+                return document, None
+            except Exception as e:
+                return document, str(e)
+
+        succeeded, failed = [], []
+        for document, error in pool.map(run, documents):
+            if error is None:
+                succeeded.append(document)
+            else:
+                failed.append((document, error))
+        return succeeded, failed
+
+    def _commit_batch(self, conn, phase: str, succeeded: List[Dict],
+                      failed: List[Tuple[Dict, str]], after_id: str) -> None:
+        """Met à jour les documents, l'audit et le point de reprise en une transaction."""
+        from psycopg2.extras import execute_values
+
+        ids = [str(d['id']) for d in succeeded]
+        performed_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        try:
+            with conn.cursor() as cur:
+                if ids and phase == ARCHIVE:
+                    execute_values(cur, """
+                        UPDATE "DocumentFile" AS d
+                        SET archived = true, archived_at = NOW(), updated_at = NOW(),
+                            bucket_name = v.bucket_name, file_path = v.file_path
+                        FROM (VALUES %s) AS v(id, bucket_name, file_path)
+                        WHERE d.id = v.id::uuid
+                    """, [(str(d['id']), d['bucket_name'], d['file_path']) for d in succeeded])
+                elif ids:
+                    cur.execute('DELETE FROM "DocumentFile" WHERE id = ANY(%s::uuid[])', (ids,))
+
+                audit_rows = [
+                    (str(d['id']), phase, 'automatic_retention', 'system',
+                     json.dumps({'rule_id': d['rule_id'], f'{phase}d_at': performed_at,
+                                 **({'bucket_name': d['bucket_name'], 'file_path': d['file_path']}
+                                    if phase == ARCHIVE else {})}))
+                    for d in succeeded
+                ] + [
+                    (str(d['id']), phase, 'automatic_retention_failed', 'system',
+                     json.dumps({'rule_id': d['rule_id'], 'error': error}))
+                    for d, error in failed
+                ]
+                if audit_rows:
+                    execute_values(cur, """
+                        INSERT INTO "RetentionAudit"
+                        (document_id, action, reason, performed_by, metadata)
+                        VALUES %s
+                    """, audit_rows, template='(%s, %s, %s, %s, %s::jsonb)')
+
+                cur.execute("""
+                    INSERT INTO "RetentionJobCheckpoint" (job_name, phase, last_document_id, updated_at)
+                    VALUES (%s, %s, %s, NOW())
+                    ON CONFLICT (job_name, phase)
+                    DO UPDATE SET last_document_id = EXCLUDED.last_document_id, updated_at = NOW()
+                """, (self.job_name, phase, after_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _load_checkpoint(self, conn, phase: str) -> Optional[str]:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT last_document_id FROM "RetentionJobCheckpoint"
+                WHERE job_name = %s AND phase = %s
+            """, (self.job_name, phase))
+            row = cur.fetchone()
+        conn.commit()
+        if row and row[0]:
+            print(f'Reprise de la rétention {phase} après le document {row[0]}')
+            return str(row[0])
+        return None
+
+    def _clear_checkpoint(self, conn, phase: str) -> None:
+        with conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM "RetentionJobCheckpoint"
+                WHERE job_name = %s AND phase = %s
+            """, (self.job_name, phase))
+        conn.commit()
+
+
+if __name__ == '__main__':
+    RetentionSweeper(
+        max_workers=int(os.getenv('RETENTION_MAX_WORKERS', '8')),
+        batch_size=int(os.getenv('RETENTION_BATCH_SIZE', '500'))
+    ).run()
@@ -0,0 +1,518 @@
+"""
+Chiffrement authentifié en flux des documents sensibles (GED).
+
+Contrairement à `EncryptionService` (encryption-service.ts) qui chiffre un
+`Buffer` complet en mémoire, ce module découpe le document en segments de
+taille fixe chiffrés chacun en AES-256-GCM avec un nonce propre et un tag
+d'authentification. La mémoire utilisée est donc proportionnelle à la taille
+d'un segment, et une lecture partielle (range) ne déchiffre que les segments
+concernés.
+
+Format du fichier chiffré :
+
+    en-tête  : MAGIC (6) | version (1) | taille de segment (4) | préfixe de nonce (7)
+    segments : chiffré (<= taille de segment) | tag (16)
+
+Le nonce d'un segment vaut `préfixe (7) | index (4, big endian) | dernier (1)`.
+L'en-tête est passé en données authentifiées de chaque segment ; le drapeau
+"dernier" empêche la troncature ou la réorganisation des segments.
+
+Les clés de données (une par document) sont stockées dans `EncryptionKeys`,
+enveloppées par la clé maître. `rotate_keys` ré-enveloppe ces clés avec une
+nouvelle clé maître sans rechiffrer le contenu des documents.
+
+Deux schémas d'enveloppement coexistent (colonne `key_wrapping`) :
+
+- `node-legacy` : clés écrites par `storeKey` (encryption-service.ts) avec
+  `crypto.createCipher`, qui dérive la clé AES et l'IV de la clé maître par
+  EVP_BytesToKey (MD5, sans sel) ; la colonne `iv` ne sert que d'AAD ;
+- `aes-gcm-aad` : clés écrites par ce module, nonce aléatoire de 12 octets
+  stocké dans `iv` et AAD `<id>:<key_version>`.
+
+La rotation convertit les clés historiques au second schéma.
+"""
+
+import base64
+import hashlib
+import os
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+MAGIC = b'PFENC1'
+FORMAT_VERSION = 1
+HEADER_STRUCT = struct.Struct('>6sBI7s')
+HEADER_LENGTH = HEADER_STRUCT.size
+NONCE_PREFIX_LENGTH = 7
+TAG_LENGTH = 16
+KEY_LENGTH = 32  # 256 bits
+DEFAULT_SEGMENT_SIZE = 64 * 1024
+MAX_SEGMENT_SIZE = 16 * 1024 * 1024
+WRAPPING_NODE_LEGACY = 'node-legacy'
+WRAPPING_AES_GCM_AAD = 'aes-gcm-aad'
+LEGACY_IV_LENGTH = 12  # IV de aes-256-gcm dérivé par EVP_BytesToKey
+
+
+class EncryptionError(Exception):
+    """Erreur de chiffrement / déchiffrement ou d'intégrité d'un document."""
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def load_master_keys_from_env() -> Tuple[str, Dict[str, bytes]]:
+    """Charge les clés maîtres depuis l'environnement.
+
+    `ENCRYPTION_MASTER_KEY` (base64) est la clé courante, de version
+    `ENCRYPTION_MASTER_KEY_VERSION` (défaut `v1`). Les anciennes versions encore
+    nécessaires pendant une rotation sont lues dans `ENCRYPTION_MASTER_KEY_<VERSION>`.
+
+    Returns:
+        Tuple[str, Dict[str, bytes]]: La version courante et le trousseau version -> clé
+    """
+    current_version = os.getenv('ENCRYPTION_MASTER_KEY_VERSION', 'v1')
+    current_key = os.getenv('ENCRYPTION_MASTER_KEY')
+    if not current_key:
+        raise EncryptionError('Clé maître de chiffrement non configurée')
+
+    keyring = {current_version: base64.b64decode(current_key)}
+    prefix = 'ENCRYPTION_MASTER_KEY_'
+    for name, value in os.environ.items():
+        if name.startswith(prefix) and name != 'ENCRYPTION_MASTER_KEY_VERSION':
+            keyring.setdefault(name[len(prefix):].lower(), base64.b64decode(value))
+    return current_version, keyring
+
+
+def derive_legacy_key(master_key: bytes) -> Tuple[bytes, bytes]:
+    """Clé et IV dérivés comme `crypto.createCipher('aes-256-gcm', masterKey)`.
+
+    EVP_BytesToKey avec MD5, sans sel et une seule itération : blocs
+    MD5(bloc précédent | clé maître) concaténés jusqu'à 32 + 12 octets.
+    """
+    derived, block = b'', b''
+    while len(derived) < KEY_LENGTH + LEGACY_IV_LENGTH:
+        block = hashlib.md5(block + master_key).digest()
+        derived += block
+    return derived[:KEY_LENGTH], derived[KEY_LENGTH:KEY_LENGTH + LEGACY_IV_LENGTH]
+
+
+class KeyCache:
+    """Cache LRU borné et à durée de vie limitée des clés de données déchiffrées."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: 'OrderedDict[str, Tuple[float, bytes, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key_id: str) -> Optional[Tuple[bytes, str]]:
+        """Retourne (clé, user_id propriétaire) ou None si absente ou expirée."""
+        with self._lock:
+            entry = self._entries.get(key_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, key, owner_id = entry
+            if expires_at <= self._clock():
+                del self._entries[key_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key_id)
+            self.hits += 1
+            return key, owner_id
+
+    def put(self, key_id: str, key: bytes, owner_id: str) -> None:
+        with self._lock:
+            self._entries[key_id] = (self._clock() + self.ttl_seconds, key, owner_id)
+            self._entries.move_to_end(key_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key_id: Optional[str] = None) -> None:
+        with self._lock:
+            if key_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class EncryptionKeyStore:
+    """Accès à la table `EncryptionKeys` (clés de données enveloppées)."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self._connect = connection_factory
+
+    def insert_key(self, key_id: str, wrapped_key: bytes, nonce: bytes, key_version: str,
+                   encryption_level: str, user_id: str, document_id: str) -> None:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO "EncryptionKeys"
+                    (id, encrypted_key, iv, key_version, key_wrapping, encryption_level, user_id,
+                     document_id, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
+                """, (
+                    key_id,
+                    base64.b64encode(wrapped_key).decode(),
+                    base64.b64encode(nonce).decode(),
+                    key_version,
+                    WRAPPING_AES_GCM_AAD,
+                    encryption_level,
+                    user_id,
+                    document_id
+                ))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def fetch_key(self, key_id: str) -> Optional[Dict]:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT id, encrypted_key, iv, key_version, key_wrapping, user_id
+                    FROM "EncryptionKeys"
+                    WHERE id = %s
+                """, (key_id,))
+                row = cur.fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        return self._decode_row(row)
+
+    def fetch_keys_by_version(self, key_version: str, after_id: Optional[str],
+                              limit: int) -> List[Dict]:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT id, encrypted_key, iv, key_version, key_wrapping, user_id
+                    FROM "EncryptionKeys"
+                    WHERE COALESCE(key_version, 'v1') = %s
+                      AND (%s::uuid IS NULL OR id > %s::uuid)
+                    ORDER BY id
+                    LIMIT %s
+                """, (key_version, after_id, after_id, limit))
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+        return [self._decode_row(row) for row in rows]
+
+    def update_wrapped_keys(self, updates: List[Tuple[str, bytes, bytes, str]]) -> None:
+        """Met à jour un lot de clés ré-enveloppées (schéma `aes-gcm-aad`) en une seule requête."""
+        if not updates:
+            return
+        from psycopg2.extras import execute_values
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    UPDATE "EncryptionKeys" AS k
+                    SET encrypted_key = v.encrypted_key,
+                        iv = v.iv,
+                        key_version = v.key_version,
+                        key_wrapping = v.key_wrapping
+                    FROM (VALUES %s) AS v(id, encrypted_key, iv, key_version, key_wrapping)
+                    WHERE k.id = v.id::uuid
+                """, [
+                    (key_id, base64.b64encode(wrapped).decode(), base64.b64encode(nonce).decode(), version,
+                     WRAPPING_AES_GCM_AAD)
+                    for key_id, wrapped, nonce, version in updates
+                ])
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _decode_row(row) -> Dict:
+        key_id, encrypted_key, iv, key_version, key_wrapping, user_id = row
+        return {
+            'id': str(key_id),
+            'wrapped_key': base64.b64decode(encrypted_key),
+            'nonce': base64.b64decode(iv),
+            'key_version': key_version or 'v1',
+            'key_wrapping': key_wrapping or WRAPPING_NODE_LEGACY,
+            'user_id': user_id
+        }
+
+
+class StreamingEncryptionService:
+    """Chiffrement segmenté des documents avec gestion des clés enveloppées."""
+
+    def __init__(self, key_store: Optional[EncryptionKeyStore] = None,
+                 master_keys: Optional[Tuple[str, Dict[str, bytes]]] = None,
+                 segment_size: int = DEFAULT_SEGMENT_SIZE,
+                 key_cache: Optional[KeyCache] = None):
+        if not 0 < segment_size <= MAX_SEGMENT_SIZE:
+            raise ValueError(f'Taille de segment invalide: {segment_size}')
+        self.key_store = key_store or EncryptionKeyStore()
+        self.current_version, self.master_keys = master_keys or load_master_keys_from_env()
+        self.segment_size = segment_size
+        self.key_cache = key_cache or KeyCache()
+
+    # ------------------------------------------------------------------
+    # Gestion des clés
+    # ------------------------------------------------------------------
+
+    def create_data_key(self, user_id: str, document_id: str,
+                        encryption_level: str = 'standard') -> Tuple[str, bytes]:
+        """Génère une clé de données, la stocke enveloppée et retourne (key_id, clé)."""
+        key_id = str(uuid.uuid4())
+        data_key = AESGCM.generate_key(bit_length=KEY_LENGTH * 8)
+        wrapped, nonce = self._wrap_key(key_id, data_key, self.current_version)
+        self.key_store.insert_key(key_id, wrapped, nonce, self.current_version,
+                                  encryption_level, user_id, document_id)
+        self.key_cache.put(key_id, data_key, user_id)
+        return key_id, data_key
+
+    def retrieve_key(self, key_id: str, user_id: str) -> bytes:
+        """Retourne la clé de données déchiffrée, depuis le cache si possible."""
+        cached = self.key_cache.get(key_id)
+        if cached is None:
+            row = self.key_store.fetch_key(key_id)
+            if not row:
+                raise EncryptionError('Clé de chiffrement non trouvée')
+            data_key = self._unwrap_key(key_id, row['wrapped_key'], row['nonce'], row['key_version'],
+                                        row['key_wrapping'])
+            owner_id = row['user_id']
+            self.key_cache.put(key_id, data_key, owner_id)
+        else:
+            data_key, owner_id = cached
+
+        if owner_id != user_id:
+            raise EncryptionError('Accès non autorisé à la clé de chiffrement')
+        return data_key
+
+    def rotate_keys(self, from_version: str, batch_size: int = 500) -> int:
+        """Ré-enveloppe toutes les clés `from_version` avec la clé maître courante.
+
+        Seules les clés de données sont rechiffrées : le contenu des documents
+        reste intact puisque la clé de données ne change pas. Les clés
+        historiques (`node-legacy`) passent au schéma `aes-gcm-aad`. Une clé
+        illisible est laissée en place et signalée, sans interrompre les lots
+        suivants (les lots précédents sont déjà validés).
+
+        Args:
+            from_version (str): La version de clé maître à retirer
+            batch_size (int): Le nombre de clés traitées par lot
+
+        Returns:
+            int: Le nombre de clés ré-enveloppées
+        """
+        if from_version == self.current_version:
+            return 0
+        if from_version not in self.master_keys:
+            raise EncryptionError(f'Clé maître {from_version} absente du trousseau')
+
+        rotated = 0
+        after_id = None
+        while True:
+            rows = self.key_store.fetch_keys_by_version(from_version, after_id, batch_size)
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                try:
+                    data_key = self._unwrap_key(row['id'], row['wrapped_key'], row['nonce'], from_version,
+                                                row['key_wrapping'])
+                except EncryptionError as e:
+                    print(f"⚠️ Clé {row['id']} non ré-enveloppée ({row['key_wrapping']}): {e}")
+                    continue
+                wrapped, nonce = self._wrap_key(row['id'], data_key, self.current_version)
+                updates.append((row['id'], wrapped, nonce, self.current_version))
+            self.key_store.update_wrapped_keys(updates)
+            rotated += len(updates)
+            after_id = rows[-1]['id']
+        return rotated
+
+    def _wrap_key(self, key_id: str, data_key: bytes, version: str) -> Tuple[bytes, bytes]:
+        nonce = os.urandom(12)
+        aad = f'{key_id}:{version}'.encode()
+        return AESGCM(self.master_keys[version]).encrypt(nonce, data_key, aad), nonce
+
+    def _unwrap_key(self, key_id: str, wrapped: bytes, nonce: bytes, version: str,
+                    wrapping: str = WRAPPING_AES_GCM_AAD) -> bytes:
+        master_key = self.master_keys.get(version)
+        if master_key is None:
+            raise EncryptionError(f'Clé maître {version} absente du trousseau')
+        try:
+            if wrapping == WRAPPING_NODE_LEGACY:
+                # `nonce` contient l'IV aléatoire de storeKey, utilisé seulement comme AAD
+                legacy_key, legacy_iv = derive_legacy_key(master_key)
+                return AESGCM(legacy_key).decrypt(legacy_iv, wrapped, nonce)
+            if wrapping != WRAPPING_AES_GCM_AAD:
+                raise EncryptionError(f"Schéma d'enveloppement inconnu: {wrapping}")
+            return AESGCM(master_key).decrypt(nonce, wrapped, f'{key_id}:{version}'.encode())
+        except InvalidTag as e:
+            raise EncryptionError('Clé de chiffrement corrompue') from e
+
+    # ------------------------------------------------------------------
+    # Chiffrement / déchiffrement en flux
+    # ------------------------------------------------------------------
+
+    def encrypt_stream(self, data_key: bytes, source: BinaryIO, destination: BinaryIO) -> int:
+        """Chiffre `source` vers `destination` segment par segment.
+
+        Returns:
+            int: Le nombre d'octets écrits
+        """
+        header = HEADER_STRUCT.pack(MAGIC, FORMAT_VERSION, self.segment_size,
+                                    os.urandom(NONCE_PREFIX_LENGTH))
+        destination.write(header)
+        written = HEADER_LENGTH
+        aead = AESGCM(data_key)
+        prefix = header[-NONCE_PREFIX_LENGTH:]
+
+        # Lecture avec un segment d'avance pour savoir lequel est le dernier
+        current = _read_exact(source, self.segment_size)
+        index = 0
+        while True:
+            following = _read_exact(source, self.segment_size) if len(current) == self.segment_size else b''
+            is_last = not following
+            segment = aead.encrypt(_segment_nonce(prefix, index, is_last), current, header)
+            destination.write(segment)
+            written += len(segment)
+            if is_last:
+                return written
+            current = following
+            index += 1
+
+    def decrypt_stream(self, data_key: bytes, source: BinaryIO) -> Iterator[bytes]:
+        """Déchiffre un flux complet et produit les segments en clair au fil de l'eau."""
+        header, segment_size, prefix = self._read_header(source)
+        aead = AESGCM(data_key)
+        encrypted_size = segment_size + TAG_LENGTH
+
+        current = _read_exact(source, encrypted_size)
+        index = 0
+        while True:
+            following = _read_exact(source, encrypted_size) if len(current) == encrypted_size else b''
+            is_last = not following
+            yield self._open_segment(aead, prefix, index, is_last, current, header)
+            if is_last:
+                return
+            current = following
+            index += 1
+
+    def decrypt_range(self, data_key: bytes, source: BinaryIO, offset: int, length: int) -> bytes:
+        """Déchiffre uniquement les segments couvrant [offset, offset + length).
+
+        `source` doit pouvoir se positionner (`seek`) ; seuls les segments utiles sont lus.
+        """
+        if offset < 0 or length < 0:
+            raise ValueError('Plage invalide')
+        source.seek(0)
+        header, segment_size, prefix = self._read_header(source)
+        encrypted_size = segment_size + TAG_LENGTH
+
+        source.seek(0, os.SEEK_END)
+        body_size = source.tell() - HEADER_LENGTH
+        segment_count = max(1, -(-body_size // encrypted_size))
+        last_plain = body_size - (segment_count - 1) * encrypted_size - TAG_LENGTH
+        if last_plain < 0:
+            raise EncryptionError('Document chiffré tronqué')
+        plaintext_size = (segment_count - 1) * segment_size + last_plain
+
+        end = min(offset + length, plaintext_size)
+        if length == 0 or offset >= end:
+            return b''
+
+        aead = AESGCM(data_key)
+        first_index = offset // segment_size
+        last_index = (end - 1) // segment_size
+        chunks = []
+        for index in range(first_index, last_index + 1):
+            source.seek(HEADER_LENGTH + index * encrypted_size)
+            chunk = _read_exact(source, encrypted_size)
+            chunks.append(self._open_segment(aead, prefix, index, index == segment_count - 1,
+                                             chunk, header))
+        start = offset - first_index * segment_size
+        return b''.join(chunks)[start:start + (end - offset)]
+
+    def encrypt_document(self, source: BinaryIO, destination: BinaryIO, user_id: str,
+                         document_id: str, encryption_level: str = 'standard') -> Dict:
+        """Crée une clé de données pour le document et le chiffre en flux."""
+        key_id, data_key = self.create_data_key(user_id, document_id, encryption_level)
+        size = self.encrypt_stream(data_key, source, destination)
+        return {
+            'encryptionKey': key_id,
+            'algorithm': 'aes-256-gcm-stream',
+            'segmentSize': self.segment_size,
+            'keyVersion': self.current_version,
+            'encryptedSize': size
+        }
+
+    def decrypt_document(self, key_id: str, user_id: str, source: BinaryIO,
+                         destination: BinaryIO) -> int:
+        """Déchiffre un document complet vers `destination`, segment par segment."""
+        data_key = self.retrieve_key(key_id, user_id)
+        written = 0
+        for chunk in self.decrypt_stream(data_key, source):
+            destination.write(chunk)
+            written += len(chunk)
+        return written
+
+    def _read_header(self, source: BinaryIO) -> Tuple[bytes, int, bytes]:
+        header = _read_exact(source, HEADER_LENGTH)
+        if len(header) != HEADER_LENGTH:
+            raise EncryptionError('En-tête de document chiffré invalide')
+        magic, version, segment_size, prefix = HEADER_STRUCT.unpack(header)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise EncryptionError('Format de document chiffré non reconnu')
+        if not 0 < segment_size <= MAX_SEGMENT_SIZE:
+            raise EncryptionError('Taille de segment invalide')
+        return header, segment_size, prefix
+
+    @staticmethod
+    def _open_segment(aead: AESGCM, prefix: bytes, index: int, is_last: bool,
+                      segment: bytes, header: bytes) -> bytes:
+        if len(segment) < TAG_LENGTH:
+            raise EncryptionError('Document chiffré tronqué')
+        try:
+            return aead.decrypt(_segment_nonce(prefix, index, is_last), segment, header)
+        except InvalidTag as e:
+            raise EncryptionError(f'Intégrité du segment {index} compromise') from e
+
+
+def _segment_nonce(prefix: bytes, index: int, is_last: bool) -> bytes:
+    if index > 0xFFFFFFFF:
+        raise EncryptionError('Document trop volumineux pour la taille de segment')
+    return prefix + struct.pack('>IB', index, 1 if is_last else 0)
+
+
+def _read_exact(source: BinaryIO, size: int) -> bytes:
+    """Lit `size` octets, sauf en fin de flux (les flux réseau peuvent lire moins)."""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = source.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
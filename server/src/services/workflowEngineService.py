@@ -0,0 +1,460 @@
+"""
+Moteur de workflows documentaires compilés, avec exécution groupée des étapes.
+
+`WorkflowConfigurationService.executeWorkflowStep` (workflow-configuration-service.ts)
+relit pour chaque étape l'instance puis le template et ses étapes, vérifie les
+conditions, exécute les actions (notification, tâche, facture, signature) les
+unes après les autres, puis écrit l'instance par `advanceToNextStep` ou
+`completeWorkflow` : valider cent documents enchaîne cent transitions et leurs
+envois.
+
+Ici :
+
+- chaque "WorkflowTemplate" est compilé une fois en table de transitions
+  (condition précompilée, actions, étape suivante), gardée en cache ;
+- `WorkflowEngine.execute_steps` applique un lot d'événements : instances
+  verrouillées ensemble, transitions calculées en mémoire, une seule écriture
+  d'état par instance, et les actions déposées dans "workflow_outbox" dans la
+  même transaction ;
+- `OutboxDispatcher` vide la file avec un pool de workers, les actions d'un
+  lot s'exécutant en parallèle ; les échecs sont réessayés avec un délai
+  croissant.
+
+Mêmes conditions que `checkWorkflowConditions` (seule la première condition
+de l'étape est évaluée). Différence voulue : un événement dont l'étape n'est
+pas l'étape courante de l'instance est refusé, pour qu'un double envoi ne
+fasse pas avancer le workflow deux fois.
+"""
+
+import atexit
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Actions effectivement exécutées par executeWorkflowActions
+DISPATCHED_ACTIONS = ('send_notification', 'create_task', 'generate_invoice', 'request_signature')
+# Notification de fin d'étape (sendWorkflowNotifications(step, instance, 'complete'))
+STEP_NOTIFICATION = 'step_notification'
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+RETRY_BASE_SECONDS = 30
+
+
+def get_db_connection():
+    import psycopg2
+
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT')
+    )
+
+
+def compile_condition(step: Dict[str, Any]) -> Callable[[Dict[str, Any], Optional[Dict[str, Any]]], bool]:
+    """Prédicat (instance, result) -> bool, comme checkWorkflowConditions."""
+    conditions = step.get('conditions') or []
+    if not conditions:
+        return lambda instance, result: True
+    condition = conditions[0]
+    if condition == 'if_required':
+        required = bool(step.get('required'))
+        return lambda instance, result: required
+    if condition == 'if_amount_greater_than':
+        threshold = (step.get('condition_params') or {}).get('threshold') or 0
+        return lambda instance, result: ((result or {}).get('amount') or 0) > threshold
+    if condition == 'if_expert_assigned':
+        return lambda instance, result: bool(instance.get('expert_id'))
+    return lambda instance, result: True
+
+
+class CompiledStep:
+    __slots__ = ('index', 'step_id', 'name', 'check', 'actions', 'action_params', 'notification', 'next_step')
+
+    def __init__(self, index: int, step: Dict[str, Any], next_step: Optional[int]):
+        self.index = index
+        self.step_id = step['id']
+        self.name = step.get('name')
+        self.check = compile_condition(step)
+        self.actions = tuple(a for a in (step.get('actions') or []) if a in DISPATCHED_ACTIONS)
+        self.action_params = step.get('action_params') or {}
+        notifications = step.get('notifications') or {}
+        self.notification = notifications if notifications.get('on_complete') else None
+        self.next_step = next_step
+
+
+class CompiledWorkflow:
+    """Table de transitions d'un template : index d'étape -> étape compilée."""
+
+    def __init__(self, template: Dict[str, Any]):
+        self.template_id = template['id']
+        self.version = template.get('version')
+        steps = sorted(template.get('steps') or [], key=lambda s: s.get('order') or 0)
+        self.steps = [CompiledStep(i, step, i + 1 if i + 1 < len(steps) else None)
+                      for i, step in enumerate(steps)]
+
+    def transition(self, instance: Dict[str, Any], step_number: int,
+                   result: Optional[Dict[str, Any]]) -> Tuple[Optional[CompiledStep], Optional[str]]:
+        """Étape franchissable, ou (None, erreur)."""
+        if instance['status'] in FINAL_STATUSES:
+            return None, 'Instance de workflow terminée'
+        if step_number < 0 or step_number >= len(self.steps):
+            return None, 'Étape de workflow non trouvée'
+        if step_number != instance['current_step']:
+            return None, "Étape différente de l'étape courante"
+        step = self.steps[step_number]
+        if not step.check(instance, result):
+            return None, 'Conditions de workflow non remplies'
+        return step, None
+
+
+def outbox_rows(step: CompiledStep, instance: Dict[str, Any], user_id: Optional[str],
+                result: Optional[Dict[str, Any]]) -> List[Tuple[str, str, str, Dict[str, Any]]]:
+    """(instance_id, step_id, action, payload) pour les actions et la notification de l'étape."""
+    base = {
+        'instance_id': instance['id'],
+        'template_id': instance['template_id'],
+        'document_id': instance.get('document_id'),
+        'client_id': instance.get('client_id'),
+        'expert_id': instance.get('expert_id'),
+        'step_id': step.step_id,
+        'step_name': step.name,
+        'user_id': user_id,
+        'result': result
+    }
+    rows = [(instance['id'], step.step_id, action, {**base, 'action_params': step.action_params})
+            for action in step.actions]
+    if step.notification:
+        rows.append((instance['id'], step.step_id, STEP_NOTIFICATION, {
+            **base,
+            'event': 'complete',
+            'recipients': step.notification.get('recipients') or [],
+            'template': step.notification.get('template')
+        }))
+    return rows
+
+
+class WorkflowStore:
+    """Templates, instances (verrouillées par lot) et file "workflow_outbox"."""
+
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self._connect = connection_factory
+
+    def load_templates(self, template_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        from psycopg2.extras import RealDictCursor
+
+        conn = self._connect()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute('SELECT id, version FROM "WorkflowTemplate" WHERE id = ANY(%s)', (template_ids,))
+                templates = {r['id']: {**r, 'steps': []} for r in cur.fetchall()}
+                cur.execute("""
+                    SELECT id, workflow_id, name, "order", required, conditions, condition_params,
+                           actions, action_params, notifications
+                    FROM "WorkflowStep"
+                    WHERE workflow_id = ANY(%s)
+                    ORDER BY workflow_id, "order"
+                """, (template_ids,))
+                for step in cur.fetchall():
+                    if step['workflow_id'] in templates:
+                        templates[step['workflow_id']]['steps'].append(dict(step))
+            conn.commit()
+            return templates
+        finally:
+            conn.close()
+
+    def transition(self, instance_ids: List[str],
+                   apply: Callable[[Dict[str, Dict[str, Any]]], Tuple[List[Tuple], List[Tuple]]]) -> None:
+        """Verrouille les instances, appelle `apply(instances)` puis écrit états et actions en une transaction.
+
+        `apply` retourne (états (id, status, current_step), lignes d'outbox).
+        """
+        from psycopg2.extras import RealDictCursor, execute_values
+
+        conn = self._connect()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # Ordre fixe : deux lots concurrents ne s'interbloquent pas
+                cur.execute("""
+                    SELECT id::text, template_id, document_id::text, client_id::text, expert_id::text,
+                           status, current_step
+                    FROM "WorkflowInstance"
+                    WHERE id = ANY(%s::uuid[])
+                    ORDER BY id
+                    FOR UPDATE
+                """, (instance_ids,))
+                instances = {r['id']: dict(r) for r in cur.fetchall()}
+            states, outbox = apply(instances)
+            with conn.cursor() as cur:
+                if states:
+                    execute_values(cur, """
+                        UPDATE "WorkflowInstance" AS w
+                        SET status = v.status,
+                            current_step = v.current_step,
+                            completed_at = CASE WHEN v.status = 'completed' THEN NOW() ELSE w.completed_at END
+                        FROM (VALUES %s) AS v(id, status, current_step)
+                        WHERE w.id = v.id
+                    """, states, template='(%s::uuid, %s, %s::int)', page_size=1000)
+                if outbox:
+                    execute_values(cur, """
+                        INSERT INTO workflow_outbox (instance_id, step_id, action, payload)
+                        VALUES %s
+                    """, [(i, s, a, json.dumps(p, default=str)) for i, s, a, p in outbox],
+                        template='(%s::uuid, %s, %s, %s::jsonb)', page_size=1000)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def claim(self, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        """Réserve des actions à exécuter (en attente, ou réservées dont le bail a expiré)."""
+        from psycopg2.extras import RealDictCursor
+
+        conn = self._connect()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    UPDATE workflow_outbox
+                    SET status = 'processing', attempts = attempts + 1,
+                        available_at = NOW() + make_interval(secs => %(lease)s)
+                    WHERE id IN (
+                        SELECT id FROM workflow_outbox
+                        WHERE status IN ('pending', 'processing') AND available_at <= NOW()
+                        ORDER BY id
+                        LIMIT %(limit)s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, instance_id::text, step_id, action, payload, attempts
+                """, {'limit': limit, 'lease': lease_seconds})
+                rows = [dict(r) for r in cur.fetchall()]
+            conn.commit()
+            rows.sort(key=lambda r: r['id'])
+            return rows
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def settle(self, done: List[int], retry: List[Tuple[int, str, float]], failed: List[Tuple[int, str]]) -> None:
+        """Clôt un lot : terminées, à réessayer (id, erreur, délai en s), abandonnées (id, erreur)."""
+        from psycopg2.extras import execute_values
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                if done:
+                    cur.execute("""
+                        UPDATE workflow_outbox SET status = 'done', processed_at = NOW(), last_error = NULL
+                        WHERE id = ANY(%s)
+                    """, (done,))
+                if retry:
+                    execute_values(cur, """
+                        UPDATE workflow_outbox AS o
+                        SET status = 'pending', last_error = v.error,
+                            available_at = NOW() + make_interval(secs => v.delay)
+                        FROM (VALUES %s) AS v(id, error, delay)
+                        WHERE o.id = v.id
+                    """, retry, template='(%s::bigint, %s, %s::float8)')
+                if failed:
+                    execute_values(cur, """
+                        UPDATE workflow_outbox AS o
+                        SET status = 'failed', last_error = v.error, processed_at = NOW()
+                        FROM (VALUES %s) AS v(id, error)
+                        WHERE o.id = v.id
+                    """, failed, template='(%s::bigint, %s)')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+class WorkflowEngine:
+    """Exécution groupée d'étapes sur des templates compilés une fois."""
+
+    def __init__(self, store: Optional[WorkflowStore] = None):
+        self.store = store or WorkflowStore()
+        self._compiled: Dict[str, CompiledWorkflow] = {}
+        self._lock = threading.Lock()
+        self.stats = {'events': 0, 'advanced': 0, 'completed': 0, 'rejected': 0, 'actions': 0}
+
+    def compiled(self, template_ids: List[str]) -> Dict[str, CompiledWorkflow]:
+        with self._lock:
+            missing = [t for t in set(template_ids) if t not in self._compiled]
+        if missing:
+            loaded = {tid: CompiledWorkflow(t) for tid, t in self.store.load_templates(missing).items()}
+            with self._lock:
+                self._compiled.update(loaded)
+        with self._lock:
+            return {t: self._compiled[t] for t in template_ids if t in self._compiled}
+
+    def invalidate(self, template_id: Optional[str] = None) -> None:
+        """À appeler après modification d'un template (tous si None)."""
+        with self._lock:
+            if template_id is None:
+                self._compiled.clear()
+            else:
+                self._compiled.pop(template_id, None)
+
+    def execute_step(self, instance_id: str, step_number: int, user_id: Optional[str] = None,
+                     result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self.execute_steps([{'instance_id': instance_id, 'step_number': step_number,
+                                    'user_id': user_id, 'result': result}])[0]
+
+    def execute_steps(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Applique des événements {instance_id, step_number, user_id, result}, dans l'ordre reçu.
+
+        Retourne, par événement : instance_id, step_number, ok, error, status, current_step.
+        Plusieurs événements d'une même instance s'enchaînent ; l'instance n'est écrite qu'une fois.
+        """
+        outcomes: List[Dict[str, Any]] = []
+
+        def apply(instances: Dict[str, Dict[str, Any]]) -> Tuple[List[Tuple], List[Tuple]]:
+            outcomes.clear()
+            workflows = self.compiled(list({i['template_id'] for i in instances.values()}))
+            touched: Dict[str, Dict[str, Any]] = {}
+            outbox: List[Tuple] = []
+            for event in events:
+                instance_id = str(event['instance_id'])
+                instance = touched.get(instance_id) or instances.get(instance_id)
+                outcome = {'instance_id': instance_id, 'step_number': event['step_number'],
+                           'ok': False, 'error': None, 'status': None, 'current_step': None}
+                outcomes.append(outcome)
+                if instance is None:
+                    outcome['error'] = 'Instance de workflow non trouvée'
+                    continue
+                workflow = workflows.get(instance['template_id'])
+                if workflow is None:
+                    outcome['error'] = 'Template de workflow non trouvé'
+                    continue
+                step, error = workflow.transition(instance, event['step_number'], event.get('result'))
+                if step is None:
+                    outcome.update(error=error, status=instance['status'], current_step=instance['current_step'])
+                    continue
+                outbox.extend(outbox_rows(step, instance, event.get('user_id'), event.get('result')))
+                if step.next_step is None:
+                    instance = {**instance, 'status': 'completed'}
+                else:
+                    instance = {**instance, 'status': 'in_progress', 'current_step': step.next_step}
+                touched[instance_id] = instance
+                outcome.update(ok=True, status=instance['status'], current_step=instance['current_step'])
+            states = [(i['id'], i['status'], i['current_step']) for i in touched.values()]
+            return states, outbox
+
+        self.store.transition(sorted({str(e['instance_id']) for e in events}), apply)
+
+        self.stats['events'] += len(events)
+        for outcome in outcomes:
+            if not outcome['ok']:
+                self.stats['rejected'] += 1
+            elif outcome['status'] == 'completed':
+                self.stats['completed'] += 1
+            else:
+                self.stats['advanced'] += 1
+        return outcomes
+
+
+class OutboxDispatcher:
+    """Vide "workflow_outbox" : lots réservés, actions exécutées en parallèle par `workers` threads.
+
+    `handlers` associe une action (send_notification, create_task, ...,
+    step_notification) à une fonction recevant le payload ; une action sans
+    gestionnaire est considérée comme traitée.
+    """
+
+    def __init__(self, store: Optional[WorkflowStore] = None,
+                 handlers: Optional[Dict[str, Callable[[Dict[str, Any]], None]]] = None,
+                 workers: int = 8, batch_size: int = 100, poll_seconds: float = 1,
+                 lease_seconds: float = 300, max_attempts: int = 5, autostart: bool = True):
+        self.store = store or WorkflowStore()
+        self.handlers = dict(handlers or {})
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='workflow-outbox')
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'done': 0, 'retried': 0, 'failed': 0, 'batches': 0, 'errors': 0}
+        if autostart:
+            self.start()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='workflow-outbox-dispatcher', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def notify(self) -> None:
+        """Réveille le dispatcher (par exemple juste après execute_steps)."""
+        self._wake.set()
+
+    def _handle(self, row: Dict[str, Any]) -> Optional[str]:
+        handler = self.handlers.get(row['action'])
+        if handler is None:
+            return None
+        try:
+            handler(row['payload'])
+            return None
+        except Exception as e:
+            return str(e) or e.__class__.__name__
+
+    def drain_once(self) -> int:
+        """Traite un lot ; retourne le nombre d'actions réservées."""
+        rows = self.store.claim(self.batch_size, self.lease_seconds)
+        if not rows:
+            return 0
+        done: List[int] = []
+        retry: List[Tuple[int, str, float]] = []
+        failed: List[Tuple[int, str]] = []
+        for row, error in zip(rows, self._pool.map(self._handle, rows)):
+            if error is None:
+                done.append(row['id'])
+            elif row['attempts'] >= self.max_attempts:
+                failed.append((row['id'], error))
+            else:
+                retry.append((row['id'], error, RETRY_BASE_SECONDS * 2 ** (row['attempts'] - 1)))
+        self.store.settle(done, retry, failed)
+        self.stats['batches'] += 1
+        self.stats['done'] += len(done)
+        self.stats['retried'] += len(retry)
+        self.stats['failed'] += len(failed)
+        if failed:
+            print(f'Actions de workflow abandonnées après {self.max_attempts} tentatives : {len(failed)}')
+        return len(rows)
+
+    def drain(self) -> int:
+        """Traite jusqu'à épuisement des actions disponibles."""
+        total = 0
+        while True:
+            claimed = self.drain_once()
+            if not claimed:
+                return total
+            total += claimed
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self._pool.shutdown(wait=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                claimed = self.drain_once()
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f'Erreur traitement outbox workflow : {str(e)}')
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
@@ -76,8 +76,10 @@ export interface MessageNotification {
   message_id: string;
   title: string;
   body: string;
+  message_count: number; // messages regroupés tant que la notification n'est pas lue
   is_read: boolean;
   created_at: string;
+  updated_at?: string;
 }
 
 // Types pour les événements Socket.IO